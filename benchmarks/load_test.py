@@ -0,0 +1,430 @@
+"""
+Load test of the cluster's read/write paths with latency SLO reports.
+
+Drives a configurable mix of requests at stepped, open-loop request rates:
+
+  read         GET  {node}/data/{key}          (a random region's node, like the generator)
+  routed_read  GET  {controller}/api/v1/data/{key}
+  write        POST {controller}/api/v1/data
+  state        GET  {controller}/rl/system-state[?topK=K]
+  action       POST {controller}/rl/execute-action   (random REPLICATE/EVICT)
+
+Keys are drawn Zipf-like from --num_keys keys, which are written once before
+the first step. Arrivals are Poisson at each step's rate and latency is taken
+from the *scheduled* send time, so a backed-up server can't hide its queueing
+by slowing the client down (no coordinated omission).
+
+Per step and endpoint the report has throughput, p50/p99/p999 latency, errors
+and whether the p99 SLO held. A step is saturated when the achieved rate
+falls short of the offered one, an SLO is missed, more than 1% of requests
+fail or requests had to be dropped at --max_outstanding. The
+first saturated step is the saturation point; stepping stops there unless
+--keep_going. If the load generator itself falls behind its schedule the
+step is flagged generator_bound, and its numbers describe the client.
+
+Against the Docker Compose stack (CONTROLLER_URL / REGION_NODE_URLS as for the
+generator) or a stand-in (common/standin_server.py) started for the run:
+
+    python load_test.py --qps 50 100 200 400 --output load_baseline.json
+    python load_test.py --standin --qps 500 1000 2000 --mix read=0.8,write=0.1,state=0.1
+    python load_test.py --qps 50 100 200 400 --output load_now.json --compare load_baseline.json
+
+The stand-in runs in its own process: sharing the GIL with the load generator
+would add up to a switch interval (5 ms) to every request it serves.
+--compare exits with status 1 if any endpoint's p99 got
+slower than --threshold times the baseline at the same step, or a step
+the baseline sustained is now saturated.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+
+import aiohttp
+import numpy as np
+
+COMMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common')
+sys.path.append(COMMON)
+from state_codec import STATE_ACCEPT
+
+from run_benchmarks import metadata
+
+CONTROLLER_URL = os.environ.get("CONTROLLER_URL", "http://localhost:8080")
+# Same ports as docker-compose.yaml / generator.py
+NODE_URLS = [f"http://localhost:{port}" for port in range(8081, 8086)]
+if os.environ.get("REGION_NODE_URLS"):
+    NODE_URLS = [item.split("=", 1)[1] for item in os.environ["REGION_NODE_URLS"].split(",")]
+
+ENDPOINTS = ["read", "routed_read", "write", "state", "action"]
+DEFAULT_MIX = {"read": 0.85, "write": 0.1, "state": 0.04, "action": 0.01}
+# p99 targets in ms. A JVM node sleeps 10 ms for a local read and 150 ms for a miss.
+DEFAULT_SLO_P99_MS = {"read": 200, "routed_read": 250, "write": 500, "state": 1000, "action": 500}
+
+DEFAULT_QPS = [25, 50, 100, 200, 400]
+STEP_SECS = 10
+# Unrecorded load at the first step's rate, so connection setup doesn't land in its percentiles
+WARMUP_SECS = 3
+NUM_KEYS = 20
+ZIPF_EXPONENT = 1.1
+VALUE_BYTES = 16
+MAX_INFLIGHT = 256
+MAX_OUTSTANDING = 20000
+HTTP_TIMEOUT_SECS = 5
+
+# A step is saturated below this fraction of the offered rate
+ACHIEVED_FRACTION = 0.9
+MAX_ERROR_RATE = 0.01
+# Sends started this late (p99) mean the load generator, not the server, is the limit
+GENERATOR_LAG_MS = 5
+# Latencies below this are compared as equal: sub-millisecond noise is not a regression
+NOISE_FLOOR_MS = 1.0
+# With fewer requests a p99 is little more than the maximum, so it is shown but not flagged
+MIN_COMPARE_SAMPLES = 200
+
+
+def parse_weights(text, defaults, name):
+    """Parses "read=0.8,write=0.2" into {"read": 0.8, "write": 0.2}, checked against ENDPOINTS."""
+    if not text:
+        return dict(defaults)
+    weights = {}
+    for item in text.split(","):
+        endpoint, _, value = item.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in {name}: {endpoint!r} (one of {ENDPOINTS})")
+        weights[endpoint] = float(value)
+    return weights
+
+
+class Target:
+    """Where the requests go, plus what the mix needs to build them."""
+
+    def __init__(self, controller_url, node_urls, keys, value_bytes=VALUE_BYTES, state_top_k=None,
+                 binary_state=False):
+        self.controller_url = controller_url.rstrip("/")
+        self.node_urls = [url.rstrip("/") for url in node_urls]
+        self.keys = keys
+        self.value = "x" * value_bytes
+        self.state_params = {"topK": state_top_k} if state_top_k else None
+        self.state_headers = {"Accept": STATE_ACCEPT} if binary_state else None
+        self.node_ids = []
+
+    def request(self, endpoint, key, node, rng):
+        """(method, url, keyword arguments) of one request."""
+        if endpoint == "read":
+            return "GET", f"{self.node_urls[node % len(self.node_urls)]}/data/{key}", {}
+        if endpoint == "routed_read":
+            return "GET", f"{self.controller_url}/api/v1/data/{key}", {}
+        if endpoint == "write":
+            return "POST", f"{self.controller_url}/api/v1/data", {"json": {"key": key, "value": self.value}}
+        if endpoint == "state":
+            return "GET", f"{self.controller_url}/rl/system-state", {"params": self.state_params,
+                                                                    "headers": self.state_headers}
+        action = "REPLICATE" if rng.random() < 0.5 else "EVICT"
+        payload = {"actionType": action, "key": key, "targetNode": self.node_ids[node % len(self.node_ids)]}
+        return "POST", f"{self.controller_url}/rl/execute-action", {"json": payload}
+
+
+async def prepare(session, target):
+    """Writes every key once and learns the node ids for actions from one state poll."""
+    semaphore = asyncio.Semaphore(32)
+
+    async def write(key):
+        async with semaphore:
+            async with session.post(f"{target.controller_url}/api/v1/data",
+                                    json={"key": key, "value": target.value}) as response:
+                response.raise_for_status()
+
+    await asyncio.gather(*(write(key) for key in target.keys))
+    async with session.get(f"{target.controller_url}/rl/system-state") as response:
+        response.raise_for_status()
+        target.node_ids = [node["nodeId"] for node in await response.json()]
+
+
+async def run_step(session, target, mix, rate, duration, rng, max_outstanding=MAX_OUTSTANDING):
+    """
+    Sends Poisson arrivals at `rate` for `duration` seconds, then waits for the
+    stragglers. Returns per-endpoint latencies (ms, successful requests only),
+    error counts, send lags and the time from the first arrival to the last completion.
+    """
+    endpoints = list(mix)
+    weights = np.array([mix[e] for e in endpoints], dtype=float)
+    gaps = rng.exponential(1.0 / rate, size=int(rate * duration * 1.2) + 16)
+    arrivals = np.cumsum(gaps)
+    arrivals = arrivals[arrivals < duration]
+    ops = rng.choice(len(endpoints), size=len(arrivals), p=weights / weights.sum())
+    popularity = 1.0 / np.arange(1, len(target.keys) + 1) ** ZIPF_EXPONENT
+    keys = rng.choice(len(target.keys), size=len(arrivals), p=popularity / popularity.sum())
+    nodes = rng.integers(0, 1 << 30, size=len(arrivals))
+
+    latencies = {e: [] for e in endpoints}
+    errors = Counter()
+    lags = np.zeros(len(arrivals))
+    dropped = 0
+    pending = set()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    last_done = start
+
+    async def send(endpoint, method, url, kwargs, scheduled):
+        nonlocal last_done
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                await response.read()
+                ok = response.status < 400
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        done = loop.time()
+        last_done = max(last_done, done)
+        if ok:
+            latencies[endpoint].append((done - scheduled) * 1000)
+        else:
+            errors[endpoint] += 1
+
+    for i, offset in enumerate(arrivals):
+        scheduled = start + offset
+        delay = scheduled - loop.time()
+        if delay > 0.001:
+            await asyncio.sleep(delay)
+        lags[i] = max(0.0, loop.time() - scheduled) * 1000
+        if len(pending) >= max_outstanding:
+            dropped += 1
+            continue
+        endpoint = endpoints[ops[i]]
+        method, url, kwargs = target.request(endpoint, target.keys[keys[i]], int(nodes[i]), rng)
+        task = asyncio.create_task(send(endpoint, method, url, kwargs, scheduled))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+
+    return {
+        "latencies": latencies,
+        "errors": errors,
+        "lags": lags,
+        "dropped": dropped,
+        "offered": len(arrivals),
+        "elapsed": max(last_done - start, duration)
+    }
+
+
+def summarize_step(rate, duration, raw, slo):
+    """Step report: per-endpoint throughput, percentiles and SLOs, plus saturation and its reasons."""
+    elapsed = raw["elapsed"]
+    endpoints = {}
+    succeeded = 0
+    failed = 0
+    reasons = []
+    for endpoint, values in raw["latencies"].items():
+        errors = raw["errors"][endpoint]
+        count = len(values) + errors
+        if count == 0:
+            continue
+        succeeded += len(values)
+        failed += errors
+        entry = {"count": count, "errors": errors, "throughput": len(values) / elapsed}
+        if values:
+            p50, p99, p999 = np.percentile(values, [50, 99, 99.9])
+            entry.update({"mean_ms": float(np.mean(values)), "p50_ms": float(p50), "p99_ms": float(p99),
+                          "p999_ms": float(p999), "max_ms": float(np.max(values))})
+        target = slo.get(endpoint)
+        if target is not None:
+            entry["slo_p99_ms"] = target
+            entry["slo_met"] = bool(values) and entry["p99_ms"] <= target
+            if not entry["slo_met"]:
+                reasons.append(f"{endpoint} p99 over {target} ms")
+        endpoints[endpoint] = entry
+
+    offered_rate = raw["offered"] / duration
+    achieved_rate = succeeded / elapsed
+    error_rate = failed / max(succeeded + failed, 1)
+    if achieved_rate < ACHIEVED_FRACTION * offered_rate:
+        reasons.append(f"achieved {achieved_rate:.1f}/s of {offered_rate:.1f}/s offered")
+    if error_rate > MAX_ERROR_RATE:
+        reasons.append(f"error rate {error_rate:.1%}")
+    if raw["dropped"]:
+        reasons.append(f"{raw['dropped']} requests dropped at the outstanding limit")
+    lag_p99 = float(np.percentile(raw["lags"], 99)) if len(raw["lags"]) else 0.0
+
+    return {
+        "target_qps": rate,
+        "offered_qps": offered_rate,
+        "achieved_qps": achieved_rate,
+        "duration_secs": elapsed,
+        "error_rate": error_rate,
+        "dropped": raw["dropped"],
+        "send_lag_p99_ms": lag_p99,
+        "generator_bound": lag_p99 > GENERATOR_LAG_MS,
+        "saturated": bool(reasons),
+        "reasons": reasons,
+        "endpoints": endpoints
+    }
+
+
+def print_step(step):
+    status = "SATURATED (" + "; ".join(step["reasons"]) + ")" if step["saturated"] else "ok"
+    print(f"--- {step['target_qps']} qps: achieved {step['achieved_qps']:.1f}/s, errors {step['error_rate']:.2%}, "
+          f"send lag p99 {step['send_lag_p99_ms']:.1f} ms -> {status}")
+    if step["generator_bound"]:
+        print("    WARNING: the load generator fell behind its schedule, these numbers describe the client")
+    print(f"    {'endpoint':<12} {'count':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9} {'SLO':>9}")
+    for endpoint, e in step["endpoints"].items():
+        slo = "" if "slo_met" not in e else ("met" if e["slo_met"] else "MISSED")
+        print(f"    {endpoint:<12} {e['count']:>7} {e['throughput']:>9.1f} {e.get('p50_ms', float('nan')):>9.2f} "
+              f"{e.get('p99_ms', float('nan')):>9.2f} {e.get('p999_ms', float('nan')):>9.2f} {slo:>9}")
+
+
+async def run_load_test(target, mix, rates, step_secs, slo, seed=0, max_inflight=MAX_INFLIGHT,
+                        max_outstanding=MAX_OUTSTANDING, keep_going=False, warmup_secs=WARMUP_SECS):
+    rng = np.random.default_rng(seed)
+    connector = aiohttp.TCPConnector(limit=max_inflight)
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECS)
+    steps = []
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await prepare(session, target)
+        if "action" in mix and not target.node_ids:
+            print("WARNING: the state has no nodes, dropping 'action' from the mix")
+            mix = {e: w for e, w in mix.items() if e != "action"}
+        if warmup_secs > 0:
+            await run_step(session, target, mix, rates[0], warmup_secs, rng, max_outstanding)
+        for rate in rates:
+            raw = await run_step(session, target, mix, rate, step_secs, rng, max_outstanding)
+            step = summarize_step(rate, step_secs, raw, slo)
+            print_step(step)
+            steps.append(step)
+            if step["saturated"] and not keep_going:
+                break
+
+    sustained = [s["target_qps"] for s in steps if not s["saturated"]]
+    saturated = [s["target_qps"] for s in steps if s["saturated"]]
+    return {
+        "steps": steps,
+        "max_sustained_qps": max(sustained) if sustained else None,
+        "saturation_qps": saturated[0] if saturated else None
+    }
+
+
+def compare(report, baseline, threshold):
+    """Prints p50/p99 against the baseline at the same step rates. Returns the regressions found."""
+    regressions = []
+    base_steps = {s["target_qps"]: s for s in baseline["steps"]}
+    print(f"\n{'step / endpoint':<28} {'base p50':>9} {'now p50':>9} {'base p99':>9} {'now p99':>9} {'ratio':>7}")
+    for step in report["steps"]:
+        base = base_steps.get(step["target_qps"])
+        if base is None:
+            continue
+        for endpoint, now in step["endpoints"].items():
+            before = base["endpoints"].get(endpoint)
+            if before is None or "p99_ms" not in now or "p99_ms" not in before:
+                continue
+            ratio = max(now["p99_ms"], NOISE_FLOOR_MS) / max(before["p99_ms"], NOISE_FLOOR_MS)
+            if min(now["count"], before["count"]) < MIN_COMPARE_SAMPLES:
+                flag = "  (few samples)" if ratio > threshold else ""
+            else:
+                flag = "  REGRESSION" if ratio > threshold else ""
+            name = f"{step['target_qps']} qps / {endpoint}"
+            print(f"{name:<28} {before['p50_ms']:>9.2f} {now['p50_ms']:>9.2f} {before['p99_ms']:>9.2f} "
+                  f"{now['p99_ms']:>9.2f} {ratio:>6.2f}x{flag}")
+            if flag == "  REGRESSION":
+                regressions.append(f"{name} p99")
+
+    # Only steps both runs reached count: a shorter run is not a lower saturation point
+    print(f"max sustained qps: baseline {baseline.get('max_sustained_qps')}, now {report.get('max_sustained_qps')}")
+    for step in report["steps"]:
+        base = base_steps.get(step["target_qps"])
+        if step["saturated"] and base is not None and not base["saturated"]:
+            regressions.append(f"{step['target_qps']} qps saturated")
+    return regressions
+
+
+def start_standin(latency_scale):
+    """Starts standin_server.py on free ports. Returns (process, controller URL, node URLs)."""
+    process = subprocess.Popen([sys.executable, "-u", os.path.join(COMMON, "standin_server.py"), "--port", "0",
+                                "--latency_scale", str(latency_scale)], stdout=subprocess.PIPE, text=True)
+    exports = {}
+    while len(exports) < 2:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"standin_server.py exited with status {process.wait()}")
+        name, _, value = line.strip().removeprefix("export ").partition("=")
+        exports[name] = value
+    node_urls = [item.split("=", 1)[1] for item in exports["REGION_NODE_URLS"].split(",")]
+    return process, exports["CONTROLLER_URL"], node_urls
+
+
+def main(args):
+    mix = parse_weights(args.mix, DEFAULT_MIX, "--mix")
+    slo = {**DEFAULT_SLO_P99_MS, **parse_weights(args.slo, {}, "--slo")}
+    keys = [f"user_profile_{i}" for i in range(args.num_keys)]
+
+    stand_in = None
+    if args.standin:
+        stand_in, controller_url, node_urls = start_standin(args.standin_latency_scale)
+    else:
+        controller_url, node_urls = args.controller_url, args.node_urls or NODE_URLS
+    target = Target(controller_url, node_urls, keys, args.value_bytes, args.state_top_k, args.binary_state)
+
+    print(f"--- Load test of {controller_url} and {len(node_urls)} nodes, mix {mix}, "
+          f"{args.step_secs}s per step ---")
+    try:
+        report = asyncio.run(run_load_test(target, mix, args.qps, args.step_secs, slo, args.seed, args.max_inflight,
+                                           args.max_outstanding, args.keep_going, args.warmup_secs))
+    finally:
+        if stand_in is not None:
+            stand_in.terminate()
+            stand_in.wait()
+
+    report = {
+        "meta": metadata(),
+        "config": {"controller_url": controller_url, "node_urls": node_urls, "standin": args.standin, "mix": mix,
+                   "slo_p99_ms": slo, "qps": args.qps, "step_secs": args.step_secs,
+                   "warmup_secs": args.warmup_secs, "num_keys": args.num_keys,
+                   "value_bytes": args.value_bytes, "state_top_k": args.state_top_k,
+                   "binary_state": args.binary_state, "max_inflight": args.max_inflight, "seed": args.seed},
+        **report
+    }
+    print(f"Max sustained: {report['max_sustained_qps']} qps, saturation at: {report['saturation_qps']} qps")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--qps", type=float, nargs="+", default=DEFAULT_QPS, help="Offered request rate of each step")
+    parser.add_argument("--step_secs", type=float, default=STEP_SECS)
+    parser.add_argument("--warmup_secs", type=float, default=WARMUP_SECS)
+    parser.add_argument("--mix", type=str, default=None,
+                        help=f"Request mix as endpoint=weight,... over {ENDPOINTS} (default {DEFAULT_MIX})")
+    parser.add_argument("--slo", type=str, default=None,
+                        help=f"p99 targets in ms as endpoint=ms,... (default {DEFAULT_SLO_P99_MS})")
+    parser.add_argument("--keep_going", action="store_true", help="Run every step even after saturation")
+    parser.add_argument("--controller_url", type=str, default=CONTROLLER_URL)
+    parser.add_argument("--node_urls", type=str, nargs="+", default=None,
+                        help="Node base URLs for reads (default: REGION_NODE_URLS or the docker-compose ports)")
+    parser.add_argument("--standin", action="store_true", help="Start a stand-in cluster for the run")
+    parser.add_argument("--standin_latency_scale", type=float, default=0.0,
+                        help="Fraction of the 10/150 ms read latency the stand-in sleeps")
+    parser.add_argument("--num_keys", type=int, default=NUM_KEYS)
+    parser.add_argument("--value_bytes", type=int, default=VALUE_BYTES)
+    parser.add_argument("--state_top_k", type=int, default=None)
+    parser.add_argument("--binary_state", action="store_true", help="Ask for the binary state encoding")
+    parser.add_argument("--max_inflight", type=int, default=MAX_INFLIGHT, help="Concurrent HTTP connections")
+    parser.add_argument("--max_outstanding", type=int, default=MAX_OUTSTANDING,
+                        help="Requests waiting for a connection before new arrivals are dropped")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="load_test_results.json")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=2.0,
+                        help="p99 slowdown ratio counted as a regression (p99s vary more between runs than medians)")
+    main(parser.parse_args())
@@ -0,0 +1,342 @@
+"""
+Micro and macro benchmarks for the agents' hot paths.
+
+Micro benchmarks time single calls on synthetic /rl/system-state payloads at
+20 / 1k / 10k keys and 5 / 50 nodes: state parsing, action masks, reward,
+graph construction (full and incremental), GNN forward (single and batched), MaskablePPO.predict,
+the observation pipeline (rates, normalization, frame stack),
+block sampling of workload requests, decoding of the JSON vs binary state encodings
+(those results also record the payload size in bytes) and the per-candidate cost
+of shadow evaluation (counterfactual placement update plus scoring).
+Macro benchmarks time full ReplicationEnv steps over HTTP against the
+asyncio stand-in cluster (common/standin_server.py).
+
+Results are written as JSON so runs can be compared across commits:
+
+    python run_benchmarks.py --output baseline.json
+    python run_benchmarks.py --output current.json --compare baseline.json
+
+--compare exits with status 1 if any benchmark got slower than --threshold.
+Benchmarks whose dependencies are missing (e.g. ray for ReplicationGNN) are
+reported as skipped.
+"""
+import os
+import sys
+import copy
+import json
+import itertools
+import time
+import platform
+import argparse
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'common'))
+sys.path.append(os.path.join(ROOT, 'rl-agent'))
+sys.path.append(os.path.join(ROOT, 'rl-agent-gnn'))
+
+from standin_server import BackgroundStandIn
+
+STATE_SIZES = [(20, 5), (1000, 5), (1000, 50), (10000, 5), (10000, 50)]
+ENV_SIZES = [(20, 5), (1000, 5), (1000, 50)]
+GNN_BATCH_SIZES = [1, 32]
+PAIR_SIZES = [(1000, 5), (1000, 50), (10000, 5)]
+PRUNE_TOP_M = 256
+SAMPLING_KEYS = [20, 1000000]
+SAMPLING_BLOCK = 1000000
+PIPELINE_CONFIG = {"rates": True, "normalize": True, "frames": 4}
+
+# Per benchmark: stop after MIN_TIME_SECS once MIN_REPEATS calls were made
+MIN_REPEATS = 5
+MAX_REPEATS = 1000
+MIN_TIME_SECS = 0.5
+
+
+def synthetic_state(num_keys, num_nodes, seed=0, demand_density=0.5, stored_ratio=0.4):
+    """Payload with Zipf-like key popularity, regional demand and a random placement."""
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, num_keys + 1)
+    reads = rng.poisson(200 * popularity[None, :] * rng.random((num_nodes, num_keys)))
+    demand = rng.random((num_nodes, num_keys)) < demand_density
+    stored = rng.random((num_nodes, num_keys)) < stored_ratio
+    stored[0] |= ~stored.any(axis=0)  # every key has at least one replica
+
+    state = []
+    for n in range(num_nodes):
+        key_metrics = {}
+        for k in np.flatnonzero(demand[n] | stored[n]):
+            key_metrics[f"user_profile_{k}"] = {
+                "readCount": int(reads[n, k]),
+                "writeCount": int(reads[n, k] // 10),
+                "stored": bool(stored[n, k]),
+            }
+        state.append({
+            "nodeId": f"replication-{n}",
+            "keyMetrics": key_metrics,
+            "storageCost": 1.5 * int(stored[n].sum()),
+        })
+    return state
+
+
+def measure(fn):
+    """Per-call wall times (ms) of fn()."""
+    fn()  # warm-up
+    times = []
+    deadline = time.perf_counter() + MIN_TIME_SECS
+    while len(times) < MAX_REPEATS and (len(times) < MIN_REPEATS or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+    times = np.array(times)
+    return {
+        "median_ms": float(np.median(times)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "min_ms": float(times.min()),
+        "repeats": int(len(times)),
+    }
+
+
+# --- Micro benchmarks ---------------------------------------------------------
+
+def micro_mlp(results):
+    from replication_env import MAX_NODES, ReplicationEnv
+    from sb3_contrib import MaskablePPO
+
+    for num_keys, num_nodes in STATE_SIZES:
+        state = synthetic_state(num_keys, num_nodes)
+        tag = f"keys={num_keys},nodes={num_nodes}"
+        # Node slots sized to the cluster so the projection doesn't drop nodes
+        env = ReplicationEnv(max_nodes=max(MAX_NODES, num_nodes))
+
+        results[f"micro/parse_state_to_observation/{tag}"] = measure(lambda: env._parse_state_to_observation(state))
+        env._parse_state_to_observation(state)  # the mask is built from this presence
+        results[f"micro/get_action_mask/{tag}"] = measure(env.action_masks)
+        results[f"micro/calculate_reward/{tag}"] = measure(lambda: env._calculate_reward(state))
+
+        # Same observation through rates + running normalization + a 4-frame stack
+        env = ReplicationEnv(max_nodes=max(MAX_NODES, num_nodes), obs_pipeline=PIPELINE_CONFIG)
+        results[f"micro/parse_state_to_observation/pipeline/{tag}"] = measure(
+            lambda: env._parse_state_to_observation(state))
+
+    env = ReplicationEnv()
+    model = MaskablePPO("MlpPolicy", env, seed=0, device="cpu")
+    obs = env._parse_state_to_observation(synthetic_state(20, 5))
+    masks = env.action_masks()
+    results["micro/maskable_ppo_predict"] = measure(
+        lambda: model.predict(obs, action_masks=masks, deterministic=True))
+
+
+def micro_sampling(results):
+    from sampling import zipf_profile
+
+    rng = np.random.default_rng(0)
+    for num_keys in SAMPLING_KEYS:
+        profile = zipf_profile(num_keys, 5, rng=rng)
+        results[f"micro/sample_requests/keys={num_keys},block={SAMPLING_BLOCK}"] = measure(
+            lambda: profile.sample(rng, SAMPLING_BLOCK))
+
+
+def micro_state_transfer(results):
+    from reward_model import state_to_arrays
+    from state_codec import StateDecoder, encode_state
+
+    for num_keys, num_nodes in STATE_SIZES:
+        state = synthetic_state(num_keys, num_nodes)
+        tag = f"keys={num_keys},nodes={num_nodes}"
+        body_json = json.dumps(state).encode()
+        body_binary = encode_state(state)
+        decoder = StateDecoder()
+
+        results[f"micro/decode_state/json/{tag}"] = measure(lambda: state_to_arrays(json.loads(body_json)))
+        results[f"micro/decode_state/json/{tag}"]["bytes"] = len(body_json)
+        results[f"micro/decode_state/binary/{tag}"] = measure(lambda: decoder.decode(body_binary))
+        results[f"micro/decode_state/binary/{tag}"]["bytes"] = len(body_binary)
+
+
+def micro_shadow(results):
+    from reward_model import RewardModel, state_to_arrays
+    from shadow import ShadowPlacement
+
+    metrics_model = RewardModel(0.1, 0.9)
+    for num_keys, num_nodes in STATE_SIZES:
+        live = state_to_arrays(synthetic_state(num_keys, num_nodes))
+        placement = ShadowPlacement()
+
+        def candidate_step():
+            shadow_state = placement.observe(live)
+            return metrics_model.metrics(shadow_state.presence, shadow_state.reads, shadow_state.storage_cost)
+
+        results[f"micro/shadow_candidate_step/keys={num_keys},nodes={num_nodes}"] = measure(candidate_step)
+
+
+def micro_gnn(results):
+    from graph_utils import IncrementalGraphState, parse_system_state_to_graph
+    from gnn_environment import MAX_KEYS, MAX_SERVERS, build_graph_obs
+    from reward_model import state_to_arrays
+
+    for num_keys, num_nodes in STATE_SIZES:
+        state = synthetic_state(num_keys, num_nodes)
+        tag = f"keys={num_keys},nodes={num_nodes}"
+        window = sorted({k for node in state for k in node['keyMetrics']})[:MAX_KEYS]
+        results[f"micro/parse_system_state_to_graph/full/{tag}"] = measure(lambda: parse_system_state_to_graph(state))
+        results[f"micro/parse_system_state_to_graph/window/{tag}"] = measure(
+            lambda: parse_system_state_to_graph(state, key_names=window))
+
+        if num_nodes > MAX_SERVERS:
+            continue  # beyond the env's padded observation
+        # One step's worth of change: a replica flipped and a few counters bumped
+        changed = copy.deepcopy(state)
+        for node in changed[:3]:
+            for metrics in list(node['keyMetrics'].values())[:3]:
+                metrics['readCount'] += 1
+        if window[0] in changed[0]['keyMetrics']:
+            metrics = changed[0]['keyMetrics'][window[0]]
+            metrics['stored'] = not metrics['stored']
+        graph = IncrementalGraphState(MAX_KEYS, MAX_SERVERS)
+        graph.update(state, window)
+        # The env parses each poll once and hands the graph its StateArrays
+        states = itertools.cycle([state_to_arrays(changed), state_to_arrays(state)])
+        results[f"micro/build_graph_obs/{tag}"] = measure(lambda: build_graph_obs(state, window))
+        results[f"micro/incremental_graph_obs/{tag}"] = measure(
+            lambda: (graph.update(next(states), window), graph.observation()))
+
+    try:
+        import torch
+        from gnn_environment import ReplicationEnvGNN, MAX_SERVERS
+        from gnn_model import ReplicationGNN
+    except ImportError as e:
+        print(f"Skipping ReplicationGNN.forward: {e}")
+        results["micro/gnn_forward"] = {"skipped": str(e)}
+        return
+
+    torch.manual_seed(0)
+    env = ReplicationEnvGNN()
+    model = ReplicationGNN(env.observation_space, env.action_space, MAX_KEYS * MAX_SERVERS, {}, "bench")
+    model.eval()
+    # The observation window is fixed-size, so a 20-key / 5-node state fills it the way the env does
+    state = synthetic_state(20, 5)
+    obs, _ = build_graph_obs(state, sorted({k for node in state for k in node['keyMetrics']})[:MAX_KEYS])
+
+    for batch_size in GNN_BATCH_SIZES:
+        batch = {name: torch.as_tensor(np.repeat(value[None], batch_size, axis=0)) for name, value in obs.items()}
+
+        def forward():
+            with torch.no_grad():
+                model({"obs": batch}, [], None)
+
+        results[f"micro/gnn_forward/batch={batch_size}"] = measure(forward)
+
+    # Pair scoring alone at graph sizes beyond the env window, full and top-M pruned
+    pruned = ReplicationGNN(env.observation_space, env.action_space, MAX_KEYS * MAX_SERVERS,
+                            {"custom_model_config": {"prune_top_m": PRUNE_TOP_M}}, "bench")
+    for num_keys, num_servers in PAIR_SIZES:
+        k_emb, s_emb = torch.randn(num_keys, 128), torch.randn(num_servers, 128)
+        context = (k_emb.mean(0, keepdim=True), s_emb.mean(0, keepdim=True))
+        for mode, m in (("full", model), (f"top{PRUNE_TOP_M}", pruned)):
+            def score():
+                with torch.no_grad():
+                    m._score_pairs(k_emb, s_emb, *context)
+
+            results[f"micro/gnn_score_pairs/{mode}/keys={num_keys},servers={num_servers}"] = measure(score)
+
+
+# --- Macro benchmarks ---------------------------------------------------------
+
+def macro_env_step(results):
+    import replication_env
+    from replication_env import MAX_NODES, ReplicationEnv
+
+    stand_in = BackgroundStandIn()
+    for num_keys, num_nodes in ENV_SIZES:
+        cluster = stand_in.add_cluster(node_ids=[f"replication-{n}" for n in range(num_nodes)],
+                                       num_keys=num_keys, seed=0)
+        replication_env.CONTROLLER_URL = cluster.controller_url
+        env = ReplicationEnv(max_nodes=max(MAX_NODES, num_nodes))
+        env.reset()
+        rng = np.random.default_rng(0)
+
+        def step():
+            mask = env.action_masks()
+            env.step(int(rng.choice(np.flatnonzero(mask))))
+
+        results[f"macro/env_step/keys={num_keys},nodes={num_nodes}"] = measure(step)
+    stand_in.close()
+
+
+# --- Reporting ----------------------------------------------------------------
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    versions = {"python": platform.python_version(), "numpy": np.__version__}
+    try:
+        import torch
+        versions["torch"] = torch.__version__
+    except ImportError:
+        pass
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(), "machine": platform.machine(), "versions": versions}
+
+
+def compare(results, baseline, threshold):
+    """Prints current vs baseline medians. Returns the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<68} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    for name in sorted(results):
+        now, base = results[name], baseline.get(name)
+        if base is None or "median_ms" not in now or "median_ms" not in base:
+            continue
+        ratio = now["median_ms"] / max(base["median_ms"], 1e-9)
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<68} {base['median_ms']:>10.3f} {now['median_ms']:>10.3f} {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suite", type=str, default="all", choices=["micro", "macro", "all"])
+    parser.add_argument("--output", type=str, default="benchmark_results.json")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio counted as a regression")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads (fixed for comparable numbers)")
+    args = parser.parse_args()
+
+    try:
+        import torch
+        torch.set_num_threads(args.threads)
+    except ImportError:
+        pass
+
+    results = {}
+    if args.suite in ("micro", "all"):
+        micro_mlp(results)
+        micro_gnn(results)
+        micro_sampling(results)
+        micro_state_transfer(results)
+        micro_shadow(results)
+    if args.suite in ("macro", "all"):
+        macro_env_step(results)
+
+    for name in sorted(results):
+        r = results[name]
+        print(f"{name:<68} " + (f"{r['median_ms']:>10.3f} ms (p90 {r['p90_ms']:.3f}, n={r['repeats']})"
+                               if "median_ms" in r else f"skipped: {r['skipped']}"))
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than {args.threshold}x baseline")
+            sys.exit(1)
@@ -0,0 +1,184 @@
+"""
+Regression fixtures for the demand/placement accounting fix, checked against
+every record of the recorded runs in results/.
+
+A record only has (time, avg_latency, total_cost). The cost pins down the
+replica count (cost / COST_PER_KEY_STORED, every key is under 1 KiB), and the
+demand is the workload generator's: its regional profiles (see
+simulated_cluster.regional_profiles), averaged over the run since evaluation
+picks them at random. For each replica count seen in a run, RewardModel gives
+the corrected latency of the best and the worst placement of that many
+replicas, and the corrected bill. The check reloads the result files and
+asserts, record by record, that:
+  - the record's cost is a whole number of replicas, at most one per
+    (node, key), and RewardModel bills that placement at exactly that cost;
+  - the replica counts seen per run still match the fixture, as do the
+    corrected latency ranges;
+  - the recorded latency (10 ms throughout, the old accounting) is only
+    reachable under the corrected model with full replication; with fewer
+    replicas even the best placement scores higher.
+
+Experiment sizes come from the README: "3keys" is the small experiment,
+5 keys on 3 nodes, and "20keys" is 20 keys on 5 nodes. Full replication
+(the static run) must cost K * N replicas, which the check also asserts.
+
+    python accounting_fixtures.py          # check ../results against fixtures/accounting_regression.json
+    python accounting_fixtures.py --build  # regenerate it from ../results
+"""
+import argparse
+import json
+import math
+import os
+from collections import Counter
+
+import numpy as np
+
+from reward_model import RewardModel
+from simulated_cluster import regional_profiles
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'results')
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'accounting_regression.json')
+
+COST_PER_KEY_STORED = 1.5
+
+# results/ file suffix -> (keys, nodes) of that experiment
+EXPERIMENTS = {
+    "3keys": (5, 3),
+    "20keys": (20, 5),
+}
+POLICIES = ["static", "mlp", "gnn"]
+
+
+def run_path(policy, suffix):
+    return os.path.join(RESULTS_DIR, f"evaluation_results_{policy}_{suffix}.json")
+
+
+def load_records(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def replica_count(cost, num_keys, num_nodes, where):
+    replicas = cost / COST_PER_KEY_STORED
+    assert replicas == round(replicas), f"{where}: cost {cost} is not a whole number of replicas"
+    replicas = int(round(replicas))
+    assert 0 <= replicas <= num_keys * num_nodes, \
+        f"{where}: {replicas} replicas don't fit {num_keys} keys on {num_nodes} nodes"
+    return replicas
+
+
+def mean_demand(num_keys, num_nodes):
+    """(N, K) read demand of the generator's profiles, averaged over all of them."""
+    return np.mean(regional_profiles(num_keys, num_nodes), axis=0)
+
+
+def placements(demand, replicas):
+    """(best, worst) (N, K) placements of `replicas` replicas: on the busiest or the idlest (node, key) pairs."""
+    order = np.argsort(-demand, axis=None, kind='stable')
+    best = np.zeros(demand.size, dtype=bool)
+    best[order[:replicas]] = True
+    worst = np.zeros(demand.size, dtype=bool)
+    worst[order[demand.size - replicas:]] = True
+    return best.reshape(demand.shape), worst.reshape(demand.shape)
+
+
+def corrected_metrics(num_keys, num_nodes, replicas):
+    """(best latency, worst latency, cost) of `replicas` replicas under RewardModel."""
+    model = RewardModel(latency_weight=0.1, cost_weight=0.9, storage_prices=np.full(num_nodes, COST_PER_KEY_STORED))
+    demand = mean_demand(num_keys, num_nodes)
+    (best_latency, best_cost), (worst_latency, worst_cost) = (
+        model.metrics(presence, demand, None) for presence in placements(demand, replicas))
+    assert best_cost == worst_cost
+    return float(best_latency), float(worst_latency), float(best_cost)
+
+
+def build_fixtures():
+    fixtures = []
+    for suffix, (num_keys, num_nodes) in EXPERIMENTS.items():
+        for policy in POLICIES:
+            path = run_path(policy, suffix)
+            if not os.path.exists(path):
+                continue
+            run = os.path.basename(path)
+            records = load_records(path)
+            counts = Counter(replica_count(item['total_cost'], num_keys, num_nodes, f"{run} sample {i}")
+                             for i, item in enumerate(records))
+            cases = []
+            for replicas in sorted(counts):
+                best, worst, cost = corrected_metrics(num_keys, num_nodes, replicas)
+                cases.append({
+                    "replicas": replicas,
+                    "records": counts[replicas],
+                    "corrected_best_latency": best,
+                    "corrected_worst_latency": worst,
+                    "corrected_cost": cost,
+                })
+            fixtures.append({
+                "run": run,
+                "keys": num_keys,
+                "nodes": num_nodes,
+                "records": len(records),
+                "cases": cases,
+            })
+    return fixtures
+
+
+def check_fixtures(fixtures):
+    """Checks every record of every fixture's run; returns the number of records checked."""
+    checked = 0
+    for suffix, (num_keys, num_nodes) in EXPERIMENTS.items():
+        static = run_path("static", suffix)
+        if os.path.exists(static):
+            full = {replica_count(item['total_cost'], num_keys, num_nodes, os.path.basename(static))
+                    for item in load_records(static)}
+            assert full == {num_keys * num_nodes}, \
+                f"{suffix}: the static run holds {sorted(full)} replicas, not {num_keys} x {num_nodes}"
+
+    for fixture in fixtures:
+        run, num_keys, num_nodes = fixture["run"], fixture["keys"], fixture["nodes"]
+        records = load_records(os.path.join(RESULTS_DIR, run))
+        assert len(records) == fixture["records"], f"{run}: {len(records)} records, fixture has {fixture['records']}"
+        cases = {case["replicas"]: case for case in fixture["cases"]}
+
+        seen = Counter()
+        for i, item in enumerate(records):
+            where = f"{run} sample {i}"
+            replicas = replica_count(item['total_cost'], num_keys, num_nodes, where)
+            assert replicas in cases, f"{where}: {replicas} replicas, not in the fixture"
+            case = cases[replicas]
+            assert item['total_cost'] == case["corrected_cost"], \
+                f"{where}: recorded cost {item['total_cost']}, corrected bill {case['corrected_cost']}"
+            if replicas == num_keys * num_nodes:
+                assert math.isclose(item['avg_latency'], case["corrected_best_latency"]), \
+                    f"{where}: full replication should score the recorded {item['avg_latency']} ms"
+            else:
+                assert item['avg_latency'] < case["corrected_best_latency"], \
+                    f"{where}: recorded {item['avg_latency']} ms is reachable with {replicas} replicas"
+            seen[replicas] += 1
+            checked += 1
+
+        for replicas, case in cases.items():
+            assert seen[replicas] == case["records"], \
+                f"{run}: {seen[replicas]} records with {replicas} replicas, fixture has {case['records']}"
+            best, worst, cost = corrected_metrics(num_keys, num_nodes, replicas)
+            assert (best, worst, cost) == (case["corrected_best_latency"], case["corrected_worst_latency"],
+                                           case["corrected_cost"]), \
+                f"{run}: corrected accounting changed for {replicas} replicas ({best}, {worst}, {cost})"
+    return checked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--build", action="store_true", help="Regenerate the fixture file from results/")
+    args = parser.parse_args()
+
+    if args.build:
+        fixtures = build_fixtures()
+        os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+        with open(FIXTURE_PATH, 'w') as f:
+            json.dump(fixtures, f, indent=2)
+        print(f"Wrote {len(fixtures)} runs to {FIXTURE_PATH}")
+    else:
+        with open(FIXTURE_PATH) as f:
+            fixtures = json.load(f)
+        print(f"Checked {check_fixtures(fixtures)} recorded samples: OK")
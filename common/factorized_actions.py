@@ -0,0 +1,283 @@
+import zlib
+import numpy as np
+from gymnasium import spaces
+
+from reward_model import StateArrays, is_stored, key_read_totals, state_to_arrays
+
+# Order of the autoregressive heads: pick a key, then a node, then an operation.
+PHASE_KEY = 0
+PHASE_NODE = 1
+PHASE_OP = 2
+NUM_PHASES = 3
+
+OPS = ["REPLICATE", "EVICT"]
+
+
+def stable_key_hash(key_name):
+    """CRC32 of the key name. Unlike hash(), stable across processes and runs."""
+    return zlib.crc32(key_name.encode('utf-8'))
+
+
+class KeySharder:
+    """
+    Projects an unbounded keyspace onto a fixed window of key slots.
+
+    Keys are hashed into `num_shards` shards. Every call to `select_window`
+    focuses on one shard (round-robin, skipping empty shards) and returns its
+    hottest `window_size` keys. The policy only ever sees the window, so its
+    input/output size is independent of how many keys the cluster holds.
+    """
+
+    def __init__(self, num_shards=1, window_size=20):
+        self.num_shards = num_shards
+        self.window_size = window_size
+        self.active_shard = 0
+
+    def shard_of(self, key_name):
+        return stable_key_hash(key_name) % self.num_shards
+
+    def select_window(self, state_json):
+        if not state_json:
+            return []
+
+        # One pass over the state: total reads per key
+        key_reads = key_read_totals(state_json)
+
+        if self.num_shards == 1:
+            candidates = list(key_reads)
+        else:
+            shards = {}
+            for k in key_reads:
+                shards.setdefault(self.shard_of(k), []).append(k)
+            # Advance from the current shard to the next non-empty one
+            for offset in range(self.num_shards):
+                shard = (self.active_shard + offset) % self.num_shards
+                if shard in shards:
+                    self.active_shard = shard
+                    break
+            candidates = shards.get(self.active_shard, [])
+
+        # Hottest first, name as tie-breaker so the window order is deterministic
+        candidates.sort(key=lambda k: (-key_reads[k], k))
+        return candidates[:self.window_size]
+
+    def advance(self):
+        """Move the focus to the next shard (called once per executed action)."""
+        self.active_shard = (self.active_shard + 1) % self.num_shards
+
+
+def window_observation(state_json, key_names, node_names, num_key_slots, counts=False):
+    """
+    Builds the [presence, log1p(reads), log1p(writes)] matrices for an
+    arbitrary list of keys, zero-padded to `num_key_slots` columns.
+    Reads are regional demand and are filled in whether or not the node
+    holds the key; presence is the node's `stored` flag.
+
+    Returns (flat_observation, presence) where presence is (nodes, key_slots).
+    With `counts`, also the raw (2, nodes, key_slots) read/write counts, which
+    the observation pipeline's rate stage differences between snapshots.
+    """
+    num_nodes = len(node_names)
+    presence = np.zeros((num_nodes, num_key_slots), dtype=np.float32)
+    raw_counts = np.zeros((2, num_nodes, num_key_slots), dtype=np.float64)
+
+    if isinstance(state_json, StateArrays):
+        _fill_from_arrays(state_json, key_names, node_names, presence, raw_counts)
+        state_json = None
+
+    key_index = {k: i for i, k in enumerate(key_names)}
+    node_index = {n: i for i, n in enumerate(node_names)}
+
+    for node_data in state_json or []:
+        i = node_index.get(node_data['nodeId'])
+        if i is None: continue
+
+        for key_name, metrics in node_data.get('keyMetrics', {}).items():
+            key_idx = key_index.get(key_name)
+            if key_idx is None: continue
+
+            presence[i, key_idx] = 1.0 if is_stored(metrics) else 0.0
+            raw_counts[0, i, key_idx] = metrics.get('readCount', 0)
+            raw_counts[1, i, key_idx] = metrics.get('writeCount', 0)
+
+    obs = np.concatenate([
+        presence.flatten(),
+        np.log1p(raw_counts).astype(np.float32).flatten()
+    ])
+    if counts:
+        return obs, presence, raw_counts
+    return obs, presence
+
+
+def _window_index(state, key_names, node_names):
+    """(dst, src) index pairs mapping the window's (node, key) cells to the state's, None if disjoint."""
+    node_pos = {n: i for i, n in enumerate(state.node_ids)}
+    rows = [(i, node_pos[n]) for i, n in enumerate(node_names) if n in node_pos]
+    cols = [(j, state.key_index[k]) for j, k in enumerate(key_names) if k in state.key_index]
+    if not rows or not cols:
+        return None
+    dst_rows, src_rows = zip(*rows)
+    dst_cols, src_cols = zip(*cols)
+    return np.ix_(dst_rows, dst_cols), np.ix_(src_rows, src_cols)
+
+
+def _fill_from_arrays(state, key_names, node_names, presence, raw_counts):
+    """window_observation for a StateArrays: one fancy-indexed gather instead of the dict walk."""
+    index = _window_index(state, key_names, node_names)
+    if index is None:
+        return
+    dst, src = index
+    presence[dst] = state.presence[src]
+    raw_counts[0][dst] = state.reads[src]
+    raw_counts[1][dst] = state.writes[src]
+
+
+def window_fits(state_json, key_names, node_names, num_key_slots):
+    """
+    (nodes, key_slots) bool: where a replica of each window key would fit
+    (StateArrays.fits), for masking REPLICATE. None when no node reports a
+    capacity, so clusters without limits skip the work.
+    """
+    if isinstance(state_json, StateArrays):
+        if state_json.capacity_bytes is None or not np.any(state_json.capacity_bytes > 0):
+            return None
+    elif not any(n.get('capacityBytes', 0) > 0 for n in state_json or []):
+        return None
+    state = state_to_arrays(state_json)
+    fits = np.ones((len(node_names), num_key_slots), dtype=bool)
+    index = _window_index(state, key_names, node_names)
+    if index is not None:
+        dst, src = index
+        fits[dst] = state.fits()[src]
+    return fits
+
+
+class FactorizedActionHeads:
+    """
+    Autoregressive key -> node -> op decision, decomposed into sub-steps.
+
+    A single Discrete(max(K + 1, N, 2)) action space is reused for every head and
+    the current phase (plus the choices made so far) is appended to the
+    observation. The mask of each head is conditioned on the earlier choices,
+    so MaskablePPO gets true autoregressive masking without a custom policy.
+    Heads that are left with exactly one valid choice are taken automatically
+    and never cost a policy forward pass.
+
+    With `protect_last_replica` a key's only replica can't be evicted, which
+    is what makes the node head depend on the chosen key.
+
+    With `noop_action` the key head has one extra choice (index K) that ends
+    the decision without touching the cluster. `action_filter(op, key, node)`
+    (slot indices) can veto single actions, e.g. a PlacementGuard.
+    `set_replica_fits` blocks replicating to nodes without room for the key.
+    """
+
+    def __init__(self, num_key_slots, num_nodes, protect_last_replica=True, noop_action=True):
+        self.num_key_slots = num_key_slots
+        self.num_nodes = num_nodes
+        self.protect_last_replica = protect_last_replica
+        self.noop_action = noop_action
+        self.action_filter = None
+        self.action_space = spaces.Discrete(max(num_key_slots + (1 if noop_action else 0), num_nodes, len(OPS)))
+        self.context_size = NUM_PHASES + num_key_slots + num_nodes
+        self.node_available = np.ones(num_nodes, dtype=bool)
+        self.replica_fits = None
+        self.reset()
+
+    def set_available_nodes(self, node_available):
+        """Marks which node slots are live; empty slots are never valid targets."""
+        self.node_available = np.asarray(node_available, dtype=bool)
+
+    def set_replica_fits(self, fits):
+        """(nodes, key_slots) bool from window_fits, or None when every node has room."""
+        self.replica_fits = fits
+
+    def reset(self):
+        self.phase = PHASE_KEY
+        self.key_idx = None
+        self.node_idx = None
+        self.op_idx = None
+
+    @property
+    def complete(self):
+        return self.op_idx is not None or self.is_noop
+
+    @property
+    def is_noop(self):
+        return self.noop_action and self.key_idx == self.num_key_slots
+
+    def context(self):
+        """One-hot [phase | chosen key | chosen node] appended to the observation."""
+        ctx = np.zeros(self.context_size, dtype=np.float32)
+        ctx[min(self.phase, NUM_PHASES - 1)] = 1.0
+        if self.key_idx is not None and not self.is_noop:
+            ctx[NUM_PHASES + self.key_idx] = 1.0
+        if self.node_idx is not None:
+            ctx[NUM_PHASES + self.num_key_slots + self.node_idx] = 1.0
+        return ctx
+
+    def _op_mask(self, presence, key_idx, node_idx):
+        if not self.node_available[node_idx]:
+            return np.zeros(len(OPS), dtype=bool)
+        present = presence[node_idx, key_idx] > 0
+        replicas = np.count_nonzero(presence[:, key_idx])
+        can_evict = present and not (self.protect_last_replica and replicas <= 1)
+        fits = self.replica_fits is None or self.replica_fits[node_idx, key_idx]
+        mask = np.array([not present and fits, can_evict], dtype=bool)
+        if self.action_filter is not None:
+            for op in np.flatnonzero(mask):
+                mask[op] = self.action_filter(op, key_idx, node_idx)
+        return mask
+
+    def mask(self, presence, num_real_keys):
+        """Validity mask for the current head. `presence` is (nodes, key_slots)."""
+        mask = np.zeros(self.action_space.n, dtype=bool)
+
+        if self.phase == PHASE_KEY:
+            for k in range(num_real_keys):
+                if any(self._op_mask(presence, k, n).any() for n in range(self.num_nodes)):
+                    mask[k] = True
+            if self.noop_action:
+                mask[self.num_key_slots] = True
+        elif self.phase == PHASE_NODE:
+            for n in range(self.num_nodes):
+                mask[n] = self._op_mask(presence, self.key_idx, n).any()
+        else:
+            mask[:len(OPS)] = self._op_mask(presence, self.key_idx, self.node_idx)
+
+        if not mask.any():
+            # Nothing is actionable (e.g. empty window): keep the head well-defined
+            mask[0] = True
+        return mask
+
+    def select(self, action, presence, num_real_keys):
+        """
+        Records the choice for the current head, then auto-selects any
+        following head that has a single valid choice. Returns True once
+        the full (key, node, op) triple is known.
+        """
+        self._record(int(action))
+        while not self.complete:
+            mask = self.mask(presence, num_real_keys)
+            if np.count_nonzero(mask) != 1:
+                break
+            self._record(int(np.flatnonzero(mask)[0]))
+        return self.complete
+
+    def _record(self, action):
+        if self.phase == PHASE_KEY:
+            self.key_idx = action
+        elif self.phase == PHASE_NODE:
+            self.node_idx = action
+        else:
+            self.op_idx = action
+        self.phase += 1
+
+    def is_valid(self, presence, num_real_keys):
+        """False for the no-op and for the placeholder decision taken when nothing was actionable."""
+        return (not self.is_noop and self.key_idx < num_real_keys and
+                bool(self._op_mask(presence, self.key_idx, self.node_idx)[self.op_idx]))
+
+    def decision(self):
+        """(op_name, key_slot, node_idx) of the completed decision."""
+        return OPS[self.op_idx], self.key_idx, self.node_idx
@@ -0,0 +1,168 @@
+import heapq
+import numpy as np
+
+from factorized_actions import window_fits, window_observation
+from reward_model import key_read_totals, state_node_ids
+
+
+class SlotMap:
+    """
+    Stable name -> slot id mapping over a fixed number of slots.
+
+    A name keeps its slot for as long as it is retained. Released slots go
+    back to a free list and the lowest free slot is always handed out first,
+    so ids grow only as far as the number of live names requires.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slot_of = {}
+        self.names = [None] * capacity
+        self._free = list(range(capacity))
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, name):
+        return name in self.slot_of
+
+    def assign(self, name):
+        """Returns the slot of `name`, allocating one if needed. None when full."""
+        slot = self.slot_of.get(name)
+        if slot is not None:
+            return slot
+        if not self._free:
+            return None
+        slot = heapq.heappop(self._free)
+        self.slot_of[name] = slot
+        self.names[slot] = name
+        return slot
+
+    def release(self, name):
+        slot = self.slot_of.pop(name, None)
+        if slot is not None:
+            self.names[slot] = None
+            heapq.heappush(self._free, slot)
+
+    def retain(self, names):
+        """Releases every name not in `names`. Returns the released names."""
+        released = [n for n in self.slot_of if n not in names]
+        for n in released:
+            self.release(n)
+        return released
+
+    def used(self):
+        """Boolean occupancy per slot."""
+        return np.array([n is not None for n in self.names], dtype=bool)
+
+
+class KeyspaceProjection:
+    """
+    Discovers keys and nodes from /rl/system-state and projects them onto a
+    fixed (max_nodes x max_keys) layout.
+
+    Nodes get a stable slot the first time they report and lose it only after
+    missing `node_idle_limit` consecutive polls, so a transient failure doesn't
+    reshuffle the layout. Key slots hold the current top-`max_keys` hottest
+    keys: a key keeps its column while it stays hot, and a column freed by a
+    key that cooled down is reused by the next newly hot key.
+    """
+
+    def __init__(self, max_keys, max_nodes, node_idle_limit=5, noop_action=True):
+        self.max_keys = max_keys
+        self.max_nodes = max_nodes
+        self.node_idle_limit = node_idle_limit
+        # An extra last action that leaves the placement as it is
+        self.noop_action = noop_action
+        self.key_slots = SlotMap(max_keys)
+        self.node_slots = SlotMap(max_nodes)
+        self._node_missing = {}
+
+    def update_nodes(self, state_json):
+        seen = set()
+        for node_id in state_node_ids(state_json):
+            seen.add(node_id)
+            self._node_missing[node_id] = 0
+            if self.node_slots.assign(node_id) is None:
+                print(f"WARNING: More than {self.max_nodes} nodes, ignoring '{node_id}'")
+
+        for node_id in list(self.node_slots.slot_of):
+            if node_id in seen: continue
+            self._node_missing[node_id] += 1
+            if self._node_missing[node_id] > self.node_idle_limit:
+                self.node_slots.release(node_id)
+                del self._node_missing[node_id]
+
+    def update_keys(self, state_json):
+        key_reads = key_read_totals(state_json)
+        hot = heapq.nsmallest(self.max_keys, key_reads, key=lambda k: (-key_reads[k], k))
+        self.key_slots.retain(set(hot))
+        for k in hot:
+            self.key_slots.assign(k)
+
+    def update(self, state_json):
+        self.update_nodes(state_json)
+        self.update_keys(state_json)
+
+    def observation(self, state_json, counts=False):
+        """(flat_observation, presence[, raw counts]) in slot order. Call `update` first."""
+        return window_observation(state_json, self.key_slots.names, self.node_slots.names, self.max_keys, counts)
+
+    def fits(self, state_json):
+        """(max_nodes, max_keys) replica room in slot order for `action_mask`, None if unlimited."""
+        return window_fits(state_json, self.key_slots.names, self.node_slots.names, self.max_keys)
+
+    @property
+    def noop_index(self):
+        """Id of the no-op action, None without one."""
+        return 2 * self.max_keys * self.max_nodes if self.noop_action else None
+
+    @property
+    def num_actions(self):
+        return 2 * self.max_keys * self.max_nodes + (1 if self.noop_action else 0)
+
+    def action_mask(self, presence, fits=None):
+        """
+        Flat mask over [REPLICATE | EVICT] x (key_slot * max_nodes + node_slot),
+        followed by the always-valid no-op. Empty key or node slots are never
+        valid, nor are replicas where `fits` (from `fits`) says there's no room.
+        """
+        valid = np.outer(self.key_slots.used(), self.node_slots.used())
+        present = presence.T > 0
+        replicable = valid & ~present if fits is None else valid & ~present & fits.T
+        mask = np.concatenate([
+            replicable.flatten(),
+            (valid & present).flatten(),
+            [True] if self.noop_action else []
+        ]).astype(bool)
+        if not mask.any():
+            mask[0] = True
+        return mask
+
+    def encode_action(self, action_type, key, node):
+        """Inverse of decode_action. None if the key or node has no slot."""
+        if action_type == "NOOP":
+            return self.noop_index
+        key_slot = self.key_slots.slot_of.get(key)
+        node_slot = self.node_slots.slot_of.get(node)
+        if key_slot is None or node_slot is None:
+            return None
+        action_id = key_slot * self.max_nodes + node_slot
+        if action_type == "EVICT":
+            action_id += self.max_keys * self.max_nodes
+        return action_id
+
+    def decode_action(self, action_id):
+        """(action_type, key, node), or None for the no-op or an empty slot."""
+        if action_id == self.noop_index:
+            return None
+        limit = self.max_keys * self.max_nodes
+        is_evict = action_id >= limit
+        if is_evict:
+            action_id -= limit
+
+        key_name = self.key_slots.names[action_id // self.max_nodes]
+        node_name = self.node_slots.names[action_id % self.max_nodes]
+        if key_name is None or node_name is None:
+            return None
+        return ("EVICT" if is_evict else "REPLICATE"), key_name, node_name
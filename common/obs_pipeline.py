@@ -0,0 +1,348 @@
+"""
+Observation pipeline: per-row feature stages shared by the MLP and GNN envs.
+
+The envs hand over their observation as rows of features, each row
+identified by a stable id, plus optionally raw cumulative counters per row:
+
+  MLP   one row per (node slot, key slot) cell of window_observation:
+        [presence, log1p(reads), log1p(writes)], id (node, key), counters (reads, writes)
+  GNN   x_keys rows (id: key name, counters: the key's total reads/writes)
+        and x_servers rows (id: node id)
+
+Rows with id None are padding. They come out as zeros and never enter the
+statistics. The stages run in this order, each one optional:
+
+  RateDelta         appends log1p(counter increase since the previous snapshot)
+                    for every counter, matched by id. A counter that went down
+                    was reset (an evict drops the node's counters), so all of it
+                    counts as new. An id seen for the first time has rate 0.
+  RunningNormalize  (x - mean) / std per feature column, clipped, with the
+                    mean/var accumulated over every real row seen in training.
+  FrameStack        the last `frames` outputs of each id side by side. History
+                    lives in a preallocated ring buffer that is written once per
+                    step and never shifted (see FrameStack).
+
+Only the normalization statistics outlive an episode. save_pipelines writes
+them, together with the config needed to rebuild the pipelines, next to a
+model (pipeline_path), and evaluation loads them frozen.
+"""
+import json
+import os
+
+import numpy as np
+
+from keyspace import SlotMap
+
+PIPELINE_SUFFIX = ".obs_pipeline.npz"
+
+
+class RateDelta:
+
+    def __init__(self, num_counts):
+        self.num_counts = num_counts
+        self.reset()
+
+    def reset(self):
+        self._index = {}
+        self._counts = np.zeros((0, self.num_counts))
+
+    def output_dim(self, dim):
+        return dim + self.num_counts
+
+    def __call__(self, x, ids, counts):
+        counts = np.asarray(counts, dtype=np.float64)
+        prev_rows = np.array([self._index.get(i, -1) if i is not None else -1 for i in ids], dtype=np.int64)
+        seen = prev_rows >= 0
+        rates = np.zeros((len(ids), self.num_counts), dtype=np.float32)
+        if seen.any():
+            current = counts[seen]
+            delta = current - self._counts[prev_rows[seen]]
+            rates[seen] = np.log1p(np.where(delta < 0, current, delta))
+        self._index = {i: r for r, i in enumerate(ids) if i is not None}
+        self._counts = counts
+        return np.concatenate([x, rates], axis=1)
+
+
+class RunningNormalize:
+    """Per-column running mean/var (parallel-variance update), like SB3's VecNormalize but over rows."""
+
+    def __init__(self, dim, skip_columns=(), clip=10.0, epsilon=1e-8):
+        self.dim = dim
+        self.clip = clip
+        self.epsilon = epsilon
+        self.columns = np.array([c for c in range(dim) if c not in set(skip_columns)], dtype=np.int64)
+        self.mean = np.zeros(len(self.columns))
+        self.var = np.ones(len(self.columns))
+        self.count = 1e-4
+        self.training = True
+
+    def reset(self):
+        pass
+
+    def output_dim(self, dim):
+        return dim
+
+    def update(self, batch):
+        batch_mean, batch_var, batch_count = batch.mean(axis=0), batch.var(axis=0), len(batch)
+        delta = batch_mean - self.mean
+        total = self.count + batch_count
+        self.mean = self.mean + delta * batch_count / total
+        m2 = self.var * self.count + batch_var * batch_count + delta ** 2 * self.count * batch_count / total
+        self.var = m2 / total
+        self.count = total
+
+    def __call__(self, x, ids, counts):
+        real = np.array([i is not None for i in ids], dtype=bool)
+        if not real.any():
+            return x
+        values = x[np.ix_(real, self.columns)].astype(np.float64)
+        if self.training:
+            self.update(values)
+        x[np.ix_(real, self.columns)] = np.clip((values - self.mean) / np.sqrt(self.var + self.epsilon),
+                                                -self.clip, self.clip)
+        return x
+
+    def state_dict(self):
+        return {"mean": self.mean, "var": self.var, "count": np.array(self.count)}
+
+    def load_state_dict(self, state):
+        self.mean, self.var, self.count = state["mean"].copy(), state["var"].copy(), float(state["count"])
+
+
+class FrameStack:
+    """
+    Last `frames` rows of every id, oldest first. The ring holds 2 * frames
+    frames over `max_rows` id slots, and each step writes its frame at
+    position p and p + frames. ring[p + 1 : p + 1 + frames] is then always the
+    ordered history as a contiguous view, so no step copies or rolls old
+    frames. Only the output (in this step's row order) is gathered. Ids keep
+    their ring slot while they appear in consecutive steps. A new id starts
+    with its first frame repeated.
+    """
+
+    def __init__(self, frames, max_rows, dim):
+        self.frames = frames
+        self.max_rows = max_rows
+        self.dim = dim
+        self.ring = np.zeros((2 * frames, max_rows, dim), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self._slots = SlotMap(self.max_rows)
+        self._pos = self.frames - 1
+
+    def output_dim(self, dim):
+        return dim * self.frames
+
+    def __call__(self, x, ids, counts):
+        self._slots.retain({i for i in ids if i is not None})
+        slot_rows = np.full(len(ids), -1, dtype=np.int64)
+        fresh = []
+        for r, i in enumerate(ids):
+            if i is None:
+                continue
+            if i not in self._slots:
+                fresh.append(r)
+            slot = self._slots.assign(i)
+            slot_rows[r] = -1 if slot is None else slot
+
+        self._pos = (self._pos + 1) % self.frames
+        valid = slot_rows >= 0
+        slots = slot_rows[valid]
+        self.ring[self._pos, slots] = x[valid]
+        self.ring[self._pos + self.frames, slots] = x[valid]
+        if fresh:
+            fresh = np.array(fresh)
+            fresh = fresh[slot_rows[fresh] >= 0]
+            self.ring[:, slot_rows[fresh]] = x[fresh]
+
+        history = self.ring[self._pos + 1:self._pos + 1 + self.frames]
+        out = np.zeros((len(ids), self.frames, self.dim), dtype=np.float32)
+        out[valid] = history[:, slots].transpose(1, 0, 2)
+        return out.reshape(len(ids), self.frames * self.dim)
+
+
+class ObservationPipeline:
+    """
+    RateDelta -> RunningNormalize -> FrameStack over (rows, num_features)
+    observations. `__call__` returns a new (rows, output_dim) float32 array.
+    """
+
+    def __init__(self, num_features, max_rows, rates=False, num_counts=0, normalize=False,
+                 skip_columns=(), frames=1, clip=10.0):
+        self.config = {"num_features": num_features, "max_rows": max_rows, "rates": rates,
+                       "num_counts": num_counts, "normalize": normalize,
+                       "skip_columns": list(skip_columns), "frames": frames, "clip": clip}
+        self.stages = []
+        dim = num_features
+        if rates and num_counts:
+            self.stages.append(RateDelta(num_counts))
+        dim = self._output_dim(dim)
+        if normalize:
+            self.stages.append(RunningNormalize(dim, skip_columns, clip))
+        if frames > 1:
+            self.stages.append(FrameStack(frames, max_rows, dim))
+        self.output_dim = self._output_dim(num_features)
+        self._training = True
+
+    def _output_dim(self, dim):
+        for stage in self.stages:
+            dim = stage.output_dim(dim)
+        return dim
+
+    @property
+    def training(self):
+        return self._training
+
+    @training.setter
+    def training(self, mode):
+        """False freezes the normalization statistics (evaluation)."""
+        self._training = mode
+        for stage in self.stages:
+            if hasattr(stage, "training"):
+                stage.training = mode
+
+    def reset(self):
+        """Drops per-episode history (counter snapshots, frame stack)."""
+        for stage in self.stages:
+            stage.reset()
+
+    def __call__(self, features, ids, counts=None):
+        x = np.array(features, dtype=np.float32)
+        for stage in self.stages:
+            x = stage(x, ids, counts)
+        padding = np.array([i is None for i in ids], dtype=bool)
+        x[padding] = 0.0
+        return x
+
+    def state_dict(self):
+        return {f"{n}.{k}": v for n, stage in enumerate(self.stages) if hasattr(stage, "state_dict")
+                for k, v in stage.state_dict().items()}
+
+    def load_state_dict(self, state):
+        for n, stage in enumerate(self.stages):
+            if hasattr(stage, "load_state_dict"):
+                stage.load_state_dict({k.split(".", 1)[1]: v for k, v in state.items()
+                                       if k.split(".", 1)[0] == str(n)})
+
+
+def build_pipeline(config, num_features, max_rows, num_counts=0, skip_columns=()):
+    """
+    A pipeline from the envs' {"rates", "normalize", "frames"} config, None if
+    every stage is off (the env then keeps its plain observation).
+    """
+    config = config or {}
+    rates, normalize, frames = config.get("rates", False), config.get("normalize", False), config.get("frames", 1)
+    if not (rates or normalize or frames > 1):
+        return None
+    return ObservationPipeline(num_features, max_rows, rates=rates, num_counts=num_counts, normalize=normalize,
+                               skip_columns=skip_columns, frames=frames, clip=config.get("clip", 10.0))
+
+
+def add_pipeline_arguments(parser):
+    """--obs_rates / --obs_normalize / --frame_stack, shared by the agents' trainers."""
+    parser.add_argument("--obs_rates", action="store_true",
+                        help="Add per-key read/write rates (counter deltas between snapshots) to the observation")
+    parser.add_argument("--obs_normalize", action="store_true",
+                        help="Normalize observation features with running mean/var (saved next to the model)")
+    parser.add_argument("--frame_stack", type=int, default=1, help="Observations of the last N steps per key")
+
+
+def pipeline_config(args):
+    """build_pipeline config from parsed add_pipeline_arguments flags."""
+    return {"rates": args.obs_rates, "normalize": args.obs_normalize, "frames": args.frame_stack}
+
+
+def grid_rows(observation, counts, node_names, key_names):
+    """
+    Per-cell rows of a window_observation as pipeline arguments: features
+    (nodes * key slots, 3), ids (node, key) with None for empty slots, and
+    counters (nodes * key slots, 2).
+    """
+    num_cells = len(observation) // 3
+    features = observation.reshape(3, num_cells).T
+    key_names = list(key_names) + [None] * (num_cells // len(node_names) - len(key_names))
+    ids = [(n, k) if n is not None and k is not None else None for n in node_names for k in key_names]
+    return features, ids, counts.reshape(2, num_cells).T
+
+
+def pipeline_path(model_path):
+    """
+    Where the pipeline state of a model is kept: next to a model file
+    (policy.zip -> policy.obs_pipeline.npz), inside a checkpoint directory.
+    """
+    if os.path.isdir(model_path):
+        return os.path.join(model_path, PIPELINE_SUFFIX.lstrip("."))
+    return os.path.splitext(model_path)[0] + PIPELINE_SUFFIX
+
+
+def save_pipelines(path, pipelines):
+    """Writes {name: pipeline} configs and statistics to `path` (temp file + rename)."""
+    arrays = {f"{name}.{k}": v for name, pipeline in pipelines.items() for k, v in pipeline.state_dict().items()}
+    config = json.dumps({name: pipeline.config for name, pipeline in pipelines.items()})
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, config=np.array(config), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_pipelines(path, training=False):
+    """{name: pipeline} rebuilt from save_pipelines, frozen unless `training`. None if there is no file."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        pipelines = {}
+        for name, config in json.loads(str(data["config"])).items():
+            pipeline = ObservationPipeline(**config)
+            pipeline.load_state_dict({k[len(name) + 1:]: data[k] for k in data.files if k.startswith(name + ".")})
+            pipeline.training = training
+            pipelines[name] = pipeline
+    return pipelines
+
+
+if __name__ == "__main__":
+    # Consistency checks: frame stack against a naive per-id history, normalization
+    # against batch statistics, rates against counter deltas, save/load round trip
+    import tempfile
+    from collections import deque
+
+    rng = np.random.default_rng(0)
+    frames, rows, dim = 4, 12, 3
+    pipeline = ObservationPipeline(dim, rows, frames=frames)
+    history = {}
+    ids_pool = [f"k{i}" for i in range(20)]
+    for step in range(200):
+        ids = list(rng.choice(ids_pool, size=rows - 2, replace=False)) + [None, None]
+        x = rng.normal(size=(rows, dim)).astype(np.float32)
+        out = pipeline(x, ids)
+        history = {i: history.get(i, deque([x[r]] * frames, maxlen=frames)) for r, i in enumerate(ids) if i}
+        for r, i in enumerate(ids):
+            if i:
+                history[i].append(x[r])
+                assert np.array_equal(out[r], np.concatenate(history[i])), step
+        assert not out[-2:].any()
+
+    pipeline = ObservationPipeline(2, 8, normalize=True, skip_columns=(0,))
+    batches = [rng.normal(5.0, 3.0, size=(8, 2)) for _ in range(50)]
+    for batch in batches:
+        pipeline(batch, list(range(8)))
+    stacked = np.concatenate(batches)
+    normalize = pipeline.stages[0]
+    assert np.allclose(normalize.mean, stacked[:, 1].mean(), atol=1e-3)
+    assert np.allclose(normalize.var, stacked[:, 1].var(), atol=1e-2)
+
+    pipeline = ObservationPipeline(1, 3, rates=True, num_counts=1)
+    pipeline(np.zeros((3, 1)), ["a", "b", None], np.array([[10.0], [5.0], [0.0]]))
+    out = pipeline(np.zeros((3, 1)), ["b", "a", "c"], np.array([[2.0], [13.0], [7.0]]))
+    assert np.allclose(out[:, 1], np.log1p([2.0, 3.0, 0.0])), out  # b reset to 2, a +3, c new
+
+    pipeline = ObservationPipeline(3, 6, rates=True, num_counts=2, normalize=True, skip_columns=(0,), frames=2)
+    for _ in range(10):
+        pipeline(rng.random((6, 3)), list(range(6)), rng.integers(0, 100, size=(6, 2)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pipeline_path(os.path.join(tmp, "model.zip"))
+        save_pipelines(path, {"obs": pipeline})
+        loaded = load_pipelines(path)["obs"]
+    assert loaded.output_dim == pipeline.output_dim == 10 and not loaded.training
+    assert all(np.array_equal(v, loaded.state_dict()[k]) for k, v in pipeline.state_dict().items())
+    print("OK: frame stack, normalization, rates and save/load")
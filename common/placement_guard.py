@@ -0,0 +1,140 @@
+"""
+Placement stability layer between a policy and the controller.
+
+Every replicate/evict costs real work: a network copy in
+NodeClientService.replicateData, and DataStoreService.evict drops the node's
+counters. A policy that flips the same replica back and forth pays that cost
+for nothing. PlacementGuard sits in front of /rl/execute-action and
+enforces:
+
+  min_dwell       a new replica stays at least this long before it can be
+                  evicted, and an evicted one stays away as long;
+  key_budget      at most this many actions per key per `window`;
+  global_budget   at most this many actions in total per `window`.
+
+Times are in seconds of `clock` (time.monotonic by default; the simulated env
+passes its model time). Every limit is optional. Without limits the guard
+only counts, so the thrash metric is available for any run.
+
+A thrash is an executed action that undoes the previous change to the same
+(key, node) pair within `thrash_window` seconds (default: `window`).
+
+Envs use `check` to drop blocked actions from the policy's mask and `admit`
+right before executing. A blocked action becomes a no-op.
+"""
+import time
+from collections import Counter, deque
+
+
+class PlacementGuard:
+
+    def __init__(self, min_dwell=0.0, key_budget=None, global_budget=None, window=60.0,
+                 thrash_window=None, clock=time.monotonic):
+        self.min_dwell = min_dwell
+        self.key_budget = key_budget
+        self.global_budget = global_budget
+        self.window = window
+        self.thrash_window = window if thrash_window is None else thrash_window
+        self.clock = clock
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """A guard from a dict of constructor arguments (None: count only, no limits)."""
+        return cls(**{**(config or {}), **kwargs})
+
+    def reset(self):
+        """Forgets all history, e.g. when a simulated episode restarts its clock."""
+        self._changes = {}      # (key, node) -> (time, action_type) of the last executed change
+        self._key_times = {}    # key -> deque of action times inside the window
+        self._times = deque()   # all action times inside the window
+        self.counts = Counter()
+
+    @property
+    def active(self):
+        """True if any limit is set, i.e. the guard can block something."""
+        return bool(self.min_dwell) or self.key_budget is not None or self.global_budget is not None
+
+    def _expire(self, times, now):
+        while times and times[0] <= now - self.window:
+            times.popleft()
+
+    def check(self, action_type, key, node):
+        """None if the action may run now, otherwise why it is blocked ("dwell", "key_budget", "global_budget")."""
+        now = self.clock()
+        last = self._changes.get((key, node))
+        if last is not None and last[1] != action_type and now - last[0] < self.min_dwell:
+            return "dwell"
+        if self.key_budget is not None:
+            times = self._key_times.get(key)
+            if times:
+                self._expire(times, now)
+                if len(times) >= self.key_budget:
+                    return "key_budget"
+        if self.global_budget is not None:
+            self._expire(self._times, now)
+            if len(self._times) >= self.global_budget:
+                return "global_budget"
+        return None
+
+    def record(self, action_type, key, node):
+        """Registers an executed action."""
+        now = self.clock()
+        last = self._changes.get((key, node))
+        if last is not None and last[1] != action_type and now - last[0] < self.thrash_window:
+            self.counts["thrash"] += 1
+        self._changes[(key, node)] = (now, action_type)
+        if self.key_budget is not None:
+            self._key_times.setdefault(key, deque()).append(now)
+        if self.global_budget is not None:
+            self._times.append(now)
+        self.counts["executed"] += 1
+        self.counts[action_type.lower()] += 1
+
+    def admit(self, action_type, key, node):
+        """check + record. Returns False (and counts the reason) if the action must be dropped."""
+        reason = self.check(action_type, key, node)
+        if reason is not None:
+            self.counts["blocked"] += 1
+            self.counts[f"blocked_{reason}"] += 1
+            return False
+        self.record(action_type, key, node)
+        return True
+
+    def filter_mask(self, mask, decode, num_actions=None):
+        """
+        Clears the entries of `mask` whose decoded action is blocked.
+        `decode(i)` gives (action_type, key, node) or None; only the first
+        `num_actions` entries are checked (e.g. to skip a no-op).
+        """
+        if not self.active:
+            return mask
+        for i in mask[:num_actions].nonzero()[0]:
+            decoded = decode(int(i))
+            if decoded is not None and self.check(*decoded) is not None:
+                mask[i] = False
+        if not mask.any():
+            # No no-op and everything blocked: any choice is dropped by admit anyway
+            mask[0] = True
+        return mask
+
+    def stats(self):
+        """Counters so far: executed, replicate, evict, thrash, blocked and blocked_<reason>."""
+        stats = {name: self.counts[name] for name in ("executed", "replicate", "evict", "thrash", "blocked")}
+        stats.update({name: count for name, count in self.counts.items() if name.startswith("blocked_")})
+        return stats
+
+
+def add_guard_arguments(parser):
+    """--min_dwell / --key_budget / --global_budget / --budget_window, shared by the agents' scripts."""
+    parser.add_argument("--min_dwell", type=float, default=0.0,
+                        help="Seconds a replica change must stand before it can be undone")
+    parser.add_argument("--key_budget", type=int, default=None, help="Max actions per key per --budget_window")
+    parser.add_argument("--global_budget", type=int, default=None, help="Max actions per --budget_window")
+    parser.add_argument("--budget_window", type=float, default=60.0, help="Seconds")
+
+
+def guard_config(args):
+    """PlacementGuard arguments from parsed add_guard_arguments flags."""
+    return {"min_dwell": args.min_dwell, "key_budget": args.key_budget,
+            "global_budget": args.global_budget, "window": args.budget_window}
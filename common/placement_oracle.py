@@ -0,0 +1,226 @@
+"""
+Offline placement oracle.
+
+Under RewardModel the objective is a sum of independent per-key terms:
+
+    LATENCY_WEIGHT * sum_i demand[i, k] * latency(i, holders_k) / total_reads
+  + COST_WEIGHT    * units[k] * sum_{j in holders_k} price[j]
+
+(units[k]: billed KiB of key k, 1 for keys under 1 KiB), so the best replica
+set can be found key by key. Up to EXACT_MAX_NODES nodes every non-empty
+subset is scored for all keys at once with one matrix product; beyond that a
+vectorized greedy is used and its gap to a lower bound is reported.
+
+Nodes without room for a key (`fits`) are left out of its holder sets. Each
+key is checked on its own, which is exact for the one move at a time that
+next_action proposes.
+"""
+import numpy as np
+
+from reward_model import (REMOTE_READ_LATENCY_MS, billable_units, default_latency_matrix, nearest_holder_latency,
+                          state_to_arrays)
+
+COST_PER_KEY_STORED = 1.5
+EXACT_MAX_NODES = 12
+
+
+class PlacementOracle:
+
+    def __init__(self, latency_weight, cost_weight, latency_matrix=None, storage_prices=None):
+        self.latency_weight = latency_weight
+        self.cost_weight = cost_weight
+        self.latency_matrix = latency_matrix
+        self.storage_prices = storage_prices
+        self._subset_cache = {}
+
+    def _matrices(self, num_nodes, prices=None):
+        latency = default_latency_matrix(num_nodes) if self.latency_matrix is None \
+            else np.asarray(self.latency_matrix, dtype=np.float64)
+        if self.storage_prices is not None:
+            prices = self.storage_prices
+        prices = np.full(num_nodes, COST_PER_KEY_STORED) if prices is None else np.asarray(prices, dtype=np.float64)
+        return latency, prices
+
+    def _subsets(self, num_nodes, latency):
+        """All non-empty holder sets as (S, N) masks and their (S, N) served latency."""
+        if num_nodes not in self._subset_cache:
+            codes = np.arange(1, 2 ** num_nodes)
+            masks = ((codes[:, None] >> np.arange(num_nodes)) & 1).astype(bool)
+            served = np.where(masks[:, None, :], latency[None, :, :], np.inf).min(axis=2)
+            self._subset_cache[num_nodes] = (masks, served)
+        return self._subset_cache[num_nodes]
+
+    def key_objective(self, presence, demand, total_reads=None, key_units=None, prices=None):
+        """(K,) objective of the current placement; keys without a holder are served remotely."""
+        num_nodes, num_keys = presence.shape
+        latency, prices = self._matrices(num_nodes, prices)
+        units = np.ones(num_keys) if key_units is None else key_units
+        total_reads = demand.sum() if total_reads is None else total_reads
+        served = nearest_holder_latency(latency, presence)
+        served = np.where(np.isinf(served), REMOTE_READ_LATENCY_MS, served)
+        lat = (demand * served).sum(axis=0) / max(total_reads, 1)
+        return self.latency_weight * lat + self.cost_weight * units * (prices @ presence)
+
+    def solve(self, demand, key_units=None, prices=None, fits=None):
+        """
+        demand: (N, K) reads per region and key. key_units (K,): billed KiB
+        per replica, 1 each by default. prices (N,): price per billed KiB,
+        overridden by the oracle's own storage_prices. fits (N, K): where a
+        replica may be placed, everywhere by default.
+        Returns (target presence (N, K) bool, per-key objective (K,), lower bound (K,)).
+        A key that fits nowhere gets no holders.
+        """
+        num_nodes, num_keys = demand.shape
+        latency, prices = self._matrices(num_nodes, prices)
+        units = np.ones(num_keys) if key_units is None else np.asarray(key_units, dtype=np.float64)
+        total_reads = max(demand.sum(), 1)
+        demand = demand.astype(np.float64)
+
+        lower = (self.latency_weight * (demand * latency.min(axis=1)[:, None]).sum(axis=0) / total_reads
+                 + self.cost_weight * prices.min() * units)
+
+        if num_nodes <= EXACT_MAX_NODES:
+            masks, served = self._subsets(num_nodes, latency)
+            objective = (self.latency_weight * (demand.T @ served.T) / total_reads
+                         + self.cost_weight * units[:, None] * (masks @ prices)[None, :])
+            if fits is not None:
+                # (K, S): the subset uses a node the key doesn't fit on
+                blocked = (~fits).T.astype(np.int64) @ masks.T.astype(np.int64) > 0
+                objective = np.where(blocked, np.inf, objective)
+            best = objective.argmin(axis=1)
+            target, optimal = masks[best].T, objective[np.arange(num_keys), best]
+        else:
+            target, optimal = self._solve_greedy(demand, latency, prices, total_reads, units, fits)
+
+        nowhere = np.isinf(optimal)
+        if nowhere.any():
+            target[:, nowhere] = False
+            optimal[nowhere] = (self.latency_weight * REMOTE_READ_LATENCY_MS
+                                * demand[:, nowhere].sum(axis=0) / total_reads)
+        return target, optimal, lower
+
+    def _solve_greedy(self, demand, latency, prices, total_reads, units, fits=None):
+        num_nodes, num_keys = demand.shape
+        keys = np.arange(num_keys)
+        blocked = np.zeros((num_keys, num_nodes), dtype=bool) if fits is None else ~fits.T
+
+        # Best single holder per key, then keep adding the most improving node
+        single = (self.latency_weight * (demand.T @ latency.T) / total_reads
+                  + self.cost_weight * units[:, None] * prices[None, :])
+        single = np.where(blocked, np.inf, single)
+        first = single.argmin(axis=1)
+        target = np.zeros((num_nodes, num_keys), dtype=bool)
+        target[first, keys] = True
+        served = latency[:, first].T                      # (K, N) latency per requesting node
+        objective = single[keys, first]
+        active = np.ones(num_keys, dtype=bool)
+
+        for _ in range(num_nodes - 1):
+            # candidate[k, j]: objective after adding node j to key k's holders,
+            # one (K, N) pass per j rather than a (K, N, N) tensor
+            lat = np.empty((num_keys, num_nodes))
+            for j in range(num_nodes):
+                lat[:, j] = (np.minimum(served, latency[:, j][None, :]) * demand.T).sum(axis=1)
+            lat /= total_reads
+            cost = self.cost_weight * units[:, None] * ((prices @ target)[:, None] + prices[None, :])
+            candidate = np.where(target.T | blocked, np.inf, self.latency_weight * lat + cost)
+            best = candidate.argmin(axis=1)
+            gain = objective - candidate[keys, best]
+            improve = active & (gain > 1e-12) & np.isfinite(objective)
+            if not improve.any():
+                break
+            k = keys[improve]
+            target[best[improve], k] = True
+            served[k] = np.minimum(served[k], latency.T[best[improve]])
+            objective[k] = candidate[k, best[improve]]
+            active = improve
+        return target, objective
+
+    def next_action(self, presence, demand, key_units=None, prices=None, fits=None):
+        """
+        Single move toward the optimum, for step-by-step execution: the key
+        with the largest objective gap, replicating before evicting so a key
+        never drops to zero replicas. Returns (op, key_idx, node_idx) or None.
+        """
+        if demand.size == 0:
+            return None
+        if fits is not None:
+            # Current holders always "fit", so the optimum never evicts a key just for being where it is
+            fits = fits | presence
+        target, optimal, _ = self.solve(demand, key_units, prices, fits)
+        gap = self.key_objective(presence, demand, key_units=key_units, prices=prices) - optimal
+        k = int(gap.argmax())
+        if gap[k] <= 1e-9:
+            return None
+
+        missing = np.flatnonzero(target[:, k] & ~presence[:, k])
+        if missing.size:
+            return "REPLICATE", k, int(missing[demand[missing, k].argmax()])
+        extra = np.flatnonzero(presence[:, k] & ~target[:, k])
+        if extra.size:
+            return "EVICT", k, int(extra[demand[extra, k].argmin()])
+        return None
+
+    def state_action(self, state):
+        """next_action for a /rl/system-state (JSON or StateArrays), with its prices, key sizes and capacities."""
+        arrays = state_to_arrays(state)
+        return self.next_action(arrays.presence, arrays.reads, arrays.key_units(), arrays.prices(), arrays.fits())
+
+
+def apply_action(state_json, action_type, key, node):
+    """Applies a move to a state payload in place, the way the nodes would report it afterwards."""
+    for node_data in state_json:
+        if node_data['nodeId'] != node:
+            continue
+        key_metrics = node_data.setdefault('keyMetrics', {})
+        was_stored = key in key_metrics and key_metrics[key].get('stored', True)
+        metrics = key_metrics.setdefault(key, {"readCount": 0, "writeCount": 0})
+        metrics['stored'] = action_type == "REPLICATE"
+        if metrics['stored'] != was_stored:
+            size = metrics.get('sizeBytes', 0) if was_stored else _key_size(state_json, key)
+            sign = 1 if metrics['stored'] else -1
+            metrics['sizeBytes'] = size if metrics['stored'] else 0
+            node_data['storedBytes'] = node_data.get('storedBytes', 0) + sign * size
+            node_data['storageCost'] = node_data.get('storageCost', 0) + \
+                sign * node_data.get('storagePrice', COST_PER_KEY_STORED) * float(billable_units(size))
+    return state_json
+
+
+def _key_size(state_json, key):
+    """Size of the largest copy of `key` in the state, 0 if no node holds it."""
+    return max((n.get('keyMetrics', {}).get(key, {}).get('sizeBytes', 0) for n in state_json), default=0)
+
+
+def synthetic_state(rng, num_keys, num_nodes, hot_keys_per_region=4, replica_prob=0.5, storage_prices=None):
+    """
+    A /rl/system-state shaped payload with skewed regional demand (a few hot
+    keys per region, like the generator's profiles) and a random placement.
+    `storage_prices` (N,) are per billed KiB, COST_PER_KEY_STORED by default;
+    every key is smaller than a KiB.
+    """
+    prices = np.full(num_nodes, COST_PER_KEY_STORED) if storage_prices is None else storage_prices
+    demand = rng.poisson(2.0, size=(num_nodes, num_keys))
+    for n in range(num_nodes):
+        hot = rng.choice(num_keys, size=min(hot_keys_per_region, num_keys), replace=False)
+        demand[n, hot] += rng.poisson(60.0, size=hot.size)
+    stored = rng.random((num_nodes, num_keys)) < replica_prob
+
+    state = []
+    for n in range(num_nodes):
+        key_metrics = {}
+        for k in range(num_keys):
+            if demand[n, k] > 0 or stored[n, k]:
+                key_metrics[f"user_profile_{k}"] = {
+                    "readCount": int(demand[n, k]),
+                    "writeCount": 0,
+                    "stored": bool(stored[n, k]),
+                    "sizeBytes": 64 if stored[n, k] else 0,
+                }
+        state.append({
+            "nodeId": f"replication-{n}",
+            "keyMetrics": key_metrics,
+            "storageCost": float(prices[n]) * int(stored[n].sum()),
+            "storagePrice": float(prices[n]),
+            "storedBytes": 64 * int(stored[n].sum()),
+        })
+    return state
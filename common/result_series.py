@@ -0,0 +1,441 @@
+"""
+Streaming loading, smoothing and downsampling of evaluation result series.
+
+Evaluation runs write a JSON array with one record per step
+({"time", "avg_latency", "total_cost", ...}); shadow runs nest the live
+numbers under "live". json.load builds every record as a dict before anything
+is plotted, and matplotlib then draws every raw point, which gets slow and
+unreadable for long runs or many seeds.
+
+Here files are read `CHUNK_BYTES` at a time, the complete records of each
+chunk are decoded together, and only the requested fields are kept, as
+float64 columns. Everything after that
+is vectorized NumPy:
+    rolling_mean       trailing mean via a cumulative sum, O(n)
+    rolling_quantiles  trailing quantiles over sliding windows, at chosen
+                       positions only
+    across_runs        mean and quantile band of several runs (seeds) on a
+                       common time grid
+    column_quantiles   NaN-aware quantiles down the columns, in one sort
+    minmax_downsample  first/min/max/last point of each of `n_buckets` buckets,
+                       so spikes survive
+    lttb               Largest-Triangle-Three-Buckets, for smooth lines
+
+The plotting scripts reduce every series to about one point per pixel column
+before handing it to matplotlib.
+"""
+import hashlib
+import json
+import os
+import re
+from operator import itemgetter
+
+import numpy as np
+
+CHUNK_BYTES = 1 << 20
+BLOCK_ROWS = 65536
+
+DEFAULT_FIELDS = {
+    "time": "time",
+    "avg_latency": "avg_latency",
+    "total_cost": "total_cost",
+}
+# evaluate.py --shadow: the numbers of the policy that was acting
+SHADOW_FIELDS = {
+    "time": "time",
+    "avg_latency": "live.avg_latency",
+    "total_cost": "live.total_cost",
+}
+
+# Whitespace, commas and the array brackets between top-level records
+_SEPARATORS = re.compile(r"[\s,\[\]]*")
+# The end of one record followed by the start of the next
+_BOUNDARY = re.compile(r"\}[\s,]*\{")
+
+
+def _decode_one_by_one(decoder, text, final):
+    """Decodes records from the start of `text`; returns them and where decoding stopped."""
+    records = []
+    pos = 0
+    while True:
+        pos = _SEPARATORS.match(text, pos).end()
+        if pos >= len(text):
+            return records, pos
+        try:
+            record, pos_after = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return records, pos  # the record continues in the next chunk
+        records.append(record)
+        pos = pos_after
+
+
+def _last_boundary(buffer, start):
+    """Position just after the last record-ending "}" in buffer[start:], or `start` if there is none."""
+    tail = 4096
+    while True:
+        lo = max(start, len(buffer) - tail)
+        last = None
+        for last in _BOUNDARY.finditer(buffer, lo):
+            pass
+        if last is not None:
+            return last.start() + 1
+        if lo == start:
+            return start
+        tail *= 4
+
+
+def iter_batches(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Yields the records of a JSON array file (or a JSON Lines file) as lists,
+    one per chunk of about `chunk_bytes`, holding at most one chunk plus one
+    partial record in memory.
+
+    Arrays: each chunk is cut after the last "}" that is followed by the next
+    "{", and everything before the cut is decoded by a single json.loads.
+    Such a "}" can also close a dict inside a list inside a record; then the
+    slice has unbalanced brackets, json.loads fails, and that chunk is decoded
+    record by record instead. JSON Lines chunks are cut at the last newline.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    json_lines = None
+    with open(path, "r") as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            buffer += chunk
+            final = not chunk
+            if json_lines is None:
+                stripped = buffer.lstrip()
+                if not stripped and not final:
+                    continue
+                json_lines = not stripped.startswith("[")
+
+            if json_lines:
+                cut = len(buffer) if final else buffer.rfind("\n") + 1
+                lines = [line for line in buffer[:cut].split("\n") if line.strip()]
+                buffer = buffer[cut:]
+                if lines:
+                    yield json.loads("[" + ",".join(lines) + "]")
+            else:
+                start = _SEPARATORS.match(buffer).end()
+                if final:
+                    cut = len(buffer)
+                    body = buffer[start:].rstrip(" \t\r\n,]")
+                else:
+                    cut = _last_boundary(buffer, start)
+                    body = buffer[start:cut]
+                if body:
+                    try:
+                        records = json.loads("[" + body + "]")
+                    except json.JSONDecodeError:
+                        records, used = _decode_one_by_one(decoder, buffer[start:], final)
+                        cut = start + used
+                    buffer = buffer[cut:]
+                    yield records
+            if final:
+                return
+
+
+def iter_records(path, chunk_bytes=CHUNK_BYTES):
+    """Yields the records of `path` one at a time; see iter_batches."""
+    for records in iter_batches(path, chunk_bytes):
+        yield from records
+
+
+def _getter(field_path):
+    parts = field_path.split(".")
+
+    def get(record):
+        for part in parts:
+            if not isinstance(record, dict):
+                return None
+            record = record.get(part)
+        return record
+
+    return get
+
+
+def _column(records, field_path):
+    try:
+        if "." not in field_path:
+            return np.array(list(map(itemgetter(field_path), records)), dtype=np.float64)
+    except (KeyError, TypeError):
+        pass
+    # Nested, or some records lack the field
+    get = _getter(field_path)
+    return np.array([np.nan if v is None else v for v in map(get, records)], dtype=np.float64)
+
+
+def _cache_path(path, fields, cache_dir):
+    stat = os.stat(path)
+    key = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, sorted(fields.items())])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.npz")
+
+
+def load_series(path, fields=None, chunk_bytes=CHUNK_BYTES, cache_dir=None):
+    """
+    Reads the given fields of every record in `path`.
+
+    `fields` maps column names to dotted record paths (default DEFAULT_FIELDS).
+    Returns (columns, accounting): a dict of float64 arrays, NaN where a
+    record lacks the field, and the "accounting" tag of the first record
+    (None for runs recorded before it existed).
+
+    With `cache_dir`, the columns are also saved there as .npz, keyed by the
+    file's path, size and mtime, and later calls load that instead of parsing.
+    """
+    fields = fields or DEFAULT_FIELDS
+    cached = _cache_path(path, fields, cache_dir) if cache_dir else None
+    if cached and os.path.exists(cached):
+        with np.load(cached) as saved:
+            accounting = str(saved["accounting"]) if saved["accounting"].size else None
+            return {name: saved[name] for name in fields}, accounting
+    columns, accounting = _parse_series(path, fields, chunk_bytes)
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = cached + ".tmp.npz"
+        np.savez(partial, accounting=np.array([] if accounting is None else accounting), **columns)
+        os.replace(partial, cached)
+    return columns, accounting
+
+
+def _parse_series(path, fields, chunk_bytes):
+    blocks = {name: [] for name in fields}
+    accounting = None
+    first = True
+    for records in iter_batches(path, chunk_bytes):
+        if not records:
+            continue
+        if first:
+            accounting = records[0].get("accounting")
+            first = False
+        for name, field_path in fields.items():
+            blocks[name].append(_column(records, field_path))
+    columns = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in blocks.items()}
+    return columns, accounting
+
+
+def accounting_label(accounting, label):
+    """Marks curves recorded before reads at non-holders were scored as remote."""
+    if accounting != 'demand':
+        return f"{label} [legacy accounting]"
+    return label
+
+
+def rolling_mean(values, window):
+    """Trailing mean over up to `window` values; the first window-1 use what is there."""
+    values = np.asarray(values, dtype=np.float64)
+    window = max(1, int(window))
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    return (sums[end] - sums[start]) / (end - start)
+
+
+def rolling_quantiles(values, window, quantiles=(0.1, 0.9), positions=None, block=BLOCK_ROWS):
+    """
+    Trailing quantiles over up to `window` values, shape
+    (len(quantiles), len(positions)). `positions` are the indices to evaluate
+    (default all of them); plots only need one per pixel column. Full windows
+    are gathered `block` positions at a time, so at most block * window
+    values are copied at once.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    window = max(1, int(window))
+    positions = np.arange(len(values)) if positions is None else np.asarray(positions, dtype=np.int64)
+    out = np.empty((len(quantiles), len(positions)))
+    head = np.searchsorted(positions, window - 1)
+    for j in range(head):
+        out[:, j] = np.quantile(values[:positions[j] + 1], quantiles)
+    windows = np.lib.stride_tricks.sliding_window_view(values, window) if len(values) >= window else None
+    for start in range(head, len(positions), block):
+        stop = min(start + block, len(positions))
+        out[:, start:stop] = np.quantile(windows[positions[start:stop] - window + 1], quantiles, axis=1)
+    return out
+
+
+def across_runs(runs, num_points, quantiles=(0.1, 0.9)):
+    """
+    Mean and quantile band of several runs of one policy (e.g. seeds).
+    `runs` is a list of (x, y) arrays; each is interpolated onto `num_points`
+    evenly spaced x values over the span the runs share.
+    Returns (grid, mean, bands) with bands of shape (len(quantiles), num_points).
+    """
+    lo = max(x[0] for x, _ in runs)
+    hi = min(x[-1] for x, _ in runs)
+    if hi <= lo:
+        # No common span: fall back to the union, NaN outside each run
+        lo = min(x[0] for x, _ in runs)
+        hi = max(x[-1] for x, _ in runs)
+    grid = np.linspace(lo, hi, num_points)
+    stacked = np.vstack([np.interp(grid, x, y, left=np.nan, right=np.nan) for x, y in runs])
+    return grid, np.nanmean(stacked, axis=0), column_quantiles(stacked, quantiles)
+
+
+def column_quantiles(stacked, quantiles):
+    """
+    np.nanquantile(stacked, quantiles, axis=0) with linear interpolation, in
+    one sort; nanquantile goes column by column in Python.
+    """
+    ordered = np.sort(stacked, axis=0)  # NaNs sort last
+    valid = (~np.isnan(stacked)).sum(axis=0)
+    out = np.full((len(quantiles), stacked.shape[1]), np.nan)
+    has = valid > 0
+    cols = np.nonzero(has)[0]
+    for i, q in enumerate(quantiles):
+        pos = q * (valid[has] - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, valid[has] - 1)
+        frac = pos - lo
+        out[i, has] = ordered[lo, cols] * (1 - frac) + ordered[hi, cols] * frac
+    return out
+
+
+def minmax_downsample(x, y, n_buckets):
+    """
+    Splits the series into `n_buckets` equal-count buckets and keeps the
+    first, min, max and last point of each, in x order. Extremes survive, so
+    a spike visible in the raw plot is visible in the downsampled one.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(x)
+    if n <= 4 * n_buckets:
+        return x, y
+    size = n // n_buckets
+    usable = size * n_buckets
+    offsets = np.arange(n_buckets) * size
+    shaped = y[:usable].reshape(n_buckets, size)
+    picks = np.stack([
+        offsets,
+        offsets + np.nanargmin(shaped, axis=1),
+        offsets + np.nanargmax(shaped, axis=1),
+        offsets + size - 1,
+    ], axis=1)
+    picks.sort(axis=1)
+    idx = picks.ravel()
+    # Drop repeats (min or max at a bucket edge) and keep the tail
+    idx = np.concatenate((idx[np.concatenate(([True], np.diff(idx) != 0))], np.arange(usable, n)))
+    return x[idx], y[idx]
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point, and from
+    each of n_out-2 buckets the point forming the largest triangle with the
+    previously kept point and the next bucket's mean. The bucket loop is
+    sequential by construction; each bucket's work is vectorized.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Next-bucket means for every bucket at once
+    csx = np.concatenate(([0.0], np.cumsum(x)))
+    csy = np.concatenate(([0.0], np.cumsum(y)))
+    # Bucket b spans [edges[b], edges[b+1]); after the last one comes the final point
+    next_start = edges[1:]
+    next_stop = np.append(edges[2:], n)
+    counts = next_stop - next_start
+    mean_x = (csx[next_stop] - csx[next_start]) / counts
+    mean_y = (csy[next_stop] - csy[next_start]) / counts
+
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        area = np.abs((x[a] - mean_x[b]) * (by - y[a]) - (x[a] - bx) * (mean_y[b] - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[b + 1] = a
+    return x[idx], y[idx]
+
+
+def downsample(x, y, n_points, method="minmax"):
+    """Reduces (x, y) to about `n_points` points with "minmax" (n_points/4 buckets) or "lttb"."""
+    if method == "lttb":
+        return lttb(x, y, n_points)
+    if method == "minmax":
+        return minmax_downsample(x, y, max(1, n_points // 4))
+    raise ValueError(f"unknown downsampling method {method!r}")
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+    import warnings
+
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    t = np.arange(n, dtype=np.float64)
+    y = 10 + np.sin(t / 5000) + rng.normal(0, 0.2, n)
+    y[123_457] = 50.0  # one spike
+
+    xs, ys = minmax_downsample(t, y, 500)
+    assert ys.max() == 50.0 and ys.min() == y.min(), "min/max buckets lost an extreme"
+    assert np.all(np.diff(xs) > 0) and xs[0] == 0 and xs[-1] == n - 1
+    xl, yl = lttb(t, y, 2000)
+    assert len(xl) == 2000 and xl[0] == 0 and xl[-1] == n - 1 and np.all(np.diff(xl) > 0)
+    assert 50.0 in yl, "LTTB should keep an isolated spike"
+
+    mean = rolling_mean(y, 100)
+    assert np.isclose(mean[5000], y[4901:5001].mean()) and mean[0] == y[0]
+    bands = rolling_quantiles(y[:200_000], 50, (0.1, 0.9), block=7919)
+    assert np.allclose(bands[:, 1000], np.quantile(y[951:1001], (0.1, 0.9)))
+    assert np.allclose(bands[:, 3], np.quantile(y[:4], (0.1, 0.9)))
+    positions = np.array([3, 1000, 150_000])
+    assert np.allclose(rolling_quantiles(y[:200_000], 50, (0.1, 0.9), positions), bands[:, positions])
+
+    stacked = rng.normal(size=(5, 1000))
+    stacked[rng.random(stacked.shape) < 0.3] = np.nan
+    stacked[:, 7] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # the all-NaN column
+        expected = np.nanquantile(stacked, (0.1, 0.5, 0.9), axis=0)
+    assert np.allclose(column_quantiles(stacked, (0.1, 0.5, 0.9)), expected, equal_nan=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.json")
+        records = [{"time": float(i), "avg_latency": float(y[i]), "total_cost": 100.0 + i % 7,
+                    "placement": {"k": [1, 2]}} for i in range(200_000)]
+        records[0]["accounting"] = "demand"
+        del records[17]["total_cost"]
+        with open(path, "w") as f:
+            json.dump(records, f, indent=4)
+        start = time.perf_counter()
+        columns, accounting = load_series(path, chunk_bytes=4096)
+        elapsed = time.perf_counter() - start
+        assert accounting == "demand" and len(columns["time"]) == 200_000
+        assert np.isnan(columns["total_cost"][17]) and columns["total_cost"][18] == 100.0 + 18 % 7
+        assert np.array_equal(columns["avg_latency"], y[:200_000])
+        start = time.perf_counter()
+        load_series(path, cache_dir=os.path.join(tmp, "cache"))
+        cached, cached_accounting = load_series(path, cache_dir=os.path.join(tmp, "cache"))
+        cached_elapsed = time.perf_counter() - start
+        assert cached_accounting == "demand"
+        assert all(np.array_equal(cached[k], columns[k], equal_nan=True) for k in columns)
+        print(f"Loaded {len(columns['time'])} records ({os.path.getsize(path) / 1e6:.1f} MB) in {elapsed:.2f}s; "
+              f"parse + cache + cached load {cached_elapsed:.2f}s")
+
+        # Lists of dicts inside records defeat the chunk cut; JSON Lines has no brackets
+        nested = [{"time": i, "live": {"avg_latency": i / 2}, "candidates": [{"a": 1}, {"b": 2}]} for i in range(5000)]
+        for text in (json.dumps(nested, indent=2), "\n".join(json.dumps(r) for r in nested)):
+            with open(path, "w") as f:
+                f.write(text)
+            columns, accounting = load_series(path, SHADOW_FIELDS, chunk_bytes=1000)
+            assert accounting is None and np.array_equal(columns["avg_latency"], np.arange(5000) / 2)
+            assert np.isnan(columns["total_cost"]).all()
+
+    assert accounting_label("demand", "GNN") == "GNN"
+    assert accounting_label(None, "GNN") == "GNN [legacy accounting]"
+
+    print("result_series checks passed")
@@ -0,0 +1,347 @@
+"""
+Vectorized latency/cost model over (nodes, keys) presence and read matrices.
+
+Accounting model: a node's keyMetrics entry records read *demand* at that
+region (hits and misses). Whether the node holds a replica is the separate
+`stored` flag. A read is local only if the requesting node stores the key,
+otherwise it is served remotely.
+
+Storage is billed like DataStoreService.getStorageCost: each node charges its
+own price per KiB and every stored key is billed for at least one KiB, so
+with the default price of 1.5 a small key costs 1.5 wherever it is stored.
+Nodes may also have a byte capacity; `StateArrays.fits` says which replicas
+would still fit.
+
+Run this file directly to check the vectorized model against a dict-based
+implementation on random states.
+"""
+from operator import itemgetter
+
+import numpy as np
+
+LOCAL_READ_LATENCY_MS = 10
+REMOTE_READ_LATENCY_MS = 150
+
+# Tag written into evaluation results so plots can tell runs scored with the
+# old (any entry == replica) accounting apart from demand-based ones.
+ACCOUNTING_VERSION = "demand"
+
+# Billing of CostConstants.java
+BILLING_UNIT_BYTES = 1024
+MIN_BILLABLE_BYTES = 1024
+DEFAULT_STORAGE_PRICE = 1.5
+
+
+def billable_units(size_bytes):
+    """Billed KiB of entries of `size_bytes` bytes, at least one unit each."""
+    return np.maximum(size_bytes, MIN_BILLABLE_BYTES) / BILLING_UNIT_BYTES
+
+
+class StateArrays:
+    """
+    Dense view of a /rl/system-state payload. Built from the JSON by
+    state_to_arrays or decoded from the binary encoding (state_codec.py);
+    the agents' state helpers accept it anywhere they accept the JSON list.
+    """
+
+    def __init__(self, node_ids, key_names, presence, reads, writes, storage_cost, reported=None,
+                 key_bytes=None, storage_price=None, capacity_bytes=None, stored_bytes=None):
+        self.node_ids = node_ids          # list, len N
+        self.key_names = key_names        # list, len K
+        self.presence = presence          # (N, K) bool
+        self.reads = reads                # (N, K) int64
+        self.writes = writes              # (N, K) int64
+        self.storage_cost = storage_cost  # (N,) float64, as reported by the nodes
+        # (N, K) bool: the node has a keyMetrics entry for the key
+        self.reported = (presence | (reads > 0) | (writes > 0)) if reported is None else reported
+        # Byte accounting, None when the nodes don't report it
+        self.key_bytes = key_bytes            # (N, K) int64, size of the node's copy (0 if not stored)
+        self.storage_price = storage_price    # (N,) float64, price per billed KiB
+        self.capacity_bytes = capacity_bytes  # (N,) int64, 0 = unlimited
+        self.stored_bytes = stored_bytes      # (N,) int64
+        self._key_index = None
+
+    def __len__(self):
+        # Like the JSON list: falsy when no node answered
+        return len(self.node_ids)
+
+    @property
+    def key_index(self):
+        if self._key_index is None:
+            self._key_index = {k: j for j, k in enumerate(self.key_names)}
+        return self._key_index
+
+    def key_size(self):
+        """(K,) bytes of each key: its largest reported copy, 0 if no node holds it."""
+        if self.key_bytes is None:
+            return np.zeros(len(self.key_names), dtype=np.int64)
+        return self.key_bytes.max(axis=0, initial=0)
+
+    def key_units(self):
+        """(K,) billed KiB per replica of each key."""
+        return billable_units(self.key_size())
+
+    def prices(self, default_price=DEFAULT_STORAGE_PRICE):
+        """
+        (N,) price per billed KiB. Nodes that don't report one are priced at
+        what they bill now per billed unit, or `default_price` if they hold nothing.
+        """
+        if self.storage_price is not None:
+            return np.asarray(self.storage_price, dtype=np.float64)
+        units = self.presence.astype(np.float64) @ self.key_units()
+        return np.where(units > 0, self.storage_cost / np.maximum(units, 1e-12), default_price)
+
+    def unit_cost(self, default_price=DEFAULT_STORAGE_PRICE):
+        """(N, K) cost of keeping a replica of key k on node n, for counterfactual placements."""
+        return np.outer(self.prices(default_price), self.key_units())
+
+    def fits(self):
+        """
+        (N, K) bool: node n holds key k or has room for a copy of it. Keys
+        no node holds have unknown size and only need the node not to be full.
+        """
+        shape = (len(self.node_ids), len(self.key_names))
+        if self.capacity_bytes is None or not np.any(self.capacity_bytes > 0):
+            return np.ones(shape, dtype=bool)
+        stored = np.zeros(len(self.node_ids), dtype=np.int64) if self.stored_bytes is None else self.stored_bytes
+        free = np.where(self.capacity_bytes > 0, self.capacity_bytes - stored, np.iinfo(np.int64).max)
+        size = self.key_size()
+        return self.presence | ((size[None, :] <= free[:, None]) & (free[:, None] > 0))
+
+
+def is_stored(metrics):
+    """
+    Placement flag of a keyMetrics entry. Payloads from nodes that predate the
+    flag only report keys they hold counters for, so they default to stored.
+    """
+    return metrics.get('stored', True)
+
+
+# keyMetrics fields read into StateArrays, with their value in payloads that predate them
+_METRIC_FIELDS = {'readCount': 0, 'writeCount': 0, 'sizeBytes': 0, 'stored': True}
+_METRIC_GETTERS = {name: itemgetter(name) for name in _METRIC_FIELDS}
+
+
+def _metric_column(metrics, name, dtype, count):
+    """One field of every keyMetrics entry of a node, without a Python-level call per entry."""
+    try:
+        return np.fromiter(map(_METRIC_GETTERS[name], metrics), dtype, count)
+    except KeyError:
+        default = _METRIC_FIELDS[name]
+        return np.fromiter((m.get(name, default) for m in metrics), dtype, count)
+
+
+def state_to_arrays(state_json):
+    """
+    Dense arrays of the JSON, one node row at a time. Demand comes from every
+    entry, presence only from stored ones. Parsing dominates the cost of a
+    step at scale, so callers convert once and pass the StateArrays on.
+    """
+    if isinstance(state_json, StateArrays):
+        return state_json
+    state_json = state_json or []
+    node_ids = [n['nodeId'] for n in state_json]
+    key_metrics = [n.get('keyMetrics', {}) for n in state_json]
+
+    # Keys in order of first appearance; nodes usually report the same ones
+    key_index = {}
+    for metrics in key_metrics:
+        if not key_index.keys() >= metrics.keys():
+            for k in metrics:
+                key_index.setdefault(k, len(key_index))
+
+    shape = (len(node_ids), len(key_index))
+    presence = np.zeros(shape, dtype=bool)
+    reported = np.zeros(shape, dtype=bool)
+    read_matrix = np.zeros(shape, dtype=np.int64)
+    write_matrix = np.zeros(shape, dtype=np.int64)
+    size_matrix = np.zeros(shape, dtype=np.int64)
+    for i, metrics in enumerate(key_metrics):
+        count = len(metrics)
+        if not count:
+            continue
+        cols = np.fromiter(map(key_index.__getitem__, metrics), np.int64, count)
+        entries = metrics.values()
+        reported[i, cols] = True
+        presence[i, cols] = _metric_column(entries, 'stored', bool, count)
+        read_matrix[i, cols] = _metric_column(entries, 'readCount', np.int64, count)
+        write_matrix[i, cols] = _metric_column(entries, 'writeCount', np.int64, count)
+        size_matrix[i, cols] = _metric_column(entries, 'sizeBytes', np.int64, count)
+
+    storage_cost = np.array([n.get('storageCost', 0) for n in state_json], dtype=np.float64)
+    # Nodes that predate per-node prices don't send one; leave pricing to StateArrays.prices
+    storage_price = None
+    if state_json and all('storagePrice' in n for n in state_json):
+        storage_price = np.array([n['storagePrice'] for n in state_json], dtype=np.float64)
+    capacity_bytes = np.array([n.get('capacityBytes', 0) for n in state_json], dtype=np.int64)
+    stored_bytes = np.array([n.get('storedBytes', 0) for n in state_json], dtype=np.int64)
+    arrays = StateArrays(node_ids, list(key_index), presence, read_matrix, write_matrix, storage_cost, reported,
+                         size_matrix, storage_price, capacity_bytes, stored_bytes)
+    # Same order as key_names: saves rebuilding it for key lookups
+    arrays._key_index = key_index
+    return arrays
+
+
+def state_node_ids(state):
+    """Node ids in report order, for a JSON state or StateArrays."""
+    if isinstance(state, StateArrays):
+        return list(state.node_ids)
+    return [node_data['nodeId'] for node_data in state or []]
+
+
+def key_read_totals(state):
+    """{key: reads summed over the nodes} for a JSON state or StateArrays."""
+    if isinstance(state, StateArrays):
+        return dict(zip(state.key_names, state.reads.sum(axis=0).tolist()))
+    key_reads = {}
+    for node_data in state or []:
+        for k, m in node_data.get('keyMetrics', {}).items():
+            key_reads[k] = key_reads.get(k, 0) + m.get('readCount', 0)
+    return key_reads
+
+
+def default_latency_matrix(num_nodes):
+    """Local reads at LOCAL_READ_LATENCY_MS, every cross-region read at REMOTE_READ_LATENCY_MS."""
+    matrix = np.full((num_nodes, num_nodes), REMOTE_READ_LATENCY_MS, dtype=np.float64)
+    np.fill_diagonal(matrix, LOCAL_READ_LATENCY_MS)
+    return matrix
+
+
+def nearest_holder_latency(latency_matrix, presence):
+    """
+    (N, K) latency of a read at each node for each key when served by its
+    nearest holder (latency_matrix[i, j]: node i served by node j), inf for
+    keys without one. For each requesting node the holders are visited in
+    order of latency, so the first one that holds a key is its nearest; no
+    (N, N, K) tensor of every pair is built.
+    """
+    served = np.empty(presence.shape)
+    for i in range(presence.shape[0]):
+        order = np.argsort(latency_matrix[i], kind='stable')
+        served[i] = latency_matrix[i, order[presence[order].argmax(axis=0)]]
+    served[:, ~presence.any(axis=0)] = np.inf
+    return served
+
+
+class RewardModel:
+    """
+    latency_matrix[i, j]: ms for a read arriving at node i served by a replica on node j.
+    A read is served by the nearest holder; keys with no holder cost REMOTE_READ_LATENCY_MS.
+    Without a matrix the legacy 10/150 local/remote split is used.
+
+    storage_prices[i]: price per billed KiB on node i, so a key under 1 KiB
+    costs storage_prices[i] per replica. Without prices the storageCost
+    reported by each node (its actual bill) is used.
+    """
+
+    def __init__(self, latency_weight, cost_weight, latency_matrix=None, storage_prices=None, scale=1.0):
+        self.latency_weight = latency_weight
+        self.cost_weight = cost_weight
+        self.latency_matrix = None if latency_matrix is None else np.asarray(latency_matrix, dtype=np.float64)
+        self.storage_prices = None if storage_prices is None else np.asarray(storage_prices, dtype=np.float64)
+        self.scale = scale
+
+    def read_latency(self, presence):
+        """(N, K) latency of a read at each node for each key."""
+        if self.latency_matrix is None:
+            return np.where(presence, LOCAL_READ_LATENCY_MS, REMOTE_READ_LATENCY_MS)
+
+        nearest = nearest_holder_latency(self.latency_matrix, presence)
+        return np.where(np.isinf(nearest), REMOTE_READ_LATENCY_MS, nearest)
+
+    def storage_cost(self, presence, reported_cost, key_units=None):
+        """`key_units` (K,): billed KiB per replica of each key, one unit each if not given."""
+        if self.storage_prices is None:
+            return float(reported_cost.sum())
+        if key_units is None:
+            return float(self.storage_prices @ presence.sum(axis=1))
+        return float(self.storage_prices @ (presence @ key_units))
+
+    def metrics(self, presence, reads, reported_cost, key_units=None):
+        """(avg_latency, total_cost)."""
+        total_reads = reads.sum()
+        total_cost = self.storage_cost(presence, reported_cost, key_units)
+        if total_reads == 0:
+            return 0, total_cost
+        latency_sum = (reads * self.read_latency(presence)).sum()
+        return latency_sum / total_reads, total_cost
+
+    def reward_from_metrics(self, avg_lat, total_cost):
+        return -1 * ((self.latency_weight * avg_lat) + (self.cost_weight * total_cost)) / self.scale
+
+    def reward(self, presence, reads, reported_cost, key_units=None):
+        return self.reward_from_metrics(*self.metrics(presence, reads, reported_cost, key_units))
+
+    def state_metrics(self, state_json):
+        arrays = state_to_arrays(state_json)
+        return self.metrics(arrays.presence, arrays.reads, arrays.storage_cost, arrays.key_units())
+
+    def state_reward(self, state_json):
+        arrays = state_to_arrays(state_json)
+        return self.reward(arrays.presence, arrays.reads, arrays.storage_cost, arrays.key_units())
+
+
+def reference_metrics(state_json):
+    """Dict-of-sets implementation of the accounting model, the ground truth for the check below."""
+    total_storage_cost = sum(node.get('storageCost', 0) for node in state_json)
+    total_reads = 0
+    predicted_latency_sum = 0
+    presence_map = {}
+
+    for node_data in state_json:
+        for key_name, metrics in node_data.get('keyMetrics', {}).items():
+            if is_stored(metrics):
+                presence_map.setdefault(key_name, set()).add(node_data['nodeId'])
+
+    for node_data in state_json:
+        for key_name, metrics in node_data.get('keyMetrics', {}).items():
+            reads = metrics.get('readCount', 0)
+            total_reads += reads
+            is_local = node_data['nodeId'] in presence_map.get(key_name, set())
+            predicted_latency_sum += reads * (10 if is_local else 150)
+
+    avg_latency = (predicted_latency_sum / total_reads) if total_reads > 0 else 0
+    return avg_latency, total_storage_cost
+
+
+def random_state(rng, num_nodes, num_keys, density=0.5, stored_ratio=0.5):
+    """Random payload; `density` of (node, key) pairs have demand, `stored_ratio` of those hold a replica."""
+    state = []
+    for i in range(num_nodes):
+        key_metrics = {}
+        for k in range(num_keys):
+            if rng.random() < density:
+                key_metrics[f"user_profile_{k}"] = {
+                    "readCount": int(rng.integers(0, 1000)),
+                    "writeCount": int(rng.integers(0, 100)),
+                    "stored": bool(rng.random() < stored_ratio),
+                }
+        num_stored = sum(m["stored"] for m in key_metrics.values())
+        state.append({
+            "nodeId": f"replication-{i}",
+            "keyMetrics": key_metrics,
+            "storageCost": 1.5 * num_stored,
+        })
+    return state
+
+
+def check_against_reference(trials=500, seed=0):
+    """Property check: exact agreement with reference_metrics on random states."""
+    rng = np.random.default_rng(seed)
+    model = RewardModel(latency_weight=0.1, cost_weight=0.9)
+    for _ in range(trials):
+        state = random_state(rng, int(rng.integers(0, 8)), int(rng.integers(0, 40)),
+                             density=float(rng.random()), stored_ratio=float(rng.random()))
+        expected = reference_metrics(state)
+        actual = model.state_metrics(state)
+        assert actual == expected, f"{actual} != {expected} for {state}"
+
+        # Default matrix must match the 10/150 fast path
+        arrays = state_to_arrays(state)
+        matrix_model = RewardModel(0.1, 0.9, latency_matrix=default_latency_matrix(len(arrays.node_ids)))
+        assert np.array_equal(matrix_model.read_latency(arrays.presence), model.read_latency(arrays.presence))
+    return trials
+
+
+if __name__ == "__main__":
+    print(f"Checked {check_against_reference()} random states against the dict-based reward: OK")
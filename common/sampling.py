@@ -0,0 +1,204 @@
+"""
+Vectorized request sampling for workload generation.
+
+np.random.choice(p=...) validates p and rebuilds its CDF on every call, which
+dominates a per-request loop. Here each distribution gets a Walker/Vose alias
+table once, and requests are drawn in blocks with two uniform draws per
+sample, all from one seeded np.random.Generator so runs are reproducible.
+
+A Profile is one stationary traffic pattern: independent key and region
+distributions plus a read ratio, like generate_skewed_profile in generator.py.
+Time-varying profiles (DiurnalProfile, FlashCrowdProfile) map a time in
+seconds to a Profile via `at(t)` and cache the resulting alias tables per
+time bucket. Static profiles implement `at` too, so callers treat both alike.
+"""
+import numpy as np
+
+
+class AliasTable:
+
+    def __init__(self, probs):
+        probs = np.asarray(probs, dtype=np.float64)
+        if probs.ndim != 1 or len(probs) == 0 or (probs < 0).any() or probs.sum() <= 0:
+            raise ValueError("probs must be a non-empty 1-D array of non-negative weights")
+        n = len(probs)
+        # Plain lists: the pairing loop is sequential and numpy scalar indexing is slow
+        scaled = (probs * (n / probs.sum())).tolist()
+        prob = [1.0] * n
+        alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to rounding and keep prob=1
+        self.prob = np.array(prob)
+        self.alias = np.array(alias)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, rng, size):
+        idx = rng.integers(0, len(self.prob), size=size)
+        return np.where(rng.random(size) < self.prob[idx], idx, self.alias[idx])
+
+
+class Profile:
+
+    def __init__(self, key_probs, region_probs, read_ratio=0.9):
+        self.key_probs = np.asarray(key_probs, dtype=np.float64)
+        self.key_probs = self.key_probs / self.key_probs.sum()
+        self.region_probs = np.asarray(region_probs, dtype=np.float64)
+        self.region_probs = self.region_probs / self.region_probs.sum()
+        self.read_ratio = read_ratio
+        self._keys = AliasTable(self.key_probs)
+        self._regions = AliasTable(self.region_probs)
+
+    def at(self, t):
+        return self
+
+    def with_distributions(self, key_probs=None, region_probs=None):
+        """A copy with some distributions replaced; unchanged alias tables are shared, not rebuilt."""
+        profile = Profile.__new__(Profile)
+        profile.read_ratio = self.read_ratio
+        profile.key_probs, profile._keys = self.key_probs, self._keys
+        profile.region_probs, profile._regions = self.region_probs, self._regions
+        if key_probs is not None:
+            profile.key_probs = np.asarray(key_probs, dtype=np.float64) / np.sum(key_probs)
+            profile._keys = AliasTable(profile.key_probs)
+        if region_probs is not None:
+            profile.region_probs = np.asarray(region_probs, dtype=np.float64) / np.sum(region_probs)
+            profile._regions = AliasTable(profile.region_probs)
+        return profile
+
+    def sample(self, rng, size):
+        """(key indices, region indices, is_read) arrays of length `size`."""
+        return self._keys.sample(rng, size), self._regions.sample(rng, size), rng.random(size) < self.read_ratio
+
+    def joint(self):
+        """(regions, keys) request distribution, the form SimulatedCluster uses."""
+        return np.outer(self.region_probs, self.key_probs)
+
+
+def _split(size, hot, hot_share):
+    hot = list(hot)
+    if len(hot) == size:
+        return np.full(size, 1.0 / size)
+    probs = np.full(size, (1 - hot_share) / (size - len(hot)))
+    probs[hot] = hot_share / len(hot)
+    return probs
+
+
+def skewed_profile(num_keys, num_regions, hot_keys, hot_regions, read_ratio=0.9, hot_share=0.8):
+    """`hot_share` of the traffic on hot_keys, from hot_regions (generate_skewed_profile)."""
+    return Profile(_split(num_keys, hot_keys, hot_share), _split(num_regions, hot_regions, hot_share), read_ratio)
+
+
+def zipf_weights(num_keys, exponent=1.0, rng=None):
+    """Zipf popularity 1/rank^exponent. With rng, ranks are shuffled over the key ids."""
+    weights = 1.0 / np.arange(1, num_keys + 1) ** exponent
+    if rng is not None:
+        weights = weights[rng.permutation(num_keys)]
+    return weights / weights.sum()
+
+
+def zipf_profile(num_keys, num_regions, exponent=1.0, region_probs=None, read_ratio=0.9, rng=None):
+    region_probs = np.full(num_regions, 1.0 / num_regions) if region_probs is None else region_probs
+    return Profile(zipf_weights(num_keys, exponent, rng), region_probs, read_ratio)
+
+
+class _TimeVarying:
+    """Caches one Profile per `resolution`-second bucket. Subclasses implement _build(t)."""
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self._bucket = None
+        self._profile = None
+
+    def at(self, t):
+        bucket = int(t // self.resolution)
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._profile = self._build(bucket * self.resolution)
+        return self._profile
+
+
+class DiurnalProfile(_TimeVarying):
+    """
+    Follow-the-sun region mix over a `period`: region r peaks at phase
+    r / num_regions of the period, with relative swing `amplitude` (0..1).
+    Keys and read ratio come from `base`.
+    """
+
+    def __init__(self, base, period=86400.0, amplitude=0.8, resolution=None):
+        super().__init__(resolution or period / 96)
+        self.base = base
+        self.period = period
+        self.amplitude = amplitude
+
+    def _build(self, t):
+        num_regions = len(self.base.region_probs)
+        phase = 2 * np.pi * (t / self.period - np.arange(num_regions) / num_regions)
+        region_probs = self.base.region_probs * (1 + self.amplitude * np.cos(phase))
+        return self.base.with_distributions(region_probs=region_probs)
+
+
+class FlashCrowdProfile(_TimeVarying):
+    """
+    `base` traffic, except for the first `duration` seconds of every `period`
+    when `share` of all requests hit `keys` (optionally from `regions` only).
+    """
+
+    def __init__(self, base, keys, period, duration, share=0.8, regions=None, resolution=1.0):
+        super().__init__(resolution)
+        self.base = base
+        self.keys = list(keys)
+        self.regions = None if regions is None else list(regions)
+        self.period = period
+        self.duration = duration
+        self.share = share
+        self._crowd = None
+
+    def _build(self, t):
+        if t % self.period >= self.duration:
+            return self.base
+        if self._crowd is None:
+            self._crowd = self._build_crowd()
+        return self._crowd
+
+    def _build_crowd(self):
+        key_probs = self.base.key_probs * (1 - self.share)
+        key_probs[self.keys] += self.share / len(self.keys)
+        region_probs = None
+        if self.regions is not None:
+            region_probs = self.base.region_probs * (1 - self.share)
+            region_probs[self.regions] += self.share / len(self.regions)
+        return self.base.with_distributions(key_probs, region_probs)
+
+
+class RequestStream:
+    """
+    Hands out single requests from pre-drawn blocks. The block is redrawn when
+    it runs out or when the caller passes a different profile.
+    """
+
+    def __init__(self, rng, block_size=4096):
+        self.rng = rng
+        self.block_size = block_size
+        self._profile = None
+        self._block = None
+        self._pos = 0
+
+    def draw(self, profile):
+        """(key index, region index, is_read) for the next request."""
+        if profile is not self._profile or self._pos >= self.block_size:
+            self._profile = profile
+            self._block = [a.tolist() for a in profile.sample(self.rng, self.block_size)]
+            self._pos = 0
+        i = self._pos
+        self._pos += 1
+        return self._block[0][i], self._block[1][i], self._block[2][i]
@@ -0,0 +1,175 @@
+"""
+Counterfactual placements for shadow (dry-run) evaluation.
+
+A ShadowPlacement follows the live /rl/system-state stream but keeps its own
+replica set. The live demand is replayed against it, a candidate policy's
+actions are applied to it instead of the cluster, and it is scored with the
+same RewardModel as the live placement.
+
+Client writes still replicate a key to every node (the controller's static
+write policy), so a shadow eviction is undone exactly when a live one would
+be. A client write is recognized by writeCount growing on every node that
+reports the key; a live REPLICATE only bumps the target node. Nodes reset a
+key's writeCount when they evict it, so a count that dropped is measured from
+0, and a replica evicted and rewritten in between may only be back where it was.
+
+A node's shadow bill is its live bill adjusted for the reported keys where
+the shadow differs, each replica at the node's price per KiB times the key's
+billed KiB (StateArrays.unit_cost). Nodes that don't report a price are
+priced at what they bill now per billed KiB, falling back to
+COST_PER_KEY_STORED for nodes that hold nothing.
+
+Run this file directly to check shadows against the simulated cluster.
+"""
+import numpy as np
+
+from reward_model import RewardModel, StateArrays, state_to_arrays
+from simulated_cluster import COST_PER_KEY_STORED
+
+
+class ShadowPlacement:
+    """
+    Replica set over every (node, key) seen so far. Nodes and keys enter with
+    their live placement the first time they show up; keys that drop out of a
+    top-K state keep their shadow replicas until they are reported again.
+
+    Actions only apply to keys in the last observed state. Those are the only
+    ones a candidate sees, and writes to unreported keys are only picked up
+    once they come back, so an earlier action could not be ordered against them.
+    """
+
+    def __init__(self, default_price=COST_PER_KEY_STORED):
+        self.default_price = default_price
+        self.node_index = {}
+        self.key_index = {}
+        self.stored = np.zeros((0, 0), dtype=bool)
+        self.writes = np.zeros((0, 0), dtype=np.int64)
+        self.actions = 0
+        self._reported_keys = []
+        self._visible = set()
+
+    @staticmethod
+    def _grow(names, index):
+        """Indices of `names`, allocating new ones. Returns (indices, mask of names that are new)."""
+        new = np.array([name not in index for name in names], dtype=bool)
+        for name in np.asarray(names, dtype=object)[new]:
+            index[name] = len(index)
+        return np.array([index[name] for name in names], dtype=np.intp), new
+
+    def observe(self, live):
+        """
+        Folds one live state (JSON or StateArrays) into the shadow and returns
+        the state as it would look with the shadow placement, as StateArrays.
+        """
+        live = state_to_arrays(live)
+        rows, new_rows = self._grow(live.node_ids, self.node_index)
+        cols, new_cols = self._grow(live.key_names, self.key_index)
+
+        shape = (len(self.node_index), len(self.key_index))
+        if shape != self.stored.shape:
+            pad = ((0, shape[0] - self.stored.shape[0]), (0, shape[1] - self.stored.shape[1]))
+            self.stored = np.pad(self.stored, pad)
+            self.writes = np.pad(self.writes, pad)
+
+        # Live order usually matches the shadow's, then plain slices avoid fancy-index copies
+        if np.array_equal(rows, np.arange(len(rows))) and np.array_equal(cols, np.arange(len(cols))):
+            grid = (slice(0, len(rows)), slice(0, len(cols)))
+        else:
+            grid = np.ix_(rows, cols)
+        stored = self.stored[grid].copy()
+        if new_rows.any() or new_cols.any():
+            # Newcomers start from the live placement
+            seen = ~(new_rows[:, None] | new_cols[None, :])
+            stored[~seen] = live.presence[~seen]
+            old_cols = ~new_cols
+        else:
+            old_cols = True
+
+        # A node forgets a key's writeCount when it evicts it, so a count below
+        # the baseline (or a replica gone) restarts from 0 and the next write is growth
+        baseline = self.writes[grid]
+        baseline = np.where((live.writes < baseline) | ~live.presence, 0, baseline)
+        grew = live.writes > baseline
+        # Evicted and written again since the last state: the count restarted
+        # from 0, so it can be back at the baseline, but not above the others' growth
+        growth = np.maximum(live.writes - baseline, 0).max(axis=0, initial=0)
+        rewritten = live.presence & (live.writes > 0) & (live.writes <= growth)
+        written = (np.where(live.reported, grew | rewritten, True).all(axis=0)
+                   & (grew.sum(axis=0) >= min(2, len(rows))))
+        stored[:, written & old_cols & ~new_rows.any()] = True
+
+        self.stored[grid] = stored
+        self.writes[grid] = live.writes
+        self._reported_keys = live.key_names
+        self._visible = None
+
+        # The live bill also covers keys outside a top-K state, so bill only the differences
+        sizes = live.key_size()
+        storage_cost, stored_bytes = live.storage_cost, live.stored_bytes
+        changed = stored != live.presence
+        if changed.any():
+            sign = np.where(changed, np.where(stored, 1, -1), 0)
+            storage_cost = storage_cost + (sign * live.unit_cost(self.default_price)).sum(axis=1)
+            if stored_bytes is not None:
+                stored_bytes = stored_bytes + sign @ sizes
+        return StateArrays(live.node_ids, live.key_names, stored, live.reads, live.writes, storage_cost,
+                           live.reported | stored, np.where(stored, sizes[None, :], 0), live.storage_price,
+                           live.capacity_bytes, stored_bytes)
+
+    def apply(self, action_type, key, node):
+        """Applies a candidate's action to the shadow. False for unseen keys/nodes or unknown ops."""
+        n = self.node_index.get(node)
+        k = self.key_index.get(key)
+        if self._visible is None:
+            self._visible = set(self._reported_keys)
+        if n is None or key not in self._visible or action_type not in ("REPLICATE", "EVICT"):
+            return False
+        self.stored[n, k] = action_type == "REPLICATE"
+        self.actions += 1
+        return True
+
+    def replicas(self):
+        return int(self.stored.sum())
+
+
+def check_against_cluster(ticks=300, seed=0):
+    """
+    A shadow fed the live actions must track the cluster exactly, and a shadow
+    fed another policy's actions must match a second cluster that executed
+    them (same seed, so the same demand).
+    """
+    from simulated_cluster import SimulatedCluster
+
+    rng = np.random.default_rng(seed)
+    metrics_model = RewardModel(0.1, 0.9)
+    live, twin = SimulatedCluster(seed=seed), SimulatedCluster(seed=seed)
+    mirror, shadow = ShadowPlacement(), ShadowPlacement()
+
+    for t in range(ticks):
+        live.tick()
+        twin.tick()
+        # Every 50 ticks the top-K changes which keys are reported
+        state = live.state(top_k=None if (t // 50) % 2 == 0 else 8)
+        mirrored = mirror.observe(state)
+        shadowed = shadow.observe(state)
+
+        expected = state_to_arrays(state)
+        assert np.array_equal(mirrored.presence, expected.presence), f"tick {t}: mirror diverged"
+        assert metrics_model.metrics(mirrored.presence, mirrored.reads, mirrored.storage_cost) == \
+            metrics_model.metrics(expected.presence, expected.reads, expected.storage_cost)
+
+        columns = [twin.key_index[k] for k in shadowed.key_names]
+        assert np.array_equal(shadowed.presence, twin.stored[:, columns]), f"tick {t}: shadow diverged"
+
+        # Random actions on reported keys, like a policy picking from what it sees
+        for cluster, placement in ((live, mirror), (twin, shadow)):
+            action = ("REPLICATE", "EVICT")[int(rng.integers(2))]
+            key = expected.key_names[int(rng.integers(len(expected.key_names)))]
+            node = cluster.node_ids[int(rng.integers(len(cluster.node_ids)))]
+            assert placement.apply(action, key, node)
+            cluster.execute(action, key, node)
+    return ticks
+
+
+if __name__ == "__main__":
+    print(f"Checked {check_against_cluster()} ticks of shadow placements against the simulated cluster: OK")
@@ -0,0 +1,200 @@
+"""
+In-process stand-in for the controller and replication nodes.
+
+Produces /rl/system-state payloads and applies /rl/execute-action commands
+without any HTTP, for fast offline evaluation. Traffic follows the workload
+generator: each profile makes a block of keys hot in one region (80% of the
+traffic) and a final "chaos" profile spreads a few hot keys over every region.
+
+It mirrors what the Java services (and standin_server.py) report:
+  - readCount is cumulative read demand at the region, hits and misses,
+    kept across replicate and evict (DataStoreService.getReadCount);
+  - writeCount counts writes and replicas since the key was last evicted
+    from the node, which drops its write counter;
+  - a client write goes through the controller, which replicates the key to
+    every node (static write policy), so writes undo evictions;
+  - storageCost is the node's price per billed KiB times its billed KiB, each
+    key billed for at least one KiB (COST_PER_KEY_STORED per small key by
+    default);
+  - a node with a byte capacity rejects writes and replicas that don't fit.
+
+With `workload` (a WorkloadModel, config dict or config path, see
+workload_models.py) traffic follows that model instead, one tick per
+`tick_seconds` of model time, and the nodes are its regions.
+"""
+import numpy as np
+
+from reward_model import billable_units
+from workload_models import load_workload
+
+COST_PER_KEY_STORED = 1.5
+
+
+def skewed_profile(num_keys, num_nodes, hot_keys, hot_nodes, hot_share=0.8):
+    """(N, K) joint request distribution, like generate_skewed_profile in generator.py."""
+    def split(size, hot):
+        hot = list(hot)
+        if len(hot) == size:
+            return np.full(size, 1.0 / size)
+        probs = np.full(size, (1 - hot_share) / (size - len(hot)))
+        probs[hot] = hot_share / len(hot)
+        return probs / probs.sum()
+
+    return np.outer(split(num_nodes, hot_nodes), split(num_keys, hot_keys))
+
+
+def regional_profiles(num_keys, num_nodes):
+    """One profile per region with its own block of hot keys, plus a global chaos profile."""
+    block = max(1, num_keys // num_nodes)
+    profiles = []
+    for n in range(num_nodes):
+        start = (n * block) % num_keys
+        hot = [(start + i) % num_keys for i in range(block)]
+        profiles.append(skewed_profile(num_keys, num_nodes, hot, [n]))
+    chaos_keys = sorted({(i * num_keys) // 4 for i in range(4)})
+    profiles.append(skewed_profile(num_keys, num_nodes, chaos_keys, range(num_nodes)))
+    return profiles
+
+
+class SimulatedCluster:
+
+    # Defaults follow generator.py: one request every 0.5 s, profiles switch
+    # every 10 s, and the agents poll once per second.
+    # storage_prices / capacity_bytes: per node or one value for all (capacity 0 = unlimited).
+    # key_bytes: per key or one value; by default the size of the generator's initial value.
+    def __init__(self, num_keys=20, num_nodes=5, requests_per_tick=2, phase_ticks=10,
+                 read_ratio=0.9, cyclic=True, seed=None, node_ids=None, workload=None, tick_seconds=1.0,
+                 storage_prices=None, capacity_bytes=None, key_bytes=None):
+        self.rng = np.random.default_rng(seed)
+        self.workload = load_workload(workload)
+        self.tick_seconds = tick_seconds
+        if self.workload is not None:
+            num_keys, num_nodes = self.workload.num_keys, self.workload.num_regions
+        self.key_names = [f"user_profile_{i}" for i in range(num_keys)]
+        self.node_ids = node_ids or [f"replication-{i}" for i in range(num_nodes)]
+        self.key_index = {k: i for i, k in enumerate(self.key_names)}
+        self.node_index = {n: i for i, n in enumerate(self.node_ids)}
+        # Rank of each key in name order, for the controller's tie-break
+        self._name_rank = np.argsort(np.argsort(self.key_names))
+
+        self.requests_per_tick = requests_per_tick
+        self.phase_ticks = phase_ticks
+        self.read_ratio = read_ratio
+        self.cyclic = cyclic
+        self.profiles = regional_profiles(num_keys, len(self.node_ids))
+
+        num_nodes = len(self.node_ids)
+        self.prices = np.broadcast_to(np.asarray(COST_PER_KEY_STORED if storage_prices is None else storage_prices,
+                                                 dtype=np.float64), (num_nodes,)).copy()
+        self.capacity = np.broadcast_to(np.asarray(capacity_bytes or 0, dtype=np.int64), (num_nodes,)).copy()
+        if key_bytes is None:
+            key_bytes = [2 * len(k) + len("initial_value_for_") for k in self.key_names]
+        self.key_bytes = np.broadcast_to(np.asarray(key_bytes, dtype=np.int64), (num_keys,)).copy()
+
+        shape = (num_nodes, num_keys)
+        # Seeded like the generator: the initial writes put every key everywhere (that has room)
+        self.stored = np.zeros(shape, dtype=bool)
+        self.reads = np.zeros(shape, dtype=np.int64)
+        self.writes = np.zeros(shape, dtype=np.int64)
+        self._write(np.arange(num_keys), np.ones(num_keys, dtype=np.int64))
+
+        self.ticks = 0
+        self.profile_idx = 0
+
+    def _next_profile(self):
+        if self.cyclic:
+            self.profile_idx = (self.profile_idx + 1) % len(self.profiles)
+        else:
+            self.profile_idx = int(self.rng.integers(len(self.profiles)))
+
+    def tick(self):
+        """Advances the workload by one polling interval."""
+        self.ticks += 1
+        if self.workload is not None:
+            return self._tick_workload()
+        if self.ticks % self.phase_ticks == 0:
+            self._next_profile()
+
+        profile = self.profiles[self.profile_idx]
+        requests = self.rng.multinomial(self.requests_per_tick, profile.ravel()).reshape(profile.shape)
+        num_reads = self.rng.binomial(requests, self.read_ratio)
+        self.reads += num_reads
+
+        num_writes = (requests - num_reads).sum(axis=0)
+        written = np.flatnonzero(num_writes)
+        self._write(written, num_writes[written])
+
+    def _tick_workload(self):
+        profile = self.workload.at(self.ticks * self.tick_seconds)
+        keys, regions, is_read = profile.sample(self.rng, self.requests_per_tick)
+        np.add.at(self.reads, (regions[is_read], keys[is_read]), 1)
+        written, counts = np.unique(keys[~is_read], return_counts=True)
+        self._write(written, counts)
+
+    def _fits(self, k):
+        """(N,) nodes that hold key k or have room for it."""
+        if not self.capacity.any():
+            return np.ones(len(self.node_ids), dtype=bool)
+        stored_bytes = self.stored @ self.key_bytes
+        return self.stored[:, k] | (self.capacity == 0) | (stored_bytes + self.key_bytes[k] <= self.capacity)
+
+    def _write(self, keys, counts):
+        """Client writes: the controller replicates each key to every node that accepts it."""
+        if not self.capacity.any():
+            self.stored[:, keys] = True
+            self.writes[:, keys] += counts
+            return
+        for k, count in zip(keys, counts):
+            accepted = self._fits(k)
+            self.stored[accepted, k] = True
+            self.writes[accepted, k] += count
+
+    def execute(self, action_type, key, node):
+        """Applies an agent action. False for unknown keys or nodes, or a replica that doesn't fit."""
+        k = self.key_index.get(key)
+        n = self.node_index.get(node)
+        if k is None or n is None:
+            return False
+        if action_type == "REPLICATE":
+            if not self._fits(k)[n]:
+                return False
+            self.stored[n, k] = True
+            self.writes[n, k] += 1
+        elif action_type == "EVICT":
+            self.stored[n, k] = False
+            # DataStoreService.evict drops the key's writeCount; ShadowPlacement relies on that
+            self.writes[n, k] = 0
+        else:
+            return False
+        return True
+
+    def hot_keys(self, top_k):
+        totals = self.reads.sum(axis=0) + self.writes.sum(axis=0)
+        # Hottest first, name order on ties (matches the controller's merge)
+        return np.lexsort((self._name_rank, -totals))[:top_k].tolist()
+
+    def state(self, top_k=None):
+        """The /rl/system-state payload, optionally restricted to the top-K keys."""
+        keys = range(len(self.key_names)) if top_k is None else self.hot_keys(top_k)
+        stored_bytes = self.stored @ self.key_bytes
+        bills = self.prices * (self.stored @ billable_units(self.key_bytes))
+        state = []
+        for n, node_id in enumerate(self.node_ids):
+            key_metrics = {}
+            for k in keys:
+                if self.stored[n, k] or self.reads[n, k] > 0:
+                    key_metrics[self.key_names[k]] = {
+                        "readCount": int(self.reads[n, k]),
+                        "writeCount": int(self.writes[n, k]),
+                        "stored": bool(self.stored[n, k]),
+                        "sizeBytes": int(self.key_bytes[k]) if self.stored[n, k] else 0,
+                    }
+            state.append({
+                "nodeId": node_id,
+                "keyMetrics": key_metrics,
+                "storageCost": float(bills[n]),
+                "storagePrice": float(self.prices[n]),
+                "capacityBytes": int(self.capacity[n]),
+                "storedBytes": int(stored_bytes[n]),
+            })
+        return state
@@ -0,0 +1,437 @@
+"""
+Lightweight stand-in for the replication controller and nodes (stdlib asyncio).
+
+Implements the endpoints the Python side talks to, with the JSON shapes of
+RLController / DataController / ApiController:
+
+  controller  GET  /rl/system-state[?topK=K]     POST /rl/execute-action
+                   (JSON, or the binary encoding of state_codec.py if accepted)
+              POST /api/v1/data                  GET  /api/v1/data/{key}
+  node        GET  /data/{key}                   GET  /internal/data/{key}
+              GET  /management/metrics           GET  /management/heavy-hitters?k=K
+              POST /management/metrics/keys      POST /management/replicate
+              DELETE /management/data/{key}
+
+Node bookkeeping follows DataStoreService: one read counter per key covering
+hits and misses, kept across replicate and evict (the node's sketch without
+its overestimate), write counters for stored keys (dropped on evict), UTF-8
+sizes of the stored entries, storage billed per KiB at the node's price, and an
+optional byte capacity (writes that don't fit get 507 Insufficient Storage). Reads sleep `latency_scale` times the reported 10/150 ms
+(0 by default, so runs are as fast as the loop allows).
+
+With `num_keys` set, every /rl/system-state poll first replays one tick of
+the generator's workload profiles (see simulated_cluster.py), so agents can
+train and evaluate without a separate generator. A `workload` model or
+config (workload_models.py) replaces those profiles, one tick per
+`tick_seconds` of model time.
+
+Many clusters can run in one process, each on its own random ports:
+
+    stand_in = BackgroundStandIn()
+    cluster = stand_in.add_cluster(num_keys=20, seed=0)
+    os.environ["CONTROLLER_URL"] = cluster.controller_url  # before importing the agent modules
+    ...
+    stand_in.close()
+
+Or as a drop-in for the Docker Compose stack on the usual ports:
+
+    python standin_server.py --port 8080 --node_base_port 8081
+"""
+import argparse
+import asyncio
+import json
+import threading
+from collections import Counter
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+from reward_model import BILLING_UNIT_BYTES, MIN_BILLABLE_BYTES
+from simulated_cluster import COST_PER_KEY_STORED, regional_profiles
+from state_codec import STATE_MEDIA_TYPE, encode_state
+from workload_models import load_workload
+
+LOCAL_READ_LATENCY_MS = 10
+REMOTE_READ_LATENCY_MS = 150
+# node.metrics.top-k-capacity: the largest k a node's heavy-hitter endpoint accepts
+HEAVY_HITTER_CAPACITY = 4096
+
+# Same node names / regions as docker-compose.yaml and generator.py
+DEFAULT_NODES = ["replication-us", "replication-eu", "replication-ap", "replication-sa", "replication-jp"]
+DEFAULT_REGIONS = ["us-east", "eu-west", "ap-south", "sa-east", "jp-east"]
+
+STATUS_TEXT = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+               507: "Insufficient Storage"}
+
+
+class StandInNode:
+
+    def __init__(self, node_id, latency_scale=0.0, storage_price=COST_PER_KEY_STORED, capacity_bytes=0):
+        self.node_id = node_id
+        self.latency_scale = latency_scale
+        self.storage_price = storage_price
+        self.capacity_bytes = capacity_bytes
+        self.store = {}
+        self.sizes = {}
+        self.stored_bytes = 0
+        self.billed_bytes = 0
+        self.read_counts = Counter()  # hits and misses, whether or not the key is stored
+        self.write_counts = Counter()
+        self.accesses = Counter()  # hits, misses and writes: the heavy-hitter ranking
+        self.url = None
+
+    def put(self, key, value):
+        """False, and nothing stored, if the entry would take the node over capacity."""
+        size = len(key.encode("utf-8")) + len(value.encode("utf-8"))
+        growth = size - self.sizes.get(key, 0)
+        if self.capacity_bytes > 0 and growth > 0 and self.stored_bytes + growth > self.capacity_bytes:
+            return False
+        self._release(key)
+        self.sizes[key] = size
+        self.stored_bytes += size
+        self.billed_bytes += max(size, MIN_BILLABLE_BYTES)
+        self.store[key] = value
+        self.write_counts[key] += 1
+        self.accesses[key] += 1
+        return True
+
+    def _release(self, key):
+        size = self.sizes.pop(key, None)
+        if size is not None:
+            self.stored_bytes -= size
+            self.billed_bytes -= max(size, MIN_BILLABLE_BYTES)
+
+    def evict(self, key):
+        self._release(key)
+        self.store.pop(key, None)
+        self.write_counts.pop(key, None)
+
+    def read(self, key):
+        """Counts the read and returns (value, reported latency in ms)."""
+        self.accesses[key] += 1
+        self.read_counts[key] += 1
+        if key in self.store:
+            return self.store[key], LOCAL_READ_LATENCY_MS
+        return None, REMOTE_READ_LATENCY_MS
+
+    def read_count(self, key):
+        return self.read_counts.get(key, 0)
+
+    def key_metric(self, key):
+        return {"readCount": self.read_count(key), "writeCount": self.write_counts.get(key, 0),
+                "stored": key in self.store, "sizeBytes": self.sizes.get(key, 0)}
+
+    def top_keys(self, k):
+        """Like KeyPopularityTracker.topKeys: a k above the capacity is an error, not a shorter list."""
+        if not 0 <= k <= HEAVY_HITTER_CAPACITY:
+            raise ValueError(f"k must be between 0 and the top-K capacity {HEAVY_HITTER_CAPACITY}, got {k}")
+        return [key for key, _ in self.accesses.most_common(k)]
+
+    def node_metric(self, keys):
+        return {"nodeId": self.node_id,
+                "keyMetrics": {key: self.key_metric(key) for key in keys},
+                "storageCost": self.storage_price * self.billed_bytes / BILLING_UNIT_BYTES,
+                "storagePrice": self.storage_price,
+                "capacityBytes": self.capacity_bytes,
+                "storedBytes": self.stored_bytes}
+
+    def all_metrics(self):
+        keys = set(self.store) | set(self.read_counts) | set(self.write_counts)
+        keys.update(self.top_keys(HEAVY_HITTER_CAPACITY))
+        return self.node_metric(keys)
+
+    def heavy_hitters(self, k):
+        return self.node_metric(self.top_keys(k))
+
+    def metrics_for(self, keys):
+        return self.node_metric([key for key in keys if key in self.store or key in self.accesses])
+
+    async def handle(self, method, path, query, body, headers):
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if method == "GET" and len(parts) == 2 and parts[0] == "data":
+            value, latency = self.read(parts[1])
+            if self.latency_scale > 0:
+                await asyncio.sleep(latency * self.latency_scale / 1000.0)
+            return 200, {"key": parts[1], "value": value, "latencyMs": latency}
+        if method == "GET" and len(parts) == 3 and parts[:2] == ["internal", "data"]:
+            if parts[2] not in self.store:
+                return 404, None
+            value, _ = self.read(parts[2])
+            return 200, value
+        if method == "DELETE" and len(parts) == 3 and parts[:2] == ["management", "data"]:
+            self.evict(parts[2])
+            return 200, None
+        if method == "GET" and path == "/management/metrics":
+            return 200, self.all_metrics()
+        if method == "GET" and path == "/management/heavy-hitters":
+            try:
+                return 200, self.heavy_hitters(int(query.get("k", ["20"])[0]))
+            except ValueError as e:
+                return 400, str(e)
+        if method == "POST" and path == "/management/metrics/keys":
+            return 200, self.metrics_for(json.loads(body))
+        if method == "POST" and path == "/management/replicate":
+            request = json.loads(body)
+            return (200 if self.put(request["key"], request["value"]) else 507), None
+        return 404, None
+
+
+class StandInCluster:
+
+    # storage_prices / capacity_bytes: per node or one value for all (capacity 0 = unlimited)
+    def __init__(self, node_ids=None, regions=None, latency_scale=0.0,
+                 num_keys=None, requests_per_poll=2, phase_ticks=10, read_ratio=0.9, seed=None,
+                 workload=None, tick_seconds=1.0, storage_prices=None, capacity_bytes=None):
+        self.workload = load_workload(workload)
+        if self.workload is not None:
+            num_keys = self.workload.num_keys
+            regions = regions or self.workload.regions
+            count = self.workload.num_regions
+            node_ids = node_ids or (DEFAULT_NODES[:count] if count <= len(DEFAULT_NODES)
+                                    else [f"replication-{i}" for i in range(count)])
+        node_ids = node_ids or DEFAULT_NODES
+        prices = np.broadcast_to(COST_PER_KEY_STORED if storage_prices is None else storage_prices, len(node_ids))
+        capacities = np.broadcast_to(capacity_bytes or 0, len(node_ids))
+        self.nodes = [StandInNode(n, latency_scale, float(price), int(capacity))
+                      for n, price, capacity in zip(node_ids, prices, capacities)]
+        self.node_by_id = {node.node_id: node for node in self.nodes}
+        self.regions = regions or (DEFAULT_REGIONS[:len(node_ids)] if len(node_ids) <= len(DEFAULT_REGIONS)
+                                   else [f"region-{i}" for i in range(len(node_ids))])
+        self.replication_map = {}
+        self.controller_url = None
+        self._servers = []
+
+        # Optional built-in workload: one generator tick per state poll
+        self.rng = np.random.default_rng(seed)
+        self.requests_per_poll = requests_per_poll
+        self.phase_ticks = phase_ticks
+        self.read_ratio = read_ratio
+        self.tick_seconds = tick_seconds
+        self.ticks = 0
+        self.key_names = [f"user_profile_{i}" for i in range(num_keys)] if num_keys else []
+        self.profiles = regional_profiles(num_keys, len(self.nodes)) if num_keys and not self.workload else []
+        for key in self.key_names:
+            self.write(key, f"initial_value_for_{key}")
+
+    @property
+    def node_urls(self):
+        return {region: node.url for region, node in zip(self.regions, self.nodes)}
+
+    # --- Controller logic (ReplicationService / RLController) ---
+
+    def write(self, key, value):
+        """Static write policy: every node gets every write (a full node rejects it)."""
+        self.replication_map[key] = {node.node_id for node in self.nodes if node.put(key, value)}
+
+    def execute_action(self, action_type, key, target_node):
+        node = self.node_by_id.get(target_node)
+        if node is None:
+            return False
+        if action_type.upper() == "REPLICATE":
+            if node.put(key, "agent-replicated-value"):
+                self.replication_map.setdefault(key, set()).add(node.node_id)
+        elif action_type.upper() == "EVICT":
+            node.evict(key)
+            self.replication_map.get(key, set()).discard(node.node_id)
+        return True
+
+    def system_state(self, top_k=None):
+        if top_k is None:
+            return [node.all_metrics() for node in self.nodes]
+        totals = Counter()
+        for node in self.nodes:
+            for key, metric in node.heavy_hitters(top_k)["keyMetrics"].items():
+                totals[key] += metric["readCount"] + metric["writeCount"]
+        hot_keys = sorted(totals, key=lambda k: (-totals[k], k))[:top_k]
+        return [node.metrics_for(hot_keys) for node in self.nodes]
+
+    def tick(self):
+        """One polling interval of the generator's workload, applied directly to the nodes."""
+        if self.workload is not None:
+            self.ticks += 1
+            keys, regions, is_read = self.workload.at(self.ticks * self.tick_seconds).sample(
+                self.rng, self.requests_per_poll)
+            self._apply(zip(regions.tolist(), keys.tolist(), is_read.tolist()))
+            return
+        if not self.profiles:
+            return
+        self.ticks += 1
+        profile = self.profiles[(self.ticks // self.phase_ticks) % len(self.profiles)]
+        requests = self.rng.multinomial(self.requests_per_poll, profile.ravel()).reshape(profile.shape)
+        self._apply((n, k, self.rng.random() < self.read_ratio)
+                    for n, k in zip(*np.nonzero(requests)) for _ in range(requests[n, k]))
+
+    def _apply(self, requests):
+        for n, k, is_read in requests:
+            key = self.key_names[k]
+            if is_read:
+                self.nodes[n].read(key)
+            else:
+                self.write(key, f"val_{int(self.rng.integers(1000, 9999))}")
+
+    async def handle(self, method, path, query, body, headers):
+        if method == "GET" and path == "/rl/system-state":
+            self.tick()
+            top_k = query.get("topK")
+            try:
+                state = self.system_state(int(top_k[0]) if top_k else None)
+            except ValueError as e:
+                return 400, str(e)
+            if STATE_MEDIA_TYPE in headers.get("accept", ""):
+                return 200, encode_state(state)
+            return 200, state
+        if method == "POST" and path == "/rl/execute-action":
+            request = json.loads(body)
+            ok = self.execute_action(request["actionType"], request["key"], request["targetNode"])
+            return (202 if ok else 400), None
+        if method == "POST" and path == "/api/v1/data":
+            request = json.loads(body)
+            self.write(request["key"], request["value"])
+            return 201, None
+        if method == "GET" and path.startswith("/api/v1/data/"):
+            key = unquote(path[len("/api/v1/data/"):])
+            holders = self.replication_map.get(key)
+            node = self.node_by_id[next(iter(holders))] if holders else self.nodes[0]
+            value, latency = node.read(key)
+            return 200, {"key": key, "value": value, "retrievalLatencyMs": latency, "servedByNode": node.url}
+        return 404, None
+
+    # --- Servers ---
+
+    async def start(self, host="127.0.0.1", port=0, node_base_port=None):
+        """Starts the controller and one server per node. Port 0 picks free ports."""
+        server = await _serve(self.handle, host, port)
+        self.controller_url = f"http://{host}:{server.sockets[0].getsockname()[1]}"
+        self._servers.append(server)
+        for i, node in enumerate(self.nodes):
+            node_port = 0 if node_base_port is None else node_base_port + i
+            server = await _serve(node.handle, host, node_port)
+            node.url = f"http://{host}:{server.sockets[0].getsockname()[1]}"
+            self._servers.append(server)
+        return self
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+
+async def _serve(handler, host, port):
+    async def on_connection(reader, writer):
+        try:
+            await _handle_connection(handler, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(on_connection, host, port)
+
+
+async def _handle_connection(handler, reader, writer):
+    """Minimal HTTP/1.1 with keep-alive: one request at a time per connection."""
+    while True:
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return
+        method, target, version = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+        url = urlparse(target)
+        try:
+            status, payload = await handler(method, url.path, parse_qs(url.query), body, headers)
+        except (ValueError, KeyError, TypeError):
+            status, payload = 400, None
+        except Exception:
+            status, payload = 500, None
+
+        # bytes are an already encoded binary system state
+        content_type = STATE_MEDIA_TYPE if isinstance(payload, bytes) else "application/json"
+        data = payload if isinstance(payload, bytes) else b"" if payload is None else json.dumps(payload).encode()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+        if not keep_alive:
+            return
+
+
+class BackgroundStandIn:
+    """Runs any number of stand-in clusters on an event loop in a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.clusters = []
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def add_cluster(self, host="127.0.0.1", port=0, node_base_port=None, **cluster_kwargs):
+        cluster = self._run(self._create(cluster_kwargs, host, port, node_base_port))
+        self.clusters.append(cluster)
+        return cluster
+
+    async def _create(self, cluster_kwargs, host, port, node_base_port):
+        # Built on the loop thread: the cluster is only ever touched from there
+        return await StandInCluster(**cluster_kwargs).start(host, port, node_base_port)
+
+    def close(self):
+        for cluster in self.clusters:
+            self._run(cluster.stop())
+        self.clusters = []
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+async def _main(args):
+    node_ids = None  # the default five, or one per workload region
+    if args.nodes is not None:
+        node_ids = DEFAULT_NODES[:args.nodes] if args.nodes <= len(DEFAULT_NODES) \
+            else [f"replication-{i}" for i in range(args.nodes)]
+    cluster = await StandInCluster(node_ids=node_ids, latency_scale=args.latency_scale,
+                                   num_keys=args.num_keys, seed=args.seed, workload=args.workload,
+                                   storage_prices=args.storage_prices, capacity_bytes=args.capacity_bytes).start(
+        args.host, args.port, args.node_base_port)
+    print(f"export CONTROLLER_URL={cluster.controller_url}")
+    print("export REGION_NODE_URLS=" + ",".join(f"{r}={u}" for r, u in cluster.node_urls.items()))
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="Controller port (0 = random)")
+    parser.add_argument("--node_base_port", type=int, default=8081,
+                        help="Node i listens on base+i like docker-compose (omit with --port 0 for random)")
+    parser.add_argument("--nodes", type=int, default=None)
+    parser.add_argument("--latency_scale", type=float, default=0.0,
+                        help="Fraction of the reported 10/150 ms actually slept per read (1.0 = like the JVM nodes)")
+    parser.add_argument("--num_keys", type=int, default=None,
+                        help="Replay the generator's workload over this many keys on every state poll")
+    parser.add_argument("--workload", type=str, default=None,
+                        help="Workload config (JSON, see workload_models.py) replayed instead of the generator's profiles")
+    parser.add_argument("--storage_prices", type=float, nargs="+", default=None,
+                        help="Price per billed KiB, one for all nodes or one per node")
+    parser.add_argument("--capacity_bytes", type=int, nargs="+", default=None,
+                        help="Byte capacity, one for all nodes or one per node (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.port == 0:
+        args.node_base_port = None
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
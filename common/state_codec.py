@@ -0,0 +1,206 @@
+"""
+Columnar binary encoding of /rl/system-state.
+
+The controller serves it instead of JSON when the request carries
+`Accept: application/x-replication-state` (StateEncoder.java). Key names go
+once into a dictionary and every per-node metric is a fixed-width column, so
+decoding is a few np.frombuffer views over the response body instead of a
+JSON parse plus a Python walk over every (node, key) entry.
+
+Layout (little-endian):
+
+    "RSv2" | u32 nodes N | u32 keys K | u32 count width (4|8) | u32 node blob len | u32 key blob len
+    node ids, NUL separated UTF-8 | key names, NUL separated UTF-8 | zero padding to 8 bytes
+    f64 storageCost[N] | f64 storagePrice[N] | i64 capacityBytes[N] | i64 storedBytes[N]
+    int readCount[N*K] | int writeCount[N*K] | int sizeBytes[N*K]   node-major, int32 or int64
+    u8 flags[N*K]                                                   bit 0: stored, bit 1: reported by the node
+
+"RSv1" bodies (controllers from before per-node prices) have only the
+storageCost column and no sizes; they still decode, without byte accounting.
+
+decode_state returns the same StateArrays state_to_arrays builds from the
+JSON (keys numbered by first appearance), with reads/writes as read-only views
+into the buffer. encode_state is the Python twin of the Java encoder, used by
+the stand-in controller and the benchmarks.
+"""
+import struct
+
+import numpy as np
+
+from reward_model import StateArrays, state_to_arrays
+
+STATE_MEDIA_TYPE = "application/x-replication-state"
+# Accept header of the agents' polls: the encoding if the controller has it, JSON otherwise
+STATE_ACCEPT = f"{STATE_MEDIA_TYPE}, application/json;q=0.5"
+
+MAGIC = b"RSv2"
+MAGIC_V1 = b"RSv1"
+_HEADER = struct.Struct("<4sIIIII")
+HEADER_BYTES = _HEADER.size
+
+FLAG_STORED = 1
+FLAG_REPORTED = 2
+
+_COUNT_DTYPES = {4: np.dtype("<i4"), 8: np.dtype("<i8")}
+
+
+def _split_names(blob, count):
+    if count == 0:
+        return []
+    names = blob.decode("utf-8").split("\0")
+    if len(names) != count:
+        raise ValueError(f"Expected {count} names in the dictionary, found {len(names)}")
+    return names
+
+
+def _layout(buf):
+    """Header fields plus the byte offset of every section. sizes_at is None for version 1."""
+    if len(buf) < HEADER_BYTES:
+        raise ValueError("Truncated system state: no header")
+    magic, num_nodes, num_keys, count_bytes, node_blob, key_blob = _HEADER.unpack_from(buf, 0)
+    if magic not in (MAGIC, MAGIC_V1):
+        raise ValueError(f"Not a binary system state (magic {magic!r})")
+    if count_bytes not in _COUNT_DTYPES:
+        raise ValueError(f"Unsupported count width {count_bytes}")
+    v1 = magic == MAGIC_V1
+    keys_at = HEADER_BYTES + node_blob
+    dict_end = keys_at + key_blob
+    costs_at = (dict_end + 7) // 8 * 8
+    cells = num_nodes * num_keys
+    reads_at = costs_at + (1 if v1 else 4) * 8 * num_nodes
+    writes_at = reads_at + cells * count_bytes
+    sizes_at = None if v1 else writes_at + cells * count_bytes
+    flags_at = writes_at + (1 if v1 else 2) * cells * count_bytes
+    if len(buf) < flags_at + cells:
+        raise ValueError(f"Truncated system state: {len(buf)} bytes, expected {flags_at + cells}")
+    return num_nodes, num_keys, count_bytes, keys_at, dict_end, costs_at, reads_at, writes_at, sizes_at, flags_at
+
+
+class StateDecoder:
+    """
+    decode_state with the key dictionary cached: consecutive polls of a stable
+    key set reuse the decoded name list instead of splitting the blob again.
+    """
+
+    def __init__(self):
+        self._key_blob = None
+        self._key_names = None
+
+    def _key_names_of(self, blob, count):
+        if blob != self._key_blob:
+            self._key_names = _split_names(bytes(blob), count)
+            self._key_blob = bytes(blob)
+        return self._key_names
+
+    def decode(self, buf):
+        buf = memoryview(buf).cast("B")
+        (num_nodes, num_keys, count_bytes, keys_at, dict_end, costs_at,
+         reads_at, writes_at, sizes_at, flags_at) = _layout(buf)
+        shape = (num_nodes, num_keys)
+        cells = num_nodes * num_keys
+        count_dtype = _COUNT_DTYPES[count_bytes]
+
+        node_ids = _split_names(bytes(buf[HEADER_BYTES:keys_at]), num_nodes)
+        key_names = self._key_names_of(buf[keys_at:dict_end], num_keys)
+        storage_cost = np.frombuffer(buf, dtype="<f8", count=num_nodes, offset=costs_at)
+        reads = np.frombuffer(buf, dtype=count_dtype, count=cells, offset=reads_at).reshape(shape)
+        writes = np.frombuffer(buf, dtype=count_dtype, count=cells, offset=writes_at).reshape(shape)
+        flags = np.frombuffer(buf, dtype=np.uint8, count=cells, offset=flags_at).reshape(shape)
+        accounting = {}
+        if sizes_at is not None:
+            accounting = dict(
+                key_bytes=np.frombuffer(buf, dtype=count_dtype, count=cells, offset=sizes_at).reshape(shape),
+                storage_price=np.frombuffer(buf, dtype="<f8", count=num_nodes, offset=costs_at + 8 * num_nodes),
+                capacity_bytes=np.frombuffer(buf, dtype="<i8", count=num_nodes, offset=costs_at + 16 * num_nodes),
+                stored_bytes=np.frombuffer(buf, dtype="<i8", count=num_nodes, offset=costs_at + 24 * num_nodes))
+        # key_names is shared with later decodes, so hand out a copy of the list
+        return StateArrays(node_ids, list(key_names), (flags & FLAG_STORED) != 0, reads, writes,
+                           storage_cost, (flags & FLAG_REPORTED) != 0, **accounting)
+
+
+def decode_state(buf):
+    return StateDecoder().decode(buf)
+
+
+def _node_column(values, num_nodes):
+    values = np.zeros(num_nodes) if values is None else values
+    return np.ascontiguousarray(values, dtype="<i8").tobytes()
+
+
+def encode_state(state):
+    """Encodes a JSON state (list of node metrics) or StateArrays like the controller does."""
+    arrays = state_to_arrays(state)
+    num_nodes, num_keys = len(arrays.node_ids), len(arrays.key_names)
+    num_cells = num_nodes * num_keys
+    key_bytes = arrays.key_bytes if arrays.key_bytes is not None else np.zeros(num_cells, dtype=np.int64)
+    max_count = max(int(arrays.reads.max(initial=0)), int(arrays.writes.max(initial=0)), int(key_bytes.max(initial=0)))
+    count_bytes = 4 if max_count <= np.iinfo(np.int32).max else 8
+    count_dtype = _COUNT_DTYPES[count_bytes]
+
+    node_blob = "\0".join(arrays.node_ids).encode("utf-8")
+    key_blob = "\0".join(arrays.key_names).encode("utf-8")
+    dict_end = HEADER_BYTES + len(node_blob) + len(key_blob)
+    padding = b"\0" * ((dict_end + 7) // 8 * 8 - dict_end)
+    flags = arrays.reported.astype(np.uint8) * FLAG_REPORTED | arrays.presence.astype(np.uint8) * FLAG_STORED
+
+    return b"".join([
+        _HEADER.pack(MAGIC, num_nodes, num_keys, count_bytes, len(node_blob), len(key_blob)),
+        node_blob, key_blob, padding,
+        np.ascontiguousarray(arrays.storage_cost, dtype="<f8").tobytes(),
+        np.ascontiguousarray(arrays.prices(), dtype="<f8").tobytes(),
+        _node_column(arrays.capacity_bytes, num_nodes),
+        _node_column(arrays.stored_bytes, num_nodes),
+        np.ascontiguousarray(arrays.reads, dtype=count_dtype).tobytes(),
+        np.ascontiguousarray(arrays.writes, dtype=count_dtype).tobytes(),
+        np.ascontiguousarray(key_bytes, dtype=count_dtype).tobytes(),
+        np.ascontiguousarray(flags, dtype=np.uint8).tobytes(),
+    ])
+
+
+if __name__ == "__main__":
+    # Round-trip check against the JSON parser
+    import json
+    import time
+
+    rng = np.random.default_rng(0)
+    keys = [f"user_profile_{k}" for k in range(10_000)]
+    state = [{
+        "nodeId": f"replication-{region}",
+        "storageCost": float(i + 1),
+        "keyMetrics": {k: {"readCount": int(rng.integers(0, 1000)), "writeCount": int(rng.integers(0, 50)),
+                           "stored": bool(rng.random() < 0.3), "sizeBytes": int(rng.integers(0, 5000))}
+                       for k in keys if rng.random() < 0.8},
+        "storagePrice": 0.5 * (i + 1),
+        "capacityBytes": 1 << 30,
+        "storedBytes": int(rng.integers(0, 1 << 20)),
+    } for i, region in enumerate(["us", "eu", "ap", "sa", "jp"])]
+
+    expected = state_to_arrays(state)
+    body_json = json.dumps(state).encode()
+    body_bin = encode_state(state)
+    decoded = decode_state(body_bin)
+    assert decoded.node_ids == expected.node_ids and decoded.key_names == expected.key_names
+    for field in ("presence", "reads", "writes", "storage_cost", "reported",
+                  "key_bytes", "storage_price", "capacity_bytes", "stored_bytes"):
+        assert np.array_equal(getattr(decoded, field), getattr(expected, field)), field
+
+    # Version 1 bodies: same columns minus the byte accounting
+    arrays = expected
+    v1 = b"".join([_HEADER.pack(MAGIC_V1, *_HEADER.unpack_from(body_bin, 0)[1:]),
+                   body_bin[HEADER_BYTES:_layout(memoryview(body_bin))[5] + 8 * len(arrays.node_ids)],
+                   arrays.reads.astype("<i4").tobytes(), arrays.writes.astype("<i4").tobytes(),
+                   (arrays.reported.astype(np.uint8) * FLAG_REPORTED | arrays.presence.astype(np.uint8)).tobytes()])
+    old = decode_state(v1)
+    assert old.key_bytes is None and np.array_equal(old.reads, expected.reads)
+    assert np.array_equal(old.presence, expected.presence)
+
+    decoder = StateDecoder()
+    decoder.decode(body_bin)
+    start = time.perf_counter()
+    state_to_arrays(json.loads(body_json))
+    json_ms = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    decoder.decode(body_bin)
+    bin_ms = (time.perf_counter() - start) * 1e3
+    print(f"OK  json {len(body_json) / 1e6:.2f} MB {json_ms:.1f} ms  |  "
+          f"binary {len(body_bin) / 1e6:.2f} MB {bin_ms:.2f} ms")
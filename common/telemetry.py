@@ -0,0 +1,110 @@
+"""
+Low-overhead training telemetry.
+
+Each series is a fixed-size NumPy ring buffer, so recording a value is an
+array store and memory never grows. Summaries (mean/p50/p99 over the values
+recorded since the previous summary, at most `capacity` of them) are computed
+only when asked for, e.g. every few thousand steps.
+
+Envs and training loops record into the shared module-level TELEMETRY. Envs
+that run in subprocesses (SubprocVecEnv, remote RLlib runners) record into
+their own process's copy.
+
+Series recorded by the agents (times in ms):
+    env_step      full env.step()
+    http_state    GET /rl/system-state
+    http_action   POST /rl/execute-action
+    mask          action-mask construction (MLP env)
+    obs_build     graph observation + mask construction (GNN env)
+    forward       policy forward pass
+    reward        per-step reward
+    train_iter    one RLlib algo.train() iteration
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+DEFAULT_CAPACITY = 4096
+
+
+class RingBuffer:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.data = np.zeros(capacity, dtype=np.float64)
+        self.capacity = capacity
+        self.index = 0
+        self.count = 0  # values recorded since the last clear
+
+    def append(self, value):
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.capacity
+        self.count += 1
+
+    def values(self):
+        """The last min(count, capacity) values, oldest first."""
+        n = min(self.count, self.capacity)
+        return np.take(self.data, np.arange(self.index - n, self.index), mode='wrap')
+
+    def clear(self):
+        self.count = 0
+
+
+class Telemetry:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.series = {}
+
+    def record(self, name, value):
+        buffer = self.series.get(name)
+        if buffer is None:
+            buffer = self.series[name] = RingBuffer(self.capacity)
+        buffer.append(value)
+
+    @contextmanager
+    def timer(self, name):
+        """Records the wall time of the block in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def summary(self, reset=True):
+        """{name: {"count", "mean", "p50", "p99"}} over the current window of every series."""
+        result = {}
+        for name, buffer in self.series.items():
+            if buffer.count == 0:
+                continue
+            values = buffer.values()
+            p50, p99 = np.percentile(values, [50, 99])
+            result[name] = {"count": buffer.count, "mean": float(values.mean()),
+                            "p50": float(p50), "p99": float(p99)}
+            if reset:
+                buffer.clear()
+        return result
+
+    @staticmethod
+    def format_summary(summary):
+        lines = [f"{'series':<12} {'count':>7} {'mean':>10} {'p50':>10} {'p99':>10}"]
+        for name in sorted(summary):
+            s = summary[name]
+            lines.append(f"{name:<12} {s['count']:>7} {s['mean']:>10.3f} {s['p50']:>10.3f} {s['p99']:>10.3f}")
+        return "\n".join(lines)
+
+
+TELEMETRY = Telemetry()
+
+
+def time_forward_passes(module, name="forward", telemetry=TELEMETRY):
+    """Times every forward call of a torch module with hooks. Returns the hook handles."""
+    state = {}
+
+    def before(mod, inputs):
+        state["start"] = time.perf_counter()
+
+    def after(mod, inputs, output):
+        telemetry.record(name, (time.perf_counter() - state["start"]) * 1000.0)
+
+    return [module.register_forward_pre_hook(before), module.register_forward_hook(after)]
@@ -0,0 +1,161 @@
+"""
+On-disk transition store for offline pre-training.
+
+Transitions (observation, mask, action, reward, next observation, done) are
+buffered in memory and written as shards: one directory per chunk with one
+.npy file per field, so readers can memory-map them. Dict observations (the
+GNN env) are stored field by field, e.g. `observations.x_keys.npy`.
+
+A shard is written to a temporary directory and renamed into place once
+complete, so a crashed writer never leaves a half-written shard behind and
+several runs can log into the same directory.
+"""
+import glob
+import os
+import time
+
+import gymnasium as gym
+import numpy as np
+
+SHARD_PREFIX = "shard_"
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for name, item in value.items():
+            _flatten(f"{prefix}.{name}", item, out)
+    else:
+        # Envs may hand out views of buffers they update in place (IncrementalGraphState)
+        out[prefix] = np.array(value, copy=True)
+
+
+def _snapshot(observation):
+    if isinstance(observation, dict):
+        return {name: _snapshot(item) for name, item in observation.items()}
+    return np.array(observation, copy=True)
+
+
+class TransitionLogger:
+
+    def __init__(self, directory, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        # Unique per writer so concurrent runs don't collide
+        self._run_id = f"{int(time.time())}_{os.getpid()}"
+        self._num_shards = 0
+        self._buffer = {}
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, observation, mask, action, reward, next_observation, done=False):
+        fields = {}
+        _flatten("observations", observation, fields)
+        _flatten("next_observations", next_observation, fields)
+        fields["masks"] = np.asarray(mask, dtype=bool)
+        fields["actions"] = np.int64(action)
+        fields["rewards"] = np.float32(reward)
+        fields["dones"] = bool(done)
+
+        for name, value in fields.items():
+            self._buffer.setdefault(name, []).append(value)
+        self._size += 1
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._size == 0:
+            return None
+        name = f"{SHARD_PREFIX}{self._run_id}_{self._num_shards:05d}"
+        final_path = os.path.join(self.directory, name)
+        tmp_path = os.path.join(self.directory, "." + name + ".tmp")
+        os.makedirs(tmp_path)
+        for field, values in self._buffer.items():
+            np.save(os.path.join(tmp_path, field + ".npy"), np.stack(values))
+        os.rename(tmp_path, final_path)
+
+        self._num_shards += 1
+        self._buffer = {}
+        self._size = 0
+        return final_path
+
+    def close(self):
+        self.flush()
+
+
+class TransitionDataset:
+    """Memory-mapped view over every complete shard in a directory."""
+
+    def __init__(self, directory):
+        self.shards = []
+        for path in sorted(glob.glob(os.path.join(directory, SHARD_PREFIX + "*"))):
+            fields = {os.path.basename(f)[:-len(".npy")]: np.load(f, mmap_mode="r")
+                      for f in glob.glob(os.path.join(path, "*.npy"))}
+            self.shards.append(fields)
+
+    def __len__(self):
+        return sum(len(shard["actions"]) for shard in self.shards)
+
+    def fields(self, prefix):
+        """Names of the stored arrays under `prefix` (e.g. the keys of a dict observation)."""
+        names = self.shards[0] if self.shards else {}
+        return sorted(n for n in names if n == prefix or n.startswith(prefix + "."))
+
+    def batches(self, batch_size, rng, fields=("observations", "masks", "actions")):
+        """
+        One shuffled pass: shards in random order, random minibatches within
+        each shard. Only the rows of the current batch are read from disk.
+        Dict observations come back as dicts, e.g. batch["observations"]["x_keys"].
+        """
+        for shard_idx in rng.permutation(len(self.shards)):
+            shard = self.shards[shard_idx]
+            order = rng.permutation(len(shard["actions"]))
+            for start in range(0, len(order), batch_size):
+                # Sorted indices keep the memory-mapped reads sequential
+                idx = np.sort(order[start:start + batch_size])
+                batch = {}
+                for field in fields:
+                    if field in shard:
+                        batch[field] = np.asarray(shard[field][idx])
+                    else:
+                        batch[field] = {name[len(field) + 1:]: np.asarray(shard[name][idx])
+                                        for name in shard if name.startswith(field + ".")}
+                yield batch
+
+
+class TransitionRecorder(gym.Wrapper):
+    """
+    Logs every step of the wrapped env. The mask is taken from the env's
+    `action_masks()` (MaskablePPO envs) or from the observation's
+    "action_mask" entry (GNN env), as seen *before* the action.
+    """
+
+    def __init__(self, env, directory, chunk_size=DEFAULT_CHUNK_SIZE):
+        super().__init__(env)
+        self.logger = TransitionLogger(directory, chunk_size)
+        self._last_obs = None
+
+    def _mask(self, observation):
+        if isinstance(observation, dict) and "action_mask" in observation:
+            return observation["action_mask"] > 0
+        return self.env.unwrapped.action_masks()
+
+    def reset(self, **kwargs):
+        observation, info = self.env.reset(**kwargs)
+        self._last_obs = _snapshot(observation)
+        return observation, info
+
+    def step(self, action):
+        mask = self._mask(self._last_obs)
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.logger.record(self._last_obs, mask, action, reward, observation, terminated or truncated)
+        # The env's next step may overwrite the arrays it returned
+        self._last_obs = _snapshot(observation)
+        return observation, reward, terminated, truncated, info
+
+    def action_masks(self):
+        return self.env.unwrapped.action_masks()
+
+    def close(self):
+        self.logger.close()
+        super().close()
@@ -0,0 +1,220 @@
+"""
+Synthetic workload models for large keyspaces (10k - 1M keys).
+
+A WorkloadModel is built from a JSON config and turns time (seconds) into a
+request distribution with the same interface as the profiles in
+sampling.py (`at(t)`, `sample(rng, size)`, `joint()`). It combines:
+
+  popularity  Zipf over keys, ranks shuffled over key ids by the seed;
+  diurnal     follow-the-sun region mix, region r peaking at r/R of the period;
+  drift       every `interval` s a `fraction` of keys swap popularity ranks;
+  hot_sets    `count` blocks of `size` consecutive key ids (related keys, e.g.
+              one tenant's data) carry `share` of the traffic, mostly from
+              a home region, and are replaced every `lifetime` s.
+
+Example config (every section but num_keys is optional):
+
+    {
+      "num_keys": 100000,
+      "regions": ["us-east", "eu-west", "ap-south", "sa-east", "jp-east"],
+      "read_ratio": 0.9,
+      "seed": 0,
+      "popularity": {"zipf_exponent": 1.1},
+      "diurnal": {"period": 86400, "amplitude": 0.8},
+      "drift": {"interval": 600, "fraction": 0.01},
+      "hot_sets": {"count": 2, "size": 50, "share": 0.3, "lifetime": 900, "region_focus": 0.8}
+    }
+
+The key alias table is built once over popularity ranks; drift only permutes
+the rank -> key mapping, so a model over 1M keys never rebuilds it.
+Everything depends only on (seed, t), so the live generator and the
+simulated backends see the same traffic for the same config.
+"""
+import json
+
+import numpy as np
+
+from sampling import AliasTable, Profile, zipf_weights
+
+DEFAULT_REGIONS = ["us-east", "eu-west", "ap-south", "sa-east", "jp-east"]
+
+# Salts for the per-epoch generators, so drift and hot sets use independent streams
+_DRIFT, _HOT_SETS = 1, 2
+
+
+class MappedProfile:
+    """A Profile over local indices 0..len(mapping)-1 whose samples are key ids mapping[i]."""
+
+    def __init__(self, profile, mapping, num_keys):
+        self.profile = profile
+        self.mapping = mapping
+        self.num_keys = num_keys
+
+    def sample(self, rng, size):
+        keys, regions, is_read = self.profile.sample(rng, size)
+        return self.mapping[keys], regions, is_read
+
+    def joint(self):
+        joint = np.zeros((len(self.profile.region_probs), self.num_keys))
+        np.add.at(joint.T, self.mapping, self.profile.key_probs[:, None] * self.profile.region_probs[None, :])
+        return joint
+
+
+class MixtureProfile:
+    """Each request comes from component i with probability weights[i]."""
+
+    def __init__(self, weights, components):
+        self.weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+        self.components = components
+        self._choice = AliasTable(self.weights)
+
+    def at(self, t):
+        return self
+
+    def sample(self, rng, size):
+        choice = self._choice.sample(rng, size)
+        keys = np.empty(size, dtype=np.int64)
+        regions = np.empty(size, dtype=np.int64)
+        is_read = np.empty(size, dtype=bool)
+        for i, component in enumerate(self.components):
+            idx = np.flatnonzero(choice == i)
+            if len(idx):
+                keys[idx], regions[idx], is_read[idx] = component.sample(rng, len(idx))
+        return keys, regions, is_read
+
+    def joint(self):
+        return sum(w * c.joint() for w, c in zip(self.weights, self.components))
+
+
+class WorkloadModel:
+
+    def __init__(self, num_keys, regions=None, read_ratio=0.9, seed=0, popularity=None,
+                 diurnal=None, drift=None, hot_sets=None, resolution=None):
+        self.num_keys = num_keys
+        self.regions = list(regions or DEFAULT_REGIONS)
+        self.read_ratio = read_ratio
+        self.seed = seed
+        self.diurnal = diurnal
+        self.drift = drift
+        self.hot_sets = hot_sets
+        # Finest time step any component needs; the distribution is rebuilt at most once per step
+        steps = [s for s in (diurnal and diurnal.get("period", 86400.0) / 96,
+                             drift and drift["interval"], hot_sets and hot_sets.get("lifetime")) if s]
+        self.resolution = resolution or (min(steps) if steps else float("inf"))
+
+        popularity = popularity or {}
+        # Over popularity ranks; regions are swapped in per time step
+        self._ranks = Profile(zipf_weights(num_keys, popularity.get("zipf_exponent", 1.0)),
+                              np.ones(len(self.regions)), read_ratio)
+        self._initial_mapping = np.random.default_rng(seed).permutation(num_keys)
+        self._mapping = self._initial_mapping.copy()
+        self._drift_epoch = 0
+        self._bucket = None
+        self._profile = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**config)
+
+    @property
+    def num_regions(self):
+        return len(self.regions)
+
+    def key_name(self, k):
+        return f"user_profile_{k}"
+
+    def key_names(self):
+        return [self.key_name(k) for k in range(self.num_keys)]
+
+    def _rank_to_key(self, t):
+        """Popularity rank -> key id after the drift epochs up to t."""
+        if not self.drift:
+            return self._mapping
+        epoch = int(t // self.drift["interval"])
+        if epoch < self._drift_epoch:  # time went backwards: replay from the start
+            self._mapping, self._drift_epoch = self._initial_mapping.copy(), 0
+        if epoch > self._drift_epoch:
+            mapping = self._mapping.copy()  # profiles already handed out keep theirs
+            swaps = max(1, int(self.drift.get("fraction", 0.01) * self.num_keys) // 2)
+            for e in range(self._drift_epoch + 1, epoch + 1):
+                rng = np.random.default_rng([self.seed, _DRIFT, e])
+                a, b = rng.choice(self.num_keys, size=2 * swaps, replace=False).reshape(2, swaps)
+                mapping[a], mapping[b] = mapping[b], mapping[a]
+            self._mapping, self._drift_epoch = mapping, epoch
+        return self._mapping
+
+    def _region_probs(self, t):
+        probs = np.ones(self.num_regions)
+        if self.diurnal:
+            phase = 2 * np.pi * (t / self.diurnal.get("period", 86400.0) - np.arange(self.num_regions) / self.num_regions)
+            probs = probs * (1 + self.diurnal.get("amplitude", 0.8) * np.cos(phase))
+        return probs / probs.sum()
+
+    def _hot_set_components(self, t):
+        config = self.hot_sets
+        epoch = int(t // config["lifetime"]) if config.get("lifetime") else 0
+        rng = np.random.default_rng([self.seed, _HOT_SETS, epoch])
+        size = min(config.get("size", 50), self.num_keys)
+        focus = config.get("region_focus", 0.8)
+        components = []
+        for _ in range(config.get("count", 1)):
+            start = int(rng.integers(0, self.num_keys))
+            keys = (start + np.arange(size)) % self.num_keys
+            home = int(rng.integers(0, self.num_regions))
+            region_probs = np.full(self.num_regions, (1 - focus) / max(1, self.num_regions - 1))
+            region_probs[home] = focus if self.num_regions > 1 else 1.0
+            components.append(MappedProfile(Profile(np.ones(size), region_probs, self.read_ratio), keys, self.num_keys))
+        return components
+
+    def _build(self, t):
+        ranks = self._ranks.with_distributions(region_probs=self._region_probs(t))
+        base = MappedProfile(ranks, self._rank_to_key(t), self.num_keys)
+        if not self.hot_sets:
+            return MixtureProfile([1.0], [base])
+        hot = self._hot_set_components(t)
+        share = self.hot_sets.get("share", 0.3)
+        return MixtureProfile([1 - share] + [share / len(hot)] * len(hot), [base] + hot)
+
+    def at(self, t):
+        if not np.isfinite(self.resolution):  # stationary workload
+            bucket = start = 0
+        else:
+            bucket = int(t // self.resolution)
+            start = bucket * self.resolution
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._profile = self._build(start)
+        return self._profile
+
+
+def load_workload(spec):
+    """A WorkloadModel from a model, a config dict or the path of a JSON config."""
+    if spec is None or isinstance(spec, WorkloadModel):
+        return spec
+    if isinstance(spec, str):
+        with open(spec) as f:
+            spec = json.load(f)
+    return WorkloadModel.from_config(spec)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Summarize the traffic a workload config produces")
+    parser.add_argument("config", type=str)
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--samples", type=int, default=100_000, help="Requests drawn per hour")
+    args = parser.parse_args()
+
+    model = load_workload(args.config)
+    rng = np.random.default_rng(model.seed)
+    print(f"{model.num_keys} keys, regions {model.regions}")
+    for hour in range(int(args.hours)):
+        start = time.perf_counter()
+        keys, regions, is_read = model.at(hour * 3600.0).sample(rng, args.samples)
+        elapsed = time.perf_counter() - start
+        top_share = np.sort(np.bincount(keys, minlength=model.num_keys))[-10:].sum() / args.samples
+        region_mix = np.bincount(regions, minlength=model.num_regions) / args.samples
+        print(f"h{hour:02d} top-10 keys {top_share:.1%}  regions {np.round(region_mix, 2)}  "
+              f"reads {is_read.mean():.1%}  ({args.samples / max(elapsed, 1e-9) / 1e6:.1f}M req/s)")
@@ -0,0 +1,24 @@
+package com.chethan.projects.replication.config;
+
+import com.chethan.projects.replication.store.HeapKeyValueStore;
+import com.chethan.projects.replication.store.KeyValueStore;
+import com.chethan.projects.replication.store.MappedLogKeyValueStore;
+import org.springframework.context.annotation.Bean;
+import org.springframework.context.annotation.Configuration;
+
+import java.io.IOException;
+import java.nio.file.Path;
+
+@Configuration
+public class AppConfig {
+
+    @Bean
+    public KeyValueStore keyValueStore(StorageConfig config) throws IOException {
+        return switch (config.getEngine()) {
+            case "heap" -> new HeapKeyValueStore();
+            case "mmap" -> new MappedLogKeyValueStore(Path.of(config.getDir()), config.getSegmentBytes(),
+                    config.getCompactionIntervalSecs(), config.getCompactionGarbageRatio());
+            default -> throw new IllegalArgumentException("Unknown node.storage.engine: " + config.getEngine());
+        };
+    }
+}
@@ -6,9 +6,49 @@ public final class CostConstants {
     public static final long LOCAL_READ_LATENCY_MS = 10;
     public static final long REMOTE_READ_LATENCY_MS = 150;
 
-    // Cost in a hypothetical currency unit (e.g., dollars)
+    // Cost in a hypothetical currency unit (e.g., dollars) per billing unit stored.
+    // Default for node.storage.price; every node can charge its own.
     public static final double COST_PER_KEY_STORED = 1.5;
 
+    // Storage is billed per KiB, and every key for at least one KiB (like the
+    // minimum billable object size of cloud object stores). Small keys therefore
+    // cost exactly COST_PER_KEY_STORED each; larger ones pay for their bytes.
+    public static final long BILLING_UNIT_BYTES = 1024;
+    public static final long MIN_BILLABLE_BYTES = 1024;
+
     private CostConstants() {
     }
-}
\ No newline at end of file
+
+    /**
+     * Bytes a key occupies in the store: UTF-8 key plus UTF-8 value, exactly
+     * what the mapped log store writes for them.
+     */
+    public static long entryBytes(String key, String value) {
+        return utf8Length(key) + (value == null ? 0 : utf8Length(value));
+    }
+
+    public static long billableBytes(long entryBytes) {
+        return Math.max(entryBytes, MIN_BILLABLE_BYTES);
+    }
+
+    private static long utf8Length(String s) {
+        long bytes = 0;
+        for (int i = 0; i < s.length(); i++) {
+            char c = s.charAt(i);
+            if (c < 0x80) {
+                bytes += 1;
+            } else if (c < 0x800) {
+                bytes += 2;
+            } else if (Character.isHighSurrogate(c) && i + 1 < s.length() && Character.isLowSurrogate(s.charAt(i + 1))) {
+                bytes += 4;
+                i++;
+            } else if (Character.isSurrogate(c)) {
+                // Unpaired surrogate: String.getBytes(UTF_8) writes it as '?'
+                bytes += 1;
+            } else {
+                bytes += 3;
+            }
+        }
+        return bytes;
+    }
+}
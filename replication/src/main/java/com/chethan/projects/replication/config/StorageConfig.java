@@ -0,0 +1,37 @@
+package com.chethan.projects.replication.config;
+
+import lombok.Data;
+import org.springframework.boot.context.properties.ConfigurationProperties;
+import org.springframework.stereotype.Component;
+
+@Component
+@ConfigurationProperties(prefix = "node.storage")
+@Data
+public class StorageConfig {
+
+    /**
+     * "heap" keeps replicas in a heap map that a restart loses.
+     * "mmap" keeps them in a memory-mapped append-only log under {@code dir}.
+     */
+    private String engine = "heap";
+
+    /**
+     * Directory of the mmap engine's log segments and index checkpoint.
+     */
+    private String dir = "node-data";
+
+    /**
+     * Size of one log segment (values larger than this get a segment of their own).
+     */
+    private long segmentBytes = 64L << 20;
+
+    /**
+     * How often sealed segments are checked for compaction. 0 disables background compaction.
+     */
+    private long compactionIntervalSecs = 30;
+
+    /**
+     * Fraction of a segment's bytes that must be overwritten or deleted before it is compacted.
+     */
+    private double compactionGarbageRatio = 0.5;
+}
@@ -7,9 +7,11 @@ import com.chethan.projects.replication.dto.SimpleReplicationRequest;
 import com.chethan.projects.replication.service.DataStoreService;
 import org.springframework.beans.factory.annotation.Autowired;
 import org.springframework.beans.factory.annotation.Value;
+import org.springframework.http.HttpStatus;
 import org.springframework.http.ResponseEntity;
 import org.springframework.web.bind.annotation.*;
 
+import java.util.List;
 import java.util.Map;
 import java.util.Optional;
 
@@ -47,23 +49,53 @@ public class ApiController {
      */
     @GetMapping("/management/metrics")
     public ResponseEntity<NodeMetric> getMetrics() {
+        return ResponseEntity.ok(buildNodeMetric(dataStoreService.getAllKeyMetrics()));
+    }
+
+    /**
+     * MANAGEMENT API: Metrics for the k most accessed keys only (O(k) payload).
+     * 400 if k exceeds node.metrics.top-k-capacity.
+     */
+    @GetMapping("/management/heavy-hitters")
+    public ResponseEntity<NodeMetric> getHeavyHitters(@RequestParam(defaultValue = "20") int k) {
+        return ResponseEntity.ok(buildNodeMetric(dataStoreService.getHeavyHitters(k)));
+    }
+
+    /**
+     * MANAGEMENT API: Metrics for an explicit set of keys.
+     * Used by the Controller to fetch a cluster-wide top-K from every node.
+     */
+    @PostMapping("/management/metrics/keys")
+    public ResponseEntity<NodeMetric> getKeyMetrics(@RequestBody List<String> keys) {
+        return ResponseEntity.ok(buildNodeMetric(dataStoreService.getKeyMetrics(keys)));
+    }
+
+    @ExceptionHandler(IllegalArgumentException.class)
+    public ResponseEntity<String> badRequest(IllegalArgumentException e) {
+        return ResponseEntity.badRequest().body(e.getMessage());
+    }
+
+    private NodeMetric buildNodeMetric(Map<String, KeyMetric> keyMetrics) {
         NodeMetric metrics = new NodeMetric();
         metrics.setNodeId(nodeId);
-        Map<String, KeyMetric> keyMetrics = dataStoreService.getAllKeyMetrics();
         metrics.setKeyMetrics(keyMetrics);
-
         metrics.setStorageCost(dataStoreService.getStorageCost());
-
-        return ResponseEntity.ok(metrics);
+        metrics.setStoragePrice(dataStoreService.getStoragePrice());
+        metrics.setCapacityBytes(dataStoreService.getCapacityBytes());
+        metrics.setStoredBytes(dataStoreService.getStoredBytes());
+        return metrics;
     }
 
     /**
      * MANAGEMENT API: A simple way to add data for testing.
      * Later, this will be expanded to fetch from a source node.
+     * Answers 507 Insufficient Storage when the value doesn't fit the node's capacity.
      */
     @PostMapping("/management/replicate")
     public ResponseEntity<Void> replicateData(@RequestBody SimpleReplicationRequest request) {
-        dataStoreService.put(request.getKey(), request.getValue());
+        if (!dataStoreService.put(request.getKey(), request.getValue())) {
+            return ResponseEntity.status(HttpStatus.INSUFFICIENT_STORAGE).build();
+        }
         return ResponseEntity.ok().build();
     }
 
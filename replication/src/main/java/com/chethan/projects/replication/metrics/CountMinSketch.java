@@ -0,0 +1,54 @@
+package com.chethan.projects.replication.metrics;
+
+import java.util.concurrent.atomic.AtomicLongArray;
+
+/**
+ * Fixed-memory frequency estimator. Estimates never undercount; with
+ * width w and depth d the overcount is at most (e / w) * total with
+ * probability 1 - e^-d.
+ */
+public class CountMinSketch {
+
+    private final int depth;
+    private final int width;
+    private final AtomicLongArray table;
+
+    public CountMinSketch(int depth, int width) {
+        this.depth = depth;
+        this.width = width;
+        this.table = new AtomicLongArray(depth * width);
+    }
+
+    public void add(String key, long count) {
+        int h1 = mix(key.hashCode());
+        int h2 = mix(h1 ^ 0x9E3779B9) | 1;
+        for (int row = 0; row < depth; row++) {
+            table.addAndGet(cell(row, h1, h2), count);
+        }
+    }
+
+    public long estimate(String key) {
+        int h1 = mix(key.hashCode());
+        int h2 = mix(h1 ^ 0x9E3779B9) | 1;
+        long min = Long.MAX_VALUE;
+        for (int row = 0; row < depth; row++) {
+            min = Math.min(min, table.get(cell(row, h1, h2)));
+        }
+        return min;
+    }
+
+    // Kirsch-Mitzenmacher: row hash = h1 + row * h2
+    private int cell(int row, int h1, int h2) {
+        return row * width + Math.floorMod(h1 + row * h2, width);
+    }
+
+    // Murmur3 finalizer, spreads String.hashCode() bits across the word
+    private static int mix(int h) {
+        h ^= h >>> 16;
+        h *= 0x85EBCA6B;
+        h ^= h >>> 13;
+        h *= 0xC2B2AE35;
+        h ^= h >>> 16;
+        return h;
+    }
+}
@@ -0,0 +1,78 @@
+package com.chethan.projects.replication.metrics;
+
+import java.util.List;
+
+/**
+ * Fixed-memory popularity tracking.
+ * A Space-Saving summary ranks every access, and a Count-Min sketch counts
+ * every read, hits and misses alike, so memory no longer grows with the
+ * number of distinct keys ever requested and a key's read demand doesn't
+ * depend on whether the node held it at the time.
+ */
+public class KeyPopularityTracker {
+
+    public static final int SKETCH_DEPTH = 4;
+    // Every read is counted, so the width bounds the overcount relative to all reads
+    public static final int SKETCH_WIDTH = 8192;
+    // Covers the factorized agents' default of window_keys * num_shards up to 200 shards of 20
+    public static final int DEFAULT_TOP_K_CAPACITY = 4096;
+
+    private final CountMinSketch reads = new CountMinSketch(SKETCH_DEPTH, SKETCH_WIDTH);
+    private final SpaceSavingTopK heavyHitters;
+    private final int topKCapacity;
+
+    public KeyPopularityTracker() {
+        this(DEFAULT_TOP_K_CAPACITY);
+    }
+
+    public KeyPopularityTracker(int topKCapacity) {
+        if (topKCapacity <= 0) {
+            throw new IllegalArgumentException("topKCapacity must be positive, got " + topKCapacity);
+        }
+        this.topKCapacity = topKCapacity;
+        this.heavyHitters = new SpaceSavingTopK(topKCapacity);
+    }
+
+    /**
+     * Ranks a write; writes aren't read demand, so the sketch doesn't see them.
+     */
+    public void recordAccess(String key) {
+        heavyHitters.offer(key);
+    }
+
+    /**
+     * Counts and ranks a read, whether or not this node stores the key.
+     */
+    public void recordRead(String key) {
+        reads.add(key, 1);
+        heavyHitters.offer(key);
+    }
+
+    /**
+     * Reads of `key` at this node so far, hits and misses. Never undercounts.
+     */
+    public long estimateReads(String key) {
+        return reads.estimate(key);
+    }
+
+    public boolean isTracked(String key) {
+        return heavyHitters.isMonitored(key);
+    }
+
+    public int getTopKCapacity() {
+        return topKCapacity;
+    }
+
+    /**
+     * The k most accessed keys, hottest first.
+     * @throws IllegalArgumentException if k exceeds the number of keys tracked,
+     * rather than silently returning fewer.
+     */
+    public List<String> topKeys(int k) {
+        if (k < 0 || k > topKCapacity) {
+            throw new IllegalArgumentException("k must be between 0 and the top-K capacity "
+                    + topKCapacity + " (node.metrics.top-k-capacity), got " + k);
+        }
+        return heavyHitters.top(k);
+    }
+}
@@ -0,0 +1,202 @@
+package com.chethan.projects.replication.metrics;
+
+import java.util.ArrayList;
+import java.util.Comparator;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+/**
+ * Space-Saving heavy hitters over a fixed number of counters.
+ * Keys are hashed onto independent stripes, each with its own share of the
+ * counters and its own lock, so concurrent reads of different keys rarely
+ * contend. Within a stripe, any key with frequency above the stripe's traffic
+ * divided by its counters is guaranteed to be monitored; with even hashing
+ * that is about total / capacity, as for a single summary.
+ *
+ * Each stripe is a stream-summary (Metwally et al.): counters with the same
+ * count share a bucket, and buckets form a list ordered by count. An
+ * increment moves a counter to the next bucket and the minimum is the first
+ * bucket, so {@link #offer} is O(1).
+ */
+public class SpaceSavingTopK {
+
+    public static final int DEFAULT_STRIPES = 16;
+    // Stripes with fewer counters than this would evict too eagerly
+    static final int MIN_COUNTERS_PER_STRIPE = 64;
+
+    private final Stripe[] stripes;
+
+    public SpaceSavingTopK(int capacity) {
+        this(capacity, DEFAULT_STRIPES);
+    }
+
+    public SpaceSavingTopK(int capacity, int stripes) {
+        if (capacity <= 0 || stripes <= 0) {
+            throw new IllegalArgumentException("capacity and stripes must be positive");
+        }
+        int count = Math.max(1, Math.min(stripes, capacity / MIN_COUNTERS_PER_STRIPE));
+        this.stripes = new Stripe[count];
+        for (int i = 0; i < count; i++) {
+            // The first capacity % count stripes get one extra counter, so they add up to capacity
+            this.stripes[i] = new Stripe(capacity / count + (i < capacity % count ? 1 : 0));
+        }
+    }
+
+    private Stripe stripe(String key) {
+        int h = key.hashCode();
+        return stripes[Math.floorMod(h ^ (h >>> 16), stripes.length)];
+    }
+
+    public void offer(String key) {
+        stripe(key).offer(key);
+    }
+
+    public boolean isMonitored(String key) {
+        return stripe(key).count(key) > 0;
+    }
+
+    /**
+     * Estimated count of the key (never below the true count while it is
+     * monitored), 0 if it is not monitored.
+     */
+    public long count(String key) {
+        return stripe(key).count(key);
+    }
+
+    /**
+     * The k most frequent keys, highest first.
+     */
+    public List<String> top(int k) {
+        List<Map.Entry<String, Long>> entries = new ArrayList<>();
+        for (Stripe stripe : stripes) {
+            stripe.collect(entries);
+        }
+        entries.sort(Map.Entry.<String, Long>comparingByValue(Comparator.reverseOrder())
+                .thenComparing(Map.Entry.comparingByKey()));
+        return entries.stream().limit(k).map(Map.Entry::getKey).toList();
+    }
+
+    private static final class Counter {
+        String key;
+        Bucket bucket;
+        Counter prev;
+        Counter next;
+
+        Counter(String key) {
+            this.key = key;
+        }
+    }
+
+    private static final class Bucket {
+        final long count;
+        Counter head;
+        Bucket prev;
+        Bucket next;
+
+        Bucket(long count) {
+            this.count = count;
+        }
+    }
+
+    private static final class Stripe {
+
+        private final int capacity;
+        private final Map<String, Counter> counters;
+        // Lowest count first
+        private Bucket min;
+
+        Stripe(int capacity) {
+            this.capacity = capacity;
+            this.counters = new HashMap<>(capacity * 2);
+        }
+
+        synchronized void offer(String key) {
+            Counter counter = counters.get(key);
+            if (counter == null) {
+                if (counters.size() < capacity) {
+                    counter = new Counter(key);
+                    counters.put(key, counter);
+                    if (min == null || min.count != 1) {
+                        Bucket ones = new Bucket(1);
+                        ones.next = min;
+                        if (min != null) {
+                            min.prev = ones;
+                        }
+                        min = ones;
+                    }
+                    push(min, counter);
+                    return;
+                }
+                // Take over a counter with the minimum count; the newcomer inherits it
+                counter = min.head;
+                counters.remove(counter.key);
+                counter.key = key;
+                counters.put(key, counter);
+            }
+            increment(counter);
+        }
+
+        synchronized long count(String key) {
+            Counter counter = counters.get(key);
+            return counter == null ? 0L : counter.bucket.count;
+        }
+
+        synchronized void collect(List<Map.Entry<String, Long>> out) {
+            for (Bucket bucket = min; bucket != null; bucket = bucket.next) {
+                for (Counter counter = bucket.head; counter != null; counter = counter.next) {
+                    out.add(Map.entry(counter.key, bucket.count));
+                }
+            }
+        }
+
+        private void increment(Counter counter) {
+            Bucket from = counter.bucket;
+            Bucket to = from.next;
+            if (to == null || to.count != from.count + 1) {
+                to = new Bucket(from.count + 1);
+                to.prev = from;
+                to.next = from.next;
+                if (from.next != null) {
+                    from.next.prev = to;
+                }
+                from.next = to;
+            }
+            unlink(counter);
+            push(to, counter);
+        }
+
+        private static void push(Bucket bucket, Counter counter) {
+            counter.bucket = bucket;
+            counter.prev = null;
+            counter.next = bucket.head;
+            if (bucket.head != null) {
+                bucket.head.prev = counter;
+            }
+            bucket.head = counter;
+        }
+
+        // Removes the counter from its bucket, and the bucket from the list once it is empty
+        private void unlink(Counter counter) {
+            Bucket bucket = counter.bucket;
+            if (counter.prev != null) {
+                counter.prev.next = counter.next;
+            } else {
+                bucket.head = counter.next;
+            }
+            if (counter.next != null) {
+                counter.next.prev = counter.prev;
+            }
+            if (bucket.head == null) {
+                if (bucket.prev != null) {
+                    bucket.prev.next = bucket.next;
+                } else {
+                    min = bucket.next;
+                }
+                if (bucket.next != null) {
+                    bucket.next.prev = bucket.prev;
+                }
+            }
+        }
+    }
+}
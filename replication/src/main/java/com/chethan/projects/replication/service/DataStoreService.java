@@ -3,67 +3,235 @@ package com.chethan.projects.replication.service;
 import com.chethan.projects.replication.config.CostConstants;
 import com.chethan.projects.replication.dto.KeyMetric;
 import com.chethan.projects.replication.dto.ReadResponse;
+import com.chethan.projects.replication.metrics.KeyPopularityTracker;
+import com.chethan.projects.replication.store.HeapKeyValueStore;
+import com.chethan.projects.replication.store.KeyValueStore;
+import org.springframework.beans.factory.annotation.Autowired;
+import org.springframework.beans.factory.annotation.Value;
 import org.springframework.stereotype.Service;
 
+import java.util.Collection;
 import java.util.HashSet;
+import java.util.LinkedHashMap;
 import java.util.Map;
 import java.util.Optional;
 import java.util.Set;
 import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.atomic.AtomicLong;
 import java.util.concurrent.atomic.LongAdder;
 import java.util.stream.Collectors;
 
 @Service
 public class DataStoreService {
 
-    private final ConcurrentHashMap<String, String> store = new ConcurrentHashMap<>();
+    private final KeyValueStore store;
+    // The sketch counts every read. Stored keys also get an exact counter on their first
+    // local hit, seeded from the sketch, so demand carries over across replicate and evict
     private final ConcurrentHashMap<String, LongAdder> readCounts = new ConcurrentHashMap<>();
     private final ConcurrentHashMap<String, LongAdder> writeCounts = new ConcurrentHashMap<>();
+    private final KeyPopularityTracker popularity;
 
+    private final double storagePrice;
+    private final long capacityBytes;
+    // Entry bytes and billed bytes of everything in `store`, updated with every change to it
+    private final AtomicLong storedBytes = new AtomicLong();
+    private final AtomicLong billedBytes = new AtomicLong();
 
-    public void put(String key, String value) {
-        store.put(key, value);
+    public DataStoreService() {
+        this(CostConstants.COST_PER_KEY_STORED, 0);
+    }
+
+    public DataStoreService(double storagePrice, long capacityBytes) {
+        this(storagePrice, capacityBytes, new HeapKeyValueStore());
+    }
+
+    public DataStoreService(double storagePrice, long capacityBytes, KeyValueStore store) {
+        this(storagePrice, capacityBytes, store, KeyPopularityTracker.DEFAULT_TOP_K_CAPACITY);
+    }
+
+    /**
+     * A persistent store comes back with its keys, so their bytes are counted
+     * again here. Read and write counts start from zero.
+     * @param topKCapacity keys the heavy-hitter summary tracks, the largest k
+     *                     {@link #getHeavyHitters} accepts.
+     */
+    @Autowired
+    public DataStoreService(@Value("${node.storage.price:1.5}") double storagePrice,
+                            @Value("${node.storage.capacity-bytes:0}") long capacityBytes,
+                            KeyValueStore store,
+                            @Value("${node.metrics.top-k-capacity:4096}") int topKCapacity) {
+        this.storagePrice = storagePrice;
+        this.capacityBytes = capacityBytes;
+        this.store = store;
+        this.popularity = new KeyPopularityTracker(topKCapacity);
+        for (String key : store.keys()) {
+            long bytes = store.sizeBytes(key);
+            storedBytes.addAndGet(bytes);
+            billedBytes.addAndGet(CostConstants.billableBytes(bytes));
+        }
+    }
+
+    /**
+     * Stores the value unless it would take the node over its capacity.
+     * Overwrites that don't grow the entry always succeed.
+     * @return false if the write was rejected for lack of space.
+     */
+    public boolean put(String key, String value) {
+        boolean[] accepted = {true};
+        store.compute(key, (k, old) -> {
+            long oldBytes = old == null ? 0 : CostConstants.entryBytes(k, old);
+            long newBytes = CostConstants.entryBytes(k, value);
+            if (!reserve(newBytes - oldBytes)) {
+                accepted[0] = false;
+                return old;
+            }
+            long oldBilled = old == null ? 0 : CostConstants.billableBytes(oldBytes);
+            billedBytes.addAndGet(CostConstants.billableBytes(newBytes) - oldBilled);
+            return value;
+        });
+        if (!accepted[0]) {
+            return false;
+        }
         writeCounts.computeIfAbsent(key, k -> new LongAdder()).increment();
+        popularity.recordAccess(key);
+        return true;
+    }
+
+    /**
+     * Adds `delta` to the stored bytes, unless that would exceed the capacity.
+     * Lock-free, so concurrent puts of different keys can't overshoot together.
+     */
+    private boolean reserve(long delta) {
+        if (delta <= 0 || capacityBytes <= 0) {
+            storedBytes.addAndGet(delta);
+            return true;
+        }
+        while (true) {
+            long current = storedBytes.get();
+            if (current + delta > capacityBytes) {
+                return false;
+            }
+            if (storedBytes.compareAndSet(current, current + delta)) {
+                return true;
+            }
+        }
     }
 
     public Optional<String> get(String key) {
-        if (store.containsKey(key)) {
-            readCounts.computeIfAbsent(key, k -> new LongAdder()).increment();
+        if (store.contains(key)) {
+            recordHit(key);
             return Optional.ofNullable(store.get(key));
         }
         return Optional.empty(); // Data not found
     }
 
+    /**
+     * Counts a local hit. The exact counter starts from the sketch's count of
+     * the reads before it, misses from before the key was stored included.
+     */
+    private void recordHit(String key) {
+        readCounts.computeIfAbsent(key, k -> {
+            LongAdder counter = new LongAdder();
+            counter.add(popularity.estimateReads(k));
+            return counter;
+        }).increment();
+        popularity.recordRead(key);
+    }
+
     public void evict(String key) {
-        store.remove(key);
+        store.compute(key, (k, old) -> {
+            if (old != null) {
+                long bytes = CostConstants.entryBytes(k, old);
+                storedBytes.addAndGet(-bytes);
+                billedBytes.addAndGet(-CostConstants.billableBytes(bytes));
+            }
+            return null;
+        });
+        // Read demand lives on in the sketch, which has counted every hit too
         readCounts.remove(key);
         writeCounts.remove(key);
     }
 
     public boolean contains(String key) {
-        return store.containsKey(key);
+        return store.contains(key);
     }
 
+    /**
+     * Read demand for the key at this node, hits and misses, whether or not it is
+     * stored now: the exact counter once a stored key has been hit, otherwise the
+     * sketch estimate. Both cover the key's whole history, so replicating or
+     * evicting it doesn't reset or rewind the count.
+     */
     public long getReadCount(String key) {
-        return Optional.ofNullable(readCounts.get(key)).map(LongAdder::sum).orElse(0L);
+        LongAdder exact = readCounts.get(key);
+        if (exact != null) {
+            return exact.sum();
+        }
+        return popularity.estimateReads(key);
+    }
+
+    /**
+     * UTF-8 key + value bytes of the stored entry, 0 if the key isn't stored here.
+     */
+    public long getSizeBytes(String key) {
+        return store.sizeBytes(key);
     }
 
     public long getWriteCount(String key) {
         return Optional.ofNullable(writeCounts.get(key)).map(LongAdder::sum).orElse(0L);
     }
 
+    /**
+     * Metrics for every stored key plus the missed keys among the heavy hitters.
+     * Bounded by the store size plus the tracker capacity.
+     */
     public Map<String, KeyMetric> getAllKeyMetrics() {
-        Set<String> allKeys = new HashSet<>(store.keySet());
+        Set<String> allKeys = new HashSet<>(store.keys());
         allKeys.addAll(readCounts.keySet());
         allKeys.addAll(writeCounts.keySet());
+        allKeys.addAll(popularity.topKeys(popularity.getTopKCapacity()));
 
         return allKeys.stream()
                 .collect(Collectors.toMap(
                         key -> key,
-                        key -> new KeyMetric(getReadCount(key), getWriteCount(key))
+                        this::keyMetric
                 ));
     }
 
+    /**
+     * Metrics for the k most accessed keys on this node (hits and misses), hottest first.
+     * @throws IllegalArgumentException if k exceeds the configured top-K capacity.
+     */
+    public Map<String, KeyMetric> getHeavyHitters(int k) {
+        Map<String, KeyMetric> result = new LinkedHashMap<>();
+        for (String key : popularity.topKeys(k)) {
+            result.put(key, keyMetric(key));
+        }
+        return result;
+    }
+
+    /**
+     * Metrics for the requested keys that this node stores or has seen requested.
+     */
+    public Map<String, KeyMetric> getKeyMetrics(Collection<String> keys) {
+        Map<String, KeyMetric> result = new LinkedHashMap<>();
+        for (String key : keys) {
+            if (store.contains(key) || popularity.isTracked(key)) {
+                result.put(key, keyMetric(key));
+            }
+        }
+        return result;
+    }
+
+    /**
+     * Read demand at this node (hits and misses) and whether the node holds a replica.
+     * A key can appear here without being stored, so consumers must use `stored`
+     * for placement, never the mere presence of an entry.
+     */
+    private KeyMetric keyMetric(String key) {
+        return new KeyMetric(getReadCount(key), getWriteCount(key), store.contains(key), getSizeBytes(key));
+    }
+
     /**
      * Performs a read operation, simulating latency and tracking metrics.
      * This method will be called by our public-facing API.
@@ -72,16 +240,17 @@ public class DataStoreService {
      */
     public ReadResponse handleGet(String key) {
         try {
-            if (store.containsKey(key)) {
+            if (store.contains(key)) {
                 // --- LOCAL HIT ---
                 Thread.sleep(CostConstants.LOCAL_READ_LATENCY_MS); // Simulate latency
-                readCounts.computeIfAbsent(key, k -> new LongAdder()).increment();
+                recordHit(key);
                 return new ReadResponse(key, store.get(key), CostConstants.LOCAL_READ_LATENCY_MS);
             } else {
                 // --- MISS (requires a remote fetch) ---
                 Thread.sleep(CostConstants.REMOTE_READ_LATENCY_MS); // Simulate high latency
-                // We still increment the read count for the key, as a read was attempted.
-                readCounts.computeIfAbsent(key, k -> new LongAdder()).increment();
+                // We still count the read, as a read was attempted. Misses go to the
+                // sketch only, so unstored keys don't grow the exact counter maps.
+                popularity.recordRead(key);
                 return new ReadResponse(key, null, CostConstants.REMOTE_READ_LATENCY_MS);
             }
         }
@@ -93,10 +262,26 @@ public class DataStoreService {
     }
 
     /**
-     * Calculates the total storage cost for the node.
+     * Calculates the total storage cost for the node: this node's price per
+     * billed KiB, with every key billed for at least MIN_BILLABLE_BYTES.
      * @return The calculated storage cost.
      */
     public double getStorageCost() {
-        return store.size() * CostConstants.COST_PER_KEY_STORED;
+        return storagePrice * billedBytes.get() / CostConstants.BILLING_UNIT_BYTES;
+    }
+
+    public double getStoragePrice() {
+        return storagePrice;
+    }
+
+    /**
+     * Capacity in bytes, 0 when the node is unlimited.
+     */
+    public long getCapacityBytes() {
+        return capacityBytes;
+    }
+
+    public long getStoredBytes() {
+        return storedBytes.get();
     }
 }
\ No newline at end of file
@@ -0,0 +1,51 @@
+package com.chethan.projects.replication.store;
+
+import com.chethan.projects.replication.config.CostConstants;
+
+import java.util.Collections;
+import java.util.Set;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.function.BiFunction;
+
+/**
+ * The original engine: a ConcurrentHashMap on the heap. Nothing survives a restart.
+ */
+public class HeapKeyValueStore implements KeyValueStore {
+
+    private final ConcurrentHashMap<String, String> store = new ConcurrentHashMap<>();
+
+    @Override
+    public String get(String key) {
+        return store.get(key);
+    }
+
+    @Override
+    public boolean contains(String key) {
+        return store.containsKey(key);
+    }
+
+    @Override
+    public String compute(String key, BiFunction<String, String, String> remapping) {
+        return store.compute(key, remapping);
+    }
+
+    @Override
+    public long sizeBytes(String key) {
+        String value = store.get(key);
+        return value == null ? 0L : CostConstants.entryBytes(key, value);
+    }
+
+    @Override
+    public Set<String> keys() {
+        return Collections.unmodifiableSet(store.keySet());
+    }
+
+    @Override
+    public int size() {
+        return store.size();
+    }
+
+    @Override
+    public void close() {
+    }
+}
@@ -0,0 +1,50 @@
+package com.chethan.projects.replication.store;
+
+import java.io.Closeable;
+import java.util.Set;
+import java.util.function.BiFunction;
+
+/**
+ * Storage engine behind DataStoreService.
+ * Implementations are thread-safe, and {@link #compute} is atomic per key.
+ */
+public interface KeyValueStore extends Closeable {
+
+    /**
+     * The stored value, or null if the key isn't stored.
+     */
+    String get(String key);
+
+    boolean contains(String key);
+
+    /**
+     * Atomically replaces the value of {@code key} with {@code remapping(key, old)},
+     * where {@code old} is null for a missing key. A null result removes the key,
+     * and returning {@code old} itself leaves the store untouched.
+     * @return the new value.
+     */
+    String compute(String key, BiFunction<String, String, String> remapping);
+
+    default void put(String key, String value) {
+        compute(key, (k, old) -> value);
+    }
+
+    default void remove(String key) {
+        compute(key, (k, old) -> null);
+    }
+
+    /**
+     * UTF-8 key + value bytes of the stored entry, 0 if the key isn't stored.
+     */
+    long sizeBytes(String key);
+
+    /**
+     * Live view of the stored keys.
+     */
+    Set<String> keys();
+
+    int size();
+
+    @Override
+    void close();
+}
@@ -0,0 +1,669 @@
+package com.chethan.projects.replication.store;
+
+import lombok.extern.slf4j.Slf4j;
+
+import java.io.*;
+import java.lang.foreign.Arena;
+import java.lang.foreign.MemorySegment;
+import java.lang.foreign.ValueLayout;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.channels.Channels;
+import java.nio.channels.FileChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.*;
+import java.util.*;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.Executors;
+import java.util.concurrent.ScheduledExecutorService;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicLong;
+import java.util.concurrent.locks.Lock;
+import java.util.concurrent.locks.ReentrantReadWriteLock;
+import java.util.function.BiFunction;
+import java.util.zip.CRC32C;
+import java.util.zip.CheckedInputStream;
+import java.util.zip.CheckedOutputStream;
+
+/**
+ * Values in memory-mapped, append-only log segments, found through an
+ * in-memory hash index of key -> record location. Only keys and locations are
+ * on the heap; values stay in the page cache, so a big store adds little GC work.
+ *
+ * Record: crc32c | key length | value length (-1 for a delete) | key | value,
+ * the CRC covering everything after it. Appends and the index update that
+ * publishes them happen under one lock, and a checkpoint copies the index and
+ * takes the append position under it too, so the checkpoint holds exactly the
+ * records before that position. Reads only take a shared lock that keeps the
+ * segment mapped.
+ *
+ * A background task compacts sealed segments once their dead bytes reach
+ * {@code garbageRatio}: live records move to the end of the log, a checkpoint
+ * is written, and only then are the old segments unmapped and deleted. It also
+ * checkpoints after every segment's worth of appends. On startup the index is
+ * loaded from the checkpoint and only the log behind it is replayed (about one
+ * segment at most); without a usable checkpoint every segment is scanned. A
+ * torn record ends the scan and is overwritten by the next append.
+ *
+ * Appends go to the page cache, so they survive a process crash or restart;
+ * checkpoints and {@link #close()} force them to disk.
+ */
+@Slf4j
+public class MappedLogKeyValueStore implements KeyValueStore {
+
+    public static final long DEFAULT_SEGMENT_BYTES = 64L << 20;
+    public static final long MAX_SEGMENT_BYTES = 1L << 30;
+    public static final double DEFAULT_GARBAGE_RATIO = 0.5;
+
+    static final String CHECKPOINT_FILE = "index.checkpoint";
+    static final String SEGMENT_PREFIX = "segment-";
+    static final String SEGMENT_SUFFIX = ".log";
+    static final int HEADER_BYTES = 12;
+
+    private static final int DELETED = -1;
+    private static final int STRIPES = 64;
+    private static final int CHECKPOINT_MAGIC = 0x4b564332; // "KVC2"
+    private static final ValueLayout.OfInt INT = ValueLayout.JAVA_INT_UNALIGNED.withOrder(ByteOrder.BIG_ENDIAN);
+
+    /**
+     * A record in the log; {@code size} includes the header.
+     */
+    private record Location(int segment, int offset, int size) {
+    }
+
+    private record Position(int segment, int offset) {
+    }
+
+    private static final class Segment {
+        final int id;
+        final Path path;
+        final Arena arena;
+        final MemorySegment map;
+        // Bytes written so far, fixed once the segment is sealed
+        volatile int end;
+        // Bytes of overwritten records and deletes
+        final AtomicLong garbage = new AtomicLong();
+
+        Segment(int id, Path path, Arena arena, MemorySegment map) {
+            this.id = id;
+            this.path = path;
+            this.arena = arena;
+            this.map = map;
+        }
+    }
+
+    private final ConcurrentHashMap<String, Location> index = new ConcurrentHashMap<>();
+    private final ConcurrentHashMap<Integer, Segment> segments = new ConcurrentHashMap<>();
+    // Readers hold the read lock while they copy out of a segment, compaction the write lock to unmap one
+    private final ReentrantReadWriteLock mappingLock = new ReentrantReadWriteLock();
+    private final Object appendLock = new Object();
+    private final Object maintenanceLock = new Object();
+    // compute() is atomic per key: one of these locks per key hash
+    private final Object[] stripes = new Object[STRIPES];
+
+    private final Path dir;
+    private final long segmentBytes;
+    private final double garbageRatio;
+    private final ScheduledExecutorService maintenance;
+
+    // Guarded by appendLock
+    private Segment active;
+    private int writePosition;
+    private long appendedSinceCheckpoint;
+
+    // Guarded by maintenanceLock
+    private boolean closed;
+
+    public MappedLogKeyValueStore(Path dir) throws IOException {
+        this(dir, DEFAULT_SEGMENT_BYTES, 0, DEFAULT_GARBAGE_RATIO);
+    }
+
+    /**
+     * Opens the store in {@code dir}, recovering whatever is there.
+     * @param compactionIntervalSecs how often the background task runs; 0 only compacts on {@link #compact()}.
+     */
+    public MappedLogKeyValueStore(Path dir, long segmentBytes, long compactionIntervalSecs, double garbageRatio)
+            throws IOException {
+        if (segmentBytes <= HEADER_BYTES || segmentBytes > MAX_SEGMENT_BYTES) {
+            throw new IllegalArgumentException("segmentBytes must be in (" + HEADER_BYTES + ", " + MAX_SEGMENT_BYTES
+                    + "]: " + segmentBytes);
+        }
+        this.dir = dir;
+        this.segmentBytes = segmentBytes;
+        this.garbageRatio = garbageRatio;
+        for (int i = 0; i < STRIPES; i++) {
+            stripes[i] = new Object();
+        }
+        Files.createDirectories(dir);
+
+        long start = System.nanoTime();
+        boolean fromCheckpoint;
+        try {
+            fromCheckpoint = recover();
+        } catch (IOException | RuntimeException e) {
+            unmap(new ArrayList<>(segments.values()));
+            throw e;
+        }
+        log.info("Opened {}: {} keys in {} log segments, from {} in {} ms", dir, index.size(), segments.size(),
+                fromCheckpoint ? "the checkpoint and log tail" : "a full log scan", (System.nanoTime() - start) / 1_000_000);
+
+        if (compactionIntervalSecs > 0) {
+            maintenance = Executors.newSingleThreadScheduledExecutor(r -> {
+                Thread thread = new Thread(r, "kv-store-compaction");
+                thread.setDaemon(true);
+                return thread;
+            });
+            maintenance.scheduleWithFixedDelay(this::runMaintenance, compactionIntervalSecs, compactionIntervalSecs,
+                    TimeUnit.SECONDS);
+        } else {
+            maintenance = null;
+        }
+    }
+
+    // --- Reads ---
+
+    @Override
+    public String get(String key) {
+        while (true) {
+            Location location = index.get(key);
+            if (location == null) {
+                return null;
+            }
+            Lock lock = mappingLock.readLock();
+            lock.lock();
+            try {
+                Segment segment = segments.get(location.segment());
+                if (segment != null) {
+                    int keyLength = segment.map.get(INT, location.offset() + 4L);
+                    long valueOffset = location.offset() + (long) HEADER_BYTES + keyLength;
+                    return readString(segment.map, valueOffset, location.size() - HEADER_BYTES - keyLength);
+                }
+            } finally {
+                lock.unlock();
+            }
+            // Compacted away since the lookup: the index already points at the copy
+        }
+    }
+
+    @Override
+    public boolean contains(String key) {
+        return index.containsKey(key);
+    }
+
+    @Override
+    public long sizeBytes(String key) {
+        Location location = index.get(key);
+        return location == null ? 0L : location.size() - HEADER_BYTES;
+    }
+
+    @Override
+    public Set<String> keys() {
+        return Collections.unmodifiableSet(index.keySet());
+    }
+
+    @Override
+    public int size() {
+        return index.size();
+    }
+
+    // --- Writes ---
+
+    @Override
+    public String compute(String key, BiFunction<String, String, String> remapping) {
+        synchronized (stripe(key)) {
+            String old = get(key);
+            String value = remapping.apply(key, old);
+            // Identity on purpose: returning old itself means "leave it"
+            if (value != old) {
+                append(key, key.getBytes(StandardCharsets.UTF_8),
+                        value == null ? null : value.getBytes(StandardCharsets.UTF_8));
+            }
+            return value;
+        }
+    }
+
+    private Object stripe(String key) {
+        return stripes[Math.floorMod(key.hashCode(), STRIPES)];
+    }
+
+    /**
+     * Appends a record ({@code value} null for a delete) and points the index at it.
+     */
+    private void append(String key, byte[] keyBytes, byte[] value) {
+        int size = HEADER_BYTES + keyBytes.length + (value == null ? 0 : value.length);
+        synchronized (appendLock) {
+            MemorySegment map = reserve(size);
+            long offset = writePosition;
+            map.set(INT, offset + 4, keyBytes.length);
+            map.set(INT, offset + 8, value == null ? DELETED : value.length);
+            MemorySegment.copy(keyBytes, 0, map, ValueLayout.JAVA_BYTE, offset + HEADER_BYTES, keyBytes.length);
+            if (value != null) {
+                MemorySegment.copy(value, 0, map, ValueLayout.JAVA_BYTE, offset + HEADER_BYTES + keyBytes.length,
+                        value.length);
+            }
+            map.set(INT, offset, checksum(map, offset, size));
+            publish(key, size, value == null);
+        }
+    }
+
+    /**
+     * Copies an intact record out of a sealed segment to the end of the log.
+     */
+    private void appendCopy(String key, Segment source, int offset, int size, boolean deleted) {
+        synchronized (appendLock) {
+            MemorySegment.copy(source.map, offset, reserve(size), writePosition, size);
+            publish(key, size, deleted);
+        }
+    }
+
+    /**
+     * The active segment, rolled over to a new one if {@code size} bytes don't fit behind writePosition.
+     */
+    private MemorySegment reserve(int size) {
+        if (writePosition + (long) size > active.map.byteSize()) {
+            int id = active.id + 1;
+            try {
+                Segment next = mapSegment(id, segmentPath(id), Math.max(segmentBytes, size));
+                segments.put(id, next);
+                active = next;
+                writePosition = 0;
+            } catch (IOException e) {
+                throw new UncheckedIOException("Could not create log segment " + id + " in " + dir, e);
+            }
+        }
+        return active.map;
+    }
+
+    /**
+     * Makes the record just written at writePosition the current one for {@code key}.
+     */
+    private void publish(String key, int size, boolean deleted) {
+        int offset = writePosition;
+        writePosition += size;
+        active.end = writePosition;
+        appendedSinceCheckpoint += size;
+        Location previous = deleted ? index.remove(key) : index.put(key, new Location(active.id, offset, size));
+        if (previous != null) {
+            segments.get(previous.segment()).garbage.addAndGet(previous.size());
+        }
+        if (deleted) {
+            active.garbage.addAndGet(size);
+        }
+    }
+
+    // --- Compaction and checkpoints ---
+
+    /**
+     * Compacts the sealed segments whose garbage reached the ratio, then writes a
+     * checkpoint if anything moved or a segment's worth of log was appended since the last one.
+     */
+    public void compact() throws IOException {
+        synchronized (maintenanceLock) {
+            if (closed) return;
+            long start = System.nanoTime();
+            List<Segment> compacted = new ArrayList<>();
+            long moved = 0;
+            boolean olderKept = false;
+            for (Segment segment : sealedSegments()) {
+                if (segment.garbage.get() < garbageRatio * segment.end) {
+                    olderKept = true;
+                    continue;
+                }
+                moved += moveLiveRecords(segment, olderKept);
+                compacted.add(segment);
+            }
+
+            long appended;
+            synchronized (appendLock) {
+                appended = appendedSinceCheckpoint;
+            }
+            if (compacted.isEmpty() && appended < segmentBytes) {
+                return;
+            }
+            // The checkpoint must stop referring to the compacted segments before their files go
+            checkpoint(compacted);
+            if (!compacted.isEmpty()) {
+                unmap(compacted);
+                for (Segment segment : compacted) {
+                    Files.deleteIfExists(segment.path);
+                }
+                log.info("Compacted {} log segments in {}: moved {} live bytes in {} ms", compacted.size(), dir, moved,
+                        (System.nanoTime() - start) / 1_000_000);
+            }
+        }
+    }
+
+    private void runMaintenance() {
+        try {
+            compact();
+        } catch (IOException | RuntimeException e) {
+            log.error("Log maintenance failed in {}: {}", dir, e.getMessage());
+        }
+    }
+
+    private List<Segment> sealedSegments() {
+        int activeId;
+        synchronized (appendLock) {
+            activeId = active.id;
+        }
+        List<Segment> sealed = new ArrayList<>();
+        for (Segment segment : segments.values()) {
+            if (segment.id < activeId) {
+                sealed.add(segment);
+            }
+        }
+        sealed.sort(Comparator.comparingInt(segment -> segment.id));
+        return sealed;
+    }
+
+    /**
+     * Copies the records of a sealed segment that are still current to the end of
+     * the log. A delete is kept while an older segment that stays might hold the
+     * value it hides. Returns the bytes copied.
+     */
+    private long moveLiveRecords(Segment segment, boolean olderKept) {
+        long moved = 0;
+        int position = 0;
+        while (position < segment.end) {
+            int keyLength = segment.map.get(INT, position + 4L);
+            int valueLength = segment.map.get(INT, position + 8L);
+            int size = HEADER_BYTES + keyLength + Math.max(valueLength, 0);
+            String key = readString(segment.map, position + (long) HEADER_BYTES, keyLength);
+            synchronized (stripe(key)) {
+                Location current = index.get(key);
+                boolean live = valueLength == DELETED
+                        ? olderKept && current == null
+                        : current != null && current.segment() == segment.id && current.offset() == position;
+                if (live) {
+                    appendCopy(key, segment, position, size, valueLength == DELETED);
+                    moved += size;
+                }
+            }
+            position += size;
+        }
+        return moved;
+    }
+
+    /**
+     * Forces the log to disk and writes the index to a new checkpoint (temp file +
+     * atomic rename). Segments in {@code retiring} are left out of it.
+     */
+    private void checkpoint(Collection<Segment> retiring) throws IOException {
+        Position replayFrom;
+        String[] keys;
+        Location[] locations;
+        // Every index update happens under appendLock, so this copy is the index at replayFrom.
+        // Copying it later would mix in records past replayFrom, which replay applies anyway
+        // and which a crash may tear.
+        synchronized (appendLock) {
+            replayFrom = new Position(active.id, writePosition);
+            appendedSinceCheckpoint = 0;
+            keys = new String[index.size()];
+            locations = new Location[keys.length];
+            int i = 0;
+            for (Map.Entry<String, Location> entry : index.entrySet()) {
+                keys[i] = entry.getKey();
+                locations[i++] = entry.getValue();
+            }
+        }
+        List<Segment> sealed = new ArrayList<>();
+        for (Segment segment : segments.values()) {
+            segment.map.force();
+            if (segment.id < replayFrom.segment() && !retiring.contains(segment)) {
+                sealed.add(segment);
+            }
+        }
+
+        Path tmp = dir.resolve(CHECKPOINT_FILE + ".tmp");
+        try (FileChannel channel = FileChannel.open(tmp, StandardOpenOption.CREATE, StandardOpenOption.WRITE,
+                StandardOpenOption.TRUNCATE_EXISTING)) {
+            CheckedOutputStream checked = new CheckedOutputStream(
+                    new BufferedOutputStream(Channels.newOutputStream(channel), 1 << 16), new CRC32C());
+            DataOutputStream out = new DataOutputStream(checked);
+            out.writeInt(CHECKPOINT_MAGIC);
+            out.writeInt(replayFrom.segment());
+            out.writeInt(replayFrom.offset());
+            out.writeInt(sealed.size());
+            for (Segment segment : sealed) {
+                out.writeInt(segment.id);
+                out.writeInt(segment.end);
+            }
+            for (int i = 0; i < keys.length; i++) {
+                byte[] key = keys[i].getBytes(StandardCharsets.UTF_8);
+                out.writeInt(key.length);
+                out.write(key);
+                out.writeInt(locations[i].segment());
+                out.writeInt(locations[i].offset());
+                out.writeInt(locations[i].size());
+            }
+            out.writeInt(-1);
+            out.writeLong(keys.length);
+            out.writeLong(checked.getChecksum().getValue());
+            out.flush();
+            channel.force(true);
+        }
+        Files.move(tmp, dir.resolve(CHECKPOINT_FILE), StandardCopyOption.REPLACE_EXISTING,
+                StandardCopyOption.ATOMIC_MOVE);
+    }
+
+    // --- Recovery ---
+
+    /**
+     * Rebuilds the index from the checkpoint and the log behind it, or from every
+     * segment when there is no usable checkpoint. Returns true if the checkpoint was used.
+     */
+    private boolean recover() throws IOException {
+        TreeMap<Integer, Path> files = new TreeMap<>();
+        try (DirectoryStream<Path> stream = Files.newDirectoryStream(dir, SEGMENT_PREFIX + "*" + SEGMENT_SUFFIX)) {
+            for (Path path : stream) {
+                String name = path.getFileName().toString();
+                files.put(Integer.parseInt(name.substring(SEGMENT_PREFIX.length(), name.length() - SEGMENT_SUFFIX.length())),
+                        path);
+            }
+        }
+
+        Map<Integer, Integer> sealedEnds = new HashMap<>();
+        Position replayFrom = loadCheckpoint(files, sealedEnds);
+        for (Map.Entry<Integer, Path> file : files.entrySet()) {
+            int id = file.getKey();
+            boolean sealed = replayFrom != null && id < replayFrom.segment();
+            if (sealed && !sealedEnds.containsKey(id)) {
+                // Compacted, but the process stopped before the file was deleted
+                Files.delete(file.getValue());
+                continue;
+            }
+            Segment segment = mapSegment(id, file.getValue(), Files.size(file.getValue()));
+            segments.put(id, segment);
+            if (sealed) {
+                segment.end = sealedEnds.get(id);
+            } else {
+                segment.end = replay(segment, replayFrom != null && id == replayFrom.segment() ? replayFrom.offset() : 0);
+            }
+        }
+        if (segments.isEmpty()) {
+            segments.put(1, mapSegment(1, segmentPath(1), segmentBytes));
+        }
+        synchronized (appendLock) {
+            active = segments.get(Collections.max(segments.keySet()));
+            writePosition = active.end;
+        }
+
+        Map<Integer, Long> live = new HashMap<>();
+        for (Location location : index.values()) {
+            live.merge(location.segment(), (long) location.size(), Long::sum);
+        }
+        for (Segment segment : segments.values()) {
+            segment.garbage.set(segment.end - live.getOrDefault(segment.id, 0L));
+        }
+        return replayFrom != null;
+    }
+
+    /**
+     * Loads the index from the checkpoint. Returns where replay starts, or null
+     * (index left empty) when there is no usable checkpoint.
+     */
+    private Position loadCheckpoint(SortedMap<Integer, Path> files, Map<Integer, Integer> sealedEnds) {
+        Path path = dir.resolve(CHECKPOINT_FILE);
+        if (!Files.exists(path)) {
+            return null;
+        }
+        try (InputStream file = Files.newInputStream(path)) {
+            long fileSize = Files.size(path);
+            CheckedInputStream checked = new CheckedInputStream(new BufferedInputStream(file, 1 << 16), new CRC32C());
+            DataInputStream in = new DataInputStream(checked);
+            if (in.readInt() != CHECKPOINT_MAGIC) {
+                throw new IOException("not a checkpoint");
+            }
+            Position replayFrom = new Position(in.readInt(), in.readInt());
+            for (int i = in.readInt(); i > 0; i--) {
+                sealedEnds.put(in.readInt(), in.readInt());
+            }
+            long entries = 0;
+            for (int keyLength = in.readInt(); keyLength != -1; keyLength = in.readInt()) {
+                if (keyLength < 0 || keyLength > fileSize) {
+                    throw new IOException("corrupt entry after " + entries + " keys");
+                }
+                byte[] key = new byte[keyLength];
+                in.readFully(key);
+                Location location = new Location(in.readInt(), in.readInt(), in.readInt());
+                // Replay owns everything from replayFrom on; such an entry may point at a torn record
+                if (location.segment() > replayFrom.segment()
+                        || location.segment() == replayFrom.segment() && location.offset() >= replayFrom.offset()) {
+                    throw new IOException("entry past the replay position");
+                }
+                index.put(new String(key, StandardCharsets.UTF_8), location);
+                entries++;
+            }
+            boolean counted = in.readLong() == entries;
+            long checksum = checked.getChecksum().getValue();
+            if (!counted || in.readLong() != checksum) {
+                throw new IOException("checksum mismatch");
+            }
+
+            if (!files.containsKey(replayFrom.segment()) || !files.keySet().containsAll(sealedEnds.keySet())) {
+                throw new IOException("refers to missing log segments");
+            }
+            for (Location location : index.values()) {
+                if (!files.containsKey(location.segment())) {
+                    throw new IOException("refers to missing log segment " + location.segment());
+                }
+            }
+            return replayFrom;
+        } catch (IOException e) {
+            log.warn("Ignoring checkpoint {} ({}), scanning the whole log", path, e.getMessage());
+            index.clear();
+            sealedEnds.clear();
+            return null;
+        }
+    }
+
+    /**
+     * Applies the records from {@code offset} on to the index. Returns where they end.
+     */
+    private int replay(Segment segment, int offset) {
+        int position = offset;
+        for (int size = recordSize(segment.map, position); size > 0; size = recordSize(segment.map, position)) {
+            String key = readString(segment.map, position + (long) HEADER_BYTES, segment.map.get(INT, position + 4L));
+            if (segment.map.get(INT, position + 8L) == DELETED) {
+                index.remove(key);
+            } else {
+                index.put(key, new Location(segment.id, position, size));
+            }
+            position += size;
+        }
+        return position;
+    }
+
+    /**
+     * Size of the intact record at {@code position}, or 0 where the log ends
+     * (unwritten space, a torn record or the end of the segment).
+     */
+    private static int recordSize(MemorySegment map, int position) {
+        if (position + (long) HEADER_BYTES > map.byteSize()) {
+            return 0;
+        }
+        int keyLength = map.get(INT, position + 4L);
+        int valueLength = map.get(INT, position + 8L);
+        // Unwritten space reads as an empty key and value, which the CRC rejects
+        if (keyLength < 0 || valueLength < DELETED) {
+            return 0;
+        }
+        long size = (long) HEADER_BYTES + keyLength + Math.max(valueLength, 0);
+        if (position + size > map.byteSize() || checksum(map, position, (int) size) != map.get(INT, position)) {
+            return 0;
+        }
+        return (int) size;
+    }
+
+    // --- Segments ---
+
+    private Path segmentPath(int id) {
+        return dir.resolve(String.format("%s%010d%s", SEGMENT_PREFIX, id, SEGMENT_SUFFIX));
+    }
+
+    private Segment mapSegment(int id, Path path, long size) throws IOException {
+        Arena arena = Arena.ofShared();
+        try (FileChannel channel = FileChannel.open(path, StandardOpenOption.CREATE, StandardOpenOption.READ,
+                StandardOpenOption.WRITE)) {
+            if (channel.size() < size) {
+                // Sparse: the file only takes disk space as the log fills it
+                channel.write(ByteBuffer.wrap(new byte[1]), size - 1);
+            }
+            return new Segment(id, path, arena, channel.map(FileChannel.MapMode.READ_WRITE, 0, size, arena));
+        } catch (IOException | RuntimeException e) {
+            arena.close();
+            throw e;
+        }
+    }
+
+    private void unmap(Collection<Segment> closing) {
+        Lock lock = mappingLock.writeLock();
+        lock.lock();
+        try {
+            for (Segment segment : closing) {
+                segments.remove(segment.id);
+                segment.arena.close();
+            }
+        } finally {
+            lock.unlock();
+        }
+    }
+
+    private static int checksum(MemorySegment map, long position, int size) {
+        CRC32C crc = new CRC32C();
+        crc.update(map.asSlice(position + 4, size - 4).asByteBuffer());
+        return (int) crc.getValue();
+    }
+
+    private static String readString(MemorySegment map, long offset, int length) {
+        byte[] bytes = new byte[length];
+        MemorySegment.copy(map, ValueLayout.JAVA_BYTE, offset, bytes, 0, length);
+        return new String(bytes, StandardCharsets.UTF_8);
+    }
+
+    /**
+     * Stops compaction, writes a final checkpoint and unmaps the log.
+     */
+    @Override
+    public void close() {
+        if (maintenance != null) {
+            maintenance.shutdown();
+            try {
+                maintenance.awaitTermination(1, TimeUnit.MINUTES);
+            } catch (InterruptedException e) {
+                Thread.currentThread().interrupt();
+            }
+        }
+        synchronized (maintenanceLock) {
+            if (closed) return;
+            closed = true;
+            try {
+                checkpoint(List.of());
+            } catch (IOException e) {
+                log.error("Could not checkpoint {} on close, the next start replays the log: {}", dir, e.getMessage());
+            }
+            index.clear();
+            unmap(new ArrayList<>(segments.values()));
+        }
+    }
+}
@@ -55,6 +55,55 @@ class DataStoreServiceTest {
         assertEquals(0, dataStoreService.getWriteCount("nonexistent_key"));
     }
 
+    @Test
+    void testHeavyHittersIncludeMisses() {
+        dataStoreService.put("stored", "value");
+        dataStoreService.handleGet("stored");
+        for (int i = 0; i < 3; i++) {
+            dataStoreService.handleGet("missed");
+        }
+
+        var heavyHitters = dataStoreService.getHeavyHitters(1);
+
+        assertEquals(1, heavyHitters.size());
+        assertEquals(3, heavyHitters.get("missed").getReadCount());
+        assertFalse(heavyHitters.get("missed").isStored());
+        // Misses are counted by the sketch, not by an exact per-key counter
+        assertEquals(3, dataStoreService.getReadCount("missed"));
+    }
+
+    @Test
+    void testReadDemandSurvivesReplicateAndEvict() {
+        dataStoreService.handleGet("moving");
+        dataStoreService.handleGet("moving");
+        assertEquals(2, dataStoreService.getReadCount("moving"));
+
+        // Replicated here: the misses before it still count
+        dataStoreService.put("moving", "value");
+        assertEquals(2, dataStoreService.getReadCount("moving"));
+        dataStoreService.handleGet("moving");
+        assertEquals(3, dataStoreService.getReadCount("moving"));
+
+        // Evicted again: the hits while it was stored still count
+        dataStoreService.evict("moving");
+        assertEquals(3, dataStoreService.getReadCount("moving"));
+        dataStoreService.handleGet("moving");
+        assertEquals(4, dataStoreService.getReadCount("moving"));
+    }
+
+    @Test
+    void testMetricsSeparateDemandFromPlacement() {
+        dataStoreService.put("held", "value");
+        dataStoreService.handleGet("held");
+        dataStoreService.handleGet("not_held");
+
+        var metrics = dataStoreService.getAllKeyMetrics();
+
+        assertTrue(metrics.get("held").isStored());
+        assertFalse(metrics.get("not_held").isStored());
+        assertEquals(1, metrics.get("not_held").getReadCount());
+    }
+
     @Test
     void testStorageCost() {
         // Action
@@ -65,4 +114,42 @@ class DataStoreServiceTest {
         // Assumes COST_PER_KEY_STORED is 1.5
         assertEquals(3.0, dataStoreService.getStorageCost());
     }
-}
\ No newline at end of file
+
+    @Test
+    void testStorageCostBillsLargeValuesByTheKiB() {
+        // 4-byte key + 4092-byte value = 4 KiB, at 2.0 per KiB
+        DataStoreService priced = new DataStoreService(2.0, 0);
+        priced.put("big1", "x".repeat(4092));
+
+        assertEquals(4096, priced.getStoredBytes());
+        assertEquals(8.0, priced.getStorageCost());
+        assertEquals(4096, priced.getAllKeyMetrics().get("big1").getSizeBytes());
+    }
+
+    @Test
+    void testPutRejectedOverCapacity() {
+        DataStoreService small = new DataStoreService(1.5, 100);
+
+        assertTrue(small.put("a", "x".repeat(59)));
+        assertFalse(small.put("b", "x".repeat(59)));
+
+        assertFalse(small.contains("b"));
+        assertEquals(0, small.getWriteCount("b"));
+        assertEquals(60, small.getStoredBytes());
+        // Shrinking an existing entry always fits
+        assertTrue(small.put("a", "x"));
+        assertEquals(2, small.getStoredBytes());
+    }
+
+    @Test
+    void testEvictFreesBytes() {
+        DataStoreService small = new DataStoreService(1.5, 100);
+        small.put("a", "x".repeat(59));
+
+        small.evict("a");
+
+        assertEquals(0, small.getStoredBytes());
+        assertEquals(0.0, small.getStorageCost());
+        assertTrue(small.put("b", "x".repeat(59)));
+    }
+}
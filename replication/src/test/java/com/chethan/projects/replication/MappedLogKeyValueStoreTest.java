@@ -0,0 +1,238 @@
+package com.chethan.projects.replication;
+
+import com.chethan.projects.replication.service.DataStoreService;
+import com.chethan.projects.replication.store.MappedLogKeyValueStore;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.channels.FileChannel;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.StandardOpenOption;
+import java.time.Duration;
+import java.util.Arrays;
+import java.util.stream.Stream;
+
+import static org.junit.jupiter.api.Assertions.*;
+
+class MappedLogKeyValueStoreTest {
+
+    private static final Path CHECKPOINT = Path.of("index.checkpoint");
+    private static final Duration RECOVERY_BOUND = Duration.ofSeconds(10);
+
+    @TempDir
+    Path dir;
+
+    private MappedLogKeyValueStore open(long segmentBytes) throws IOException {
+        return new MappedLogKeyValueStore(dir, segmentBytes, 0, MappedLogKeyValueStore.DEFAULT_GARBAGE_RATIO);
+    }
+
+    private long segmentFiles() throws IOException {
+        try (Stream<Path> files = Files.list(dir)) {
+            return files.filter(p -> p.getFileName().toString().endsWith(".log")).count();
+        }
+    }
+
+    private static void writeSample(MappedLogKeyValueStore store) {
+        store.put("a", "1");
+        store.put("b", "two");
+        store.put("a", "three");
+        store.put("c", "ü€");
+        store.remove("b");
+    }
+
+    private static void assertSample(MappedLogKeyValueStore store) {
+        assertEquals("three", store.get("a"));
+        assertNull(store.get("b"));
+        assertFalse(store.contains("b"));
+        assertEquals("ü€", store.get("c"));
+        // 1-byte key + 5 UTF-8 bytes
+        assertEquals(6, store.sizeBytes("c"));
+        assertEquals(2, store.size());
+    }
+
+    @Test
+    void testRecoversFromCheckpoint() throws IOException {
+        MappedLogKeyValueStore store = open(1 << 20);
+        writeSample(store);
+        store.close();
+
+        assertTrue(Files.exists(dir.resolve(CHECKPOINT)));
+        MappedLogKeyValueStore recovered = open(1 << 20);
+        assertSample(recovered);
+        recovered.close();
+    }
+
+    @Test
+    void testRecoversByScanningTheLogWithoutCheckpoint() throws IOException {
+        MappedLogKeyValueStore store = open(1 << 20);
+        writeSample(store);
+        store.close();
+        Files.delete(dir.resolve(CHECKPOINT));
+
+        MappedLogKeyValueStore recovered = open(1 << 20);
+        assertSample(recovered);
+        recovered.close();
+    }
+
+    @Test
+    void testReplaysLogBehindCheckpointAfterCrash() throws IOException {
+        MappedLogKeyValueStore store = open(256);
+        for (int i = 0; i < 50; i++) {
+            store.put("key" + i, "value" + i);
+        }
+        // More than a segment was appended, so this writes a checkpoint
+        store.compact();
+        assertTrue(Files.exists(dir.resolve(CHECKPOINT)));
+        store.put("key0", "changed");
+        store.remove("key1");
+        store.put("late", "value");
+
+        // No close(): the writes behind the checkpoint are only in the mapped log
+        MappedLogKeyValueStore recovered = open(256);
+        assertEquals("changed", recovered.get("key0"));
+        assertNull(recovered.get("key1"));
+        assertEquals("value", recovered.get("late"));
+        assertEquals("value49", recovered.get("key49"));
+        assertEquals(50, recovered.size());
+        recovered.close();
+    }
+
+    @Test
+    void testIgnoresTornRecord() throws IOException {
+        MappedLogKeyValueStore store = open(1 << 20);
+        store.put("a", "value");
+        // A crash in the middle of an append: a header and half a key, no valid CRC
+        Path segment = dir.resolve("segment-0000000001.log");
+        try (FileChannel channel = FileChannel.open(segment, StandardOpenOption.WRITE)) {
+            channel.write(ByteBuffer.wrap(new byte[]{0, 0, 0, 7, 0, 0, 0, 3, 0, 0, 0, 5, 'k', 'e'}), 12 + 1 + 5);
+        }
+
+        MappedLogKeyValueStore recovered = open(1 << 20);
+        assertEquals("value", recovered.get("a"));
+        assertEquals(1, recovered.size());
+        recovered.put("b", "x");
+        recovered.close();
+        Files.delete(dir.resolve(CHECKPOINT));
+
+        // The torn record was overwritten, so the scan reads past it
+        MappedLogKeyValueStore reopened = open(1 << 20);
+        assertEquals("x", reopened.get("b"));
+        reopened.close();
+    }
+
+    @Test
+    void testCompactionReclaimsOverwrittenSegments() throws IOException {
+        MappedLogKeyValueStore store = open(256);
+        for (int round = 0; round < 20; round++) {
+            for (int i = 0; i < 10; i++) {
+                store.put("key" + i, "round" + round);
+            }
+        }
+        store.put("gone", "soon");
+        store.remove("gone");
+        long before = segmentFiles();
+
+        store.compact();
+
+        assertTrue(segmentFiles() < before / 2, before + " -> " + segmentFiles());
+        assertEquals("round19", store.get("key3"));
+        assertNull(store.get("gone"));
+        store.close();
+
+        // A full scan of what is left must not bring back overwritten or deleted values
+        Files.delete(dir.resolve(CHECKPOINT));
+        MappedLogKeyValueStore recovered = open(256);
+        assertEquals("round19", recovered.get("key7"));
+        assertNull(recovered.get("gone"));
+        assertEquals(10, recovered.size());
+        recovered.close();
+    }
+
+    @Test
+    void testDataStoreServiceKeepsReplicasAcrossRestart() throws IOException {
+        MappedLogKeyValueStore store = open(1 << 20);
+        DataStoreService service = new DataStoreService(1.5, 0, store);
+        service.put("held", "x".repeat(2000));
+        service.put("small", "value");
+        service.put("evicted", "value");
+        service.evict("evicted");
+        long storedBytes = service.getStoredBytes();
+        double storageCost = service.getStorageCost();
+        store.close();
+
+        MappedLogKeyValueStore reopened = open(1 << 20);
+        DataStoreService restarted = new DataStoreService(1.5, 0, reopened);
+        assertTrue(restarted.contains("held"));
+        assertFalse(restarted.contains("evicted"));
+        assertEquals(storedBytes, restarted.getStoredBytes());
+        assertEquals(storageCost, restarted.getStorageCost());
+        assertEquals(2004, restarted.getAllKeyMetrics().get("held").getSizeBytes());
+        reopened.close();
+    }
+
+    @Test
+    void testRecoversEmptyKey() throws IOException {
+        MappedLogKeyValueStore store = open(1 << 20);
+        store.put("", "empty");
+        store.put("after", "value");
+
+        // No close(): recovery scans the log, and the empty key must not end it
+        MappedLogKeyValueStore recovered = open(1 << 20);
+        assertEquals("empty", recovered.get(""));
+        assertEquals("value", recovered.get("after"));
+        recovered.close();
+    }
+
+    @Test
+    void testCheckpointsWhileWritingRecoverLatestValues() throws Exception {
+        MappedLogKeyValueStore store = open(4096);
+        int writers = 4;
+        int rounds = 2000;
+        Thread[] threads = new Thread[writers];
+        for (int t = 0; t < writers; t++) {
+            int id = t;
+            threads[t] = new Thread(() -> {
+                for (int round = 0; round < rounds; round++) {
+                    store.put("w" + id + "_" + round % 50, "round" + round);
+                }
+            });
+            threads[t].start();
+        }
+        // Checkpoints and compactions race the appends
+        while (Arrays.stream(threads).anyMatch(Thread::isAlive)) {
+            store.compact();
+        }
+        for (Thread thread : threads) {
+            thread.join();
+        }
+
+        // No close(): the newest checkpoint plus the log behind it must give the final values
+        MappedLogKeyValueStore recovered = open(4096);
+        assertEquals(writers * 50, recovered.size());
+        for (int t = 0; t < writers; t++) {
+            for (int k = 0; k < 50; k++) {
+                assertEquals("round" + (rounds - 50 + k), recovered.get("w" + t + "_" + k));
+            }
+        }
+        recovered.close();
+    }
+
+    @Test
+    void testRecoversMillionKeys() throws IOException {
+        int numKeys = 1_000_000;
+        MappedLogKeyValueStore store = new MappedLogKeyValueStore(dir);
+        for (int i = 0; i < numKeys; i++) {
+            store.put("user_profile_" + i, "initial_value_for_user_profile_" + i);
+        }
+        store.close();
+
+        // Loose bound: catches recovery falling back to something far slower than checkpoint + log tail
+        MappedLogKeyValueStore recovered = assertTimeout(RECOVERY_BOUND, () -> new MappedLogKeyValueStore(dir));
+        assertEquals(numKeys, recovered.size());
+        assertEquals("initial_value_for_user_profile_999997", recovered.get("user_profile_999997"));
+        recovered.close();
+    }
+}
@@ -0,0 +1,87 @@
+package com.chethan.projects.replication;
+
+import com.chethan.projects.replication.metrics.CountMinSketch;
+import com.chethan.projects.replication.metrics.KeyPopularityTracker;
+import com.chethan.projects.replication.metrics.SpaceSavingTopK;
+import org.junit.jupiter.api.Test;
+
+import java.util.ArrayList;
+import java.util.List;
+
+import static org.junit.jupiter.api.Assertions.*;
+
+class PopularitySketchTest {
+
+    @Test
+    void testCountMinNeverUndercounts() {
+        CountMinSketch sketch = new CountMinSketch(4, 256);
+        for (int i = 0; i < 1000; i++) {
+            sketch.add("key" + i, i % 7 + 1);
+        }
+
+        for (int i = 0; i < 1000; i++) {
+            assertTrue(sketch.estimate("key" + i) >= i % 7 + 1);
+        }
+    }
+
+    @Test
+    void testCountMinExactWithoutCollisions() {
+        CountMinSketch sketch = new CountMinSketch(4, 2048);
+        sketch.add("only_key", 5);
+
+        assertEquals(5, sketch.estimate("only_key"));
+    }
+
+    @Test
+    void testSpaceSavingKeepsHeavyHitters() {
+        SpaceSavingTopK topK = new SpaceSavingTopK(8);
+        // Two hot keys buried in a long tail of one-off keys
+        for (int i = 0; i < 500; i++) {
+            topK.offer("hot_a");
+            if (i % 2 == 0) topK.offer("hot_b");
+            topK.offer("cold_" + i);
+        }
+
+        List<String> top = topK.top(2);
+        assertEquals(List.of("hot_a", "hot_b"), top);
+        assertFalse(topK.isMonitored("cold_0"));
+    }
+
+    @Test
+    void testTrackerRejectsKAboveCapacity() {
+        KeyPopularityTracker tracker = new KeyPopularityTracker(300);
+        for (int i = 0; i < 500; i++) {
+            tracker.recordRead("key" + i);
+        }
+
+        assertEquals(300, tracker.topKeys(300).size());
+        assertThrows(IllegalArgumentException.class, () -> tracker.topKeys(301));
+    }
+
+    @Test
+    void testStripedSpaceSavingCountsEveryOfferOnce() throws InterruptedException {
+        SpaceSavingTopK topK = new SpaceSavingTopK(1024);
+        int threads = 8;
+        int offersPerThread = 50_000;
+        List<Thread> workers = new ArrayList<>();
+        for (int t = 0; t < threads; t++) {
+            int seed = t;
+            workers.add(new Thread(() -> {
+                for (int i = 0; i < offersPerThread; i++) {
+                    // A few hot keys and a long tail, on every thread
+                    topK.offer(i % 4 == 0 ? "hot_" + (i % 3) : "tail_" + ((i * 31 + seed) % 5000));
+                }
+            }));
+        }
+        workers.forEach(Thread::start);
+        for (Thread worker : workers) {
+            worker.join();
+        }
+
+        // Space-Saving keeps the counters summing to the number of offers, even under contention
+        long total = topK.top(1024).stream().mapToLong(topK::count).sum();
+        assertEquals((long) threads * offersPerThread, total);
+        assertEquals(List.of("hot_0", "hot_1", "hot_2"), topK.top(3).stream().sorted().toList());
+        assertTrue(topK.count("hot_0") >= threads * offersPerThread / 12);
+    }
+}
@@ -0,0 +1,33 @@
+package com.chethan.replicationcontroller.config;
+
+import lombok.Data;
+import org.springframework.boot.context.properties.ConfigurationProperties;
+import org.springframework.stereotype.Component;
+
+@Component
+@ConfigurationProperties(prefix = "placement")
+@Data
+public class PlacementConfig {
+
+    /**
+     * Directory holding the replication map snapshot and its append-only log.
+     * Empty keeps the map in memory only.
+     */
+    private String dir = "placement-data";
+
+    /**
+     * Log records appended before the map is compacted into a new snapshot.
+     */
+    private int snapshotInterval = 100_000;
+
+    /**
+     * fsync after every log append, so placements survive power loss and not only a process crash.
+     */
+    private boolean fsync = false;
+
+    /**
+     * Also reconcile with the nodes' /management/metrics when the map was recovered from disk.
+     * Without local state the controller always reconciles.
+     */
+    private boolean reconcileOnStartup = false;
+}
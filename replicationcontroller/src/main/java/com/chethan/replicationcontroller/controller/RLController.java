@@ -5,10 +5,16 @@ import com.chethan.replicationcontroller.dto.NodeMetric;
 import com.chethan.replicationcontroller.dto.RLActionRequest;
 import com.chethan.replicationcontroller.service.NodeClientService;
 import com.chethan.replicationcontroller.service.ReplicationService;
+import com.chethan.replicationcontroller.service.StateEncoder;
 import org.springframework.beans.factory.annotation.Autowired;
+import org.springframework.http.HttpHeaders;
+import org.springframework.http.MediaType;
 import org.springframework.http.ResponseEntity;
 import org.springframework.web.bind.annotation.*;
 
+import java.net.URI;
+import java.util.Comparator;
+import java.util.HashMap;
 import java.util.List;
 import java.util.Map;
 import java.util.Objects;
@@ -26,16 +32,20 @@ public class RLController {
     @Autowired
     private ReplicationService replicationService;
 
-    // A simple map to convert service names (e.g., "replication-us") to URLs
-    private final Map<String, String> nodeNameToUrlMap = Map.of(
-            "replication-us", "http://replication-us:8080",
-            "replication-eu", "http://replication-eu:8080",
-            "replication-ap", "http://replication-ap:8080"
-    );
+    /**
+     * Converts a service name (e.g., "replication-us") to its URL.
+     * Derived from the configured cluster nodes so new regions need no code change.
+     */
+    private String resolveNodeUrl(String nodeName) {
+        return clusterConfig.getNodes().stream()
+                .filter(nodeUrl -> nodeName != null && nodeName.equals(URI.create(nodeUrl).getHost()))
+                .findFirst()
+                .orElse(null);
+    }
 
     @PostMapping("/execute-action")
     public ResponseEntity<Void> executeAction(@RequestBody RLActionRequest actionRequest) {
-        String targetNodeUrl = nodeNameToUrlMap.get(actionRequest.getTargetNode());
+        String targetNodeUrl = resolveNodeUrl(actionRequest.getTargetNode());
         if (targetNodeUrl != null) {
             replicationService.executeAction(
                     actionRequest.getActionType(),
@@ -47,12 +57,57 @@ public class RLController {
         return ResponseEntity.badRequest().build(); // Node name not found
     }
 
+    /**
+     * Full per-node metrics, or with ?topK=K only the K hottest keys cluster-wide.
+     * The top-K variant asks every node for its heavy hitters, merges them, then
+     * fetches metrics for exactly the merged key set, so the payload is O(K) per node.
+     * Clients that accept {@link StateEncoder#MEDIA_TYPE} get the same state in the
+     * columnar binary encoding instead of JSON.
+     * A topK larger than a node's top-K capacity is a 400, never a silently shorter list.
+     */
     @GetMapping("/system-state")
-    public ResponseEntity<List<NodeMetric>> getSystemState() {
-        List<NodeMetric> allMetrics = clusterConfig.getNodes().stream()
+    public ResponseEntity<?> getSystemState(@RequestParam(required = false) Integer topK,
+                                            @RequestHeader(value = HttpHeaders.ACCEPT, required = false) String accept) {
+        List<NodeMetric> state;
+        try {
+            state = topK != null ? getTopKState(topK) : getAllMetrics();
+        } catch (IllegalArgumentException e) {
+            return ResponseEntity.badRequest().body(e.getMessage());
+        }
+        if (accept != null && accept.contains(StateEncoder.MEDIA_TYPE)) {
+            return ResponseEntity.ok()
+                    .contentType(MediaType.parseMediaType(StateEncoder.MEDIA_TYPE))
+                    .body(StateEncoder.encode(state));
+        }
+        return ResponseEntity.ok(state);
+    }
+
+    private List<NodeMetric> getAllMetrics() {
+        return clusterConfig.getNodes().stream()
                 .map(nodeUrl -> nodeClientService.getMetrics(nodeUrl))
                 .filter(Objects::nonNull) // Filter out any nodes that failed to respond
                 .collect(Collectors.toList());
-        return ResponseEntity.ok(allMetrics);
+    }
+
+    private List<NodeMetric> getTopKState(int topK) {
+        Map<String, Long> accessTotals = new HashMap<>();
+        for (String nodeUrl : clusterConfig.getNodes()) {
+            NodeMetric heavyHitters = nodeClientService.getHeavyHitters(nodeUrl, topK);
+            if (heavyHitters == null || heavyHitters.getKeyMetrics() == null) continue;
+            heavyHitters.getKeyMetrics().forEach((key, metric) ->
+                    accessTotals.merge(key, metric.getReadCount() + metric.getWriteCount(), Long::sum));
+        }
+
+        List<String> hotKeys = accessTotals.entrySet().stream()
+                .sorted(Map.Entry.<String, Long>comparingByValue(Comparator.reverseOrder())
+                        .thenComparing(Map.Entry.comparingByKey()))
+                .limit(topK)
+                .map(Map.Entry::getKey)
+                .collect(Collectors.toList());
+
+        return clusterConfig.getNodes().stream()
+                .map(nodeUrl -> nodeClientService.getKeyMetrics(nodeUrl, hotKeys))
+                .filter(Objects::nonNull)
+                .collect(Collectors.toList());
     }
 }
\ No newline at end of file
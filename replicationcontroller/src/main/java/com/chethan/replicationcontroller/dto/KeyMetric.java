@@ -8,4 +8,6 @@ import lombok.Data;
 public class KeyMetric {
     private long readCount;
     private long writeCount;
+    private boolean stored; // false: demand recorded at a node that holds no replica
+    private long sizeBytes; // UTF-8 key + value bytes of the stored replica, 0 when not stored
 }
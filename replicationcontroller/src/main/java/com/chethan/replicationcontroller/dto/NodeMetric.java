@@ -9,4 +9,8 @@ public class NodeMetric {
     private String nodeId;
     private Map<String, KeyMetric> keyMetrics;
     private double storageCost;
+    // Price per billed KiB, capacity (0 = unlimited) and bytes currently stored
+    private double storagePrice;
+    private long capacityBytes;
+    private long storedBytes;
 }
@@ -6,10 +6,14 @@ import com.chethan.replicationcontroller.dto.ReplicationRequest;
 import org.slf4j.Logger;
 import org.slf4j.LoggerFactory;
 import org.springframework.beans.factory.annotation.Autowired;
+import org.springframework.http.HttpStatus;
 import org.springframework.http.ResponseEntity;
 import org.springframework.stereotype.Service;
+import org.springframework.web.client.HttpStatusCodeException;
 import org.springframework.web.client.RestTemplate;
 
+import java.util.List;
+
 @Service
 public class NodeClientService {
 
@@ -18,16 +22,29 @@ public class NodeClientService {
     @Autowired
     private RestTemplate restTemplate;
 
-    public void replicateData(String nodeUrl, String key, String value) {
+    /**
+     * @return true if the node stored the value; false if it failed or was full
+     * (507 Insufficient Storage).
+     */
+    public boolean replicateData(String nodeUrl, String key, String value) {
         String url = nodeUrl + "/management/replicate";
         try {
             // The DB Node's simple replicate endpoint expects this body
             ReplicationRequest request = new ReplicationRequest(key, value);
             restTemplate.postForEntity(url, request, Void.class);
             logger.info("Successfully replicated key '{}' to node {}", key, nodeUrl);
+            return true;
+        } catch (HttpStatusCodeException e) {
+            if (e.getStatusCode().value() == HttpStatus.INSUFFICIENT_STORAGE.value()) {
+                logger.warn("Node {} is out of capacity, key '{}' not replicated", nodeUrl, key);
+            } else {
+                logger.error("Failed to replicate key '{}' to node {}: {}", key, nodeUrl, e.getMessage());
+            }
+            return false;
         } catch (Exception e) {
             // In a real system, we'd have retry logic or a queue
             logger.error("Failed to replicate key '{}' to node {}: {}", key, nodeUrl, e.getMessage());
+            return false;
         }
     }
 
@@ -53,6 +70,37 @@ public class NodeClientService {
         }
     }
 
+    /**
+     * @throws IllegalArgumentException if the node rejects k (400: more than its top-K capacity).
+     * Other failures are logged and return null, like the other metric calls.
+     */
+    public NodeMetric getHeavyHitters(String nodeUrl, int k) {
+        String url = nodeUrl + "/management/heavy-hitters?k=" + k;
+        try {
+            return restTemplate.getForObject(url, NodeMetric.class);
+        } catch (HttpStatusCodeException e) {
+            if (e.getStatusCode().value() == HttpStatus.BAD_REQUEST.value()) {
+                throw new IllegalArgumentException("Node " + nodeUrl + " rejected topK=" + k + ": "
+                        + e.getResponseBodyAsString(), e);
+            }
+            logger.error("Failed to get heavy hitters from node {}: {}", nodeUrl, e.getMessage());
+            return null;
+        } catch (Exception e) {
+            logger.error("Failed to get heavy hitters from node {}: {}", nodeUrl, e.getMessage());
+            return null;
+        }
+    }
+
+    public NodeMetric getKeyMetrics(String nodeUrl, List<String> keys) {
+        String url = nodeUrl + "/management/metrics/keys";
+        try {
+            return restTemplate.postForObject(url, keys, NodeMetric.class);
+        } catch (Exception e) {
+            logger.error("Failed to get key metrics from node {}: {}", nodeUrl, e.getMessage());
+            return null;
+        }
+    }
+
     public void evictData(String nodeUrl, String key) {
         String url = nodeUrl + "/management/data/" + key;
         try {
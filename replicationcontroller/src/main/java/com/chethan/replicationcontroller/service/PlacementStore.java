@@ -0,0 +1,410 @@
+package com.chethan.replicationcontroller.service;
+
+import com.chethan.replicationcontroller.config.PlacementConfig;
+import jakarta.annotation.PostConstruct;
+import jakarta.annotation.PreDestroy;
+import lombok.extern.slf4j.Slf4j;
+import org.springframework.stereotype.Service;
+
+import java.io.*;
+import java.nio.file.DirectoryStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.StandardCopyOption;
+import java.util.*;
+import java.util.concurrent.CompletableFuture;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.TimeUnit;
+
+/**
+ * The controller's key -> replica nodes map, made durable with an append-only
+ * log of placement changes plus a periodically compacted snapshot.
+ *
+ * Reads are lock-free. Mutations are serialized: each is appended to the log
+ * and then applied to the map. The log is split into numbered generations
+ * ({@code placement.log.<n>}). Every {@code placement.snapshot-interval} records
+ * the writer only switches to a new generation; a background thread then writes
+ * the map to a new snapshot (temp file + atomic rename) and deletes the older
+ * generations, so appends never wait for a snapshot.
+ *
+ * The snapshot records the first generation it does not cover. It is taken
+ * while mutations continue, so it may also hold some of that generation's
+ * changes. That is harmless: log records are "set membership" operations, and
+ * replaying them over a state that already contains some of them ends in the
+ * same map. On startup the snapshot is loaded, the generations from there on are
+ * replayed in order, and appends go to a fresh generation.
+ */
+@Slf4j
+@Service
+public class PlacementStore {
+
+    static final String SNAPSHOT_FILE = "placement.snapshot";
+    static final String LOG_FILE = "placement.log";
+
+    private static final int SNAPSHOT_MAGIC = 0x504c5332; // "PLS2"
+    private static final byte OP_PUT = 1;
+    private static final byte OP_ADD = 2;
+    private static final byte OP_REMOVE = 3;
+
+    private final ConcurrentHashMap<String, Set<String>> placements = new ConcurrentHashMap<>();
+    private final PlacementConfig config;
+    private final ExecutorService snapshotter = Executors.newSingleThreadExecutor(r -> {
+        Thread thread = new Thread(r, "placement-snapshot");
+        thread.setDaemon(true);
+        return thread;
+    });
+
+    private Path dir;
+    private FileOutputStream logFile;
+    private DataOutputStream logOut;
+    private long generation;
+    private long logRecords;
+    private Future<?> pendingSnapshot = CompletableFuture.completedFuture(null);
+    private boolean recovered;
+
+    public PlacementStore(PlacementConfig config) {
+        this.config = config;
+    }
+
+    // --- Lifecycle ---
+
+    /**
+     * Loads the snapshot and replays the log generations after it, then opens a
+     * new generation for appending.
+     */
+    @PostConstruct
+    public synchronized void open() throws IOException {
+        if (config.getDir() == null || config.getDir().isBlank()) {
+            log.info("placement.dir is empty: the replication map is kept in memory only");
+            return;
+        }
+        dir = Path.of(config.getDir());
+        Files.createDirectories(dir);
+
+        long start = System.nanoTime();
+        Path snapshot = dir.resolve(SNAPSHOT_FILE);
+        List<Long> generations = logGenerations();
+        recovered = Files.exists(snapshot) || !generations.isEmpty();
+        boolean complete = true;
+        long replayFrom = 0;
+        try {
+            if (Files.exists(snapshot)) {
+                replayFrom = readSnapshot(snapshot);
+            }
+            for (long gen : generations) {
+                // A torn record can only end the generation that was being written
+                if (gen >= replayFrom && !replayLog(logPath(gen))) {
+                    complete = false;
+                }
+            }
+        } catch (IOException e) {
+            // Start empty; ReplicationService reconciles with the nodes instead
+            log.error("Could not recover the replication map from {}: {}", dir, e.getMessage());
+            placements.clear();
+            recovered = false;
+            complete = false;
+        }
+        if (recovered) {
+            log.info("Recovered {} keys from {} (snapshot + {} log records) in {} ms",
+                    placements.size(), dir, logRecords, (System.nanoTime() - start) / 1_000_000);
+        }
+
+        // Never append to a generation found on disk: it may end in a torn record
+        long replayed = logRecords;
+        generation = Math.max(replayFrom, generations.isEmpty() ? 0 : generations.get(generations.size() - 1) + 1);
+        openLog();
+        if (replayed > 0 || !complete) {
+            compact();
+        }
+    }
+
+    /**
+     * Closes the log and waits for a snapshot still being written.
+     */
+    @PreDestroy
+    public synchronized void close() throws IOException {
+        closeLog();
+        snapshotter.shutdown();
+        try {
+            if (!snapshotter.awaitTermination(1, TimeUnit.MINUTES)) {
+                log.warn("Replication map snapshot still running at shutdown; recovery will replay the log instead");
+            }
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+        }
+    }
+
+    /**
+     * True when the map was rebuilt from a snapshot or log found on disk.
+     */
+    public boolean isRecovered() {
+        return recovered;
+    }
+
+    // --- Reads ---
+
+    public Set<String> nodesFor(String key) {
+        Set<String> nodes = placements.get(key);
+        return nodes == null ? Collections.emptySet() : Collections.unmodifiableSet(nodes);
+    }
+
+    public int size() {
+        return placements.size();
+    }
+
+    public Map<String, Set<String>> snapshot() {
+        Map<String, Set<String>> copy = new HashMap<>();
+        placements.forEach((key, nodes) -> copy.put(key, new HashSet<>(nodes)));
+        return copy;
+    }
+
+    // --- Mutations ---
+
+    public synchronized void put(String key, Collection<String> nodes) {
+        append(OP_PUT, key, nodes);
+        Set<String> replicas = ConcurrentHashMap.newKeySet();
+        replicas.addAll(nodes);
+        placements.put(key, replicas);
+    }
+
+    public synchronized void add(String key, String node) {
+        append(OP_ADD, key, List.of(node));
+        placements.computeIfAbsent(key, k -> ConcurrentHashMap.newKeySet()).add(node);
+    }
+
+    public synchronized void remove(String key, String node) {
+        append(OP_REMOVE, key, List.of(node));
+        removeFromMap(key, node);
+    }
+
+    /**
+     * Replaces the placements of the nodes in {@code reportedNodes} with what they
+     * reported ({@code observed}: key -> nodes storing it). Entries of nodes that did
+     * not answer are kept. The result is written as a fresh snapshot in the background.
+     */
+    public synchronized void reconcile(Map<String, Set<String>> observed, Set<String> reportedNodes) {
+        for (Iterator<Map.Entry<String, Set<String>>> it = placements.entrySet().iterator(); it.hasNext(); ) {
+            Map.Entry<String, Set<String>> entry = it.next();
+            entry.getValue().removeAll(reportedNodes);
+            if (entry.getValue().isEmpty() && !observed.containsKey(entry.getKey())) {
+                it.remove();
+            }
+        }
+        observed.forEach((key, nodes) ->
+                placements.computeIfAbsent(key, k -> ConcurrentHashMap.newKeySet()).addAll(nodes));
+        compact();
+    }
+
+    /**
+     * Switches the log to a new generation and queues a snapshot of the map on the
+     * background thread; the returned future completes once it is on disk and the
+     * older generations are deleted. Snapshots run one at a time, in order.
+     */
+    public synchronized Future<?> compact() {
+        if (dir == null || snapshotter.isShutdown()) return CompletableFuture.completedFuture(null);
+        long replayFrom = generation + 1;
+        try {
+            generation = replayFrom;
+            openLog();
+        } catch (IOException e) {
+            log.error("Failed to start placement log generation {}: {}", replayFrom, e.getMessage());
+            return CompletableFuture.completedFuture(null);
+        }
+        pendingSnapshot = snapshotter.submit(() -> {
+            long start = System.nanoTime();
+            try {
+                int keys = writeSnapshot(replayFrom);
+                deleteLogsBefore(replayFrom);
+                log.info("Compacted replication map: {} keys in {} ms", keys, (System.nanoTime() - start) / 1_000_000);
+            } catch (IOException e) {
+                // The older generations are kept, recovery just replays more of them
+                log.error("Failed to compact the replication map: {}", e.getMessage());
+            }
+        });
+        return pendingSnapshot;
+    }
+
+    private void removeFromMap(String key, String node) {
+        placements.computeIfPresent(key, (k, nodes) -> {
+            nodes.remove(node);
+            return nodes.isEmpty() ? null : nodes;
+        });
+    }
+
+    // --- Log ---
+
+    private Path logPath(long gen) {
+        return dir.resolve(LOG_FILE + "." + gen);
+    }
+
+    /**
+     * Generations of the log files in the directory, oldest first.
+     */
+    private List<Long> logGenerations() throws IOException {
+        List<Long> generations = new ArrayList<>();
+        try (DirectoryStream<Path> files = Files.newDirectoryStream(dir, LOG_FILE + ".*")) {
+            for (Path file : files) {
+                String suffix = file.getFileName().toString().substring(LOG_FILE.length() + 1);
+                if (!suffix.isEmpty() && suffix.chars().allMatch(Character::isDigit)) {
+                    generations.add(Long.parseLong(suffix));
+                }
+            }
+        }
+        Collections.sort(generations);
+        return generations;
+    }
+
+    private void deleteLogsBefore(long replayFrom) throws IOException {
+        for (long gen : logGenerations()) {
+            if (gen < replayFrom) {
+                Files.deleteIfExists(logPath(gen));
+            }
+        }
+    }
+
+    private void openLog() throws IOException {
+        closeLog();
+        logFile = new FileOutputStream(logPath(generation).toFile(), true);
+        logOut = new DataOutputStream(new BufferedOutputStream(logFile));
+        logRecords = 0;
+    }
+
+    private void closeLog() throws IOException {
+        if (logOut != null) {
+            logOut.close();
+            logOut = null;
+        }
+    }
+
+    private void append(byte op, String key, Collection<String> nodes) {
+        if (logOut == null) return;
+        try {
+            logOut.writeByte(op);
+            logOut.writeUTF(key);
+            if (op == OP_PUT) {
+                logOut.writeShort(nodes.size());
+            }
+            for (String node : nodes) {
+                logOut.writeUTF(node);
+            }
+            logOut.flush();
+            if (config.isFsync()) {
+                logFile.getFD().sync();
+            }
+        } catch (IOException e) {
+            log.error("Failed to append placement change for key '{}': {}", key, e.getMessage());
+            return;
+        }
+        // While a snapshot is still being written, keep appending to this generation
+        if (++logRecords >= config.getSnapshotInterval() && pendingSnapshot.isDone()) {
+            compact();
+        }
+    }
+
+    /**
+     * Applies one log generation to the map. Returns false if it ended in a torn record.
+     */
+    private boolean replayLog(Path logPath) throws IOException {
+        try (DataInputStream in = new DataInputStream(new BufferedInputStream(Files.newInputStream(logPath), 1 << 16))) {
+            while (true) {
+                int op = in.read();
+                if (op < 0) return true;
+                String key = in.readUTF();
+                switch (op) {
+                    case OP_PUT -> {
+                        int count = in.readUnsignedShort();
+                        Set<String> nodes = ConcurrentHashMap.newKeySet();
+                        for (int i = 0; i < count; i++) {
+                            nodes.add(in.readUTF());
+                        }
+                        placements.put(key, nodes);
+                    }
+                    case OP_ADD -> placements.computeIfAbsent(key, k -> ConcurrentHashMap.newKeySet()).add(in.readUTF());
+                    case OP_REMOVE -> removeFromMap(key, in.readUTF());
+                    default -> {
+                        log.warn("Unknown placement log record {} after {} records, ignoring the rest", op, logRecords);
+                        return false;
+                    }
+                }
+                logRecords++;
+            }
+        } catch (EOFException | UTFDataFormatException e) {
+            log.warn("Placement log ends in a partial record after {} records, ignoring it", logRecords);
+            return false;
+        }
+    }
+
+    // --- Snapshot ---
+
+    /**
+     * Writes the map to a new snapshot covering the log generations before
+     * {@code replayFrom}; returns the number of keys written. Runs while mutations
+     * continue, so the entry count and the node table are not known up front: each
+     * entry is preceded by a marker byte, and a node URL is written in full the
+     * first time it is referenced (as the next unused index), by index after that.
+     */
+    private int writeSnapshot(long replayFrom) throws IOException {
+        Map<String, Integer> nodeIndex = new HashMap<>();
+        int keys = 0;
+        Path tmp = dir.resolve(SNAPSHOT_FILE + ".tmp");
+        try (FileOutputStream file = new FileOutputStream(tmp.toFile());
+             DataOutputStream out = new DataOutputStream(new BufferedOutputStream(file, 1 << 16))) {
+            out.writeInt(SNAPSHOT_MAGIC);
+            out.writeLong(replayFrom);
+            for (Map.Entry<String, Set<String>> entry : placements.entrySet()) {
+                List<String> nodes = new ArrayList<>(entry.getValue());
+                out.writeByte(1);
+                out.writeUTF(entry.getKey());
+                out.writeShort(nodes.size());
+                for (String node : nodes) {
+                    Integer index = nodeIndex.get(node);
+                    if (index != null) {
+                        out.writeShort(index);
+                    } else {
+                        out.writeShort(nodeIndex.size());
+                        out.writeUTF(node);
+                        nodeIndex.put(node, nodeIndex.size());
+                    }
+                }
+                keys++;
+            }
+            out.writeByte(0);
+            out.flush();
+            file.getFD().sync();
+        }
+        Files.move(tmp, dir.resolve(SNAPSHOT_FILE), StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+        return keys;
+    }
+
+    /**
+     * Loads a snapshot into the map; returns the first log generation it does not cover.
+     */
+    private long readSnapshot(Path snapshot) throws IOException {
+        try (DataInputStream in = new DataInputStream(new BufferedInputStream(Files.newInputStream(snapshot), 1 << 16))) {
+            if (in.readInt() != SNAPSHOT_MAGIC) {
+                throw new IOException("Not a placement snapshot: " + snapshot);
+            }
+            long replayFrom = in.readLong();
+            List<String> nodes = new ArrayList<>();
+            while (in.readByte() != 0) {
+                String key = in.readUTF();
+                int count = in.readUnsignedShort();
+                Set<String> replicas = ConcurrentHashMap.newKeySet();
+                for (int j = 0; j < count; j++) {
+                    int index = in.readUnsignedShort();
+                    if (index == nodes.size()) {
+                        nodes.add(in.readUTF());
+                    } else if (index > nodes.size()) {
+                        throw new IOException("Corrupt placement snapshot: node " + index + " used before it is defined");
+                    }
+                    replicas.add(nodes.get(index));
+                }
+                placements.put(key, replicas);
+            }
+            return replayFrom;
+        }
+    }
+}
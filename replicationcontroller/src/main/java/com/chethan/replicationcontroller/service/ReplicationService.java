@@ -1,20 +1,31 @@
 package com.chethan.replicationcontroller.service;
 
 import com.chethan.replicationcontroller.config.ClusterConfig;
+import com.chethan.replicationcontroller.config.PlacementConfig;
 import com.chethan.replicationcontroller.dto.ClientReadResponse;
+import com.chethan.replicationcontroller.dto.NodeMetric;
 import com.chethan.replicationcontroller.dto.NodeReadResponse;
+import jakarta.annotation.PostConstruct;
 import lombok.extern.slf4j.Slf4j;
 import org.springframework.beans.factory.annotation.Autowired;
 import org.springframework.stereotype.Service;
 
-import java.util.Collections;
+import java.util.ArrayList;
+import java.util.HashMap;
 import java.util.HashSet;
+import java.util.List;
+import java.util.Map;
 import java.util.Set;
-import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.CompletableFuture;
 @Slf4j
 @Service
 public class ReplicationService {
-    private final ConcurrentHashMap<String, Set<String>> replicationMap = new ConcurrentHashMap<>();
+    // Durable key -> node URLs map, recovered from disk before this service starts
+    @Autowired
+    private PlacementStore replicationMap;
+
+    @Autowired
+    private PlacementConfig placementConfig;
 
     @Autowired
     private ClusterConfig clusterConfig;
@@ -22,25 +33,69 @@ public class ReplicationService {
     @Autowired
     private NodeClientService nodeClientService;
 
+    /**
+     * Runs before the controller serves traffic. Without a recovered map (first
+     * start, lost volume) the placements are rebuilt from what the nodes store,
+     * so reads are routed correctly right away instead of after the next write.
+     */
+    @PostConstruct
+    public void recoverPlacements() {
+        if (!replicationMap.isRecovered() || placementConfig.isReconcileOnStartup()) {
+            reconcileWithNodes();
+        }
+    }
+
+    /**
+     * Asks every node for its metrics in parallel and resets the placements of
+     * the nodes that answered to the keys they report as stored.
+     */
+    public void reconcileWithNodes() {
+        long start = System.nanoTime();
+        List<String> nodes = clusterConfig.getNodes();
+        List<CompletableFuture<NodeMetric>> responses = nodes.stream()
+                .map(nodeUrl -> CompletableFuture.supplyAsync(() -> nodeClientService.getMetrics(nodeUrl)))
+                .toList();
+
+        Map<String, Set<String>> observed = new HashMap<>();
+        Set<String> reported = new HashSet<>();
+        for (int i = 0; i < nodes.size(); i++) {
+            NodeMetric metrics = responses.get(i).join();
+            if (metrics == null || metrics.getKeyMetrics() == null) continue;
+            String nodeUrl = nodes.get(i);
+            reported.add(nodeUrl);
+            metrics.getKeyMetrics().forEach((key, metric) -> {
+                if (metric.isStored()) {
+                    observed.computeIfAbsent(key, k -> new HashSet<>()).add(nodeUrl);
+                }
+            });
+        }
+        replicationMap.reconcile(observed, reported);
+        log.info("Reconciled replication map with {}/{} nodes: {} keys in {} ms",
+                reported.size(), nodes.size(), replicationMap.size(), (System.nanoTime() - start) / 1_000_000);
+    }
+
     /**
      * Handles a write request based on the static replication policy.
      * Policy: Replicate to all nodes.
      */
     public void handleWrite(String key, String value) {
         // For each node in the cluster, send a replicate command
+        List<String> accepted = new ArrayList<>();
         for (String nodeUrl : clusterConfig.getNodes()) {
-            nodeClientService.replicateData(nodeUrl, key, value);
+            if (nodeClientService.replicateData(nodeUrl, key, value)) {
+                accepted.add(nodeUrl);
+            }
         }
 
-        // After successfully commanding all nodes, update our internal map
-        replicationMap.put(key, new HashSet<>(clusterConfig.getNodes()));
+        // Only the nodes that stored it (a full node rejects the write) hold the key now
+        replicationMap.put(key, accepted);
     }
 
     /**
      * Returns the set of nodes where a key is replicated.
      */
     public Set<String> getNodesForKey(String key) {
-        return replicationMap.getOrDefault(key, Collections.emptySet());
+        return replicationMap.nodesFor(key);
     }
 
     /**
@@ -91,16 +146,18 @@ public class ReplicationService {
 
             // We need to update the NodeClientService to handle this more complex replication
             // For now, let's assume a simplified 'put' command for the agent's action
-            nodeClientService.replicateData(targetNodeUrl, key, "agent-replicated-value"); // Value is a placeholder
+            boolean stored = nodeClientService.replicateData(targetNodeUrl, key, "agent-replicated-value"); // Value is a placeholder
 
-            // Update the replication map
-            getNodesForKey(key).add(targetNodeUrl);
+            // Update the replication map, unless the node had no room for it
+            if (stored) {
+                replicationMap.add(key, targetNodeUrl);
+            }
 
         }
         else if ("EVICT".equalsIgnoreCase(actionType)) {
             nodeClientService.evictData(targetNodeUrl, key);
             // Update the replication map
-            getNodesForKey(key).remove(targetNodeUrl);
+            replicationMap.remove(key, targetNodeUrl);
         }
     }
 }
\ No newline at end of file
@@ -0,0 +1,122 @@
+package com.chethan.replicationcontroller.service;
+
+import com.chethan.replicationcontroller.dto.KeyMetric;
+import com.chethan.replicationcontroller.dto.NodeMetric;
+
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.charset.StandardCharsets;
+import java.util.Collection;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.stream.Collectors;
+
+/**
+ * Columnar binary encoding of /rl/system-state, served when the client sends
+ * {@code Accept: application/x-replication-state}. Key names are sent once in
+ * a dictionary and every per-node metric becomes a fixed-width column, so the
+ * agent maps the arrays straight into numpy without parsing.
+ *
+ * Layout (little-endian):
+ * <pre>
+ *   "RSv2" | u32 nodes N | u32 keys K | u32 count width (4 or 8) | u32 node blob len | u32 key blob len
+ *   node ids, NUL separated UTF-8 | key names, NUL separated UTF-8 | zero padding to 8 bytes
+ *   f64 storageCost[N] | f64 storagePrice[N] | i64 capacityBytes[N] | i64 storedBytes[N]
+ *   int readCount[N*K] | int writeCount[N*K] | int sizeBytes[N*K]   (node-major, int32 or int64)
+ *   u8 flags[N*K]                                                   (bit 0: stored, bit 1: reported by the node)
+ * </pre>
+ * Version 1 had only the storageCost column and no sizes; the Python decoder reads both.
+ * Keys are numbered in the order they first appear across the nodes, the same
+ * order the JSON-based parser in common/reward_model.py produces.
+ */
+public final class StateEncoder {
+
+    public static final String MEDIA_TYPE = "application/x-replication-state";
+
+    public static final int HEADER_BYTES = 24;
+    public static final byte FLAG_STORED = 1;
+    public static final byte FLAG_REPORTED = 2;
+
+    private static final byte[] MAGIC = "RSv2".getBytes(StandardCharsets.US_ASCII);
+
+    private StateEncoder() {
+    }
+
+    public static byte[] encode(List<NodeMetric> nodes) {
+        Map<String, Integer> keyIndex = new LinkedHashMap<>();
+        long maxCount = 0;
+        for (NodeMetric node : nodes) {
+            if (node.getKeyMetrics() == null) continue;
+            for (Map.Entry<String, KeyMetric> entry : node.getKeyMetrics().entrySet()) {
+                keyIndex.putIfAbsent(entry.getKey(), keyIndex.size());
+                KeyMetric metric = entry.getValue();
+                maxCount = Math.max(maxCount, Math.max(metric.getReadCount(), metric.getWriteCount()));
+                maxCount = Math.max(maxCount, metric.getSizeBytes());
+            }
+        }
+
+        int numNodes = nodes.size();
+        int numKeys = keyIndex.size();
+        // Counters are longs, but almost always fit 32 bits: halve the columns when they do
+        int countBytes = maxCount <= Integer.MAX_VALUE ? 4 : 8;
+        byte[] nodeBlob = join(nodes.stream().map(NodeMetric::getNodeId).collect(Collectors.toList()));
+        byte[] keyBlob = join(keyIndex.keySet());
+
+        int dictEnd = HEADER_BYTES + nodeBlob.length + keyBlob.length;
+        int costsAt = (dictEnd + 7) / 8 * 8;
+        long cells = (long) numNodes * numKeys;
+        long size = costsAt + 4 * 8L * numNodes + 3 * cells * countBytes + cells;
+        if (size > Integer.MAX_VALUE) {
+            throw new IllegalStateException("System state too large for one binary response: " + size + " bytes");
+        }
+
+        ByteBuffer buf = ByteBuffer.allocate((int) size).order(ByteOrder.LITTLE_ENDIAN);
+        buf.put(MAGIC).putInt(numNodes).putInt(numKeys).putInt(countBytes)
+                .putInt(nodeBlob.length).putInt(keyBlob.length);
+        buf.put(nodeBlob).put(keyBlob);
+        buf.position(costsAt);
+        for (NodeMetric node : nodes) {
+            buf.putDouble(node.getStorageCost());
+        }
+        for (NodeMetric node : nodes) {
+            buf.putDouble(node.getStoragePrice());
+        }
+        for (NodeMetric node : nodes) {
+            buf.putLong(node.getCapacityBytes());
+        }
+        for (NodeMetric node : nodes) {
+            buf.putLong(node.getStoredBytes());
+        }
+
+        int readsAt = buf.position();
+        int writesAt = readsAt + (int) cells * countBytes;
+        int sizesAt = writesAt + (int) cells * countBytes;
+        int flagsAt = sizesAt + (int) cells * countBytes;
+        for (int i = 0; i < numNodes; i++) {
+            Map<String, KeyMetric> keyMetrics = nodes.get(i).getKeyMetrics();
+            if (keyMetrics == null) continue;
+            for (Map.Entry<String, KeyMetric> entry : keyMetrics.entrySet()) {
+                int cell = i * numKeys + keyIndex.get(entry.getKey());
+                KeyMetric metric = entry.getValue();
+                putCount(buf, readsAt + cell * countBytes, metric.getReadCount(), countBytes);
+                putCount(buf, writesAt + cell * countBytes, metric.getWriteCount(), countBytes);
+                putCount(buf, sizesAt + cell * countBytes, metric.getSizeBytes(), countBytes);
+                buf.put(flagsAt + cell, (byte) (FLAG_REPORTED | (metric.isStored() ? FLAG_STORED : 0)));
+            }
+        }
+        return buf.array();
+    }
+
+    private static void putCount(ByteBuffer buf, int index, long value, int countBytes) {
+        if (countBytes == 4) {
+            buf.putInt(index, (int) value);
+        } else {
+            buf.putLong(index, value);
+        }
+    }
+
+    private static byte[] join(Collection<String> names) {
+        return String.join("\0", names).getBytes(StandardCharsets.UTF_8);
+    }
+}
@@ -0,0 +1,148 @@
+package com.chethan.replicationcontroller;
+
+import com.chethan.replicationcontroller.config.PlacementConfig;
+import com.chethan.replicationcontroller.service.PlacementStore;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.StandardOpenOption;
+import java.time.Duration;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+import java.util.concurrent.Future;
+
+import static org.junit.jupiter.api.Assertions.*;
+
+class PlacementStoreTest {
+
+    private static final List<String> NODES = List.of("http://replication-us:8080", "http://replication-eu:8080",
+            "http://replication-ap:8080");
+
+    private static final Duration RECOVERY_BOUND = Duration.ofSeconds(10);
+
+    @TempDir
+    Path dir;
+
+    private PlacementStore open(int snapshotInterval) throws IOException {
+        PlacementConfig config = new PlacementConfig();
+        config.setDir(dir.toString());
+        config.setSnapshotInterval(snapshotInterval);
+        PlacementStore store = new PlacementStore(config);
+        store.open();
+        return store;
+    }
+
+    @Test
+    void testRecoversFromLogTail() throws IOException {
+        PlacementStore store = open(1000);
+        assertFalse(store.isRecovered());
+        store.put("a", NODES);
+        store.remove("a", NODES.get(0));
+        store.add("b", NODES.get(2));
+        store.add("c", NODES.get(1));
+        store.remove("c", NODES.get(1));
+        Map<String, Set<String>> expected = store.snapshot();
+        store.close();
+
+        PlacementStore recovered = open(1000);
+        assertTrue(recovered.isRecovered());
+        assertEquals(expected, recovered.snapshot());
+        assertEquals(Set.of(NODES.get(1), NODES.get(2)), recovered.nodesFor("a"));
+        assertTrue(recovered.nodesFor("c").isEmpty());
+    }
+
+    @Test
+    void testCompactionKeepsStateAndDeletesOldLogs() throws IOException {
+        PlacementStore store = open(10);
+        for (int i = 0; i < 25; i++) {
+            store.put("key" + i, NODES.subList(0, 1 + i % NODES.size()));
+        }
+        store.remove("key3", NODES.get(0));
+        Map<String, Set<String>> expected = store.snapshot();
+        store.close();
+
+        // The first 10 records moved to a snapshot and their log was deleted
+        assertTrue(Files.exists(dir.resolve("placement.snapshot")));
+        assertFalse(Files.exists(dir.resolve("placement.log.0")));
+        PlacementStore recovered = open(10);
+        assertEquals(expected, recovered.snapshot());
+        recovered.close();
+    }
+
+    @Test
+    void testRecoversChangesMadeDuringSnapshot() throws Exception {
+        PlacementStore store = open(1_000_000);
+        for (int i = 0; i < 20_000; i++) {
+            store.put("key" + i, NODES);
+        }
+        Future<?> snapshot = store.compact();
+        // Racing the background snapshot: some of these land in it, all of them in the new log
+        for (int i = 0; i < 20_000; i++) {
+            store.remove("key" + i, NODES.get(i % NODES.size()));
+            store.add("extra" + i, NODES.get(0));
+        }
+        snapshot.get();
+        Map<String, Set<String>> expected = store.snapshot();
+
+        // Reopened without closing, as after a crash
+        PlacementStore recovered = open(1_000_000);
+        assertEquals(expected, recovered.snapshot());
+        recovered.close();
+        store.close();
+    }
+
+    @Test
+    void testIgnoresTornRecord() throws IOException {
+        PlacementStore store = open(1000);
+        store.put("a", NODES);
+        store.close();
+        // A crash in the middle of an append: op byte plus half a key
+        Files.write(dir.resolve("placement.log.0"), new byte[]{2, 0, 9, 'k'}, StandardOpenOption.APPEND);
+
+        PlacementStore recovered = open(1000);
+        assertEquals(Set.copyOf(NODES), recovered.nodesFor("a"));
+        recovered.add("b", NODES.get(0));
+        recovered.close();
+        // Later appends went to a new log file, so the torn record doesn't hide them
+        PlacementStore reopened = open(1000);
+        assertEquals(Set.of(NODES.get(0)), reopened.nodesFor("b"));
+        reopened.close();
+    }
+
+    @Test
+    void testReconcileKeepsNodesThatDidNotAnswer() throws IOException {
+        PlacementStore store = open(1000);
+        store.put("a", NODES);
+        store.put("b", List.of(NODES.get(0)));
+
+        // Only the first two nodes answered; the first no longer stores "a" and "b"
+        store.reconcile(Map.of("c", Set.of(NODES.get(0))), Set.of(NODES.get(0), NODES.get(1)));
+        assertEquals(Set.of(NODES.get(2)), store.nodesFor("a"));
+        assertTrue(store.nodesFor("b").isEmpty());
+        assertEquals(Set.of(NODES.get(0)), store.nodesFor("c"));
+        store.close();
+        PlacementStore recovered = open(1000);
+        assertEquals(store.snapshot(), recovered.snapshot());
+        recovered.close();
+    }
+
+    @Test
+    void testRecoversMillionKeys() throws IOException {
+        int numKeys = 1_000_000;
+        PlacementStore store = open(100_000);
+        for (int i = 0; i < numKeys; i++) {
+            store.put("user_profile_" + i, NODES.subList(0, 1 + i % NODES.size()));
+        }
+        store.close();
+
+        // Loose bound: catches recovery falling back to something far slower than snapshot + log tail
+        PlacementStore recovered = assertTimeout(RECOVERY_BOUND, () -> open(100_000));
+        assertEquals(numKeys, recovered.size());
+        assertEquals(Set.copyOf(NODES.subList(0, 2)), recovered.nodesFor("user_profile_999997"));
+        recovered.close();
+    }
+}
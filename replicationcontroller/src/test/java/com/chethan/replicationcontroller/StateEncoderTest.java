@@ -0,0 +1,95 @@
+package com.chethan.replicationcontroller;
+
+import com.chethan.replicationcontroller.dto.KeyMetric;
+import com.chethan.replicationcontroller.dto.NodeMetric;
+import com.chethan.replicationcontroller.service.StateEncoder;
+import org.junit.jupiter.api.Test;
+
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.charset.StandardCharsets;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+
+import static org.junit.jupiter.api.Assertions.*;
+
+class StateEncoderTest {
+
+    private static NodeMetric node(String nodeId, double storageCost, Map<String, KeyMetric> keyMetrics) {
+        NodeMetric node = new NodeMetric();
+        node.setNodeId(nodeId);
+        node.setStorageCost(storageCost);
+        node.setStoragePrice(storageCost / 2);
+        node.setCapacityBytes(1L << 20);
+        node.setStoredBytes(4096);
+        node.setKeyMetrics(keyMetrics);
+        return node;
+    }
+
+    @Test
+    void testEncodesDictionaryAndColumns() {
+        Map<String, KeyMetric> us = new LinkedHashMap<>();
+        us.put("a", new KeyMetric(5, 1, true, 120));
+        us.put("b", new KeyMetric(2, 0, false, 0));
+        Map<String, KeyMetric> eu = new LinkedHashMap<>();
+        eu.put("c", new KeyMetric(7, 3, true, 4000));
+        byte[] encoded = StateEncoder.encode(List.of(node("replication-us", 2.0, us), node("replication-eu", 1.5, eu)));
+
+        ByteBuffer buf = ByteBuffer.wrap(encoded).order(ByteOrder.LITTLE_ENDIAN);
+        assertEquals("RSv2", new String(encoded, 0, 4, StandardCharsets.US_ASCII));
+        assertEquals(2, buf.getInt(4));
+        assertEquals(3, buf.getInt(8));
+        assertEquals(4, buf.getInt(12));
+        int nodeBlob = buf.getInt(16);
+        int keyBlob = buf.getInt(20);
+        int at = StateEncoder.HEADER_BYTES;
+        assertEquals("replication-us\0replication-eu", new String(encoded, at, nodeBlob, StandardCharsets.UTF_8));
+        assertEquals("a\0b\0c", new String(encoded, at + nodeBlob, keyBlob, StandardCharsets.UTF_8));
+
+        int costsAt = (at + nodeBlob + keyBlob + 7) / 8 * 8;
+        assertEquals(2.0, buf.getDouble(costsAt));
+        assertEquals(1.5, buf.getDouble(costsAt + 8));
+        assertEquals(1.0, buf.getDouble(costsAt + 16));
+        assertEquals(0.75, buf.getDouble(costsAt + 24));
+        assertEquals(1L << 20, buf.getLong(costsAt + 32));
+        assertEquals(4096, buf.getLong(costsAt + 56));
+
+        int readsAt = costsAt + 4 * 16;
+        int writesAt = readsAt + 6 * 4;
+        int sizesAt = writesAt + 6 * 4;
+        int flagsAt = sizesAt + 6 * 4;
+        assertEquals(flagsAt + 6, encoded.length);
+        // Node-major cells: us -> (a, b, c), eu -> (a, b, c)
+        assertEquals(5, buf.getInt(readsAt));
+        assertEquals(2, buf.getInt(readsAt + 4));
+        assertEquals(7, buf.getInt(readsAt + 5 * 4));
+        assertEquals(3, buf.getInt(writesAt + 5 * 4));
+        assertEquals(120, buf.getInt(sizesAt));
+        assertEquals(0, buf.getInt(sizesAt + 4));
+        assertEquals(4000, buf.getInt(sizesAt + 5 * 4));
+        assertEquals(StateEncoder.FLAG_REPORTED | StateEncoder.FLAG_STORED, encoded[flagsAt]);
+        assertEquals(StateEncoder.FLAG_REPORTED, encoded[flagsAt + 1]);
+        assertEquals(0, encoded[flagsAt + 2]);
+        assertEquals(0, encoded[flagsAt + 3]);
+    }
+
+    @Test
+    void testWidensCountsPastInt32() {
+        Map<String, KeyMetric> us = new LinkedHashMap<>();
+        us.put("a", new KeyMetric(1L << 40, 0, true, 10));
+        byte[] encoded = StateEncoder.encode(List.of(node("replication-us", 0.0, us)));
+
+        ByteBuffer buf = ByteBuffer.wrap(encoded).order(ByteOrder.LITTLE_ENDIAN);
+        assertEquals(8, buf.getInt(12));
+        int costsAt = (StateEncoder.HEADER_BYTES + buf.getInt(16) + buf.getInt(20) + 7) / 8 * 8;
+        assertEquals(1L << 40, buf.getLong(costsAt + 4 * 8));
+        assertEquals(10, buf.getLong(costsAt + 4 * 8 + 2 * 8));
+    }
+
+    @Test
+    void testEmptyState() {
+        byte[] encoded = StateEncoder.encode(List.of());
+        assertEquals(StateEncoder.HEADER_BYTES, encoded.length);
+    }
+}
@@ -0,0 +1,203 @@
+"""
+Head-to-head comparison of every key count and policy in one figure.
+
+Finds evaluation_results_{policy}_{N}keys.json files (and seed repeats named
+evaluation_results_{policy}_{N}keys_seed{S}.json) in a directory and draws a
+grid: one row per key count, cost and latency columns, one line per policy.
+
+Files are streamed in chunks into NumPy columns (common/result_series.py),
+which are cached in <dir>/.plot_cache until the file changes, and nothing
+reaches matplotlib at full resolution:
+- one run: the raw trace, reduced to min/max per pixel bucket and drawn
+  faintly, a rolling mean drawn on top, and a rolling p10-p90 band;
+- several seeds: each run's rolling mean, interpolated onto a common grid,
+  drawn as the across-seed mean with a p10-p90 band.
+
+Usage:
+    cd results
+    python plot_comparison_all.py
+    python plot_comparison_all.py --window 60 --split
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from result_series import (DEFAULT_FIELDS, SHADOW_FIELDS, accounting_label, across_runs, downsample,
+                           rolling_mean, rolling_quantiles, load_series)
+
+FILE_PATTERN = re.compile(r"evaluation_results_(?P<policy>[a-z]+)_(?P<keys>\d+)keys(?:_seed(?P<seed>\d+))?\.json$")
+
+# Drawing order, labels and colours as in plot_comparison_compilation.py
+POLICIES = {
+    'static': ('Static Policy (Baseline)', dict(color='red', linestyle='--', linewidth=2, alpha=0.7)),
+    'mlp': ('MLP Agent (Fixed Vector)', dict(color='blue', linewidth=2, alpha=0.8)),
+    'gnn': ('GNN Agent (Graph Topology)', dict(color='green', linewidth=2.5)),
+    'shadow': ('Shadow Run (Live Policy)', dict(color='purple', linewidth=2)),
+}
+METRICS = [
+    ('total_cost', 'Total Storage Cost ($)', 'Cost'),
+    ('avg_latency', 'Average Read Latency (ms)', 'Latency'),
+]
+BAND = (0.1, 0.9)
+
+DEFAULT_WINDOW = 30  # records, about 30 s of evaluation
+DEFAULT_DPI = 200
+PANEL_INCHES = (8, 4.5)
+# Parsed columns per result file, reused until the file changes
+CACHE_DIR = '.plot_cache'
+
+
+def discover(directory):
+    """{key count: {policy: [paths]}} for the result files in `directory`."""
+    found = defaultdict(lambda: defaultdict(list))
+    for path in sorted(glob.glob(os.path.join(directory, 'evaluation_results_*.json'))):
+        match = FILE_PATTERN.search(os.path.basename(path))
+        if match:
+            found[int(match['keys'])][match['policy']].append(path)
+    return found
+
+
+def load_run(path, policy, cache_dir=None):
+    """(minutes, columns, accounting) for one result file, without rows lacking a time."""
+    fields = SHADOW_FIELDS if policy == 'shadow' else DEFAULT_FIELDS
+    columns, accounting = load_series(path, fields, cache_dir=cache_dir)
+    keep = ~np.isnan(columns['time'])
+    minutes = columns['time'][keep] / 60
+    order = np.argsort(minutes, kind='stable')
+    return minutes[order], {name: values[keep][order] for name, values in columns.items()}, accounting
+
+
+def policy_order(policies):
+    known = [p for p in POLICIES if p in policies]
+    return known + sorted(p for p in policies if p not in POLICIES)
+
+
+def draw_panel(ax, runs_by_policy, metric, window, points, method):
+    """Draws one metric for every policy of one key count; returns the number of points drawn."""
+    drawn = 0
+    for policy in policy_order(runs_by_policy):
+        runs = runs_by_policy[policy]
+        label, style = POLICIES.get(policy, (policy, dict(linewidth=2)))
+        line_style = dict(style)
+        alpha = line_style.pop('alpha', 1.0)
+
+        series = []
+        for minutes, columns, _ in runs:
+            y = columns[metric]
+            valid = ~np.isnan(y)
+            if valid.sum() >= 2:
+                series.append((minutes[valid], y[valid]))
+        if not series:
+            continue
+        # Legacy if any of the runs is
+        accounting = 'demand' if all(run[2] == 'demand' for run in runs) else None
+        label = accounting_label(accounting, label)
+
+        if len(series) == 1:
+            x, y = series[0]
+            raw_x, raw_y = downsample(x, y, points, method)
+            ax.plot(raw_x, raw_y, color=line_style.get('color'), linewidth=0.6, alpha=0.25 * alpha)
+            positions = np.unique(np.linspace(0, len(x) - 1, min(points, len(x))).astype(np.int64))
+            lo, hi = rolling_quantiles(y, window, BAND, positions)
+            ax.fill_between(x[positions], lo, hi, color=line_style.get('color'), alpha=0.12 * alpha, linewidth=0)
+            mean_x, mean_y = downsample(x, rolling_mean(y, window), points, 'lttb')
+            ax.plot(mean_x, mean_y, label=label, alpha=alpha, **line_style)
+            drawn += len(raw_x) + 2 * len(positions) + len(mean_x)
+        else:
+            smoothed = [(x, rolling_mean(y, window)) for x, y in series]
+            grid, mean, (lo, hi) = across_runs(smoothed, points, BAND)
+            ax.fill_between(grid, lo, hi, color=line_style.get('color'), alpha=0.15 * alpha, linewidth=0)
+            ax.plot(grid, mean, label=f"{label} (mean of {len(series)} runs)", alpha=alpha, **line_style)
+            drawn += 3 * len(grid)
+    return drawn
+
+
+def style_axes(ax, ylabel, title, fontsize=11):
+    ax.set_xlabel('Time (minutes)', fontsize=fontsize)
+    ax.set_ylabel(ylabel, fontsize=fontsize)
+    ax.set_title(title, fontsize=fontsize + 2, fontweight='bold')
+    ax.legend(fontsize=fontsize - 2, loc='best', frameon=True)
+    ax.grid(True, linestyle=':', alpha=0.6)
+
+
+def render(directory, output, window=DEFAULT_WINDOW, dpi=DEFAULT_DPI, method='minmax', split=False, cache_dir=None):
+    start = time.perf_counter()
+    found = discover(directory)
+    if not found:
+        print(f"No evaluation_results_<policy>_<N>keys.json files in '{directory}'.")
+        return None
+
+    runs = {}
+    records = 0
+    for keys, policies in found.items():
+        for policy, paths in policies.items():
+            runs[keys, policy] = [load_run(path, policy, cache_dir) for path in paths]
+            records += sum(len(run[0]) for run in runs[keys, policy])
+    loaded = time.perf_counter()
+    print(f"Loaded {sum(len(r) for r in runs.values())} runs ({records} records) in {loaded - start:.2f}s")
+
+    plt.style.use('seaborn-v0_8-whitegrid')
+    key_counts = sorted(found)
+    # About one point per pixel column of a panel
+    points = int(PANEL_INCHES[0] * dpi)
+    fig, axes = plt.subplots(len(key_counts), len(METRICS), squeeze=False,
+                             figsize=(PANEL_INCHES[0] * len(METRICS), PANEL_INCHES[1] * len(key_counts)))
+    drawn = 0
+    for row, keys in enumerate(key_counts):
+        runs_by_policy = {policy: runs[keys, policy] for policy in found[keys]}
+        for col, (metric, ylabel, name) in enumerate(METRICS):
+            ax = axes[row][col]
+            drawn += draw_panel(ax, runs_by_policy, metric, window, points, method)
+            style_axes(ax, ylabel, f"{name}: {keys} keys")
+    fig.suptitle('GNN vs. MLP vs. Static', fontsize=16, fontweight='bold')
+    fig.tight_layout()
+    fig.savefig(output, dpi=dpi)
+    plt.close(fig)
+    print(f"Saved {len(key_counts)}x{len(METRICS)} grid ({drawn} points drawn) to: {output}")
+
+    if split:
+        for keys in key_counts:
+            runs_by_policy = {policy: runs[keys, policy] for policy in found[keys]}
+            for metric, ylabel, name in METRICS:
+                fig, ax = plt.subplots(figsize=(12, 7))
+                draw_panel(ax, runs_by_policy, metric, window, int(12 * dpi), method)
+                style_axes(ax, ylabel, f"{name}: GNN vs. MLP vs. Static ({keys} keys)", fontsize=13)
+                path = os.path.join(os.path.dirname(output), f"final_comparison_{name.lower()}_{keys}keys.png")
+                fig.savefig(path, dpi=dpi)
+                plt.close(fig)
+                print(f"Saved {path}")
+
+    print(f"Rendered in {time.perf_counter() - loaded:.2f}s, {time.perf_counter() - start:.2f}s in total")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot all evaluation results as one key-count x metric grid.")
+    parser.add_argument("--dir", type=str, default=".",
+                        help="Directory holding the evaluation_results_*.json files.")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Grid image path. Defaults to final_comparison_grid.png in --dir.")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="Rolling mean / quantile window, in records.")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--method", choices=["minmax", "lttb"], default="minmax",
+                        help="Downsampling of the raw traces.")
+    parser.add_argument("--split", action="store_true",
+                        help="Also write final_comparison_{cost,latency}_{N}keys.png per key count.")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Parse every file instead of reusing columns cached in <dir>/.plot_cache.")
+    args = parser.parse_args()
+
+    render(args.dir, args.output or os.path.join(args.dir, 'final_comparison_grid.png'),
+           window=args.window, dpi=args.dpi, method=args.method, split=args.split,
+           cache_dir=None if args.no_cache else os.path.join(args.dir, CACHE_DIR))
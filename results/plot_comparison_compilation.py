@@ -1,33 +1,42 @@
-import json
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from result_series import accounting_label, downsample, load_series
 
 # --- Configuration: File Names ---
 FILE_STATIC = 'evaluation_results_static_20keys.json'
 FILE_MLP = 'evaluation_results_mlp_20keys.json'
 FILE_GNN = 'evaluation_results_gnn_20keys.json'
 
+# Points per curve: about one per pixel column of a 12 in figure at 300 dpi
+PLOT_POINTS = 3600
+
 def load_data(filepath):
-    """Safe loading of JSON data."""
+    """Safe, chunked loading of a results file as (columns, accounting)."""
     if not os.path.exists(filepath):
         print(f"WARNING: File '{filepath}' not found. Skipping.")
         return None
     try:
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        return load_series(filepath)
     except Exception as e:
         print(f"ERROR reading '{filepath}': {e}")
         return None
 
 def extract_metrics(data):
-    """Helper to get X (minutes) and Y (metric) lists."""
-    if not data: return [], [], []
-    
+    """
+    Helper to get X (minutes) and Y (metric) arrays for latency and cost.
+    Each is min/max-downsampled on its own, so each gets its own X.
+    """
+    if not data: return [], [], [], []
+    columns = data[0]
+
     # Convert seconds to minutes for X-axis
-    time_mins = [item['time'] / 60 for item in data]
-    latency = [item['avg_latency'] for item in data]
-    cost = [item['total_cost'] for item in data]
-    return time_mins, latency, cost
+    time_mins = columns['time'] / 60
+    t_lat, latency = downsample(time_mins, columns['avg_latency'], PLOT_POINTS)
+    t_cost, cost = downsample(time_mins, columns['total_cost'], PLOT_POINTS)
+    return t_lat, latency, t_cost, cost
 
 def plot_comparison():
     # 1. Load Data
@@ -37,9 +46,9 @@ def plot_comparison():
     gnn_data = load_data(FILE_GNN)
 
     # 2. Extract Vectors
-    t_static, lat_static, cost_static = extract_metrics(static_data)
-    t_mlp, lat_mlp, cost_mlp = extract_metrics(mlp_data)
-    t_gnn, lat_gnn, cost_gnn = extract_metrics(gnn_data)
+    t_lat_static, lat_static, t_cost_static, cost_static = extract_metrics(static_data)
+    t_lat_mlp, lat_mlp, t_cost_mlp, cost_mlp = extract_metrics(mlp_data)
+    t_lat_gnn, lat_gnn, t_cost_gnn, cost_gnn = extract_metrics(gnn_data)
 
     # Use a clean style
     plt.style.use('seaborn-v0_8-whitegrid')
@@ -48,17 +57,17 @@ def plot_comparison():
 
     # Static (Baseline) - Red Dashed
     if static_data:
-        ax1.plot(t_static, cost_static, label='Static Policy (Baseline)', 
+        ax1.plot(t_cost_static, cost_static, label=accounting_label(static_data[1], 'Static Policy (Baseline)'), 
                  color='red', linestyle='--', linewidth=2, alpha=0.7)
 
     # MLP (Vector Based) - Blue
     if mlp_data:
-        ax1.plot(t_mlp, cost_mlp, label='MLP Agent (Fixed Vector)', 
+        ax1.plot(t_cost_mlp, cost_mlp, label=accounting_label(mlp_data[1], 'MLP Agent (Fixed Vector)'), 
                  color='blue', linewidth=2, alpha=0.8)
 
     # GNN (Graph Based) - Green (The "Hero" color)
     if gnn_data:
-        ax1.plot(t_gnn, cost_gnn, label='GNN Agent (Graph Topology)', 
+        ax1.plot(t_cost_gnn, cost_gnn, label=accounting_label(gnn_data[1], 'GNN Agent (Graph Topology)'), 
                  color='green', linewidth=2.5)
 
     ax1.set_xlabel('Time (minutes)', fontsize=13)
@@ -76,17 +85,17 @@ def plot_comparison():
 
     # Static (Baseline)
     if static_data:
-        ax2.plot(t_static, lat_static, label='Static Policy (Baseline)', 
+        ax2.plot(t_lat_static, lat_static, label=accounting_label(static_data[1], 'Static Policy (Baseline)'), 
                  color='red', linestyle='--', linewidth=2, alpha=0.7)
 
     # MLP Agent
     if mlp_data:
-        ax2.plot(t_mlp, lat_mlp, label='MLP Agent (Fixed Vector)', 
+        ax2.plot(t_lat_mlp, lat_mlp, label=accounting_label(mlp_data[1], 'MLP Agent (Fixed Vector)'), 
                  color='blue', linewidth=2, alpha=0.8)
 
     # GNN Agent
     if gnn_data:
-        ax2.plot(t_gnn, lat_gnn, label='GNN Agent (Graph Topology)', 
+        ax2.plot(t_lat_gnn, lat_gnn, label=accounting_label(gnn_data[1], 'GNN Agent (Graph Topology)'), 
                  color='green', linewidth=2.5)
 
     ax2.set_xlabel('Time (minutes)', fontsize=13)
@@ -3,8 +3,12 @@ from ray.rllib.algorithms.algorithm import Algorithm
 from ray.rllib.models import ModelCatalog
 from gnn_environment import ReplicationEnvGNN
 from gnn_model import ReplicationGNN
+from obs_pipeline import pipeline_path
+from placement_guard import add_guard_arguments, guard_config
+from reward_model import ACCOUNTING_VERSION
 from ray import tune
 import numpy as np
+import argparse
 import time
 import json
 import os
@@ -13,7 +17,7 @@ import os
 CHECKPOINT_PATH = os.path.abspath("./manual_checkpoints")
 EVAL_DURATION_MINUTES = 60
 
-def run_evaluation():
+def run_evaluation(placement_guard=None):
     ray.init(ignore_reinit_error=True)
 
     tune.register_env("replication_gnn_env", lambda config: ReplicationEnvGNN(config))
@@ -22,7 +26,10 @@ def run_evaluation():
     print(f"Loading agent from: {CHECKPOINT_PATH}")
     agent = Algorithm.from_checkpoint(CHECKPOINT_PATH)
 
-    env = ReplicationEnvGNN()
+    # Frozen observation statistics saved by train.py, if the model was trained with them
+    pipeline_state = pipeline_path(CHECKPOINT_PATH)
+    env = ReplicationEnvGNN({"placement_guard": placement_guard,
+                             "obs_pipeline_state": pipeline_state if os.path.exists(pipeline_state) else None})
     obs, info = env.reset()
 
     results = []
@@ -38,36 +45,24 @@ def run_evaluation():
         # Execute in Env
         obs, reward, terminated, truncated, info = env.step(action)
         
-        # Log Metrics (Reusing logic from previous eval scripts)
+        # Log Metrics with the env's reward model (same latency/cost as training)
         # We fetch state directly to calculate metrics for the plot
         state_json = env._fetch_state()
         
-        total_cost = sum(n.get('storageCost', 0) for n in state_json)
-        # Calculate Latency (Simplified approximation for plotting)
-        total_reads = 0
-        lat_sum = 0
-        presence = {}
-        for n in state_json:
-            for k in n.get('keyMetrics', {}):
-                if k not in presence: presence[k] = set()
-                presence[k].add(n['nodeId'])
-        for n in state_json:
-            nid = n['nodeId']
-            for k, m in n.get('keyMetrics', {}).items():
-                r = m.get('readCount', 0)
-                total_reads += r
-                is_local = nid in presence.get(k, set())
-                lat_sum += r * (10 if is_local else 150)
-        
-        avg_lat = (lat_sum / total_reads) if total_reads > 0 else 0
+        avg_lat, total_cost = env.reward_model.state_metrics(state_json)
         
         elapsed = time.time() - start_time
-        print(f"Time: {int(elapsed)}s | Latency: {avg_lat:.1f}ms | Cost: ${total_cost:.1f} | Action: {action}")
+        placement = env.guard.stats()
+        print(f"Time: {int(elapsed)}s | Latency: {avg_lat:.1f}ms | Cost: ${total_cost:.1f} | Action: {action} | "
+              f"Executed: {placement['executed']} (thrash {placement['thrash']}, blocked {placement['blocked']})")
 
         results.append({
             "time": elapsed,
             "avg_latency": avg_lat,
-            "total_cost": total_cost
+            "total_cost": total_cost,
+            "accounting": ACCOUNTING_VERSION,
+            # Cumulative counts since the start of the run
+            "placement": placement
         })
         
         time.sleep(1)
@@ -77,4 +72,7 @@ def run_evaluation():
     print("Evaluation Complete. Results saved.")
 
 if __name__ == "__main__":
-    run_evaluation()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    add_guard_arguments(parser)
+    args = parser.parse_args()
+    run_evaluation(guard_config(args))
\ No newline at end of file
@@ -1,11 +1,22 @@
+import os
+import sys
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import requests
 import time
-from graph_utils import parse_system_state_to_graph
+from graph_utils import SERVER_FEATURES, IncrementalGraphState, parse_system_state_to_graph
 
-CONTROLLER_URL = "http://localhost:8080"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from factorized_actions import KeySharder
+from obs_pipeline import build_pipeline, load_pipelines
+from placement_guard import PlacementGuard
+from reward_model import RewardModel, state_to_arrays
+from state_codec import STATE_ACCEPT, STATE_MEDIA_TYPE, StateDecoder
+from telemetry import TELEMETRY
+
+# Overridable so runs can target a stand-in (common/standin_server.py) or another stack
+CONTROLLER_URL = os.environ.get("CONTROLLER_URL", "http://localhost:8080")
 
 LATENCY_WEIGHT = 0.1
 COST_WEIGHT = 0.9
@@ -13,18 +24,58 @@ COST_WEIGHT = 0.9
 MAX_KEYS = 25
 MAX_SERVERS = 10
 MAX_EDGES = MAX_KEYS * MAX_SERVERS
+# Actions 0..MAX_KEYS*MAX_SERVERS-1 toggle a (key, server) pair, the last one leaves the placement alone
+NOOP_ACTION = MAX_KEYS * MAX_SERVERS
+NUM_ACTIONS = NOOP_ACTION + 1
+
+def build_graph_obs(state_json, key_names):
+    """Padded observation dict for the given key window. Returns (obs, key_names)."""
+    x_k, x_s, e_i, e_a, k_names = parse_system_state_to_graph(state_json, key_names=key_names)
+
+    nk, ns = x_k.shape[0], x_s.shape[0]
+    ne = e_i.shape[1]
+
+    obs = {
+        "x_keys": np.pad(x_k, ((0, MAX_KEYS - nk), (0,0))),
+        "x_servers": np.pad(x_s, ((0, MAX_SERVERS - ns), (0,0))),
+        "edge_index": np.pad(e_i, ((0,0), (0, MAX_EDGES - ne)), constant_values=-1),
+        "edge_attr": np.pad(e_a, ((0, MAX_EDGES - ne), (0,0))),
+        "real_counts": np.array([nk, ns, ne], dtype=np.int32),
+        "action_mask": np.zeros(NUM_ACTIONS, dtype=np.float32)
+    }
+
+    if nk > 0 and ns > 0:
+        obs["action_mask"][:nk * ns] = 1.0
+    obs["action_mask"][NOOP_ACTION] = 1.0
+
+    return obs, k_names
 
 class ReplicationEnvGNN(gym.Env):
     def __init__(self, config=None):
-        self.action_space = spaces.Discrete(MAX_KEYS * MAX_SERVERS)
+        config = config or {}
+        self.action_space = spaces.Discrete(NUM_ACTIONS)
+
+        # Optional rate / normalization / frame-stack stages over the key and server
+        # node features (common/obs_pipeline.py). "obs_pipeline_state" loads the
+        # statistics saved with a trained model, frozen, for evaluation.
+        self.obs_pipelines = None
+        if config.get("obs_pipeline_state"):
+            self.obs_pipelines = load_pipelines(config["obs_pipeline_state"])
+        elif config.get("obs_pipeline"):
+            x_keys = build_pipeline(config["obs_pipeline"], 3, MAX_KEYS, num_counts=2)
+            if x_keys is not None:
+                self.obs_pipelines = {"x_keys": x_keys,
+                                      "x_servers": build_pipeline(config["obs_pipeline"], SERVER_FEATURES, MAX_SERVERS)}
+        key_dim, server_dim = (self.obs_pipelines["x_keys"].output_dim, self.obs_pipelines["x_servers"].output_dim) \
+            if self.obs_pipelines else (3, SERVER_FEATURES)
         
         self.observation_space = spaces.Dict({
-            "x_keys": spaces.Box(-np.inf, np.inf, shape=(MAX_KEYS, 3), dtype=np.float32),
-            "x_servers": spaces.Box(-np.inf, np.inf, shape=(MAX_SERVERS, 2), dtype=np.float32),
+            "x_keys": spaces.Box(-np.inf, np.inf, shape=(MAX_KEYS, key_dim), dtype=np.float32),
+            "x_servers": spaces.Box(-np.inf, np.inf, shape=(MAX_SERVERS, server_dim), dtype=np.float32),
             "edge_index": spaces.Box(-1, max(MAX_KEYS, MAX_SERVERS), shape=(2, MAX_EDGES), dtype=np.int64),
             "edge_attr": spaces.Box(-np.inf, np.inf, shape=(MAX_EDGES, 2), dtype=np.float32),
             "real_counts": spaces.Box(0, MAX_EDGES, shape=(3,), dtype=np.int32), 
-            "action_mask": spaces.Box(0, 1, shape=(MAX_KEYS * MAX_SERVERS,), dtype=np.float32)
+            "action_mask": spaces.Box(0, 1, shape=(NUM_ACTIONS,), dtype=np.float32)
         })
         
         self.current_key_names = []
@@ -36,21 +87,54 @@ class ReplicationEnvGNN(gym.Env):
             'replication-jp'
         ]
         
+        # The graph only ever holds a window of MAX_KEYS keys. With more than
+        # one shard the window rotates across the keyspace every step, so a
+        # single policy can manage any number of keys.
+        self.sharder = KeySharder(num_shards=config.get("num_shards", 1), window_size=MAX_KEYS)
+        # Keys fetched per state poll: the controller returns only the cluster-wide top-K
+        self.top_k = config.get("top_k", MAX_KEYS * self.sharder.num_shards)
+
+        # latency_matrix / storage_prices follow the node order of /rl/system-state
+        self.reward_model = RewardModel(LATENCY_WEIGHT, COST_WEIGHT,
+                                        latency_matrix=config.get("latency_matrix"),
+                                        storage_prices=config.get("storage_prices"))
+
+        # Patched in place every step; check_graph_every > 0 verifies it against a full rebuild
+        self.graph = IncrementalGraphState(MAX_KEYS, MAX_SERVERS, MAX_EDGES)
+        self.check_graph_every = config.get("check_graph_every", 0)
+        self._obs_count = 0
+
+        # Dwell time / action budgets (PlacementGuard arguments). Blocked pairs are
+        # masked out; the guard also counts executed, blocked and thrashing actions.
+        self.guard = PlacementGuard.from_config(config.get("placement_guard"))
+        self._state_decoder = StateDecoder()
+
         self.steps = 0
         self.max_steps = 200
 
     def reset(self, *, seed=None, options=None):
         self.steps = 0
+        for pipeline in (self.obs_pipelines or {}).values():
+            pipeline.reset()
         while True:
-            state_json = self._fetch_state()
-            has_keys = any(len(n.get('keyMetrics', {})) > 0 for n in state_json)
-            if has_keys: break
+            if len(self._fetch_state().key_names) > 0: break
             time.sleep(0.2)
         return self._get_obs(), {}
 
     def step(self, action):
+        with TELEMETRY.timer("env_step"):
+            obs, reward, terminated, truncated, info = self._step(action)
+        TELEMETRY.record("reward", reward)
+        return obs, reward, terminated, truncated, info
+
+    def _step(self, action):
         self.steps += 1
         truncated = (self.steps >= self.max_steps)
+        if int(action) == NOOP_ACTION:
+            self.sharder.advance()
+            obs = self._get_obs()
+            return obs, self._calculate_reward(self._last_state) / 20.0, False, truncated, {}
+
         num_servers = len(self.current_server_ids)
         key_idx = int(action) // num_servers
         server_idx = int(action) % num_servers
@@ -67,96 +151,128 @@ class ReplicationEnvGNN(gym.Env):
         target_node = self.current_server_ids[server_idx]
 
         # Determine Action Type
-        state_json = self._fetch_state()
+        state = self._fetch_state()
         exists = False
-        for node in state_json:
-            if target_node in node['nodeId'] or node['nodeId'] in target_node:
-                if target_key in node.get('keyMetrics', {}):
+        col = state.key_index.get(target_key)
+        for n, node_id in enumerate(state.node_ids):
+            if target_node in node_id or node_id in target_node:
+                if col is not None and state.presence[n, col]:
                     exists = True
                     break
         
         action_type = "EVICT" if exists else "REPLICATE"
         #print(f"[DEBUG] {target_key} on {target_node} Exists? {exists} -> Action: {action_type}")
         
-        try:
-            resp =requests.post(f"{CONTROLLER_URL}/rl/execute-action", 
-                          json={"actionType": action_type, "key": target_key, "targetNode": target_node}, 
-                          timeout=1)
-            time.sleep(0.01) 
-            
-        except Exception as e:
-            print(f"API ERROR: {e}")
+        # A blocked toggle is dropped, like the no-op
+        if self.guard.admit(action_type, target_key, target_node):
+            try:
+                with TELEMETRY.timer("http_action"):
+                    resp =requests.post(f"{CONTROLLER_URL}/rl/execute-action", 
+                                  json={"actionType": action_type, "key": target_key, "targetNode": target_node}, 
+                                  timeout=1)
+                time.sleep(0.01) 
+                
+            except Exception as e:
+                print(f"API ERROR: {e}")
 
+        self.sharder.advance()
         obs = self._get_obs()
         
         # Calculate Scaled Reward
         # Raw reward is usually around -16.0 (Safe) to -10.0 (Optimized)
         # We scale it down to keep gradients stable.
-        reward_raw = self._calculate_reward(self._last_state_json)
+        reward_raw = self._calculate_reward(self._last_state)
         reward_scaled = reward_raw / 20.0 
         
         return obs, reward_scaled, False, truncated, {}
 
     def _fetch_state(self):
+        """
+        The current state as StateArrays (empty if it couldn't be fetched). Asks
+        for the binary encoding; controllers without it answer JSON.
+        """
         try:
-            return requests.get(f"{CONTROLLER_URL}/rl/system-state", timeout=2).json()
-        except: return []
+            with TELEMETRY.timer("http_state"):
+                response = requests.get(f"{CONTROLLER_URL}/rl/system-state", params={"topK": self.top_k},
+                                        headers={"Accept": STATE_ACCEPT}, timeout=2)
+        except requests.exceptions.RequestException:
+            return state_to_arrays([])
+        if response.status_code == 400:
+            # top_k above the nodes' top-K capacity: a configuration error, not a blip
+            raise ValueError(f"System state rejected: {response.text}")
+        if response.headers.get("Content-Type", "").startswith(STATE_MEDIA_TYPE):
+            return self._state_decoder.decode(response.content)
+        try:
+            return state_to_arrays(response.json())
+        except ValueError:
+            return state_to_arrays([])
 
     def _get_obs(self):
-        state_json = self._fetch_state()
-        self._last_state_json = state_json
-        
-        x_k, x_s, e_i, e_a, k_names = parse_system_state_to_graph(state_json)
-        self.current_key_names = k_names
-        
-        nk, ns = x_k.shape[0], x_s.shape[0]
-        ne = e_i.shape[1]
-
-        obs = {
-            "x_keys": np.pad(x_k, ((0, MAX_KEYS - nk), (0,0))),
-            "x_servers": np.pad(x_s, ((0, MAX_SERVERS - ns), (0,0))),
-            "edge_index": np.pad(e_i, ((0,0), (0, MAX_EDGES - ne)), constant_values=-1),
-            "edge_attr": np.pad(e_a, ((0, MAX_EDGES - ne), (0,0))),
-            "real_counts": np.array([nk, ns, ne], dtype=np.int32),
-            "action_mask": np.zeros(MAX_KEYS * MAX_SERVERS, dtype=np.float32)
-        }
-        
-        if nk > 0 and ns > 0:
-            obs["action_mask"][:nk * ns] = 1.0
-        else:
-            obs["action_mask"][0] = 1.0 
+        # Decoded once for the graph, the mask and the reward of this step
+        state = self._last_state = self._fetch_state()
+
+        window = self.sharder.select_window(state)
+        with TELEMETRY.timer("obs_build"):
+            self.graph.update(state, window)
+            obs = self.graph.observation()
+        self._obs_count += 1
+        if self.check_graph_every and self._obs_count % self.check_graph_every == 0:
+            errors = self.graph.consistency_errors(state)
+            if errors:
+                print(f"WARNING: incremental graph diverged from rebuild ({'; '.join(errors)}), resetting")
+                self.graph.reset()
+                self.graph.update(state, window)
+                obs = self.graph.observation()
+        self.current_key_names = list(self.graph.key_names)
+        if state:
+            # Server rows follow the state order, so actions must map through it too
+            self.current_server_ids = list(state.node_ids)
+        if self.obs_pipelines:
+            self._apply_pipelines(obs)
+        if state and (self.guard.active or (state.capacity_bytes is not None and np.any(state.capacity_bytes > 0))):
+            self._mask_blocked(obs, state)
         
         return obs
 
+    def _apply_pipelines(self, obs):
+        key_ids = self.graph.key_names + [None] * (MAX_KEYS - len(self.graph.key_names))
+        server_ids = self.graph.server_ids + [None] * (MAX_SERVERS - len(self.graph.server_ids))
+        obs["x_keys"] = self.obs_pipelines["x_keys"](obs["x_keys"], key_ids, self.graph.key_counts())
+        obs["x_servers"] = self.obs_pipelines["x_servers"](obs["x_servers"], server_ids)
+
+    def _mask_blocked(self, obs, arrays):
+        """
+        Clears the mask entries of pairs whose toggle the guard would block,
+        and of replicas to servers without room for the key.
+        """
+        fits = arrays.fits()
+        rows = [arrays.key_index.get(k) for k in self.current_key_names]
+        num_servers = len(self.current_server_ids)
+        for action in np.flatnonzero(obs["action_mask"][:NOOP_ACTION]):
+            key_idx, server_idx = divmod(int(action), num_servers)
+            row = rows[key_idx]
+            stored = row is not None and bool(arrays.presence[server_idx, row])
+            if not stored and row is not None and not fits[server_idx, row]:
+                obs["action_mask"][action] = 0.0
+                continue
+            action_type = "EVICT" if stored else "REPLICATE"
+            if self.guard.active and self.guard.check(action_type, self.current_key_names[key_idx],
+                                                      self.current_server_ids[server_idx]):
+                obs["action_mask"][action] = 0.0
+
     def _calculate_reward(self, state_json):
         if not state_json: return -100.0
         
-        total_cost = sum(n.get('storageCost', 0) for n in state_json)
-        total_reads = 0
-        latency_sum = 0
-        
-        presence_map = {}
-        for n in state_json:
-            for k in n.get('keyMetrics', {}):
-                if k not in presence_map: presence_map[k] = set()
-                presence_map[k].add(n['nodeId'])
-                
-        for n in state_json:
-            node_id = n['nodeId']
-            for k, m in n.get('keyMetrics', {}).items():
-                reads = m.get('readCount', 0)
-                total_reads += reads
-                is_local = node_id in presence_map.get(k, set())
-                latency_sum += reads * (10 if is_local else 150)
-                
-        avg_lat = (latency_sum / total_reads) if total_reads > 0 else 0
+        arrays = state_to_arrays(state_json)
+        avg_lat, total_cost = self.reward_model.metrics(arrays.presence, arrays.reads, arrays.storage_cost,
+                                                        arrays.key_units())
 
         # Only print every ~50 steps to avoid spamming too much
         if self.steps % 200 == 0:
-            print(f"\n[ENV DEBUG] Latency: {avg_lat:.2f} | Cost: {total_cost:.2f} | Reads: {total_reads}")
+            print(f"\n[ENV DEBUG] Latency: {avg_lat:.2f} | Cost: {total_cost:.2f} | Reads: {arrays.reads.sum()}")
         
         # Using Cost-Conscious weights to match best MLP result
-        reward = -1 * ((LATENCY_WEIGHT * avg_lat) + (COST_WEIGHT * total_cost))
+        reward = self.reward_model.reward_from_metrics(avg_lat, total_cost)
         
         if np.isnan(reward) or np.isinf(reward): return -100.0
         return reward
\ No newline at end of file
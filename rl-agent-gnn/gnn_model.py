@@ -6,6 +6,11 @@ from ray.rllib.utils.annotations import override
 from torch_geometric.nn import HeteroConv, GATv2Conv, LayerNorm
 from torch_geometric.data import HeteroData
 
+# Logit of actions that can't be taken (padding, masked or pruned pairs)
+MASKED_LOGIT = -1e10
+# Key-server pairs sent through the scorer at once: bounds the [pairs, 256] hidden activations
+SCORE_CHUNK_PAIRS = 8192
+
 class ReplicationGNN(TorchModelV2, nn.Module):
     def __init__(self, obs_space, action_space, num_outputs, model_config, name):
         TorchModelV2.__init__(self, obs_space, action_space, num_outputs, model_config, name)
@@ -23,7 +28,8 @@ class ReplicationGNN(TorchModelV2, nn.Module):
         self.layer_norm_server = LayerNorm(128)
 
         # Action Scorer (The "Judge")
-        # Takes [Key_Embed(128) + Server_Embed(128)] -> Score(1)
+        # Takes [Key_Embed(128) + Server_Embed(128) + Key_Context(128) + Server_Context(128)] -> Score(1)
+        # The first layer is applied factorized in _score_pairs, never on the concatenation
         self.scorer = nn.Sequential(
             nn.Linear(512, 256),
             nn.LayerNorm(256), # Extra stability
@@ -40,8 +46,54 @@ class ReplicationGNN(TorchModelV2, nn.Module):
             nn.Linear(32, 1)
         )
         
+        # Optional candidate pruning: only the top-M pairs by a cheap additive
+        # key + server score go through the full scorer, the rest are masked out
+        custom_config = (model_config or {}).get("custom_model_config", {})
+        self.prune_top_m = custom_config.get("prune_top_m", 0)
+        if self.prune_top_m:
+            self.key_prior = nn.Linear(128, 1)
+            self.server_prior = nn.Linear(128, 1)
+
+        # Logit of the no-op action (last output) from the global context, when the env has one
+        self.noop_head = nn.Linear(256, 1)
+
         self._cur_value = None
 
+    def _score_pairs(self, k_emb, s_emb, global_k, global_s):
+        """
+        Logits for all nk * ns key-server pairs (key-major), and the scorer
+        outputs they came from. The (nk, ns, 512) input is never built: the
+        first scorer layer is linear in the concatenation, so it splits into
+        per-key, per-server and context projections that are computed once
+        and added per pair, SCORE_CHUNK_PAIRS pairs at a time.
+
+        With prune_top_m, only the top-M pairs by the additive prior are
+        scored and every other pair gets MASKED_LOGIT, so the softmax never
+        mixes prior and scorer values. The prior's value doesn't reach the
+        logits; it is trained through them instead (straight-through), so
+        candidates the policy favours are pushed up the ranking.
+        """
+        nk, ns = k_emb.shape[0], s_emb.shape[0]
+        first = self.scorer[0]
+        w_key, w_server, w_ctx_key, w_ctx_server = first.weight.split(128, dim=1)
+        h_key = k_emb @ w_key.T + (global_k @ w_ctx_key.T + global_s @ w_ctx_server.T + first.bias)  # [nk, 256]
+        h_server = s_emb @ w_server.T                                                              # [ns, 256]
+
+        if not self.prune_top_m or self.prune_top_m >= nk * ns:
+            rows = max(1, SCORE_CHUNK_PAIRS // ns)
+            scores = torch.cat([
+                self.scorer[1:](h_key[start:start + rows].unsqueeze(1) + h_server.unsqueeze(0)).view(-1)
+                for start in range(0, nk, rows)])                                  # [nk * ns]
+            return scores, scores
+
+        prior = (self.key_prior(k_emb) + self.server_prior(s_emb).T).view(-1)  # [nk * ns]
+        candidates = torch.topk(prior.detach(), self.prune_top_m).indices
+        hidden = h_key[candidates // ns] + h_server[candidates % ns]            # [M, 256]
+        scores = self.scorer[1:](hidden).view(-1)
+        chosen = prior[candidates]
+        logits = torch.full_like(prior, MASKED_LOGIT).index_put((candidates,), scores + (chosen - chosen.detach()))
+        return logits, scores
+
     @override(TorchModelV2)
     def forward(self, input_dict, state, seq_lens):
         obs = input_dict["obs"]
@@ -65,7 +117,10 @@ class ReplicationGNN(TorchModelV2, nn.Module):
                 total_slots = x_keys.shape[1] * x_servers.shape[1]
                 
                 # Create the tensor attached to the graph via dummy_grad_hook
-                padded_logits = torch.full((total_slots,), -1e10).to(x_keys.device) + dummy_grad_hook
+                padded_logits = torch.full((total_slots,), MASKED_LOGIT).to(x_keys.device) + dummy_grad_hook
+                if self.num_outputs > total_slots:
+                    # Nothing to place: the no-op is the only sensible choice
+                    padded_logits = torch.cat([padded_logits, torch.zeros(1, device=x_keys.device) + dummy_grad_hook])
                 
                 logits_list.append(padded_logits)
                 self._cur_value = torch.tensor(0.0).to(x_keys.device) + dummy_grad_hook
@@ -98,25 +153,25 @@ class ReplicationGNN(TorchModelV2, nn.Module):
             global_s = torch.mean(s_emb, dim=0, keepdim=True) # [1, 128]
 
             # Pairwise Scoring with Context
-            # Expand Context to match the pairs [nk, ns, 128]
-            ctx_k_rep = global_k.unsqueeze(1).expand(nk, ns, -1)
-            ctx_s_rep = global_s.unsqueeze(0).expand(nk, ns, -1)
-
-            k_rep = k_emb.unsqueeze(1).expand(-1, ns, -1)
-            s_rep = s_emb.unsqueeze(0).expand(nk, -1, -1)
-            pairs = torch.cat([k_rep, s_rep, ctx_k_rep, ctx_s_rep], dim=-1)
-            
-            scores = self.scorer(pairs).view(-1)
+            pair_logits, scores = self._score_pairs(k_emb, s_emb, global_k, global_s)
 
             total_slots = x_keys.shape[1] * x_servers.shape[1]
-            padded_logits = torch.full((total_slots,), -1e10).to(scores.device)
-            valid_len = scores.shape[0]
-            padded_logits[:valid_len] = scores
+            padded_logits = torch.full((total_slots,), MASKED_LOGIT).to(scores.device)
+            valid_len = pair_logits.shape[0]
+            padded_logits[:valid_len] = pair_logits
+            if self.num_outputs > total_slots:
+                noop_logit = self.noop_head(torch.cat([global_k, global_s], dim=1)).view(1)
+                padded_logits = torch.cat([padded_logits, noop_logit])
 
             logits_list.append(padded_logits)
             self._cur_value = torch.mean(scores)
 
-        return torch.stack(logits_list), state
+        logits = torch.stack(logits_list)
+        # Pairs the env masked out (e.g. blocked by its placement guard) are never sampled
+        action_mask = obs.get('action_mask')
+        if action_mask is not None and action_mask.shape[-1] == logits.shape[-1]:
+            logits = logits.masked_fill(action_mask <= 0, MASKED_LOGIT)
+        return logits, state
 
     @override(TorchModelV2)
     def value_function(self):
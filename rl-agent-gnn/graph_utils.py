@@ -1,23 +1,81 @@
+import math
+import os
+import sys
 import torch
 import numpy as np
 
-def parse_system_state_to_graph(state_json):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from reward_model import BILLING_UNIT_BYTES, DEFAULT_STORAGE_PRICE, StateArrays, state_to_arrays
+
+SERVER_FEATURES = 3
+
+
+def server_features(node_data):
+    """
+    [price per billed KiB, log1p(capacity in KiB), utilization] of a node.
+    Unlimited nodes (capacity 0) have 0 for both. Nodes that don't report a
+    price predate per-node prices and all charge the default one.
+    """
+    price = node_data.get('storagePrice', DEFAULT_STORAGE_PRICE)
+    capacity = node_data.get('capacityBytes', 0)
+    utilization = node_data.get('storedBytes', 0) / capacity if capacity > 0 else 0.0
+    return [price, math.log1p(capacity / BILLING_UNIT_BYTES), utilization]
+
+
+def server_feature_matrix(arrays):
+    """(N, SERVER_FEATURES) server_features of every node of a StateArrays."""
+    num_nodes = len(arrays.node_ids)
+    features = np.zeros((num_nodes, SERVER_FEATURES), dtype=np.float32)
+    features[:, 0] = DEFAULT_STORAGE_PRICE if arrays.storage_price is None else arrays.storage_price
+    if arrays.capacity_bytes is not None:
+        capacity = arrays.capacity_bytes.astype(np.float64)
+        stored = np.zeros(num_nodes) if arrays.stored_bytes is None else arrays.stored_bytes
+        features[:, 1] = np.log1p(capacity / BILLING_UNIT_BYTES)
+        features[:, 2] = np.divide(stored, capacity, out=np.zeros(num_nodes), where=capacity > 0)
+    return features
+
+
+def window_columns(arrays, key_names):
+    """
+    (reads, writes, stored, reported) of the `key_names` columns, as
+    (len(key_names), N) arrays. Keys missing from the state are unreported.
+    """
+    index = arrays.key_index
+    cols = np.array([index.get(k, -1) for k in key_names], dtype=np.int64)
+    known = cols >= 0
+    shape = (len(key_names), len(arrays.node_ids))
+    out = []
+    for matrix in (arrays.reads, arrays.writes, arrays.presence, arrays.reported):
+        column = np.zeros(shape, dtype=matrix.dtype)
+        column[known] = matrix[:, cols[known]].T
+        out.append(column)
+    return out
+
+
+def parse_system_state_to_graph(state_json, key_names=None):
     """
     Converts JSON to Graph Tensors.
     INCLUDES NORMALIZATION to prevent NaN in training.
+
+    If `key_names` is given, only those keys (in that order) become key nodes;
+    used by the key sharder to restrict the graph to a fixed-size window.
+    A StateArrays (binary state encoding) is rebuilt from its dense columns.
     """
+    if isinstance(state_json, StateArrays):
+        return _graph_from_arrays(state_json, key_names)
     if not state_json:
         # Return valid empty structures to prevent model crashes
         return (
             np.zeros((0, 3), dtype=np.float32),
-            np.zeros((0, 2), dtype=np.float32),
+            np.zeros((0, SERVER_FEATURES), dtype=np.float32),
             np.zeros((2, 0), dtype=np.int64),
             np.zeros((0, 2), dtype=np.float32),
             []
         )
 
     # Identify Unique Keys and Servers
-    key_names = sorted(list(set(k for node in state_json for k in node.get('keyMetrics', {}).keys())))
+    if key_names is None:
+        key_names = sorted(list(set(k for node in state_json for k in node.get('keyMetrics', {}).keys())))
     server_ids = [node['nodeId'] for node in state_json]
 
     num_keys = len(key_names)
@@ -25,17 +83,16 @@ def parse_system_state_to_graph(state_json):
 
     # Build Node Features
     x_keys = np.zeros((num_keys, 3), dtype=np.float32)
-    x_servers = np.zeros((num_servers, 2), dtype=np.float32)
+    x_servers = np.zeros((num_servers, SERVER_FEATURES), dtype=np.float32)
 
     key_stats = {k: {'reads': 0, 'writes': 0} for k in key_names}
 
     for s_idx, node_data in enumerate(state_json):
-        # Server Feat: [Cost, Capacity]
-        # Normalize Cost (approx range 0-2) -> OK
-        # Normalize Capacity (0-1) -> OK
-        x_servers[s_idx] = [node_data.get('storageCost', 1.0), 0.5]
+        # Server Feat: [Price, log Capacity, Utilization]
+        x_servers[s_idx] = server_features(node_data)
         
         for k, metrics in node_data.get('keyMetrics', {}).items():
+            if k not in key_stats: continue
             key_stats[k]['reads'] += metrics.get('readCount', 0)
             key_stats[k]['writes'] += metrics.get('writeCount', 0)
 
@@ -50,17 +107,21 @@ def parse_system_state_to_graph(state_json):
     dst_indices = []
     edge_features = []
 
+    key_index = {k: i for i, k in enumerate(key_names)}
     for s_idx, node_data in enumerate(state_json):
         for k, metrics in node_data.get('keyMetrics', {}).items():
-            if k in key_names:
-                k_idx = key_names.index(k)
+            if k in key_index:
+                k_idx = key_index[k]
                 
                 src_indices.append(k_idx)
                 dst_indices.append(s_idx)
                 
                 # Edge Feat: [Local_Reads, Is_Present]
+                # Demand at a node without a replica becomes an edge with Is_Present=0,
+                # so the model sees where reads are being served remotely.
                 local_reads = np.log1p(metrics.get('readCount', 0))
-                edge_features.append([local_reads, 1.0])
+                is_present = 1.0 if metrics.get('stored', True) else 0.0
+                edge_features.append([local_reads, is_present])
 
     edge_index = np.array([src_indices, dst_indices], dtype=np.int64)
     edge_attr = np.array(edge_features, dtype=np.float32)
@@ -69,4 +130,287 @@ def parse_system_state_to_graph(state_json):
         edge_index = np.zeros((2, 0), dtype=np.int64)
         edge_attr = np.zeros((0, 2), dtype=np.float32)
 
-    return x_keys, x_servers, edge_index, edge_attr, key_names
\ No newline at end of file
+    return x_keys, x_servers, edge_index, edge_attr, key_names
+
+
+def _graph_from_arrays(arrays, key_names=None):
+    """parse_system_state_to_graph of a StateArrays; edges are in (server, key) order like the JSON's."""
+    if key_names is None:
+        key_names = sorted(arrays.key_names)
+    reads, writes, stored, reported = window_columns(arrays, key_names)
+    x_keys = np.ones((len(key_names), 3), dtype=np.float32)
+    x_keys[:, 0] = np.log1p(reads.sum(axis=1))
+    x_keys[:, 1] = np.log1p(writes.sum(axis=1))
+    servers, keys = np.nonzero(reported.T)
+    edge_index = np.array([keys, servers], dtype=np.int64).reshape(2, -1)
+    edge_attr = np.stack([np.log1p(reads[keys, servers]), stored[keys, servers]], axis=1).astype(np.float32)
+    return x_keys, server_feature_matrix(arrays), edge_index, edge_attr.reshape(-1, 2), list(key_names)
+
+
+class IncrementalGraphState:
+    """
+    Padded graph observation that is patched in place between env steps
+    instead of rebuilt by parse_system_state_to_graph.
+
+    `update` takes the step's StateArrays (JSON is parsed once) and only
+    looks at the window's columns: (keys, servers) counters and flags that
+    are compared with the previous step's as whole arrays. Changed edge
+    attributes and key totals are written with vectorized scatters; Python
+    only loops over edges that appear or disappear, which between two polls
+    is the replica the last action toggled and keys first read at a node.
+    Edges live in fixed preallocated buffers: a new edge is appended and a
+    removed one is replaced by the last edge. A reordered key window (the
+    sharder sorts by heat) is applied as a vectorized row permutation. Only a
+    change of the server list triggers a full reset.
+
+    Edge order differs from the rebuild, which message passing does not
+    care about; `consistency_errors` compares the two as edge sets.
+    """
+
+    def __init__(self, max_keys, max_servers, max_edges=None, noop_action=True):
+        self.max_keys = max_keys
+        self.max_servers = max_servers
+        # Extra last mask entry for the env's always-valid no-op action
+        self.noop_action = noop_action
+        self.max_edges = max_edges or max_keys * max_servers
+        self.x_keys = np.zeros((max_keys, 3), dtype=np.float32)
+        self.x_servers = np.zeros((max_servers, SERVER_FEATURES), dtype=np.float32)
+        self.edge_index = np.full((2, self.max_edges), -1, dtype=np.int64)
+        self.edge_attr = np.zeros((self.max_edges, 2), dtype=np.float32)
+        self._masks = {}
+        self.resets = 0
+        self.reset()
+
+    def reset(self, server_ids=()):
+        self.server_ids = list(server_ids)
+        self.key_names = []
+        # Previous step's window, (key row, server): per-edge counters and flags
+        self._reads = np.zeros((self.max_keys, self.max_servers), dtype=np.int64)
+        self._stored = np.zeros((self.max_keys, self.max_servers), dtype=bool)
+        self._slot = np.full((self.max_keys, self.max_servers), -1, dtype=np.int64)
+        self._key_totals = np.zeros((self.max_keys, 2), dtype=np.int64)   # [reads, writes] over the servers
+        self.num_edges = 0
+        self.x_keys[:] = 0
+        self.x_servers[:] = 0
+        self.edge_index[:] = -1
+        self.edge_attr[:] = 0
+        self.resets += 1
+
+    def update(self, state, key_names=None):
+        """Brings the graph to `state` (StateArrays or JSON), restricted to `key_names` (default: all keys, sorted)."""
+        arrays = state_to_arrays(state)
+        if key_names is None:
+            key_names = sorted(arrays.key_names)
+        if list(arrays.node_ids) != self.server_ids:
+            self.reset(arrays.node_ids)
+        if list(key_names) != self.key_names:
+            self._set_keys(list(key_names))
+
+        nk, ns = len(self.key_names), len(self.server_ids)
+        if ns:
+            self.x_servers[:ns] = server_feature_matrix(arrays)
+        if not nk:
+            return
+        reads, writes, stored, reported = window_columns(arrays, self.key_names)
+
+        # Appearing and disappearing edges: the only per-pair Python work
+        had = self._slot[:nk, :ns] >= 0
+        for i, s in zip(*np.nonzero(had & ~reported)):
+            self._remove_edge(i, s)
+        for i, s in zip(*np.nonzero(reported & ~had)):
+            self._add_edge(i, s)
+
+        changed = reported & ((reads != self._reads[:nk, :ns]) | (stored != self._stored[:nk, :ns]) | ~had)
+        rows, servers = np.nonzero(changed)
+        if len(rows):
+            slots = self._slot[rows, servers]
+            self.edge_attr[slots, 0] = np.log1p(reads[rows, servers])
+            self.edge_attr[slots, 1] = stored[rows, servers]
+        self._reads[:nk, :ns] = reads
+        self._stored[:nk, :ns] = stored
+
+        totals = np.stack([reads.sum(axis=1), writes.sum(axis=1)], axis=1)
+        moved = np.flatnonzero((totals != self._key_totals[:nk]).any(axis=1))
+        if len(moved):
+            self._key_totals[moved] = totals[moved]
+            self.x_keys[moved, :2] = np.log1p(totals[moved])
+
+    def observation(self):
+        """
+        Same dict as build_graph_obs. The feature and edge arrays are read-only
+        views of the buffers, valid until the next update (the vec envs, the
+        obs pipelines and TransitionRecorder copy them); the action mask is a
+        fresh array.
+        """
+        nk, ns = len(self.key_names), len(self.server_ids)
+        return {
+            "x_keys": _read_only(self.x_keys),
+            "x_servers": _read_only(self.x_servers),
+            "edge_index": _read_only(self.edge_index),
+            "edge_attr": _read_only(self.edge_attr),
+            "real_counts": np.array([nk, ns, self.num_edges], dtype=np.int32),
+            "action_mask": self._action_mask(nk, ns).copy(),
+        }
+
+    def key_counts(self):
+        """Raw (reads, writes) totals per key row, zero-padded to max_keys (x_keys holds them as log1p)."""
+        return self._key_totals.astype(np.float64)
+
+    def consistency_errors(self, state):
+        """Differences from a full rebuild of the same state and key window (empty if consistent)."""
+        x_k, x_s, e_i, e_a, _ = parse_system_state_to_graph(state, key_names=self.key_names)
+        errors = []
+        nk, ns, ne = len(x_k), len(x_s), e_i.shape[1]
+        if (nk, ns, ne) != (len(self.key_names), len(self.server_ids), self.num_edges):
+            errors.append(f"counts {(len(self.key_names), len(self.server_ids), self.num_edges)} != {(nk, ns, ne)}")
+            return errors
+        if not np.allclose(self.x_keys[:nk], x_k, atol=1e-5):
+            errors.append("x_keys differ")
+        if not np.allclose(self.x_servers[:ns], x_s, atol=1e-5):
+            errors.append("x_servers differ")
+        expected = {(int(k), int(s)): tuple(a) for (k, s), a in zip(e_i.T, e_a)}
+        actual = {(int(k), int(s)): tuple(a) for (k, s), a in
+                  zip(self.edge_index[:, :ne].T, self.edge_attr[:ne])}
+        if expected.keys() != actual.keys():
+            errors.append(f"edges differ: missing {sorted(expected.keys() - actual.keys())}, "
+                          f"extra {sorted(actual.keys() - expected.keys())}")
+        elif any(not np.allclose(actual[p], expected[p], atol=1e-5) for p in expected):
+            errors.append("edge_attr differ")
+        if (self.edge_index[:, ne:] != -1).any() or self.edge_attr[ne:].any():
+            errors.append("padding not cleared")
+        return errors
+
+    def _action_mask(self, nk, ns):
+        # One mask per window shape, built once
+        mask = self._masks.get((nk, ns))
+        if mask is None:
+            num_pairs = self.max_keys * self.max_servers
+            mask = np.zeros(num_pairs + (1 if self.noop_action else 0), dtype=np.float32)
+            if nk > 0 and ns > 0:
+                mask[:nk * ns] = 1.0
+            if self.noop_action:
+                mask[num_pairs] = 1.0
+            elif not mask.any():
+                mask[0] = 1.0
+            self._masks[nk, ns] = mask
+        return mask
+
+    def _set_keys(self, key_names):
+        new_index = {k: i for i, k in enumerate(key_names)}
+        for i, k in enumerate(self.key_names):
+            if k not in new_index:
+                for s in np.flatnonzero(self._slot[i] >= 0):
+                    self._remove_edge(i, s)
+
+        # Move surviving rows to their new positions in one go; new keys start empty
+        old_to_new = np.full(self.max_keys, -1, dtype=np.int64)
+        for i, k in enumerate(self.key_names):
+            if k in new_index:
+                old_to_new[i] = new_index[k]
+        kept = np.flatnonzero(old_to_new >= 0)
+        x_keys = np.zeros_like(self.x_keys)
+        x_keys[:len(key_names), 2] = 1.0
+        self.x_keys = _permute_rows(self.x_keys, kept, old_to_new[kept], x_keys)
+        self._reads = _permute_rows(self._reads, kept, old_to_new[kept], np.zeros_like(self._reads))
+        self._stored = _permute_rows(self._stored, kept, old_to_new[kept], np.zeros_like(self._stored))
+        self._slot = _permute_rows(self._slot, kept, old_to_new[kept], np.full_like(self._slot, -1))
+        self._key_totals = _permute_rows(self._key_totals, kept, old_to_new[kept], np.zeros_like(self._key_totals))
+        self.edge_index[0, :self.num_edges] = old_to_new[self.edge_index[0, :self.num_edges]]
+        self.key_names = key_names
+
+    def _add_edge(self, i, s):
+        slot = self._slot[i, s] = self.num_edges
+        self.edge_index[:, slot] = (i, s)
+        self.num_edges += 1
+
+    def _remove_edge(self, i, s):
+        slot, last = self._slot[i, s], self.num_edges - 1
+        if slot != last:
+            self.edge_index[:, slot] = self.edge_index[:, last]
+            self.edge_attr[slot] = self.edge_attr[last]
+            self._slot[self.edge_index[0, slot], self.edge_index[1, slot]] = slot
+        self.edge_index[:, last] = -1
+        self.edge_attr[last] = 0
+        self._slot[i, s] = -1
+        self._reads[i, s] = 0
+        self._stored[i, s] = False
+        self.num_edges = last
+
+
+def _permute_rows(values, src, dst, out):
+    out[dst] = values[src]
+    return out
+
+
+def _read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+if __name__ == "__main__":
+    # Consistency check: random actions on a simulated cluster with a rotating,
+    # re-sorted key window, comparing every incremental update to a full rebuild.
+    from factorized_actions import KeySharder
+    from simulated_cluster import SimulatedCluster
+
+    rng = np.random.default_rng(0)
+    cluster = SimulatedCluster(num_keys=60, num_nodes=5, requests_per_tick=20, seed=0,
+                               storage_prices=[1.0, 1.5, 2.0, 0.5, 1.5], capacity_bytes=[0, 4000, 0, 2500, 0])
+    sharder = KeySharder(num_shards=3, window_size=25)
+    graph = IncrementalGraphState(25, 10)
+    for step in range(2000):
+        cluster.tick()
+        k, n = rng.integers(len(cluster.key_names)), rng.integers(len(cluster.node_ids))
+        cluster.execute("EVICT" if cluster.stored[n, k] else "REPLICATE", cluster.key_names[k], cluster.node_ids[n])
+        state = cluster.state(top_k=int(rng.integers(10, 60)))
+        if step % 500 == 250:
+            state = state[:-1]  # a node drops out: forces a reset
+        # Alternate JSON and StateArrays input; check against both rebuilds
+        arrays = state_to_arrays(state)
+        graph.update(arrays if step % 2 else state, sharder.select_window(state))
+        errors = graph.consistency_errors(state) + graph.consistency_errors(arrays)
+        if errors:
+            sys.exit(f"step {step}: {errors}")
+        sharder.advance()
+    print(f"OK: 2000 incremental updates match the full rebuild ({graph.resets} resets)")
+
+    # Recorded transitions must not alias the graph's buffers: every logged
+    # next observation is the following step's observation, and an action
+    # changes what is logged.
+    import tempfile
+    import gymnasium as gym
+    from transitions import TransitionDataset, TransitionRecorder
+
+    class _SimulatedGraphEnv(gym.Env):
+        def __init__(self):
+            self.cluster = SimulatedCluster(num_keys=20, num_nodes=4, requests_per_tick=20, seed=1)
+            self.graph = IncrementalGraphState(20, 4)
+
+        def _obs(self):
+            self.cluster.tick()
+            self.graph.update(self.cluster.state(), list(self.cluster.key_names))
+            return self.graph.observation()
+
+        def reset(self, **kwargs):
+            return self._obs(), {}
+
+        def step(self, action):
+            k, n = divmod(int(action), len(self.cluster.node_ids))
+            op = "EVICT" if self.cluster.stored[n, k] else "REPLICATE"
+            self.cluster.execute(op, self.cluster.key_names[k], self.cluster.node_ids[n])
+            return self._obs(), 0.0, False, False, {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = TransitionRecorder(_SimulatedGraphEnv(), tmp, chunk_size=40)
+        env.reset()
+        for step in range(40):
+            env.step(rng.integers(20 * 4))
+        batch = next(TransitionDataset(tmp).batches(40, rng, ("observations", "next_observations")))
+        obs, next_obs = batch["observations"], batch["next_observations"]
+        for name in obs:
+            if not np.array_equal(next_obs[name][:-1], obs[name][1:]):
+                sys.exit(f"recorded next_observations.{name} are not the following observations")
+        if any(np.array_equal(obs["edge_attr"][i], next_obs["edge_attr"][i]) for i in range(40)):
+            sys.exit("a recorded transition's edge_attr did not change after its action")
+    print("OK: 40 recorded transitions each differ from the next")
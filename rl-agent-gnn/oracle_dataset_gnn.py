@@ -0,0 +1,73 @@
+"""
+Generates a behavior-cloning dataset for ReplicationGNN from the placement oracle.
+
+Same episodes as rl-agent/oracle_dataset.py, encoded as the padded graph
+observations of ReplicationEnvGNN. The action is key_idx * num_servers +
+server_idx, the index the env decodes (the op is implied by presence), and
+each episode ends with the no-op once the placement is optimal.
+
+    python oracle_dataset_gnn.py --episodes 500 --output transitions/oracle_gnn
+    python pretrain_gnn.py --data transitions/oracle_gnn
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+from gnn_environment import COST_WEIGHT, LATENCY_WEIGHT, MAX_KEYS, MAX_SERVERS, NOOP_ACTION, build_graph_obs
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from factorized_actions import KeySharder
+from placement_oracle import PlacementOracle, apply_action, synthetic_state
+from reward_model import RewardModel, state_to_arrays
+from transitions import TransitionLogger
+
+
+def generate(logger, episodes, max_moves, seed):
+    rng = np.random.default_rng(seed)
+    oracle = PlacementOracle(LATENCY_WEIGHT, COST_WEIGHT)
+    reward_model = RewardModel(LATENCY_WEIGHT, COST_WEIGHT)
+    sharder = KeySharder(num_shards=1, window_size=MAX_KEYS)
+    recorded = 0
+
+    for _ in range(episodes):
+        num_nodes = int(rng.integers(2, MAX_SERVERS + 1))
+        num_keys = int(rng.integers(1, MAX_KEYS + 1))
+        state = synthetic_state(rng, num_keys, num_nodes)
+
+        for _ in range(max_moves):
+            arrays = state_to_arrays(state)
+            move = oracle.state_action(arrays)
+            if move is None:
+                obs, _ = build_graph_obs(state, sharder.select_window(state))
+                logger.record(obs, obs["action_mask"] > 0, NOOP_ACTION, reward_model.state_reward(state) / 20.0, obs)
+                recorded += 1
+                break
+            action_type, key_idx, node_idx = move
+            key, node = arrays.key_names[key_idx], arrays.node_ids[node_idx]
+
+            obs, k_names = build_graph_obs(state, sharder.select_window(state))
+            apply_action(state, action_type, key, node)
+            if key not in k_names:
+                continue
+
+            next_obs, _ = build_graph_obs(state, sharder.select_window(state))
+            # Scaled like ReplicationEnvGNN.step
+            reward = reward_model.state_reward(state) / 20.0
+            logger.record(obs, obs["action_mask"] > 0, k_names.index(key) * num_nodes + node_idx, reward, next_obs)
+            recorded += 1
+
+    logger.close()
+    return recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, default=500)
+    parser.add_argument("--max_moves", type=int, default=200, help="Oracle moves per episode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="transitions/oracle_gnn", help="Shard directory")
+    args = parser.parse_args()
+
+    recorded = generate(TransitionLogger(args.output), args.episodes, args.max_moves, args.seed)
+    print(f"Saved {recorded} oracle decisions to {args.output}")
@@ -1,6 +1,14 @@
 import json
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from result_series import accounting_label
+
+def run_accounting(data):
+    """The "accounting" tag of a run's first record; an empty run has nothing to mark."""
+    return data[0].get('accounting') if data else 'demand'
 
 def plot_gnn_comparison():
     with open('evaluation_results_gnn.json', 'r') as f:
@@ -24,9 +32,9 @@ def plot_gnn_comparison():
     fig, ax1 = plt.subplots(figsize=(12, 6))
 
     if static_exists:
-        ax1.plot(static_time, static_cost, label='Static Policy (Baseline)', color='red', linestyle='--')
+        ax1.plot(static_time, static_cost, label=accounting_label(run_accounting(static_data), 'Static Policy (Baseline)'), color='red', linestyle='--')
     
-    ax1.plot(gnn_time, gnn_cost, label='GNN Agent (AI)', color='green', linewidth=2)
+    ax1.plot(gnn_time, gnn_cost, label=accounting_label(run_accounting(gnn_data), 'GNN Agent (AI)'), color='green', linewidth=2)
     
     ax1.set_xlabel('Time (minutes)', fontsize=12)
     ax1.set_ylabel('Total Storage Cost ($)', fontsize=12)
@@ -39,9 +47,9 @@ def plot_gnn_comparison():
     fig, ax2 = plt.subplots(figsize=(12, 6))
 
     if static_exists:
-        ax2.plot(static_time, static_latency, label='Static Policy (Baseline)', color='red', linestyle='--')
+        ax2.plot(static_time, static_latency, label=accounting_label(run_accounting(static_data), 'Static Policy (Baseline)'), color='red', linestyle='--')
 
-    ax2.plot(gnn_time, gnn_latency, label='GNN Agent (AI)', color='green', linewidth=2)
+    ax2.plot(gnn_time, gnn_latency, label=accounting_label(run_accounting(gnn_data), 'GNN Agent (AI)'), color='green', linewidth=2)
 
     ax2.set_xlabel('Time (minutes)', fontsize=12)
     ax2.set_ylabel('Avg Read Latency (ms)', fontsize=12)
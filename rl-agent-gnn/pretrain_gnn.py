@@ -0,0 +1,88 @@
+"""
+Offline pre-training of the ReplicationGNN actor from logged transitions.
+
+Reads the shards written by oracle_dataset_gnn.py or by a run with
+--log_transitions (common/transitions.py) through memory-mapped batches and
+fits the action logits with cross-entropy on the recorded action. The saved
+state dict is loaded by `train.py --warm_start` before PPO starts.
+
+    python pretrain_gnn.py --data transitions/oracle_gnn --output gnn_pretrained.pt
+    python train.py --warm_start gnn_pretrained.pt
+"""
+import os
+import sys
+import argparse
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from gnn_environment import ReplicationEnvGNN
+from gnn_model import ReplicationGNN
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from transitions import TransitionDataset
+
+
+def build_model():
+    env = ReplicationEnvGNN()
+    return ReplicationGNN(env.observation_space, env.action_space, env.action_space.n, {}, "replication_gnn")
+
+
+def to_torch(batch):
+    obs = {name: torch.as_tensor(value) for name, value in batch["observations"].items()}
+    return obs, torch.as_tensor(batch["masks"]), torch.as_tensor(batch["actions"])
+
+
+def pretrain_gnn(model, dataset_dir, epochs=10, batch_size=64, lr=1e-3, seed=0):
+    """Returns the last epoch's mean loss (None for an empty dataset)."""
+    dataset = TransitionDataset(dataset_dir)
+    if len(dataset) == 0:
+        print(f"WARNING: {dataset_dir} has no transitions")
+        return None
+    print(f"Pre-training on {len(dataset)} transitions from {len(dataset.shards)} shards")
+
+    rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+
+    # GATv2Conv(-1, ...) initializes lazily, so run one batch before building the optimizer
+    with torch.no_grad():
+        obs, _, _ = to_torch(next(dataset.batches(batch_size, rng)))
+        model({"obs": obs}, [], None)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+    model.train()
+    mean_loss = None
+    for epoch in range(epochs):
+        losses = []
+        for batch in dataset.batches(batch_size, rng):
+            obs, masks, actions = to_torch(batch)
+            logits, _ = model({"obs": obs}, [], None)
+            logits = logits.masked_fill(~masks, -1e10)
+            loss = F.cross_entropy(logits, actions)
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 0.5)
+            optimizer.step()
+            losses.append(loss.item())
+
+        mean_loss = float(np.mean(losses))
+        print(f"BC epoch {epoch + 1}/{epochs}: loss {mean_loss:.4f}")
+
+    model.eval()
+    return mean_loss
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, required=True, help="Transition shard directory")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--output", type=str, default="gnn_pretrained.pt")
+    args = parser.parse_args()
+
+    model = build_model()
+    pretrain_gnn(model, args.data, args.epochs, args.batch_size, args.lr)
+    torch.save(model.state_dict(), args.output)
+    print(f"Pre-trained weights saved to: {args.output}")
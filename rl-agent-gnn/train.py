@@ -1,5 +1,8 @@
 import os
+import sys
 import shutil
+import argparse
+import torch
 import ray
 from ray.rllib.algorithms.ppo import PPOConfig
 from gnn_environment import ReplicationEnvGNN
@@ -7,9 +10,28 @@ from gnn_model import ReplicationGNN
 from ray.tune.registry import register_env
 from ray.rllib.models import ModelCatalog
 
-def train_manual():
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from obs_pipeline import add_pipeline_arguments, pipeline_config, pipeline_path, save_pipelines
+from placement_guard import add_guard_arguments, guard_config
+from telemetry import TELEMETRY, Telemetry, time_forward_passes
+from transitions import TransitionRecorder
+
+def make_env(config):
+    env = ReplicationEnvGNN(config)
+    if config.get("log_transitions"):
+        # Every interaction is kept as shards for offline pre-training (pretrain_gnn.py)
+        env = TransitionRecorder(env, config["log_transitions"])
+    return env
+
+def env_pipelines(algo):
+    """Observation pipelines of the env that samples (the local runner's, num_env_runners=0)."""
+    runners = getattr(algo, "env_runner_group", None) or algo.workers
+    return runners.foreach_worker(lambda runner: runner.foreach_env(lambda env: env.unwrapped.obs_pipelines))[0][0]
+
+def train_manual(warm_start=None, log_transitions=None, telemetry_interval=1, prune_top_m=0, placement_guard=None,
+                 obs_pipeline=None):
     ray.init(ignore_reinit_error=True)
-    register_env("replication_gnn_env", lambda config: ReplicationEnvGNN(config))
+    register_env("replication_gnn_env", make_env)
     ModelCatalog.register_custom_model("replication_gnn_model", ReplicationGNN)
 
     print("Building PPO Configuration...")
@@ -19,11 +41,14 @@ def train_manual():
             enable_rl_module_and_learner=False,
             enable_env_runner_and_connector_v2=False,
         )
-        .environment("replication_gnn_env")
+        .environment("replication_gnn_env", env_config={"log_transitions": log_transitions,
+                                                        "placement_guard": placement_guard,
+                                                        "obs_pipeline": obs_pipeline})
         .framework("torch")
         .training(
             model={
                 "custom_model": "replication_gnn_model",
+                "custom_model_config": {"prune_top_m": prune_top_m},
             },
             train_batch_size=4800,
             minibatch_size=256,
@@ -41,6 +66,19 @@ def train_manual():
     algo = config.build()
     print("Algorithm built successfully.")
 
+    if warm_start:
+        # Actor weights from pretrain_gnn.py; PPO then only fine-tunes
+        print(f"Warm-starting model from {warm_start}...")
+        # Heads the pre-trained model doesn't have (pruning priors, an older model's
+        # no-op head) keep their fresh init
+        missing = algo.get_policy().model.load_state_dict(torch.load(warm_start), strict=False).missing_keys
+        if missing:
+            print(f"Not in {warm_start}, left at init: {', '.join(missing)}")
+
+    # Env step/HTTP/obs timings are recorded by the env (local runner, same process);
+    # forward passes here cover both sampling and the PPO update
+    time_forward_passes(algo.get_policy().model)
+
     # Manual Training Loop
     # We control exactly what happens step-by-step
     num_iterations = 15
@@ -55,7 +93,8 @@ def train_manual():
     print("\n--- Starting Training Loop ---")
 
     for i in range(num_iterations):
-        result = algo.train()
+        with TELEMETRY.timer("train_iter"):
+            result = algo.train()
         
         # Ray nesting varies by version, safe get:
         if 'env_runners' in result:
@@ -64,6 +103,8 @@ def train_manual():
             reward = result['episode_reward_mean']
         
         print(f"Iter: {i+1:03d} | Reward: {reward}")
+        if (i + 1) % telemetry_interval == 0:
+            print(Telemetry.format_summary(TELEMETRY.summary()))
 
         # Checkpoint Logic
         if reward is not None and not isinstance(reward, str) and reward > best_reward:
@@ -82,6 +123,10 @@ def train_manual():
                 save_path = str(save_obj)
 
             print(f"   --> Saved to: {save_path}")
+            # Normalization statistics the policy was trained with, for evaluate_gnn.py
+            pipelines = env_pipelines(algo)
+            if pipelines:
+                save_pipelines(pipeline_path(save_dir), pipelines)
             
             with open("best_checkpoint_path.txt", "w") as f:
                 f.write(save_path)
@@ -90,4 +135,16 @@ def train_manual():
     algo.stop()
 
 if __name__ == "__main__":
-    train_manual()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--warm_start", type=str, default=None, help="State dict written by pretrain_gnn.py")
+    parser.add_argument("--log_transitions", type=str, default=None,
+                        help="Record every training step into this shard directory")
+    parser.add_argument("--telemetry_interval", type=int, default=1,
+                        help="Iterations between telemetry summaries (times in ms)")
+    parser.add_argument("--prune_top_m", type=int, default=0,
+                        help="Fully score only the top-M key-server pairs by a cheap score (0 = score all)")
+    add_guard_arguments(parser)
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+    train_manual(args.warm_start, args.log_transitions, args.telemetry_interval, args.prune_top_m, guard_config(args),
+                 pipeline_config(args))
\ No newline at end of file
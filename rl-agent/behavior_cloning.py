@@ -0,0 +1,57 @@
+"""
+Behavior-cloning warm start for the MaskablePPO MLP policy.
+
+Fits the actor to logged transitions (common/transitions.py), e.g. from
+oracle_dataset.py or a `--log_transitions` evaluation run, by maximizing the
+log-likelihood of the recorded action under the masked action distribution.
+Shards are memory-mapped, so datasets larger than RAM are fine. PPO then
+only has to fine-tune.
+"""
+import os
+import sys
+import numpy as np
+import torch as th
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from transitions import TransitionDataset
+
+
+def pretrain_policy(model, dataset_dir, epochs=10, batch_size=256, seed=0):
+    """Runs `epochs` passes over the shards with the policy's own optimizer. Returns the last epoch's mean loss."""
+    dataset = TransitionDataset(dataset_dir)
+    if len(dataset) == 0:
+        print(f"WARNING: {dataset_dir} has no transitions, skipping warm start")
+        return None
+    shape = dataset.shards[0]["observations"].shape[1:]
+    if shape != model.observation_space.shape:
+        # e.g. oracle_dataset.py shards for a policy with observation pipeline stages (--obs_normalize ...)
+        print(f"WARNING: {dataset_dir} holds observations of shape {shape}, the policy expects "
+              f"{model.observation_space.shape}, skipping warm start")
+        return None
+    print(f"Pre-training on {len(dataset)} transitions from {len(dataset.shards)} shards")
+
+    policy = model.policy
+    policy.set_training_mode(True)
+    rng = np.random.default_rng(seed)
+    mean_loss = None
+
+    for epoch in range(epochs):
+        losses = []
+        for batch in dataset.batches(batch_size, rng):
+            obs_t = th.as_tensor(batch["observations"], device=policy.device)
+            act_t = th.as_tensor(batch["actions"], device=policy.device)
+
+            distribution = policy.get_distribution(obs_t, action_masks=batch["masks"])
+            loss = -distribution.log_prob(act_t).mean()
+
+            policy.optimizer.zero_grad()
+            loss.backward()
+            th.nn.utils.clip_grad_norm_(policy.parameters(), model.max_grad_norm)
+            policy.optimizer.step()
+            losses.append(loss.item())
+
+        mean_loss = float(np.mean(losses))
+        print(f"BC epoch {epoch + 1}/{epochs}: loss {mean_loss:.4f}")
+
+    policy.set_training_mode(False)
+    return mean_loss
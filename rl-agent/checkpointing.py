@@ -0,0 +1,283 @@
+"""
+Checkpoint/resume and best-model selection for MaskablePPO training.
+
+A checkpoint is a directory holding the SB3 zip (policy weights and optimizer
+state) and the RNG state of python, numpy and torch. It is written under a
+temporary name and renamed into place, and a `latest` file pointing at it is
+replaced atomically, so a job killed mid-save always resumes from the last
+complete checkpoint.
+
+The observation pipeline statistics of the env (running mean/var, see
+common/obs_pipeline.py) are saved next to every model file, since the policy
+is only valid together with them.
+
+Best-model selection snapshots the policy every `eval_freq` steps and scores
+it on a SimulatedCluster in a background process, so training never waits
+for an evaluation.
+"""
+import os
+import pickle
+import random
+import shutil
+import signal
+import sys
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch as th
+from stable_baselines3.common.callbacks import BaseCallback
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from obs_pipeline import pipeline_path, save_pipelines
+
+MODEL_FILE = "model.zip"
+RNG_FILE = "rng_state.pkl"
+LATEST_FILE = "latest"
+BEST_MODEL_FILE = "best_model.zip"
+BEST_SCORE_FILE = "best_model_score"
+
+
+def _atomic_write(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def env_pipelines(env):
+    """The observation pipeline of the (first) env of a VecEnv as {"obs": pipeline}, None without one."""
+    pipeline = env.get_attr("obs_pipeline", [0])[0]
+    return {"obs": pipeline} if pipeline is not None else None
+
+
+def save_model(model, path, pipelines=None):
+    """model.save plus the pipeline statistics next to it."""
+    model.save(path)
+    if pipelines:
+        save_pipelines(pipeline_path(path), pipelines)
+
+
+def save_checkpoint(model, directory, keep=3, pipelines=None):
+    """Saves model + RNG state as checkpoint_<num_timesteps> and prunes all but the newest `keep`."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"checkpoint_{model.num_timesteps:010d}"
+    final_path = os.path.join(directory, name)
+    tmp_path = os.path.join(directory, "." + name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    save_model(model, os.path.join(tmp_path, MODEL_FILE), pipelines)
+    rng_state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": th.get_rng_state(),
+        "cuda": th.cuda.get_rng_state_all() if th.cuda.is_available() else None,
+    }
+    with open(os.path.join(tmp_path, RNG_FILE), "wb") as f:
+        pickle.dump(rng_state, f)
+
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.rename(tmp_path, final_path)
+    _atomic_write(os.path.join(directory, LATEST_FILE), name)
+
+    checkpoints = sorted(d for d in os.listdir(directory) if d.startswith("checkpoint_"))
+    for old in checkpoints[:-keep]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return final_path
+
+
+def latest_checkpoint(directory):
+    """Path of the newest complete checkpoint, or None."""
+    try:
+        with open(os.path.join(directory, LATEST_FILE)) as f:
+            path = os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        return None
+    return path if os.path.exists(os.path.join(path, MODEL_FILE)) else None
+
+
+def load_checkpoint(model_cls, path, env, **kwargs):
+    """Loads the model (with its optimizer state) and restores the RNG state saved next to it."""
+    model = model_cls.load(os.path.join(path, MODEL_FILE), env=env, **kwargs)
+    with open(os.path.join(path, RNG_FILE), "rb") as f:
+        rng_state = pickle.load(f)
+    random.setstate(rng_state["python"])
+    np.random.set_state(rng_state["numpy"])
+    th.set_rng_state(rng_state["torch"])
+    if rng_state["cuda"] is not None and th.cuda.is_available():
+        th.cuda.set_rng_state_all(rng_state["cuda"])
+    return model
+
+
+class CheckpointCallback(BaseCallback):
+    """
+    Checkpoints at the first rollout boundary after every `save_freq` steps,
+    once the previous rollout has been trained on, so a resumed run has every
+    update of the steps it counts. On SIGTERM/SIGINT (preemption) training
+    stops at the next step and a final checkpoint is written; the steps of
+    the interrupted rollout were never trained on and are collected again on
+    resume. The previous signal handlers are restored when training ends.
+    """
+
+    def __init__(self, directory, save_freq, keep=3, verbose=0):
+        super().__init__(verbose)
+        self.directory = directory
+        self.save_freq = save_freq
+        self.keep = keep
+        self._last_save = 0
+        self._stop_requested = False
+        self._previous_handlers = {}
+        # Steps collected before the current rollout, all of them trained on
+        self._trained_timesteps = 0
+        self._in_rollout = False
+
+    def _request_stop(self, signum, frame):
+        print(f"Received signal {signum}, checkpointing and stopping...")
+        self._stop_requested = True
+
+    def _on_training_start(self):
+        self._last_save = self._trained_timesteps = self.num_timesteps
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._previous_handlers[signum] = signal.signal(signum, self._request_stop)
+
+    def _on_rollout_start(self):
+        # Called after train() on the previous rollout
+        self._trained_timesteps = self.num_timesteps
+        self._in_rollout = True
+        if self.num_timesteps - self._last_save >= self.save_freq:
+            self._save()
+
+    def _on_step(self):
+        return not self._stop_requested
+
+    def _on_rollout_end(self):
+        self._in_rollout = False
+
+    def _on_training_end(self):
+        try:
+            # A rollout cut short by a stop never reached train()
+            if not self._in_rollout:
+                self._trained_timesteps = self.num_timesteps
+            if self._trained_timesteps > self._last_save:
+                self._save()
+        finally:
+            for signum, handler in self._previous_handlers.items():
+                # None: installed outside Python, the default is the closest we can restore
+                signal.signal(signum, signal.SIG_DFL if handler is None else handler)
+            self._previous_handlers = {}
+
+    def _save(self):
+        # Only count trained steps: a resume must not skip the rollout that was cut short
+        collected = self.model.num_timesteps
+        self.model.num_timesteps = self._trained_timesteps
+        try:
+            path = save_checkpoint(self.model, self.directory, self.keep, env_pipelines(self.training_env))
+        finally:
+            self.model.num_timesteps = collected
+        self._last_save = self._trained_timesteps
+        if self.verbose:
+            print(f"Checkpoint saved to {path}")
+
+
+def evaluate_on_simulator(model_path, env_kwargs, cluster_kwargs, episodes, seed):
+    """Mean episode reward of a saved policy on a seeded SimulatedCluster. Runs in the eval process."""
+    from sb3_contrib import MaskablePPO
+    from simulated_env import SimulatedReplicationEnv
+
+    th.set_num_threads(1)
+    model = MaskablePPO.load(model_path, device="cpu")
+    env = SimulatedReplicationEnv(cluster_kwargs=cluster_kwargs, seed=seed, **env_kwargs)
+    env.load_obs_pipeline(pipeline_path(model_path))
+    total = 0.0
+    for episode in range(episodes):
+        obs, _ = env.reset(seed=seed + episode)
+        done = False
+        while not done:
+            action, _ = model.predict(obs, action_masks=env.action_masks(), deterministic=True)
+            obs, reward, terminated, truncated, _ = env.step(action.item())
+            total += reward
+            done = terminated or truncated
+    return total / episodes
+
+
+class BackgroundEvalCallback(BaseCallback):
+    """
+    Every `eval_freq` steps, snapshots the policy and scores it with
+    evaluate_on_simulator in a worker process. Results are collected without
+    blocking; a snapshot that beats the best score so far becomes
+    best_model.zip. At most one evaluation is in flight, later snapshots are
+    skipped while it runs.
+    """
+
+    def __init__(self, directory, eval_freq, env_kwargs=None, cluster_kwargs=None,
+                 episodes=3, seed=12345, verbose=0):
+        super().__init__(verbose)
+        self.directory = directory
+        self.eval_freq = eval_freq
+        self.env_kwargs = env_kwargs or {}
+        self.cluster_kwargs = cluster_kwargs or {}
+        self.episodes = episodes
+        self.seed = seed
+        self.best_reward = -np.inf
+        self._executor = None
+        self._pending = None
+        self._last_eval = 0
+
+    def _on_training_start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._last_eval = self.num_timesteps
+        # A resumed run must beat the best model of the run it continues
+        score_path = os.path.join(self.directory, BEST_SCORE_FILE)
+        if os.path.exists(score_path):
+            with open(score_path) as f:
+                self.best_reward = float(f.read())
+        # spawn: the worker must not inherit the trainer's torch threads or sockets
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"))
+
+    def _collect(self, wait=False):
+        if self._pending is None or not (wait or self._pending[0].done()):
+            return
+        future, snapshot, timesteps = self._pending
+        self._pending = None
+        try:
+            mean_reward = future.result()
+        except Exception as e:
+            print(f"WARNING: background evaluation failed: {e}")
+            self._remove(snapshot)
+            return
+
+        self.logger.record("eval/sim_mean_reward", mean_reward)
+        if mean_reward > self.best_reward:
+            self.best_reward = mean_reward
+            best_path = os.path.join(self.directory, BEST_MODEL_FILE)
+            if os.path.exists(pipeline_path(snapshot)):
+                os.replace(pipeline_path(snapshot), pipeline_path(best_path))
+            os.replace(snapshot, best_path)
+            _atomic_write(os.path.join(self.directory, BEST_SCORE_FILE), repr(mean_reward))
+            print(f"New best model at {timesteps} steps (sim reward {mean_reward:.2f})")
+        else:
+            self._remove(snapshot)
+
+    @staticmethod
+    def _remove(snapshot):
+        os.remove(snapshot)
+        if os.path.exists(pipeline_path(snapshot)):
+            os.remove(pipeline_path(snapshot))
+
+    def _on_step(self):
+        self._collect()
+        if self._pending is None and self.num_timesteps - self._last_eval >= self.eval_freq:
+            self._last_eval = self.num_timesteps
+            snapshot = os.path.join(self.directory, f".eval_{self.num_timesteps}.zip")
+            save_model(self.model, snapshot, env_pipelines(self.training_env))
+            future = self._executor.submit(evaluate_on_simulator, snapshot, self.env_kwargs,
+                                           self.cluster_kwargs, self.episodes, self.seed)
+            self._pending = (future, snapshot, self.num_timesteps)
+        return True
+
+    def _on_training_end(self):
+        self._collect(wait=True)
+        self._executor.shutdown()
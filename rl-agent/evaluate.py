@@ -1,124 +1,192 @@
+import os
+import sys
 import requests
 import time
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from sb3_contrib import MaskablePPO 
 
-CONTROLLER_URL = "http://localhost:8080"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from factorized_actions import OPS, FactorizedActionHeads, KeySharder, window_fits, window_observation
+from keyspace import KeyspaceProjection
+from obs_pipeline import grid_rows, load_pipelines, pipeline_path
+from placement_guard import PlacementGuard, add_guard_arguments, guard_config
+from placement_oracle import PlacementOracle
+from reward_model import ACCOUNTING_VERSION, RewardModel, state_to_arrays
+from shadow import ShadowPlacement
+from state_codec import STATE_ACCEPT, STATE_MEDIA_TYPE, StateDecoder
+from transitions import TransitionLogger
+
+# Overridable so runs can target a stand-in (common/standin_server.py) or another stack
+CONTROLLER_URL = os.environ.get("CONTROLLER_URL", "http://localhost:8080")
 EVALUATION_DURATION_MINS = 60
 
 # Synchronized frequency with GNN (1 second)
 POLLING_INTERVAL_SECS = 1
 DECISION_INTERVAL_SECS = 1
 
-NUM_KEYS = 20
-NODE_PREFIXES = ['us', 'eu', 'ap', 'sa', 'jp']
-NUM_NODES = len(NODE_PREFIXES)
+# Must match the projection size the model was trained with (see replication_env.py)
+MAX_KEYS = 20
+MAX_NODES = 8
+
+# Reward weights the oracle optimizes for (match replication_env.py)
+LATENCY_WEIGHT = 0.1
+COST_WEIGHT = 0.9
+
+# Weights don't matter here, only latency/cost are reported
+METRICS_MODEL = RewardModel(latency_weight=0.1, cost_weight=0.9)
+
+# Rewards written to transition logs, scaled like ReplicationEnv
+LOG_REWARD_MODEL = RewardModel(LATENCY_WEIGHT, COST_WEIGHT, scale=20.0)
+# Caches the key dictionary across polls of a stable key set
+STATE_DECODER = StateDecoder()
 
 
-def get_system_state():
-    """Fetches the current state of the entire cluster from the controller."""
+def get_system_state(top_k=None):
+    """
+    Fetches the current state of the entire cluster from the controller.
+    With top_k, only the cluster-wide top-K keys are included. Asks for the
+    binary encoding (controllers without it answer JSON) and returns
+    StateArrays, decoded once for the decision, the mask and the metrics.
+    """
+    params = {"topK": top_k} if top_k else None
     try:
-        response = requests.get(f"{CONTROLLER_URL}/rl/system-state", timeout=2)
+        response = requests.get(f"{CONTROLLER_URL}/rl/system-state", params=params,
+                                headers={"Accept": STATE_ACCEPT}, timeout=2)
+        if response.status_code == 400:
+            # top_k above the nodes' top-K capacity: a configuration error, not a blip
+            raise ValueError(f"System state rejected: {response.text}")
         response.raise_for_status()
-        return response.json()
+        if response.headers.get("Content-Type", "").startswith(STATE_MEDIA_TYPE):
+            return STATE_DECODER.decode(response.content)
+        return state_to_arrays(response.json())
     except requests.exceptions.RequestException as e:
         print(f"ERROR: Could not get system state: {e}")
         return None
 
-def parse_state_to_observation(state_json):
+def parse_state_to_observation(state_json, projection, pipeline=None):
     """
     Converts the JSON state into the NumPy vector.
+    Keys and nodes are discovered through the projection, exactly as in ReplicationEnv,
+    and run through the model's observation pipeline if it was trained with one.
     """
-    total_size = NUM_KEYS * NUM_NODES * 3
-    if not state_json:
-        return np.zeros(total_size, dtype=np.float32)
-
-    # Define consistent ordering
-    node_order = [f"replication-{r}" for r in NODE_PREFIXES]
-    key_order = [f"user_profile_{i}" for i in range(NUM_KEYS)]
-
-    presence = np.zeros((NUM_NODES, NUM_KEYS), dtype=np.float32)
-    read_counts = np.zeros((NUM_NODES, NUM_KEYS), dtype=np.float32)
-    write_counts = np.zeros((NUM_NODES, NUM_KEYS), dtype=np.float32)
-
-    # Map API Node IDs to our index
-    node_map = {}
-    for node_data in state_json:
-        node_id = node_data['nodeId']
-        for target in node_order:
-            if target == node_id:
-                node_map[target] = node_data
-                break
-
-    for i, node_name in enumerate(node_order):
-        node_data = node_map.get(node_name)
-        if not node_data: continue
-
-        for key_name, metrics in node_data.get('keyMetrics', {}).items():
-            if key_name in key_order:
-                key_idx = key_order.index(key_name)
-                
-                presence[i, key_idx] = 1.0
-                read_counts[i, key_idx] = np.log1p(metrics.get('readCount', 0))
-                write_counts[i, key_idx] = np.log1p(metrics.get('writeCount', 0))
-    
-    return np.concatenate([
-        presence.flatten(),
-        read_counts.flatten(),
-        write_counts.flatten()
-    ])
+    projection.update(state_json)
+    if pipeline is None:
+        return projection.observation(state_json)
+    observation, presence, counts = projection.observation(state_json, counts=True)
+    rows = grid_rows(observation, counts, projection.node_slots.names, projection.key_slots.names)
+    return pipeline(*rows).ravel(), presence
 
-def get_action_mask(state_json):
+def get_action_mask(presence, projection, guard=None, fits=None):
     """
-    Reconstructs the validity mask so MaskablePPO doesn't pick invalid actions.
+    Reconstructs the validity mask so MaskablePPO doesn't pick invalid actions
+    (nor ones the guard would block, nor replicas to nodes without room: `fits`).
     """
-    limit = NUM_KEYS * NUM_NODES
-    mask = np.zeros(limit * 2, dtype=bool)
-    
-    node_order = [f"replication-{r}" for r in NODE_PREFIXES]
-    key_order = [f"user_profile_{i}" for i in range(NUM_KEYS)]
-    
-    # Identify what exists where
-    presence_map = set()
-    for i, node_name in enumerate(node_order):
-        node_data = next((n for n in state_json if n['nodeId'] == node_name), None)
-        if node_data:
-            for key_name in node_data.get('keyMetrics', {}).keys():
-                if key_name in key_order:
-                    k_idx = key_order.index(key_name)
-                    presence_map.add((k_idx, i))
-
-    for k in range(NUM_KEYS):
-        for n in range(NUM_NODES):
-            flat_idx = (k * NUM_NODES) + n
-            if (k, n) in presence_map:
-                # Exists -> Can Evict (Index + Limit)
-                mask[limit + flat_idx] = True
-            else:
-                # Not Exists -> Can Replicate (Index)
-                mask[flat_idx] = True
-                
+    mask = projection.action_mask(presence, fits)
+    if guard is not None:
+        mask = guard.filter_mask(mask, projection.decode_action, projection.noop_index)
     return mask
 
-def decode_action(action_id):
-    """Converts an integer action back into a command."""
-    limit = NUM_KEYS * NUM_NODES
-    is_evict = action_id >= limit
-    
-    if is_evict:
-        action_id -= limit
-    
-    key_id = action_id // NUM_NODES
-    node_id = action_id % NUM_NODES
-    
-    action_type = "EVICT" if is_evict else "REPLICATE"
-    
-    key_name = f"user_profile_{key_id}"
-    node_name = f"replication-{NODE_PREFIXES[node_id]}"
-    
-    return action_type, key_name, node_name
+def decide_flat(model, state_json, projection, guard=None, pipeline=None):
+    """
+    One decision over the flat action space.
+    Returns ((action_type, key, node) or None, (observation, mask, action id)) for logging.
+    """
+    observation, presence = parse_state_to_observation(state_json, projection, pipeline)
+
+    # --- Generate Mask for Prediction ---
+    # This ensures the agent doesn't try to evict keys that don't exist
+    # or replicate keys that are already there.
+    action_masks = get_action_mask(presence, projection, guard, projection.fits(state_json))
+
+    action, _ = model.predict(observation, action_masks=action_masks, deterministic=True)
+    return decode_action(action.item(), projection), (observation, action_masks, action.item())
+
+def decode_action(action_id, projection):
+    """Converts an integer action back into a command (None for an empty slot)."""
+    return projection.decode_action(action_id)
+
+def decide_factorized(model, state_json, projection, sharder, heads, guard=None, pipeline=None):
+    """
+    Runs the key -> node -> op heads for one decision.
+    Returns (action_type, key, node), or None for the no-op or if nothing in the window is actionable.
+    Actions the guard would block are masked out.
+    """
+    projection.update_nodes(state_json)
+    node_order = projection.node_slots.names
+    window_keys = sharder.select_window(state_json)
+    if guard is not None and guard.active:
+        heads.action_filter = lambda op, k, n: guard.check(OPS[op], window_keys[k], node_order[n]) is None
+    if pipeline is None:
+        window_obs, presence = window_observation(state_json, window_keys, node_order, heads.num_key_slots)
+    else:
+        window_obs, presence, counts = window_observation(state_json, window_keys, node_order,
+                                                          heads.num_key_slots, counts=True)
+        window_obs = pipeline(*grid_rows(window_obs, counts, node_order, window_keys)).ravel()
+    heads.set_available_nodes(projection.node_slots.used())
+    heads.set_replica_fits(window_fits(state_json, window_keys, node_order, heads.num_key_slots))
+    sharder.advance()
+
+    heads.reset()
+    complete = False
+    while not complete:
+        observation = np.concatenate([window_obs, heads.context()])
+        action_masks = heads.mask(presence, len(window_keys))
+        action, _ = model.predict(observation, action_masks=action_masks, deterministic=True)
+        complete = heads.select(action.item(), presence, len(window_keys))
+
+    if not heads.is_valid(presence, len(window_keys)):
+        return None
+    action_type, key_idx, node_idx = heads.decision()
+    return action_type, window_keys[key_idx], node_order[node_idx]
+
+def oracle_decision(oracle, state_json):
+    """Next move toward the oracle's optimal placement, or None once it is reached."""
+    arrays = state_to_arrays(state_json)
+    move = oracle.state_action(arrays)
+    if move is None:
+        return None
+    action_type, key_idx, node_idx = move
+    return action_type, arrays.key_names[key_idx], arrays.node_ids[node_idx]
+
+def log_transition(logger, pending, state_json, observation):
+    """Closes the previous decision (obs, mask, action) with the reward and observation of the current state."""
+    if logger and pending:
+        logger.record(*pending, LOG_REWARD_MODEL.state_reward(state_json), observation)
+
+def load_policy(model_path, action_mode, projection, heads=None, window_keys=MAX_KEYS, loaded_models=None):
+    """
+    Loads a MaskablePPO policy and the observation pipeline saved next to it.
+    Returns (model, pipeline, heads), None if the model can't be loaded.
+    `projection` / `heads` are adapted to models trained without the no-op action.
+    With `loaded_models` ({path: model}), callers share one model per path;
+    the pipeline, which keeps per-stream state, is always loaded afresh.
+    """
+    model = (loaded_models or {}).get(model_path)
+    if model is None:
+        print(f"Loading trained model from {model_path}...")
+        try:
+            model = MaskablePPO.load(model_path)
+        except Exception as e:
+            print(f"ERROR loading model: {e}")
+            return None
+        if loaded_models is not None:
+            loaded_models[model_path] = model
+    # Observation statistics (rates / normalization / frame stack) the model was trained with
+    pipeline = None
+    pipelines = load_pipelines(pipeline_path(model_path))
+    if pipelines:
+        print(f"Using the observation pipeline saved at {pipeline_path(model_path)}")
+        pipeline = pipelines["obs"]
+    if action_mode == "flat" and model.action_space.n == projection.num_actions - 1:
+        print("Model was trained without the no-op action, evaluating without it")
+        projection.noop_action = False
+    if action_mode == "factorized" and model.action_space.n != heads.action_space.n:
+        print("Model was trained without the no-op action, evaluating without it")
+        heads = FactorizedActionHeads(window_keys, MAX_NODES, noop_action=False)
+    return model, pipeline, heads
 
 def execute_action(action_type, key, node):
     """Sends the chosen action to the controller."""
@@ -133,48 +201,47 @@ def calculate_system_metrics(state_json):
     """Calculates aggregate latency and cost from the system state."""
     if not state_json:
         return 0, 0
+    return METRICS_MODEL.state_metrics(state_json)
 
-    total_storage_cost = sum(node.get('storageCost', 0) for node in state_json)
-    
-    total_reads = 0
-    predicted_latency_sum = 0
-    presence_map = {}
-    
-    for node_data in state_json:
-        node_id = node_data['nodeId']
-        for key_name in node_data.get('keyMetrics', {}).keys():
-            if key_name not in presence_map:
-                presence_map[key_name] = set()
-            presence_map[key_name].add(node_id)
-
-    for node_data in state_json:
-        requesting_node_id = node_data['nodeId']
-        for key_name, metrics in node_data.get('keyMetrics', {}).items():
-            reads = metrics.get('readCount', 0)
-            total_reads += reads
-            is_local = requesting_node_id in presence_map.get(key_name, set())
-            latency = 10 if is_local else 150 
-            predicted_latency_sum += reads * latency
 
-    avg_latency = (predicted_latency_sum / total_reads) if total_reads > 0 else 0
-    return avg_latency, total_storage_cost
 
+def run_evaluation(mode, model_path=None, action_mode="flat", num_shards=1, window_keys=MAX_KEYS, top_k=None,
+                   log_transitions=None, guard=None):
+    print(f"--- Starting Evaluation in '{mode.upper()}' Mode ---")
 
+    # Decisions are logged in the flat layout, reusable by behavior_cloning.py
+    logger = None
+    if log_transitions:
+        if action_mode == "factorized":
+            print("WARNING: --log_transitions only supports the flat action mode, not logging")
+        else:
+            logger = TransitionLogger(log_transitions)
+    pending = None
 
-def run_evaluation(mode, model_path=None):
-    print(f"--- Starting Evaluation in '{mode.upper()}' Mode (5 Nodes / 20 Keys) ---")
+    projection = KeyspaceProjection(MAX_KEYS, MAX_NODES)
+    sharder = heads = None
+    if action_mode == "factorized":
+        sharder = KeySharder(num_shards=num_shards, window_size=window_keys)
+        heads = FactorizedActionHeads(window_keys, MAX_NODES)
     
+    # Dwell time / action budgets; also counts executed, blocked and thrashing actions
+    guard = PlacementGuard.from_config(guard)
+
+    def guarded_execute(action_type, key, node):
+        if guard.admit(action_type, key, node):
+            execute_action(action_type, key, node)
+
     model = None
+    pipeline = None
+    oracle = PlacementOracle(LATENCY_WEIGHT, COST_WEIGHT) if mode == 'oracle' else None
     if mode == 'rl':
         if not model_path:
             print("ERROR: Must provide --model_path for 'rl' mode.")
             return
-        print(f"Loading trained model from {model_path}...")
-        try:
-            model = MaskablePPO.load(model_path)
-        except Exception as e:
-            print(f"ERROR loading model: {e}")
+        loaded = load_policy(model_path, action_mode, projection, heads, window_keys)
+        if loaded is None:
             return
+        model, pipeline, heads = loaded
 
     results = []
     start_time = time.time()
@@ -182,38 +249,63 @@ def run_evaluation(mode, model_path=None):
 
     while time.time() - start_time < EVALUATION_DURATION_MINS * 60:
         loop_start = time.time()
-        state_json = get_system_state()
+        state_json = get_system_state(top_k)
         
         # RL Agent Decision
         if mode == 'rl' and state_json:
             if loop_start - last_decision_time >= DECISION_INTERVAL_SECS:
                 last_decision_time = loop_start
-                
-                observation = parse_state_to_observation(state_json)
-                
-                # --- Generate Mask for Prediction ---
-                # This ensures the agent doesn't try to evict keys that don't exist
-                # or replicate keys that are already there.
-                action_masks = get_action_mask(state_json)
-                
-                action, _ = model.predict(observation, action_masks=action_masks, deterministic=True)
-                action_type, key, node = decode_action(action.item())
-                execute_action(action_type, key, node)
+
+                if action_mode == "factorized":
+                    decision = decide_factorized(model, state_json, projection, sharder, heads, guard, pipeline)
+                    if decision:
+                        guarded_execute(*decision)
+                else:
+                    decision, step = decide_flat(model, state_json, projection, guard, pipeline)
+                    log_transition(logger, pending, state_json, step[0])
+                    pending = step
+                    if decision:
+                        guarded_execute(*decision)
+
+        # Oracle Decision: one move per interval, like the agent
+        if mode == 'oracle' and state_json:
+            if loop_start - last_decision_time >= DECISION_INTERVAL_SECS:
+                last_decision_time = loop_start
+                decision = oracle_decision(oracle, state_json)
+
+                if logger:
+                    observation, presence = parse_state_to_observation(state_json, projection)
+                    log_transition(logger, pending, state_json, observation)
+                    # Once the optimum is reached the oracle's move is "stay put"
+                    action_id = projection.encode_action(*decision) if decision else projection.noop_index
+                    pending = None if action_id is None else \
+                        (observation, get_action_mask(presence, projection, fits=projection.fits(state_json)), action_id)
+
+                if decision:
+                    guarded_execute(*decision)
 
         # Metrics Collection
         avg_latency, total_cost = calculate_system_metrics(state_json)
         
         elapsed_time = loop_start - start_time
-        print(f"Time: {int(elapsed_time)}s, Avg Latency: {avg_latency:.2f}ms, Total Cost: ${total_cost:.2f}")
+        placement = guard.stats()
+        print(f"Time: {int(elapsed_time)}s, Avg Latency: {avg_latency:.2f}ms, Total Cost: ${total_cost:.2f}, "
+              f"Actions: {placement['executed']} (thrash {placement['thrash']}, blocked {placement['blocked']})")
         
         results.append({
             "time": elapsed_time,
             "avg_latency": avg_latency,
-            "total_cost": total_cost
+            "total_cost": total_cost,
+            "accounting": ACCOUNTING_VERSION,
+            # Cumulative counts since the start of the run
+            "placement": placement
         })
 
         time.sleep(POLLING_INTERVAL_SECS)
 
+    if logger:
+        logger.close()
+
     # Save results
     output_filename = f"evaluation_results_{mode}_20keys.json"
     with open(output_filename, 'w') as f:
@@ -222,11 +314,218 @@ def run_evaluation(mode, model_path=None):
     print(f"--- Evaluation Finished. Results saved to {output_filename} ---")
 
 
+class ShadowCandidate:
+    """
+    A policy under shadow evaluation. It has its own projection, pipeline state,
+    guard and counterfactual placement, so candidates never see each other's moves.
+    Flat-mode models also keep (model, projection, pipeline) in `flat_policy`, so
+    candidates sharing a model are decided in one batched forward pass.
+    """
+
+    def __init__(self, name, decide, guard, flat_policy=None):
+        self.name = name
+        self.decide = decide  # state -> (action_type, key, node) or None
+        self.guard = guard
+        self.flat_policy = flat_policy
+        self.placement = ShadowPlacement()
+        self.decision_ms = 0.0
+
+
+def make_candidate(spec, action_mode="flat", num_shards=1, window_keys=MAX_KEYS, guard=None, loaded_models=None):
+    """
+    'static' never acts, 'oracle' follows PlacementOracle and anything else is
+    a MaskablePPO model path. Returns None if the model can't be loaded.
+    """
+    guard = PlacementGuard.from_config(guard)
+    if spec == "static":
+        return ShadowCandidate(spec, lambda state: None, guard)
+    if spec == "oracle":
+        oracle = PlacementOracle(LATENCY_WEIGHT, COST_WEIGHT)
+        return ShadowCandidate(spec, lambda state: oracle_decision(oracle, state), guard)
+
+    projection = KeyspaceProjection(MAX_KEYS, MAX_NODES)
+    sharder = heads = None
+    if action_mode == "factorized":
+        sharder = KeySharder(num_shards=num_shards, window_size=window_keys)
+        heads = FactorizedActionHeads(window_keys, MAX_NODES)
+    loaded = load_policy(spec, action_mode, projection, heads, window_keys, loaded_models)
+    if loaded is None:
+        return None
+    model, pipeline, heads = loaded
+
+    name = os.path.splitext(os.path.basename(spec))[0]
+    if action_mode == "factorized":
+        decide = lambda state: decide_factorized(model, state, projection, sharder, heads, guard, pipeline)
+        return ShadowCandidate(name, decide, guard)
+    decide = lambda state: decide_flat(model, state, projection, guard, pipeline)[0]
+    return ShadowCandidate(name, decide, guard, flat_policy=(model, projection, pipeline))
+
+
+def decide_flat_batch(model, candidates, states):
+    """
+    decide_flat for several candidates of the same model, with their
+    observations in one forward pass. Returns one decision per candidate.
+    """
+    observations, masks = [], []
+    for candidate, state in zip(candidates, states):
+        _, projection, pipeline = candidate.flat_policy
+        observation, presence = parse_state_to_observation(state, projection, pipeline)
+        observations.append(observation)
+        masks.append(get_action_mask(presence, projection, candidate.guard, projection.fits(state)))
+    actions, _ = model.predict(np.stack(observations), action_masks=np.stack(masks), deterministic=True)
+    return [decode_action(int(action), candidate.flat_policy[1]) for action, candidate in zip(actions, candidates)]
+
+
+def shadow_decision_groups(candidates):
+    """
+    Candidates that decide together: flat-mode candidates grouped by model
+    (one batched forward pass each), every other candidate on its own.
+    """
+    groups, by_model = [], {}
+    for candidate in candidates:
+        if candidate.flat_policy is None:
+            groups.append([candidate])
+        else:
+            model = candidate.flat_policy[0]
+            if id(model) not in by_model:
+                by_model[id(model)] = []
+                groups.append(by_model[id(model)])
+            by_model[id(model)].append(candidate)
+    return groups
+
+
+def decide_group(group, shadow_states):
+    """[(decision, ms)] for one decision group; a batch's time is charged to each of its candidates."""
+    started = time.perf_counter()
+    states = [shadow_states[candidate.name] for candidate in group]
+    if group[0].flat_policy is None:
+        decisions = [group[0].decide(states[0])]
+    else:
+        decisions = decide_flat_batch(group[0].flat_policy[0], group, states)
+    elapsed = (time.perf_counter() - started) * 1000
+    return [(decision, elapsed) for decision in decisions]
+
+
+def shadow_summary(results, names):
+    """Side-by-side means over the run; reward is scaled like ReplicationEnv's."""
+    rows = [("live", [r["live"] for r in results])] + [(n, [r["candidates"][n] for r in results]) for n in names]
+    lines = [f"{'policy':<24}{'latency ms':>12}{'cost $':>10}{'reward':>10}{'actions':>9}{'thrash':>8}"
+             f"{'decide ms':>11}"]
+    for name, entries in rows:
+        latency = np.mean([e["avg_latency"] for e in entries])
+        cost = np.mean([e["total_cost"] for e in entries])
+        reward = np.mean([LOG_REWARD_MODEL.reward_from_metrics(e["avg_latency"], e["total_cost"]) for e in entries])
+        placement = entries[-1].get("placement", {})
+        decide = f"{np.mean([e['decision_ms'] for e in entries]):.2f}" if "decision_ms" in entries[0] else "-"
+        lines.append(f"{name:<24}{latency:>12.2f}{cost:>10.2f}{reward:>10.2f}{placement.get('executed', '-'):>9}"
+                     f"{placement.get('thrash', '-'):>8}{decide:>11}")
+    return "\n".join(lines)
+
+
+def run_shadow(candidate_specs, action_mode="flat", num_shards=1, window_keys=MAX_KEYS, top_k=None, guard=None):
+    """
+    Dry run: every candidate decides on the live stream as if it were in
+    charge, but its actions only move its own shadow placement, which is
+    scored with the same model as the live one. Nothing is sent to the
+    controller. The state is fetched and parsed once per poll for all candidates.
+
+    Candidates given the same flat-mode model share it and decide in one
+    batched forward pass. The decision groups (models, oracle, factorized
+    candidates) run concurrently, each on its own thread.
+    """
+    print(f"--- Starting Shadow Evaluation of {', '.join(candidate_specs)} ---")
+    loaded_models = {}
+    candidates = [make_candidate(spec, action_mode, num_shards, window_keys, guard, loaded_models)
+                  for spec in candidate_specs]
+    if any(c is None for c in candidates):
+        return
+    names = [c.name for c in candidates]
+    for i, candidate in enumerate(candidates):
+        if names.count(candidate.name) > 1:
+            candidate.name = f"{candidate.name}#{i}"
+    names = [c.name for c in candidates]
+    groups = shadow_decision_groups(candidates)
+    executor = ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="shadow")
+
+    results = []
+    start_time = time.time()
+    last_decision_time = 0
+
+    while time.time() - start_time < EVALUATION_DURATION_MINS * 60:
+        loop_start = time.time()
+        state_json = get_system_state(top_k)
+        if not state_json:
+            time.sleep(POLLING_INTERVAL_SECS)
+            continue
+        live = state_to_arrays(state_json)
+        decide = loop_start - last_decision_time >= DECISION_INTERVAL_SECS
+        if decide:
+            last_decision_time = loop_start
+
+        avg_latency, total_cost = calculate_system_metrics(live)
+        entry = {
+            "time": loop_start - start_time,
+            "accounting": ACCOUNTING_VERSION,
+            "live": {"avg_latency": avg_latency, "total_cost": total_cost},
+            "candidates": {}
+        }
+        # Scored before acting, like the live metrics
+        shadow_states = {c.name: c.placement.observe(live) for c in candidates}
+        shadow_metrics = {name: calculate_system_metrics(state) for name, state in shadow_states.items()}
+        if decide:
+            futures = [executor.submit(decide_group, group, shadow_states) for group in groups]
+            for group, future in zip(groups, futures):
+                for candidate, (decision, elapsed) in zip(group, future.result()):
+                    if decision and candidate.guard.admit(*decision):
+                        candidate.placement.apply(*decision)
+                    candidate.decision_ms = elapsed
+        for candidate in candidates:
+            latency, cost = shadow_metrics[candidate.name]
+            entry["candidates"][candidate.name] = {
+                "avg_latency": latency,
+                "total_cost": cost,
+                "replicas": candidate.placement.replicas(),
+                "decision_ms": candidate.decision_ms,
+                # Cumulative counts since the start of the run
+                "placement": candidate.guard.stats()
+            }
+        results.append(entry)
+
+        print(f"Time: {int(entry['time'])}s, live {avg_latency:.2f}ms ${total_cost:.2f} | " + " | ".join(
+            f"{name} {c['avg_latency']:.2f}ms ${c['total_cost']:.2f}" for name, c in entry["candidates"].items()))
+
+        time.sleep(POLLING_INTERVAL_SECS)
+    executor.shutdown()
+
+    output_filename = "evaluation_results_shadow_20keys.json"
+    with open(output_filename, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    if results:
+        print(shadow_summary(results, names))
+    print(f"--- Shadow Evaluation Finished. Results saved to {output_filename} ---")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", type=str, required=True, choices=['static', 'rl'])
+    parser.add_argument("--mode", type=str, required=True, choices=['static', 'rl', 'oracle', 'shadow'])
     # Default to the masked model name you used
     parser.add_argument("--model_path", type=str, default="ppo_replication_policy.zip")
+    parser.add_argument("--action_mode", type=str, default="flat", choices=["flat", "factorized"])
+    parser.add_argument("--num_shards", type=int, default=1)
+    parser.add_argument("--window_keys", type=int, default=MAX_KEYS)
+    parser.add_argument("--top_k", type=int, default=None,
+                        help="Fetch only the K hottest keys (metrics below are then over those keys)")
+    parser.add_argument("--log_transitions", type=str, default=None,
+                        help="Record every decision into this shard directory (rl/oracle modes, flat actions)")
+    parser.add_argument("--candidates", type=str, nargs="+", default=None,
+                        help="Shadow mode: model paths, 'oracle' or 'static', evaluated side by side without acting")
+    add_guard_arguments(parser)
     args = parser.parse_args()
-    
-    run_evaluation(args.mode, args.model_path)
\ No newline at end of file
+
+    if args.mode == "shadow":
+        run_shadow(args.candidates or [args.model_path], args.action_mode, args.num_shards, args.window_keys,
+                   args.top_k, guard_config(args))
+    else:
+        run_evaluation(args.mode, args.model_path, args.action_mode, args.num_shards, args.window_keys, args.top_k,
+                       args.log_transitions, guard_config(args))
\ No newline at end of file
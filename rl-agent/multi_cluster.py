@@ -0,0 +1,317 @@
+"""
+Multi-cluster control loop: one process driving many independent clusters.
+
+Every cluster (one controller per tenant) keeps its own keyspace projection,
+observation pipeline state and placement guard, and all of them share one
+MaskablePPO policy:
+
+  - one coroutine per cluster polls /rl/system-state on the cluster's own
+    decision interval, over a shared aiohttp connection pool;
+  - decoding a state, building its observation and mask and scoring its
+    metrics run in the default thread pool, not on the event loop;
+  - observations that arrive within BATCH_WINDOW_MS of each other go
+    through the policy in one batched forward pass, on the policy's own
+    thread so polling continues meanwhile;
+  - each cluster's coroutine posts its own action, so dispatch is concurrent
+    across clusters.
+
+Backpressure: a cluster never has more than one decision in flight. A tick
+that comes due while the previous decision is still running is skipped and
+counted as an overrun, not queued. --max_inflight caps concurrent HTTP
+requests over all clusters. Any failure in one cluster's cycle is counted
+as an error of that cluster; the other clusters carry on.
+
+Clusters come from a JSON list of {"url", "name", "decision_interval",
+"top_k"} (only "url" is required) or straight from the command line:
+
+    python multi_cluster.py --model_path ppo_mlp_20keys.zip --clusters clusters.json
+    python multi_cluster.py --model_path ppo_mlp_20keys.zip --controller_urls http://a:8080 http://b:8080
+
+Flat action mode only: a factorized decision is several autoregressive
+forward passes per cluster (see evaluate.py).
+"""
+import os
+import sys
+import copy
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import numpy as np
+
+from evaluate import (DECISION_INTERVAL_SECS, EVALUATION_DURATION_MINS, MAX_KEYS, MAX_NODES, calculate_system_metrics,
+                      decode_action, get_action_mask, load_policy, parse_state_to_observation)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from keyspace import KeyspaceProjection
+from placement_guard import PlacementGuard, add_guard_arguments, guard_config
+from reward_model import ACCOUNTING_VERSION, state_to_arrays
+from state_codec import STATE_ACCEPT, STATE_MEDIA_TYPE, StateDecoder
+
+# A batch closes this long after its first observation, or when full
+BATCH_WINDOW_MS = 5
+MAX_BATCH = 512
+MAX_INFLIGHT = 128
+HTTP_TIMEOUT_SECS = 2
+SUMMARY_INTERVAL_SECS = 10
+
+STATE_HEADERS = {"Accept": STATE_ACCEPT}
+
+
+class Cluster:
+    """One controller and everything the loop keeps per cluster."""
+
+    def __init__(self, url, name=None, decision_interval=DECISION_INTERVAL_SECS, top_k=None,
+                 noop_action=True, pipeline=None, guard=None):
+        self.url = url.rstrip("/")
+        self.name = name or self.url
+        self.decision_interval = decision_interval
+        self.params = {"topK": top_k} if top_k else None
+        self.projection = KeyspaceProjection(MAX_KEYS, MAX_NODES, noop_action=noop_action)
+        # Rate and frame stack state is per cluster, the normalization statistics are the model's
+        self.pipeline = copy.deepcopy(pipeline)
+        self.guard = PlacementGuard.from_config(guard)
+        self.decoder = StateDecoder()
+
+        self.decisions = 0
+        self.overruns = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.cost_sum = 0.0
+        self.cycle_ms = deque(maxlen=1000)
+
+    def summary(self):
+        cycles = np.array(self.cycle_ms) if self.cycle_ms else np.zeros(1)
+        return {
+            "name": self.name,
+            "url": self.url,
+            "decisions": self.decisions,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "avg_latency": self.latency_sum / max(self.decisions, 1),
+            "total_cost": self.cost_sum / max(self.decisions, 1),
+            "cycle_p50_ms": float(np.percentile(cycles, 50)),
+            "cycle_p95_ms": float(np.percentile(cycles, 95)),
+            "placement": self.guard.stats()
+        }
+
+
+class BatchedPolicy:
+    """
+    Collects (observation, mask) pairs from every cluster and answers them
+    with one MaskablePPO forward pass per batch. While a batch is in the
+    executor the next one fills up, so batches grow with load.
+    """
+
+    def __init__(self, model, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        # Batches never wait behind the clusters' observation work in the default pool
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="policy")
+        self.batches = 0
+        self.batched = 0
+        self.forward_ms = 0.0
+
+    async def decide(self, observation, mask):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((observation, mask, future))
+        return await future
+
+    def _predict(self, observations, masks):
+        start = time.perf_counter()
+        actions, _ = self.model.predict(observations, action_masks=masks, deterministic=True)
+        self.forward_ms += (time.perf_counter() - start) * 1000
+        return actions
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            observations = np.stack([b[0] for b in batch])
+            masks = np.stack([b[1] for b in batch])
+            try:
+                actions = await loop.run_in_executor(self.executor, self._predict, observations, masks)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched += len(batch)
+            for (_, _, future), action in zip(batch, actions):
+                if not future.done():
+                    future.set_result(int(action))
+
+
+async def fetch_state(session, cluster):
+    """(body, content type) of the cluster's /rl/system-state; decoded by observe, off the event loop."""
+    async with session.get(f"{cluster.url}/rl/system-state", params=cluster.params, headers=STATE_HEADERS) as response:
+        response.raise_for_status()
+        return await response.read(), response.headers.get("Content-Type", "")
+
+
+def observe(cluster, body, content_type):
+    """
+    Decodes a state and builds everything the cycle needs from it:
+    (observation, mask, (avg latency, total cost)), or None if no
+    node answered. CPU work, run in the thread pool; a cluster has at most
+    one cycle in flight, so its projection, pipeline and guard are never
+    used by two threads at once.
+    """
+    if content_type.startswith(STATE_MEDIA_TYPE):
+        state = cluster.decoder.decode(body)
+    else:
+        # Parsed once: the observation, the mask and the metrics all read the arrays
+        state = state_to_arrays(json.loads(body))
+    if not state:
+        return None
+    observation, presence = parse_state_to_observation(state, cluster.projection, cluster.pipeline)
+    mask = get_action_mask(presence, cluster.projection, cluster.guard, cluster.projection.fits(state))
+    return observation, mask, calculate_system_metrics(state)
+
+
+async def execute_action(session, cluster, action_type, key, node):
+    payload = {"actionType": action_type, "key": key, "targetNode": node}
+    async with session.post(f"{cluster.url}/rl/execute-action", json=payload) as response:
+        response.raise_for_status()
+
+
+async def control_cluster(cluster, session, policy, start, deadline, offset):
+    """Fetch -> decide -> act, once per decision interval, until `deadline` (loop time)."""
+    loop = asyncio.get_running_loop()
+    # Spread the first polls over the interval instead of firing every cluster at once
+    next_tick = start + offset
+    while next_tick < deadline:
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        started = loop.time()
+        try:
+            body, content_type = await fetch_state(session, cluster)
+            observed = await loop.run_in_executor(None, observe, cluster, body, content_type)
+            if observed:
+                observation, mask, (avg_latency, total_cost) = observed
+                decision = decode_action(await policy.decide(observation, mask), cluster.projection)
+                if decision and cluster.guard.admit(*decision):
+                    await execute_action(session, cluster, *decision)
+
+                cluster.latency_sum += avg_latency
+                cluster.cost_sum += total_cost
+                cluster.decisions += 1
+        except Exception as e:
+            # HTTP failures, a malformed state, a failed forward pass: this cluster's cycle only
+            cluster.errors += 1
+            if cluster.errors == 1 or cluster.errors % 100 == 0:
+                print(f"ERROR [{cluster.name}] ({cluster.errors} so far): {e!r}")
+        cluster.cycle_ms.append((loop.time() - started) * 1000)
+
+        next_tick += cluster.decision_interval
+        now = loop.time()
+        if next_tick < now:
+            missed = int((now - next_tick) // cluster.decision_interval) + 1
+            cluster.overruns += missed
+            next_tick += missed * cluster.decision_interval
+
+
+async def report(clusters, policy, start):
+    """Prints throughput, batch size, cycle times and error counts every SUMMARY_INTERVAL_SECS."""
+    loop = asyncio.get_running_loop()
+    last_decisions, last_batches, last_batched = 0, 0, 0
+    while True:
+        await asyncio.sleep(SUMMARY_INTERVAL_SECS)
+        decisions = sum(c.decisions for c in clusters)
+        cycles = np.concatenate([list(c.cycle_ms) for c in clusters]) if decisions else np.zeros(1)
+        batches = policy.batches - last_batches
+        mean_batch = (policy.batched - last_batched) / max(batches, 1)
+        print(f"Time: {int(loop.time() - start)}s, decisions/s: {(decisions - last_decisions) / SUMMARY_INTERVAL_SECS:.1f}, "
+              f"mean batch: {mean_batch:.1f}, cycle p50/p95: {np.percentile(cycles, 50):.1f}/"
+              f"{np.percentile(cycles, 95):.1f}ms, overruns: {sum(c.overruns for c in clusters)}, "
+              f"errors: {sum(c.errors for c in clusters)}")
+        last_decisions, last_batches, last_batched = decisions, policy.batches, policy.batched
+
+
+async def run_clusters(clusters, model, duration_secs, max_inflight=MAX_INFLIGHT):
+    policy = BatchedPolicy(model)
+    connector = aiohttp.TCPConnector(limit=max_inflight)
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECS)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + duration_secs
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        background = [asyncio.create_task(policy.run()), asyncio.create_task(report(clusters, policy, start))]
+        await asyncio.gather(*(
+            control_cluster(c, session, policy, start, deadline, c.decision_interval * i / len(clusters))
+            for i, c in enumerate(clusters)))
+        for task in background:
+            task.cancel()
+    policy.executor.shutdown()
+
+    elapsed = loop.time() - start
+    return {
+        "accounting": ACCOUNTING_VERSION,
+        "duration_secs": elapsed,
+        "decisions_per_sec": sum(c.decisions for c in clusters) / elapsed,
+        "batches": policy.batches,
+        "mean_batch": policy.batched / max(policy.batches, 1),
+        "forward_ms_per_batch": policy.forward_ms / max(policy.batches, 1),
+        "clusters": [c.summary() for c in clusters]
+    }
+
+
+def load_clusters(path=None, urls=None):
+    """Cluster entries from a JSON file and/or a list of controller URLs."""
+    entries = []
+    if path:
+        with open(path) as f:
+            entries = json.load(f)
+    entries += [{"url": url} for url in urls or []]
+    return entries
+
+
+def main(model_path, entries, duration_mins=EVALUATION_DURATION_MINS, max_inflight=MAX_INFLIGHT, guard=None,
+         output="multi_cluster_results.json"):
+    if not entries:
+        print("ERROR: No clusters given (--clusters or --controller_urls)")
+        return
+    template = KeyspaceProjection(MAX_KEYS, MAX_NODES)
+    loaded = load_policy(model_path, "flat", template)
+    if loaded is None:
+        return
+    model, pipeline, _ = loaded
+
+    clusters = [Cluster(e["url"], e.get("name"), e.get("decision_interval", DECISION_INTERVAL_SECS), e.get("top_k"),
+                        template.noop_action, pipeline, guard) for e in entries]
+    print(f"--- Controlling {len(clusters)} clusters for {duration_mins} min ---")
+    results = asyncio.run(run_clusters(clusters, model, duration_mins * 60, max_inflight))
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"{results['decisions_per_sec']:.1f} decisions/s over {len(clusters)} clusters, "
+          f"mean batch {results['mean_batch']:.1f} ({results['forward_ms_per_batch']:.2f} ms per forward pass)")
+    print(f"--- Finished. Results saved to {output} ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", type=str, default="ppo_replication_policy.zip")
+    parser.add_argument("--clusters", type=str, default=None,
+                        help='JSON list of {"url", "name", "decision_interval", "top_k"}')
+    parser.add_argument("--controller_urls", type=str, nargs="+", default=None)
+    parser.add_argument("--duration_mins", type=float, default=EVALUATION_DURATION_MINS)
+    parser.add_argument("--max_inflight", type=int, default=MAX_INFLIGHT,
+                        help="Concurrent HTTP requests over all clusters")
+    parser.add_argument("--output", type=str, default="multi_cluster_results.json")
+    add_guard_arguments(parser)
+    args = parser.parse_args()
+
+    main(args.model_path, load_clusters(args.clusters, args.controller_urls), args.duration_mins, args.max_inflight,
+         guard_config(args), args.output)
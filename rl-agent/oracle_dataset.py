@@ -0,0 +1,78 @@
+"""
+Generates a behavior-cloning dataset for the MLP policy from the placement oracle.
+
+Each episode starts from a random synthetic state and follows the oracle's
+moves until the placement is optimal (ending with one no-op), recording transitions in exactly the
+layout ReplicationEnv uses in flat mode (see common/transitions.py).
+
+    python oracle_dataset.py --episodes 500 --output transitions/oracle
+    python train.py --warm_start transitions/oracle
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from keyspace import KeyspaceProjection
+from placement_oracle import PlacementOracle, apply_action, synthetic_state
+from reward_model import RewardModel, state_to_arrays
+from transitions import TransitionLogger
+
+from replication_env import COST_WEIGHT, LATENCY_WEIGHT, MAX_KEYS, MAX_NODES
+
+
+def generate(logger, episodes, max_moves, seed):
+    rng = np.random.default_rng(seed)
+    oracle = PlacementOracle(LATENCY_WEIGHT, COST_WEIGHT)
+    # Same reward scale as ReplicationEnv
+    reward_model = RewardModel(LATENCY_WEIGHT, COST_WEIGHT, scale=20.0)
+    recorded = 0
+
+    for _ in range(episodes):
+        num_nodes = int(rng.integers(2, MAX_NODES + 1))
+        num_keys = int(rng.integers(1, MAX_KEYS + 1))
+        state = synthetic_state(rng, num_keys, num_nodes)
+        projection = KeyspaceProjection(MAX_KEYS, MAX_NODES)
+
+        for _ in range(max_moves):
+            arrays = state_to_arrays(state)
+            move = oracle.state_action(arrays)
+            if move is None:
+                # Optimal placement reached: teach the policy to stay put
+                projection.update(state)
+                observation, presence = projection.observation(state)
+                logger.record(observation, projection.action_mask(presence), projection.noop_index,
+                              reward_model.state_reward(state), observation)
+                recorded += 1
+                break
+            action_type, key_idx, node_idx = move
+            key, node = arrays.key_names[key_idx], arrays.node_ids[node_idx]
+
+            projection.update(state)
+            observation, presence = projection.observation(state)
+            mask = projection.action_mask(presence)
+            action_id = projection.encode_action(action_type, key, node)
+            apply_action(state, action_type, key, node)
+            if action_id is None:
+                continue
+
+            projection.update(state)
+            next_observation, _ = projection.observation(state)
+            logger.record(observation, mask, action_id, reward_model.state_reward(state), next_observation)
+            recorded += 1
+
+    logger.close()
+    return recorded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, default=500)
+    parser.add_argument("--max_moves", type=int, default=200, help="Oracle moves per episode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="transitions/oracle", help="Shard directory")
+    args = parser.parse_args()
+
+    recorded = generate(TransitionLogger(args.output), args.episodes, args.max_moves, args.seed)
+    print(f"Saved {recorded} oracle decisions to {args.output}")
@@ -1,32 +1,40 @@
-import json
+import os
+import sys
+
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from result_series import accounting_label, downsample, load_series
+
+# Points per curve: about one per pixel column of the default 12 in figure
+PLOT_POINTS = 1200
+
+def load_curves(filename):
+    """
+    Reads a results file in chunks and returns (accounting, latency curve, cost curve),
+    each curve a min/max-downsampled (minutes, values) pair.
+    """
+    columns, accounting = load_series(filename)
+    minutes = columns['time'] / 60
+    latency = downsample(minutes, columns['avg_latency'], PLOT_POINTS)
+    cost = downsample(minutes, columns['total_cost'], PLOT_POINTS)
+    return accounting, latency, cost
+
 def plot_comparison(static_file, rl_file):
     """
     Loads evaluation results from two JSON files and generates
     comparative plots for latency and cost.
     """
-    with open(static_file, 'r') as f:
-        static_data = json.load(f)
-    
-    with open(rl_file, 'r') as f:
-        rl_data = json.load(f)
-
-    static_time = [item['time'] / 60 for item in static_data]
-    static_latency = [item['avg_latency'] for item in static_data]
-    static_cost = [item['total_cost'] for item in static_data]
-
-    rl_time = [item['time'] / 60 for item in rl_data]
-    rl_latency = [item['avg_latency'] for item in rl_data]
-    rl_cost = [item['total_cost'] for item in rl_data]
+    static_accounting, (static_lat_time, static_latency), (static_cost_time, static_cost) = load_curves(static_file)
+    rl_accounting, (rl_lat_time, rl_latency), (rl_cost_time, rl_cost) = load_curves(rl_file)
 
     # Average Read Latency Comparison ---
     
     plt.style.use('seaborn-v0_8-whitegrid')
     fig, ax1 = plt.subplots(figsize=(12, 7))
 
-    ax1.plot(static_time, static_latency, label='Static Policy (Baseline)', color='red', linestyle='--')
-    ax1.plot(rl_time, rl_latency, label='RL Agent Policy (AI)', color='blue', linewidth=2)
+    ax1.plot(static_lat_time, static_latency, label=accounting_label(static_accounting, 'Static Policy (Baseline)'), color='red', linestyle='--')
+    ax1.plot(rl_lat_time, rl_latency, label=accounting_label(rl_accounting, 'RL Agent Policy (AI)'), color='blue', linewidth=2)
     
     ax1.set_xlabel('Time (minutes)', fontsize=14)
     ax1.set_ylabel('Average Read Latency (ms)', fontsize=14)
@@ -43,8 +51,8 @@ def plot_comparison(static_file, rl_file):
 
     fig, ax2 = plt.subplots(figsize=(12, 7))
 
-    ax2.plot(static_time, static_cost, label='Static Policy (Baseline)', color='red', linestyle='--')
-    ax2.plot(rl_time, rl_cost, label='RL Agent Policy (AI)', color='blue', linewidth=2)
+    ax2.plot(static_cost_time, static_cost, label=accounting_label(static_accounting, 'Static Policy (Baseline)'), color='red', linestyle='--')
+    ax2.plot(rl_cost_time, rl_cost, label=accounting_label(rl_accounting, 'RL Agent Policy (AI)'), color='blue', linewidth=2)
 
     ax2.set_xlabel('Time (minutes)', fontsize=14)
     ax2.set_ylabel('Total Storage Cost ($)', fontsize=14)
@@ -1,14 +1,26 @@
+import os
+import sys
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import requests
 
-NUM_NODES = 5
-NUM_KEYS = 20
-CONTROLLER_URL = "http://localhost:8080"
-
-# Match your Docker Compose service names
-NODE_PREFIXES = ['us', 'eu', 'ap', 'sa', 'jp'] 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from factorized_actions import OPS, FactorizedActionHeads, KeySharder, window_fits, window_observation
+from keyspace import KeyspaceProjection
+from obs_pipeline import build_pipeline, grid_rows, load_pipelines
+from placement_guard import PlacementGuard
+from reward_model import RewardModel, state_to_arrays
+from state_codec import STATE_ACCEPT, STATE_MEDIA_TYPE, StateDecoder
+from telemetry import TELEMETRY
+
+# Observation capacity. Keys and nodes are discovered from /rl/system-state;
+# MAX_KEYS is the size of the hot-key projection, MAX_NODES leaves headroom
+# for adding regions without changing the network input size.
+MAX_KEYS = 20
+MAX_NODES = 8
+# Overridable so runs can target a stand-in (common/standin_server.py) or another stack
+CONTROLLER_URL = os.environ.get("CONTROLLER_URL", "http://localhost:8080")
 
 # Reward Weights (Matching your GNN config for fair comparison)
 LATENCY_WEIGHT = 0.1
@@ -17,185 +29,224 @@ COST_WEIGHT = 0.9
 class ReplicationEnv(gym.Env):
     metadata = {'render_modes': ['human']}
 
-    def __init__(self):
+    def __init__(self, action_mode="flat", num_shards=1, window_keys=MAX_KEYS,
+                 max_keys=MAX_KEYS, max_nodes=MAX_NODES, top_k=None,
+                 latency_matrix=None, storage_prices=None, state_format="json", guard=None, obs_pipeline=None):
         super(ReplicationEnv, self).__init__()
 
-        # Total actions = (replicate + evict) for every (key * node) combo
-        # Action space size = 20 * 5 * 2 = 200
-        self.action_space = spaces.Discrete(NUM_KEYS * NUM_NODES * 2)
+        # Scale reward down slightly to prevent huge numbers with 20 keys.
+        # latency_matrix / storage_prices follow the node order of /rl/system-state.
+        self.reward_model = RewardModel(LATENCY_WEIGHT, COST_WEIGHT, latency_matrix=latency_matrix,
+                                        storage_prices=storage_prices, scale=20.0)
+
+        self.action_mode = action_mode
+        # Only the cluster-wide top-K keys are fetched (the controller merges the
+        # nodes' heavy hitters). Defaults to exactly what the layout can show.
+        if top_k is None:
+            top_k = window_keys * num_shards if action_mode == "factorized" else max_keys
+        self.top_k = top_k
+        # "binary" asks the controller for the columnar encoding (common/state_codec.py)
+        # and works on the decoded arrays; controllers without it still answer JSON
+        if state_format not in ("json", "binary"):
+            raise ValueError(f"Unknown state_format '{state_format}'")
+        self.state_format = state_format
+        self._state_headers = {"Accept": STATE_ACCEPT} if state_format == "binary" else None
+        self._state_decoder = StateDecoder()
+        # Dwell time / action budgets (PlacementGuard arguments); blocked actions are
+        # masked out, and the guard counts executed, blocked and thrashing actions
+        self.guard = PlacementGuard.from_config(guard)
+        self.projection = KeyspaceProjection(max_keys, max_nodes)
+        self._presence = np.zeros((max_nodes, max_keys), dtype=np.float32)
+        self._fits = None
+        # Optional rate / normalization / frame-stack stages over the (node, key)
+        # cells of the observation (common/obs_pipeline.py). Presence is not normalized.
+        num_cells = max_nodes * (window_keys if action_mode == "factorized" else max_keys)
+        self.obs_pipeline = build_pipeline(obs_pipeline, 3, num_cells, num_counts=2, skip_columns=(0,))
+        cell_size = self.obs_pipeline.output_dim if self.obs_pipeline else 3
+        obs_low = -np.inf if self.obs_pipeline else 0
+        if action_mode == "factorized":
+            self._init_factorized(num_shards, window_keys, cell_size, obs_low)
+            return
+
+        # Total actions = (replicate + evict) for every (key slot * node slot) combo, plus a no-op
+        # Action space size = 20 * 8 * 2 + 1 = 321
+        self.action_space = spaces.Discrete(self.projection.num_actions)
 
         # State vector: [presence_matrix, read_counts, write_counts]
-        # Size = 3 * (20 * 5) = 300 inputs
-        state_size = NUM_KEYS * NUM_NODES * 3
-        self.observation_space = spaces.Box(low=0, high=np.inf, shape=(state_size,), dtype=np.float32)
+        # Size = 3 * (20 * 8) = 480 inputs (with a pipeline: its output per cell)
+        state_size = max_keys * max_nodes * cell_size
+        self.observation_space = spaces.Box(low=obs_low, high=np.inf, shape=(state_size,), dtype=np.float32)
 
         print(f"ReplicationEnv initialized. State Size: {state_size}, Action Size: {self.action_space.n}")
 
+    def _init_factorized(self, num_shards, window_keys, cell_size, obs_low):
+        # Factorized mode: the policy sees a window of `window_keys` keys picked
+        # by the sharder and decides key -> node -> op over successive sub-steps.
+        # Network size depends on the window, not on how many keys exist.
+        # Only the node slots of the projection are used here, keys come from the sharder.
+        max_nodes = self.projection.max_nodes
+        self.sharder = KeySharder(num_shards=num_shards, window_size=window_keys)
+        self.heads = FactorizedActionHeads(window_keys, max_nodes)
+        self.action_space = self.heads.action_space
+
+        state_size = window_keys * max_nodes * cell_size + self.heads.context_size
+        self.observation_space = spaces.Box(low=obs_low, high=np.inf, shape=(state_size,), dtype=np.float32)
+
+        self._state_json = None
+        self._window_keys = []
+        self._window_obs = None
+
+        print(f"ReplicationEnv initialized (factorized). State Size: {state_size}, "
+              f"Action Size: {self.action_space.n}, Shards: {num_shards}")
+
+    def _load_window(self, state_json):
+        self._state_json = state_json
+        self.projection.update_nodes(state_json)
+        self._window_keys = self.sharder.select_window(state_json)
+        if self.guard.active:
+            keys, nodes = self._window_keys, self.projection.node_slots.names
+            self.heads.action_filter = lambda op, k, n: self.guard.check(OPS[op], keys[k], nodes[n]) is None
+        node_names = self.projection.node_slots.names
+        if self.obs_pipeline is None:
+            self._window_obs, self._presence = window_observation(
+                state_json, self._window_keys, node_names, self.heads.num_key_slots)
+        else:
+            window_obs, self._presence, counts = window_observation(
+                state_json, self._window_keys, node_names, self.heads.num_key_slots, counts=True)
+            self._window_obs = self._apply_pipeline(window_obs, counts, node_names, self._window_keys)
+        self.heads.set_available_nodes(self.projection.node_slots.used())
+        self.heads.set_replica_fits(window_fits(state_json, self._window_keys, node_names, self.heads.num_key_slots))
+        self.heads.reset()
+
+    def _factorized_obs(self):
+        return np.concatenate([self._window_obs, self.heads.context()])
+
+    def _step_factorized(self, action):
+        num_real = len(self._window_keys)
+        if not self.heads.select(action, self._presence, num_real):
+            # Intermediate head: nothing touches the cluster yet
+            return self._factorized_obs(), 0.0, False, False, {}
+
+        if self.heads.is_valid(self._presence, num_real):
+            action_type, key_idx, node_idx = self.heads.decision()
+            key, node = self._window_keys[key_idx], self.projection.node_slots.names[node_idx]
+            if self.guard.admit(action_type, key, node):
+                self._execute_action(action_type, key, node)
+
+        new_state = self._poll_state()
+        reward = self._calculate_reward(new_state)
+        self.sharder.advance()
+        self._load_window(new_state)
+        return self._factorized_obs(), reward, False, False, {}
+
     def _decode_action(self, action_id):
-        # Logic: 
-        # 0..99   = REPLICATE (Keys 0-19 on Node 0, then Node 1...)
-        # 100..199 = EVICT
-        
-        limit = NUM_KEYS * NUM_NODES
-        is_evict = action_id >= limit
-        
-        if is_evict:
-            action_id -= limit
-        
-        # Calculate indices
-        key_id = action_id // NUM_NODES
-        node_id = action_id % NUM_NODES
-        
-        action_type = "EVICT" if is_evict else "REPLICATE"
-        
-        key_name = f"user_profile_{key_id}"
-        node_name = f"replication-{NODE_PREFIXES[node_id]}"
-        
-        return action_type, key_name, node_name
+        # Logic:
+        # 0..(K*N-1)       = REPLICATE (key slot * MAX_NODES + node slot)
+        # (K*N)..(2*K*N-1) = EVICT
+        # Slots are resolved to names through the keyspace projection.
+        return self.projection.decode_action(int(action_id))
 
     def _get_system_state(self):
         try:
-            response = requests.get(f"{CONTROLLER_URL}/rl/system-state", timeout=5)
-            response.raise_for_status()
-            return response.json()
+            with TELEMETRY.timer("http_state"):
+                response = requests.get(f"{CONTROLLER_URL}/rl/system-state", params={"topK": self.top_k},
+                                        headers=self._state_headers, timeout=5)
+                if response.status_code == 400:
+                    # top_k above the nodes' top-K capacity: a configuration error, not a blip
+                    raise ValueError(f"System state rejected: {response.text}")
+                response.raise_for_status()
+                if response.headers.get("Content-Type", "").startswith(STATE_MEDIA_TYPE):
+                    return self._state_decoder.decode(response.content)
+                return response.json()
         except requests.exceptions.RequestException as e:
             print(f"Error fetching system state: {e}")
             return None
 
+    def _poll_state(self):
+        """
+        The current state as StateArrays, None if it couldn't be fetched. The
+        observation, mask and reward all read it, so it is parsed only here.
+        """
+        state = self._get_system_state()
+        return None if state is None else state_to_arrays(state)
+
     def _parse_state_to_observation(self, state_json):
-        # We must enforce a consistent order for the vector
-        node_order = [f"replication-{r}" for r in NODE_PREFIXES]
-        key_order = [f"user_profile_{i}" for i in range(NUM_KEYS)]
-
-        presence = np.zeros((NUM_NODES, NUM_KEYS), dtype=np.float32)
-        read_counts = np.zeros((NUM_NODES, NUM_KEYS), dtype=np.float32)
-        write_counts = np.zeros((NUM_NODES, NUM_KEYS), dtype=np.float32)
-
-        # Map node IDs from JSON to our index (0-4)
-        # Handle exact match or prefix match
-        node_map = {}
-        for i, target_name in enumerate(node_order):
-            for node_data in state_json:
-                # Check if "replication-us" is in "replication-us" (Docker) or "us-east-1" (App)
-                if node_data['nodeId'] == target_name:
-                    node_map[target_name] = node_data
-                    break
-
-        for i, node_name in enumerate(node_order):
-            node_data = node_map.get(node_name)
-            if not node_data: continue
-
-            for key_name, metrics in node_data.get('keyMetrics', {}).items():
-                if key_name in key_order:
-                    key_idx = key_order.index(key_name)
-                    
-                    presence[i, key_idx] = 1.0
-                    # Apply log normalization to match GNN (optional but recommended)
-                    read_counts[i, key_idx] = np.log1p(metrics.get('readCount', 0))
-                    write_counts[i, key_idx] = np.log1p(metrics.get('writeCount', 0))
-        
-        return np.concatenate([
-            presence.flatten(),
-            read_counts.flatten(),
-            write_counts.flatten()
-        ])
+        # Keys and nodes are discovered from the state itself. The projection
+        # keeps each one in a stable slot, so the vector layout stays fixed
+        # while keys churn and regions come and go.
+        self.projection.update(state_json)
+        self._fits = self.projection.fits(state_json)
+        if self.obs_pipeline is None:
+            obs, self._presence = self.projection.observation(state_json)
+            return obs
+        obs, self._presence, counts = self.projection.observation(state_json, counts=True)
+        return self._apply_pipeline(obs, counts, self.projection.node_slots.names, self.projection.key_slots.names)
+
+    def _apply_pipeline(self, obs, counts, node_names, key_names):
+        return self.obs_pipeline(*grid_rows(obs, counts, node_names, key_names)).ravel()
+
+    def load_obs_pipeline(self, path, training=False):
+        """Takes over the pipeline statistics saved next to a model (frozen unless `training`)."""
+        pipelines = load_pipelines(path, training)
+        if pipelines:
+            self.obs_pipeline = pipelines["obs"]
+        return pipelines is not None
 
     def _execute_action(self, action_type, key, node):
         payload = {"actionType": action_type, "key": key, "targetNode": node}
         try:
-            requests.post(f"{CONTROLLER_URL}/rl/execute-action", json=payload, timeout=1)
+            with TELEMETRY.timer("http_action"):
+                requests.post(f"{CONTROLLER_URL}/rl/execute-action", json=payload, timeout=1)
             return True
         except: return False
 
     def _calculate_reward(self, state_json):
         if not state_json: return -100.0
-
-        total_storage_cost = 0
-        total_reads = 0
-        predicted_latency_sum = 0
-        
-        presence_map = {}
-        for node_data in state_json:
-            node_id = node_data['nodeId']
-            total_storage_cost += node_data.get('storageCost', 0)
-            for k in node_data.get('keyMetrics', {}).keys():
-                if k not in presence_map: presence_map[k] = set()
-                presence_map[k].add(node_id)
-
-        for node_data in state_json:
-            req_node = node_data['nodeId']
-            for k, m in node_data.get('keyMetrics', {}).items():
-                reads = m.get('readCount', 0)
-                total_reads += reads
-                is_local = req_node in presence_map.get(k, set())
-                predicted_latency_sum += reads * (10 if is_local else 150)
-
-        avg_lat = (predicted_latency_sum / total_reads) if total_reads > 0 else 0
-        
-        # Scale reward down slightly to prevent huge numbers with 20 keys
-        reward = -1 * ((LATENCY_WEIGHT * avg_lat) + (COST_WEIGHT * total_storage_cost))
-        return reward / 20.0
+        return self.reward_model.state_reward(state_json)
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
-        state_json = self._get_system_state()
+        if self.obs_pipeline is not None:
+            self.obs_pipeline.reset()
+        state_json = self._poll_state()
+        if self.action_mode == "factorized":
+            self._load_window(state_json)
+            return self._factorized_obs(), {}
         if state_json is None:
             return np.zeros(self.observation_space.shape, dtype=np.float32), {}
         return self._parse_state_to_observation(state_json), {}
 
     def step(self, action):
-        action_type, key, node = self._decode_action(action)
-        
-        # Execute
-        self._execute_action(action_type, key, node)
+        with TELEMETRY.timer("env_step"):
+            return self._step(action)
+
+    def _step(self, action):
+        if self.action_mode == "factorized":
+            return self._step_factorized(action)
+
+        decoded = self._decode_action(action)
+
+        # Execute (None for the no-op and the fallback action of an all-empty layout)
+        if decoded and self.guard.admit(*decoded):
+            self._execute_action(*decoded)
         
         # New State
-        new_state = self._get_system_state()
+        new_state = self._poll_state()
         obs = self._parse_state_to_observation(new_state)
         reward = self._calculate_reward(new_state)
         
         return obs, reward, False, False, {}
     
     def action_masks(self):
-        # Create a boolean mask of valid actions
-        # Action 0..(N*K-1) = REPLICATE
-        # Action (N*K)..(2*N*K-1) = EVICT
-        
-        # This requires fetching state, which is slow, but necessary for Masking.
-        # Ideally, cache the state from the last step() call.
-        state_json = self._get_system_state() 
-        
-        presence_map = set()
-        
-        node_order = [f"replication-{r}" for r in NODE_PREFIXES]
-        key_order = [f"user_profile_{i}" for i in range(NUM_KEYS)]
-        
-        for i, node_name in enumerate(node_order):
-            # Find node data
-            node_data = next((n for n in state_json if n['nodeId'] == node_name), None)
-            if node_data:
-                for key_name in node_data.get('keyMetrics', {}).keys():
-                    if key_name in key_order:
-                        k_idx = key_order.index(key_name)
-                        presence_map.add((k_idx, i))
-
-        mask = [False] * (NUM_KEYS * NUM_NODES * 2)
-        
-        limit = NUM_KEYS * NUM_NODES
-        
-        for k in range(NUM_KEYS):
-            for n in range(NUM_NODES):
-                flat_idx = (k * NUM_NODES) + n
-                
-                is_present = (k, n) in presence_map
-                
-                if is_present:
-                    # If present, we can EVICT (Action index + limit)
-                    mask[limit + flat_idx] = True
-                    # We CANNOT Replicate (already there)
-                else:
-                    # If not present, we can REPLICATE (Action index)
-                    mask[flat_idx] = True
-                    # We CANNOT Evict (not there)
-                    
-        return mask
\ No newline at end of file
+        with TELEMETRY.timer("mask"):
+            return self._action_masks()
+
+    def _action_masks(self):
+        if self.action_mode == "factorized":
+            # Uses the state cached by the last step, no extra round-trip
+            return self.heads.mask(self._presence, len(self._window_keys))
+
+        # Built from the presence matrix of the last observation, so the mask
+        # always matches what the policy saw (and needs no extra round-trip).
+        mask = self.projection.action_mask(self._presence, self._fits)
+        return self.guard.filter_mask(mask, self.projection.decode_action, self.projection.noop_index)
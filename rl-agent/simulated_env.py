@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from simulated_cluster import SimulatedCluster
+
+from replication_env import ReplicationEnv
+
+
+class SimulatedReplicationEnv(ReplicationEnv):
+    """
+    ReplicationEnv backed by an in-process SimulatedCluster instead of the
+    controller. Every state poll advances the workload by one tick, so a step
+    costs microseconds and the same seed gives the same episode.
+    """
+
+    def __init__(self, cluster_kwargs=None, max_episode_steps=200, seed=None, **env_kwargs):
+        super().__init__(**env_kwargs)
+        self.cluster_kwargs = dict(cluster_kwargs or {})
+        self.max_episode_steps = max_episode_steps
+        self._seed = seed
+        self.cluster = SimulatedCluster(seed=seed, **self.cluster_kwargs)
+        self._steps = 0
+        # Dwell times and budgets run on the cluster's model time, not wall time
+        self.guard.clock = lambda: self.cluster.ticks * self.cluster.tick_seconds
+
+    def _get_system_state(self):
+        self.cluster.tick()
+        return self.cluster.state(self.top_k)
+
+    def _execute_action(self, action_type, key, node):
+        return self.cluster.execute(action_type, key, node)
+
+    def reset(self, seed=None, options=None):
+        # A fresh cluster per episode; an explicit seed overrides the constructor's
+        if seed is not None:
+            self._seed = seed
+        self.cluster = SimulatedCluster(seed=self._seed, **self.cluster_kwargs)
+        self._steps = 0
+        self.guard.reset()
+        return super().reset(seed=seed, options=options)
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = super().step(action)
+        self._steps += 1
+        return obs, reward, terminated, self._steps >= self.max_episode_steps, info
@@ -1,47 +1,149 @@
+import os
+import sys
 import time
+import argparse
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_util import make_vec_env
-from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList
 from sb3_contrib import MaskablePPO
 
 from replication_env import ReplicationEnv
+from behavior_cloning import pretrain_policy
+from checkpointing import (BEST_MODEL_FILE, MODEL_FILE, BackgroundEvalCallback, CheckpointCallback, env_pipelines,
+                           latest_checkpoint, load_checkpoint, save_model)
 
-class RewardLoggerCallback(BaseCallback):
-    def __init__(self, verbose=0):
-        super(RewardLoggerCallback, self).__init__(verbose)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from obs_pipeline import add_pipeline_arguments, pipeline_config, pipeline_path
+from placement_guard import add_guard_arguments, guard_config
+from telemetry import TELEMETRY, Telemetry, time_forward_passes
+from transitions import TransitionRecorder
+
+class TelemetryCallback(BaseCallback):
+    """
+    Aggregates rewards and timings in ring buffers (common/telemetry.py) and
+    emits mean/p50/p99 every `summary_interval` steps, instead of a
+    logger.record call per step.
+    """
+    def __init__(self, summary_interval=2048, verbose=0):
+        super(TelemetryCallback, self).__init__(verbose)
+        self.summary_interval = summary_interval
+        self._hooks = []
+
+    def _on_training_start(self):
+        self._hooks = time_forward_passes(self.model.policy)
 
     def _on_step(self) -> bool:
-        reward = self.locals['rewards'][0]
-        self.logger.record('custom/step_reward', reward)
+        for reward in self.locals['rewards']:
+            TELEMETRY.record('reward', reward)
+        if self.n_calls % self.summary_interval == 0:
+            self._emit()
         return True
 
+    def _emit(self):
+        summary = TELEMETRY.summary()
+        for name, stats in summary.items():
+            for stat in ('mean', 'p50', 'p99'):
+                self.logger.record(f'telemetry/{name}_{stat}', stats[stat])
+        # Cumulative placement counters (executed / thrash / blocked) of the first env
+        for name, count in self.training_env.get_attr('guard', [0])[0].stats().items():
+            self.logger.record(f'placement/{name}', count)
+        if self.verbose:
+            print(f"--- Telemetry at {self.num_timesteps} steps (times in ms) ---")
+            print(Telemetry.format_summary(summary))
+
+    def _on_training_end(self):
+        for hook in self._hooks:
+            hook.remove()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--action_mode", type=str, default="flat", choices=["flat", "factorized"],
+                        help="flat=one action per (key, node, op), factorized=key -> node -> op heads")
+    parser.add_argument("--num_shards", type=int, default=1, help="Key shards (factorized mode)")
+    parser.add_argument("--window_keys", type=int, default=20, help="Keys visible per step (factorized mode)")
+    parser.add_argument("--top_k", type=int, default=None,
+                        help="Keys fetched per state poll (default: what the observation can show)")
+    parser.add_argument("--state_format", type=str, default="json", choices=["json", "binary"],
+                        help="Encoding requested for /rl/system-state (binary: columnar, see common/state_codec.py)")
+    add_guard_arguments(parser)
+    add_pipeline_arguments(parser)
+    parser.add_argument("--warm_start", type=str, default=None,
+                        help="Transition shard directory to pre-train the policy on (oracle_dataset.py, --log_transitions)")
+    parser.add_argument("--bc_epochs", type=int, default=10)
+    parser.add_argument("--log_transitions", type=str, default=None,
+                        help="Also record every training step into this shard directory for later reuse")
+    parser.add_argument("--checkpoint_dir", type=str, default="./checkpoints")
+    parser.add_argument("--checkpoint_freq", type=int, default=10_000, help="Steps between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="Continue from the latest checkpoint in --checkpoint_dir")
+    parser.add_argument("--telemetry_interval", type=int, default=2048,
+                        help="Steps between telemetry summaries (reward, env/HTTP/forward/mask times)")
+    parser.add_argument("--eval_freq", type=int, default=10_000,
+                        help="Steps between background evaluations on the simulated cluster (0 disables)")
+    parser.add_argument("--eval_workload", type=str, default=None,
+                        help="Workload model config for the simulated cluster (see common/workload_models.py)")
+    args = parser.parse_args()
+
     print("--- Starting Reinforcement Learning Training ---")
 
-    env = make_vec_env(ReplicationEnv, n_envs=1)
+    env_kwargs = {
+        "action_mode": args.action_mode,
+        "num_shards": args.num_shards,
+        "window_keys": args.window_keys,
+        "top_k": args.top_k,
+        "state_format": args.state_format,
+        "guard": guard_config(args),
+        "obs_pipeline": pipeline_config(args),
+    }
+    env = make_vec_env(ReplicationEnv, n_envs=1, env_kwargs=env_kwargs, wrapper_class=TransitionRecorder if args.log_transitions else None,
+       wrapper_kwargs={"directory": args.log_transitions} if args.log_transitions else None)
+
+    checkpoint = latest_checkpoint(args.checkpoint_dir) if args.resume else None
+    if checkpoint:
+        print(f"Resuming from {checkpoint}...")
+        model = load_checkpoint(MaskablePPO, checkpoint, env, tensorboard_log="./ppo_replication_tensorboard/")
+        # Normalization statistics continue from where the checkpoint left them
+        env.env_method("load_obs_pipeline", pipeline_path(os.path.join(checkpoint, MODEL_FILE)), True)
+    else:
+        if args.resume:
+            print(f"No checkpoint in {args.checkpoint_dir}, starting from scratch")
+        model = MaskablePPO("MlpPolicy",
+                    env,
+                    verbose=1, # Prints out training progress
+                    learning_rate=0.0003,
+                    ent_coef=0.05,
+                    n_steps=2048, 
+                    batch_size=64,
+                    tensorboard_log="./ppo_replication_tensorboard/")
 
-    model = MaskablePPO("MlpPolicy",
-                env,
-                verbose=1, # Prints out training progress
-                learning_rate=0.0003,
-                ent_coef=0.05,
-                n_steps=2048, 
-                batch_size=64,
-                tensorboard_log="./ppo_replication_tensorboard/")
+        if args.warm_start:
+            print(f"Warm-starting policy from {args.warm_start}...")
+            pretrain_policy(model, args.warm_start, epochs=args.bc_epochs)
 
     training_timesteps = 100_000
-    print(f"Starting training for {training_timesteps} timesteps...")
+    remaining = training_timesteps - model.num_timesteps
+    print(f"Starting training for {remaining} of {training_timesteps} timesteps...")
     start_time = time.time()
+
+    callbacks = [TelemetryCallback(args.telemetry_interval, verbose=1), CheckpointCallback(args.checkpoint_dir, args.checkpoint_freq, verbose=1)]
+    if args.eval_freq > 0:
+        callbacks.append(BackgroundEvalCallback(args.checkpoint_dir, args.eval_freq, env_kwargs=env_kwargs,
+                                                cluster_kwargs={"workload": args.eval_workload} if args.eval_workload else None))
     
-    model.learn(total_timesteps=training_timesteps, callback=RewardLoggerCallback())
+    model.learn(total_timesteps=remaining, callback=CallbackList(callbacks), reset_num_timesteps=checkpoint is None)
     
     end_time = time.time()
+    if model.num_timesteps < training_timesteps:
+        print(f"--- Training stopped at {model.num_timesteps} timesteps, continue with --resume ---")
+        env.close()
+        sys.exit(0)
     print(f"--- Training Finished ---")
     print(f"Total training time: {end_time - start_time:.2f} seconds")
 
     model_path = "ppo_replication_policy.zip"
-    model.save(model_path)
+    save_model(model, model_path, env_pipelines(env))
+    env.close()  # flushes the last transition shard
 
     print(f"Trained model saved to: {model_path}")
+    print(f"Best model on the simulated cluster: {os.path.join(args.checkpoint_dir, BEST_MODEL_FILE)}")
     print("\nTo view training logs, run the following command in your terminal:")
     print(f"tensorboard --logdir ./ppo_replication_tensorboard/")
\ No newline at end of file
@@ -1,11 +1,17 @@
 import requests
 import time
-import random
 import numpy as np
 import itertools
 import argparse
+import os
+import sys
 
-CONTROLLER_WRITE_URL = "http://localhost:8080/api/v1/data"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from sampling import DiurnalProfile, FlashCrowdProfile, RequestStream, skewed_profile, zipf_profile
+from workload_models import load_workload
+
+CONTROLLER_URL = os.environ.get("CONTROLLER_URL", "http://localhost:8080")
+CONTROLLER_WRITE_URL = f"{CONTROLLER_URL}/api/v1/data"
 
 # Reads go directly to the Regional Nodes (simulating Geo-DNS/Edge Access)
 # These ports match your docker-compose.yml external ports
@@ -16,41 +22,18 @@ REGION_NODES = {
     "sa-east":  "http://localhost:8084", # New
     "jp-east":  "http://localhost:8085"  # New
 }
+# e.g. REGION_NODE_URLS="us-east=http://127.0.0.1:40001,eu-west=http://127.0.0.1:40002"
+if os.environ.get("REGION_NODE_URLS"):
+    REGION_NODES.update(item.split("=", 1) for item in os.environ["REGION_NODE_URLS"].split(","))
 
 KEYS = [f"user_profile_{i}" for i in range(20)]
 REGIONS = list(REGION_NODES.keys())
 
 PHASE_DURATION_SECONDS = 10
 
-# Helper to generate skewed profiles automatically
+# Helper to generate skewed profiles automatically (80% of the traffic on the hot keys / regions)
 def generate_skewed_profile(hot_key_indices, hot_region_indices, read_ratio=0.9):
-    num_keys = len(KEYS)
-    num_regions = len(REGIONS)
-    
-    if len(hot_key_indices) == num_keys:
-        key_probs = np.full(num_keys, 1.0 / num_keys)
-    else:
-        # Distribute 20% noise to cold keys
-        key_probs = np.full(num_keys, 0.2 / (num_keys - len(hot_key_indices)))
-        # Distribute 80% traffic to hot keys
-        for idx in hot_key_indices:
-            key_probs[idx] = 0.8 / len(hot_key_indices)
-    
-    # If all regions are hot, distribute evenly.
-    if len(hot_region_indices) == num_regions:
-        region_probs = np.full(num_regions, 1.0 / num_regions)
-    else:
-        # Distribute 20% noise to cold regions
-        region_probs = np.full(num_regions, 0.2 / (num_regions - len(hot_region_indices)))
-        # Distribute 80% traffic to hot regions
-        for idx in hot_region_indices:
-            region_probs[idx] = 0.8 / len(hot_region_indices)
-
-    return {
-        "key_distribution": key_probs / key_probs.sum(),
-        "region_distribution": region_probs / region_probs.sum(),
-        "read_write_ratio": read_ratio
-    }
+    return skewed_profile(len(KEYS), len(REGIONS), hot_key_indices, hot_region_indices, read_ratio)
 
 # Define dynamic profiles (Randomized Logic)
 ALL_PROFILES = [
@@ -101,47 +84,81 @@ def send_read_request(key, region):
         print(f"READ ({region}) -> Key: {key}, FAILED: {e}")
 
 
+def time_varying_profile(mode, rng):
+    """Zipf popularity over KEYS, optionally with follow-the-sun regions or flash crowds."""
+    base = zipf_profile(len(KEYS), len(REGIONS), exponent=1.1, rng=rng)
+    if mode == "diurnal":
+        # One simulated day per 6 profile phases
+        return DiurnalProfile(base, period=6 * PHASE_DURATION_SECONDS, resolution=1.0)
+    if mode == "flash":
+        crowd = rng.choice(len(KEYS), size=2, replace=False)
+        return FlashCrowdProfile(base, crowd, period=6 * PHASE_DURATION_SECONDS,
+                                 duration=PHASE_DURATION_SECONDS, regions=[int(rng.integers(len(REGIONS)))])
+    return base
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", type=str, default="train", choices=["train", "test"], 
-                        help="train=Cyclic patterns, test=Random patterns")
+    parser.add_argument("--mode", type=str, default="train", choices=["train", "test", "zipf", "diurnal", "flash"],
+                        help="train=Cyclic patterns, test=Random patterns, zipf/diurnal/flash=Zipf keys "
+                             "(static, follow-the-sun regions, periodic flash crowds)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible request sequence")
+    parser.add_argument("--workload", type=str, default=None,
+                        help="Workload model config (JSON, see common/workload_models.py); overrides --mode")
     args = parser.parse_args()
 
+    workload = load_workload(args.workload)
+    if workload is not None:
+        unknown = [r for r in workload.regions if r not in REGION_NODES]
+        if unknown:
+            sys.exit(f"Workload regions without a node URL: {unknown}")
+        KEYS = workload.key_names()
+        REGIONS = workload.regions
+
+    # Every random choice below comes from this one generator
+    rng = np.random.default_rng(args.seed)
+    stream = RequestStream(rng)
+
     print("--- Starting Dynamic Workload Generator (Direct Access Mode) ---")
 
     # Initial data seeding
-    print("Seeding initial data...")
+    print(f"Seeding initial data ({len(KEYS)} keys)...")
     for key in KEYS:
         send_write_request(key, f"initial_value_for_{key}")
 
     start_time = time.time()
-    
-    if args.mode == "train":
+    run_start = start_time
+
+    if workload is not None:
+        current_profile = workload
+    elif args.mode == "train":
         # Cyclic
         profile_iterator = itertools.cycle(ALL_PROFILES)
         current_profile = next(profile_iterator)
-    else:
+    elif args.mode == "test":
         # Test: Random
-        current_profile = random.choice(ALL_PROFILES)
+        current_profile = ALL_PROFILES[rng.integers(len(ALL_PROFILES))]
+    else:
+        current_profile = time_varying_profile(args.mode, rng)
 
     print(f"\n--- Switched to new workload profile ---")
 
     while True:
         # Check if it's time to switch profiles
-        if time.time() - start_time > PHASE_DURATION_SECONDS:
+        if workload is None and args.mode in ("train", "test") and time.time() - start_time > PHASE_DURATION_SECONDS:
             start_time = time.time()
 
             if args.mode == "train":
                 current_profile = next(profile_iterator)
                 print(f"\n--- Switched to NEXT Cyclic Profile ---")
             else:
-                current_profile = random.choice(ALL_PROFILES)
+                current_profile = ALL_PROFILES[rng.integers(len(ALL_PROFILES))]
                 print(f"\n--- Switched to RANDOM Test Profile ---")
 
         # Choose parameters based on profile
-        key_to_access = np.random.choice(KEYS, p=current_profile["key_distribution"])
-        user_region = np.random.choice(REGIONS, p=current_profile["region_distribution"])
-        is_read_action = random.random() < current_profile["read_write_ratio"]
+        key_idx, region_idx, is_read_action = stream.draw(current_profile.at(time.time() - run_start))
+        key_to_access = KEYS[key_idx]
+        user_region = REGIONS[region_idx]
 
         print(f"User from '{user_region}' is accessing data...")
         
@@ -150,8 +167,8 @@ if __name__ == "__main__":
             send_read_request(key_to_access, user_region)
         else:
             # WRITE: Go to controller
-            new_value = f"val_{random.randint(1000, 9999)}"
+            new_value = f"val_{rng.integers(1000, 10000)}"
             send_write_request(key_to_access, new_value)
 
         # Rate limiting
-        time.sleep(0.5)
\ No newline at end of file
+        time.sleep(0.5)